@@ -0,0 +1,242 @@
+"""
+Generate large, realistic `accounts` tables for performance work.
+
+    python manage.py generate_accounts --count 10000000 --seed 42 --workers 8
+
+Rows are a pure function of (seed, row index): phones and emails come from seeded permutations of the
+row index so they are unique without lookups, ids use the IdGenerator bit layout and are unique per row
+index, and every block of BLOCK_SIZE rows draws from its own seeded RNG. The same seed therefore produces
+the same table whatever the chunk size or worker count.
+"""
+import csv
+import io
+import json
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+from multiprocessing import get_context
+
+from account.models import Account
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from libs.id_gen.id_gen import MaxSequence, SEQUENCE_BITS, WORKER_ID_BITS, compose_id
+
+BLOCK_SIZE = 1000
+PHONE_SPACE = 10 ** 9
+EMAIL_SPACE = 10 ** 12
+
+COLUMNS = (
+    "id",
+    "password",
+    "last_login",
+    "dateJoined",
+    "phoneVerified",
+    "roles",
+    "phone",
+    "email",
+    "isDeleted",
+    "timezone",
+    "geoEnabled",
+    "lang",
+    "displayName",
+    "location",
+    "entities",
+    "lastUpdated",
+)
+
+TIMEZONES = ("Africa/Accra", "Africa/Lagos", "Africa/Nairobi", "Europe/London", "America/New_York")
+LANGS = ("en", "fr", "tw", "ha", "ee")
+LOCATIONS = ("Accra", "Kumasi", "Tamale", "Takoradi", "Cape Coast", "Lagos", "Nairobi", None)
+EMAIL_DOMAINS = ("gmail.com", "yahoo.com", "outlook.com", "pipa.com")
+FIRST_NAMES = ("Ama", "Kofi", "Esi", "Kwame", "Akosua", "Yaw", "Efua", "Kojo", "Abena", "Kwesi")
+LAST_NAMES = ("Mensah", "Owusu", "Boateng", "Asante", "Osei", "Addo", "Badu", "Quaye", "Tetteh", "Adjei")
+DEVICES = ("android", "ios", "web")
+CHANNELS = ("organic", "referral", "ads", "partner")
+
+# signups are skewed towards the end of the range, like a growing product
+DEFAULT_SKEW = 3.0
+
+
+def _multiplier(rng: random.Random, space: int) -> int:
+    # coprime with 10**n, so index -> (a * index + b) % space is a permutation of the space
+    while True:
+        candidate = rng.randrange(space // 10, space)
+        if candidate % 2 and candidate % 5:
+            return candidate
+
+
+class RowFactory:
+    __slots__ = ("seed", "since", "span", "skew", "password", "_phone", "_email", "_id_base")
+
+    def __init__(self, seed: int, since: datetime, until: datetime, password: str, skew=DEFAULT_SKEW):
+        rng = random.Random(seed)
+        self.seed = seed
+        self.since = since
+        self.span = (until - since).total_seconds()
+        self.skew = skew
+        self.password = password
+        self._phone = (_multiplier(rng, PHONE_SPACE), rng.randrange(PHONE_SPACE))
+        self._email = (_multiplier(rng, EMAIL_SPACE), rng.randrange(EMAIL_SPACE))
+        self._id_base = int(since.timestamp() * 1000)
+
+    def account_id(self, index: int) -> int:
+        low_bits = SEQUENCE_BITS + WORKER_ID_BITS
+        return compose_id(self._id_base + (index >> low_bits), index >> SEQUENCE_BITS, index & MaxSequence)
+
+    def phone(self, index: int) -> str:
+        a, b = self._phone
+        return f"+233{(a * index + b) % PHONE_SPACE:09d}"
+
+    def email_local_part(self, index: int) -> str:
+        a, b = self._email
+        return f"user{(a * index + b) % EMAIL_SPACE:012d}"
+
+    def rows(self, start: int, stop: int):
+        """
+        Yield rows for indexes [start, stop) as tuples in COLUMNS order
+        """
+        block = start // BLOCK_SIZE
+        while block * BLOCK_SIZE < stop:
+            rng = random.Random(self.seed * 1_000_003 + block)
+            first = block * BLOCK_SIZE
+            for index in range(first, min(stop, first + BLOCK_SIZE)):
+                row = self._row(index, rng)
+                if index >= start:
+                    yield row
+            block += 1
+
+    def _row(self, index: int, rng: random.Random):
+        date_joined = self.since + timedelta(seconds=self.span * rng.random() ** (1 / self.skew))
+        last_updated = date_joined + timedelta(seconds=rng.random() * 30 * 24 * 3600)
+        first_name, last_name = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        has_email = rng.random() < 0.7
+
+        entities = {
+            "devices": rng.sample(DEVICES, rng.randint(1, 2)),
+            "signupChannel": rng.choice(CHANNELS),
+            "marketing": {"sms": rng.random() < 0.6, "email": rng.random() < 0.3},
+            "ordersCount": int(rng.paretovariate(1.5)) - 1,
+        }
+
+        return (
+            self.account_id(index),
+            self.password,
+            None,
+            date_joined,
+            rng.random() < 0.85,
+            "courier" if rng.random() < 0.05 else "user",
+            self.phone(index),
+            f"{self.email_local_part(index)}@{rng.choice(EMAIL_DOMAINS)}" if has_email else None,
+            rng.random() < 0.01,
+            rng.choice(TIMEZONES),
+            rng.random() < 0.4,
+            rng.choice(LANGS),
+            f"{first_name} {last_name}",
+            rng.choice(LOCATIONS),
+            entities,
+            last_updated,
+        )
+
+
+def _truncate():
+    if connection.vendor != "postgresql":
+        Account.objects.all().delete()
+        return
+
+    # PostgreSQL refuses to truncate a table other tables reference, even empty ones, without CASCADE
+    with connection.cursor() as cursor:
+        cursor.execute(f'TRUNCATE TABLE "{Account._meta.db_table}" CASCADE')
+
+
+def _copy_rows(rows) -> int:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    count = 0
+
+    for row in rows:
+        writer.writerow(
+            json.dumps(value) if isinstance(value, dict)
+            else value.isoformat() if isinstance(value, datetime)
+            else value
+            for value in row
+        )
+        count += 1
+
+    buffer.seek(0)
+    columns = ", ".join(f'"{column}"' for column in COLUMNS)
+    with connection.cursor() as cursor:
+        cursor.copy_expert(f'COPY "{Account._meta.db_table}" ({columns}) FROM STDIN WITH (FORMAT csv)', buffer)
+
+    return count
+
+
+def _bulk_create_rows(rows) -> int:
+    accounts = [Account(**dict(zip(COLUMNS, row))) for row in rows]
+    Account.objects.bulk_create(accounts, batch_size=5000)
+
+    return len(accounts)
+
+
+def _load_chunk(factory: RowFactory, start: int, stop: int, method: str) -> int:
+    rows = factory.rows(start, stop)
+    try:
+        return _copy_rows(rows) if method == "copy" else _bulk_create_rows(rows)
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = "Generate N synthetic accounts, deterministically from a seed"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, required=True)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--chunk-size", type=int, default=50_000, help=f"rounded up to a multiple of {BLOCK_SIZE}")
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument("--method", choices=("copy", "bulk"), default=None, help="default: copy on PostgreSQL")
+        parser.add_argument("--since", default="2021-01-01", help="earliest dateJoined (ISO date)")
+        parser.add_argument("--until", default="2024-01-01", help="latest dateJoined (ISO date)")
+        parser.add_argument("--password", default="Pipa-synthetic@1", help="password every account gets")
+        parser.add_argument(
+            "--truncate", action="store_true",
+            help="empty the accounts table first; on PostgreSQL this is TRUNCATE ... CASCADE, which also empties "
+                 "every table referencing it, such as django_admin_log",
+        )
+
+    def handle(self, *args, **options):
+        count = options["count"]
+        if count <= 0:
+            raise CommandError("--count must be positive")
+
+        method = options["method"] or ("copy" if connection.vendor == "postgresql" else "bulk")
+        if method == "copy" and connection.vendor != "postgresql":
+            raise CommandError("COPY is only available on PostgreSQL, use --method bulk")
+
+        chunk_size = -(-options["chunk_size"] // BLOCK_SIZE) * BLOCK_SIZE
+        since = datetime.fromisoformat(options["since"]).replace(tzinfo=timezone.utc)
+        until = datetime.fromisoformat(options["until"]).replace(tzinfo=timezone.utc)
+
+        # hash once: per-row hashing would dominate the run time
+        password = make_password(options["password"], salt=f"synthetic{options['seed']}")
+        factory = RowFactory(options["seed"], since, until, password)
+
+        if options["truncate"]:
+            _truncate()
+
+        # workers are forked, they must not share the parent's database connection
+        connections.close_all()
+
+        chunks = [(start, min(count, start + chunk_size)) for start in range(0, count, chunk_size)]
+        started = time.monotonic()
+        loaded = 0
+
+        with ProcessPoolExecutor(max_workers=options["workers"], mp_context=get_context("fork")) as pool:
+            futures = [pool.submit(_load_chunk, factory, start, stop, method) for start, stop in chunks]
+            for future in as_completed(futures):
+                loaded += future.result()
+                elapsed = time.monotonic() - started
+                self.stdout.write(f"{loaded:,}/{count:,} accounts ({loaded / elapsed:,.0f} rows/s)")
+
+        self.stdout.write(self.style.SUCCESS(f"Generated {loaded:,} accounts in {time.monotonic() - started:.1f}s"))
@@ -0,0 +1,32 @@
+"""
+Publish committed account outbox events to the account event stream.
+
+    python manage.py relay_outbox            # run until stopped
+    python manage.py relay_outbox --once     # drain the outbox and exit
+
+Any number of relays may run at once, rows claimed by one relay are skipped by the others.
+"""
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from factories.service_factory import ServiceFactory
+
+
+class Command(BaseCommand):
+    help = "Relay account outbox events to the Redis event stream"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="drain the outbox and exit")
+        parser.add_argument("--poll-interval", type=float, default=settings.ACCOUNT_OUTBOX.poll_interval)
+
+    def handle(self, *args, **options):
+        relay = ServiceFactory.create_outbox_relay()
+
+        if options["once"]:
+            self.stdout.write(f"Relayed {relay.drain()} events")
+            return
+
+        while True:
+            if not relay.drain():
+                time.sleep(options["poll_interval"])
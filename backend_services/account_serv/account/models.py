@@ -1,17 +1,18 @@
 from account.account_manager import AccountManager
+from django.contrib.auth.base_user import AbstractBaseUser
 from django.db import models
 from django.db.models import JSONField
 from django.utils.translation import gettext_lazy as _
 
 # Create your models here.
 
-class Account(models.Model):
+class Account(AbstractBaseUser):
     """
     Account Model
     This model can be used to modify Account data. retrieving, creating, updating, and deletion of data
     """
 
-    id = models.IntegerField(_("id"), primary_key=True, editable=False, db_index=True)
+    id = models.BigIntegerField(_("id"), primary_key=True, editable=False, db_index=True)
     dateJoined = models.DateTimeField(_("date joined"), auto_now_add=True, db_column="dateJoined")
     phoneVerified = models.BooleanField(_("phone verified"), default=False, db_column="phoneVerified")
     roles = models.CharField(_("roles"), max_length=255, )
@@ -40,3 +41,24 @@ class Account(models.Model):
 
     def __str__(self) -> str:
         return f"{self.id}"
+
+
+class OutboxEvent(models.Model):
+    """
+    OutboxEvent Model
+    Account events written in the same transaction as the change they describe, published later by a relay
+    """
+
+    id = models.BigAutoField(_("id"), primary_key=True)
+    topic = models.CharField(_("topic"), max_length=100)
+    accountId = models.BigIntegerField(_("account id"), db_column="accountId")
+    payload = JSONField(_("payload"), default=dict)
+    createdAt = models.DateTimeField(_("created at"), auto_now_add=True, db_column="createdAt")
+
+    class Meta:
+        db_table = "account_outbox"
+        verbose_name = _("account outbox events")
+        ordering = ["id"]
+
+    def __str__(self) -> str:
+        return f"{self.topic}:{self.accountId}"
@@ -1,21 +1,33 @@
+import functools
 from http import HTTPStatus
 from typing import Any
 
 import structlog
 from account.models import Account
 from django.contrib.auth.tokens import default_token_generator
+from django.db import transaction
 from helpers import signals
+from helpers.event_dispatcher import get_event_dispatcher
+from helpers.idempotency import idempotent
 from models.error_response import ErrorResponse
 from opentelemetry import trace
+from redis.exceptions import RedisError
 from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.views import TokenViewBase
-from serializers.account_serializer import AccountSerializer
-from serializers.token_serializer import TokenObtainPairSerializer
+from serializers.account_serializer import AccountBatchSerializer, AccountSerializer
+from serializers.otp_serializer import SendOtpSerializer, VerifyOtpSerializer
+from serializers.token_serializer import LogoutSerializer, TokenObtainPairSerializer
 from services.account_service import AccountService
+from services.otp_service import OtpService
+from services.token_revocation import get_token_revocations
 from factories.service_factory import ServiceFactory
 
 Logger = structlog.getLogger(__name__)
@@ -26,9 +38,16 @@ tracer = trace.get_tracer(__name__)
 
 
 class AccountViewSet(ModelViewSet):
-    def __init__(self, account_service: AccountService = ServiceFactory.create_account_service()):
-        super().__init__()
-        self.account_service = account_service
+    # the process wide services unless given to as_view; built on first request, not when the URLconf is imported
+    account_service: AccountService | None = None
+    otp_service: OtpService | None = None
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        if self.account_service is None:
+            self.account_service = _account_service()
+        if self.otp_service is None:
+            self.otp_service = _otp_service()
 
     serializer_class = AccountSerializer
     queryset = Account.objects.all()
@@ -41,24 +60,34 @@ class AccountViewSet(ModelViewSet):
         return self.request.user
 
     def perform_update(self, serializer, *args, **kwargs):
-        super(AccountViewSet, self).perform_update(serializer)
-
-        account = serializer.instance
-        signals.account_updated.send(sender=self.__class__, account=account, request=self.request)
+        with transaction.atomic():
+            super(AccountViewSet, self).perform_update(serializer)
+
+            get_event_dispatcher().send(
+                signals.account_updated, sender=self.__class__, account_id=serializer.instance.id,
+                fields=list(serializer.validated_data),
+            )
+
+    @idempotent("account.create")
+    def create(self, request, *args, **kwargs):
+        # through the repository, which writes the outbox event and invalidates the cached lookups
+        result = self.account_service.create_account(request.data)
+        if isinstance(result, ErrorResponse):
+            return Response(status=HTTPStatus.BAD_REQUEST, data=result.asdict())
 
-    def perform_create(self, serializer, *args, **kwargs):
-        account = serializer.save(*args, **kwargs)
-        signals.account_registered.send(sender=self.__class__, account=account, request=self.request)
+        get_event_dispatcher().send(signals.account_registered, sender=self.__class__, account_id=result["id"])
+        return Response(status=HTTPStatus.CREATED, data=result)
 
     def destroy(self, request, *args, **kwargs):
         instance = self.get_object()
         serializer = AccountSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        if instance == request.user:
-            # log user out Or delete any active tokens
-            pass
-        self.perform_destroy(instance)
+        result = self.account_service.delete_account(lookup_field=instance.id)
+        if isinstance(result, ErrorResponse):
+            return Response(status=HTTPStatus.BAD_REQUEST, exception=True, data=result.asdict())
+        # the account's tokens would otherwise stay usable until they expire
+        _revoke_account_tokens(instance.id)
         return Response(status=HTTPStatus.NO_CONTENT)
 
     def get_permissions(self):
@@ -74,6 +103,8 @@ class AccountViewSet(ModelViewSet):
                 self.permission_classes = [IsAuthenticated]
             case "reset_password":
                 self.permission_classes = [AllowAny]
+            case "otp" | "verify_otp":
+                self.permission_classes = [AllowAny]
             case "change_phone_number":
                 self.permission_classes = [IsAuthenticated]
             case "change_account_email":
@@ -86,7 +117,24 @@ class AccountViewSet(ModelViewSet):
 
         return super().get_permissions()
 
+    def get_throttles(self):
+        # the actions open to anonymous requests, see RATE_LIMITS
+        match self.action:
+            case "create":
+                self.throttle_scope = "signup"
+            case "me" if self.request and self.request.method == "POST":
+                self.throttle_scope = "signup"
+            case "reset_password":
+                self.throttle_scope = "reset_password"
+            case "otp" | "verify_otp":
+                self.throttle_scope = "otp"
+            case _:
+                self.throttle_scope = None
+
+        return super().get_throttles()
+
     @action(methods=["get", "delete", "post"], detail=False, url_path="me", url_name="me")
+    @idempotent("account.me")
     def me(self, request: Request, *args, **kwargs):
         match request.method:
             case "GET":
@@ -103,7 +151,8 @@ class AccountViewSet(ModelViewSet):
                     lookup_field=request.user.id
                 )
                 if isinstance(result, ErrorResponse):
-                    Response(status=HTTPStatus.BAD_REQUEST, exception=True, data=result.asdict())
+                    return Response(status=HTTPStatus.BAD_REQUEST, exception=True, data=result.asdict())
+                _revoke_account_tokens(request.user.id)
                 return Response(status=HTTPStatus.OK, data=True)
 
             case "POST":
@@ -114,6 +163,7 @@ class AccountViewSet(ModelViewSet):
                 return Response(status=HTTPStatus.CREATED, exception=True, data=result)
 
     @action(methods=["post"], detail=False, url_path="set-password", url_name="set-password")
+    @idempotent("account.set_password")
     def set_password(self, request: Request):
         result = self.account_service.set_password(
             data=request.data,
@@ -127,18 +177,22 @@ class AccountViewSet(ModelViewSet):
         return Response(data=True, status=HTTPStatus.OK)
 
     @action(methods=["post"], detail=False, url_path="reset-password/", url_name="reset-password")
+    @idempotent("account.reset_password")
     def reset_password(self, request: Request):
         login_field = request.query_params.get("loginField")
         result = self.account_service.reset_password(data=request.data, lookup_field=login_field)
 
         if isinstance(result, ErrorResponse):
             return Response(status=HTTPStatus.BAD_REQUEST, exception=True, data=result.asdict())
+        # whoever held the old password may hold tokens too
+        _revoke_account_tokens(result["id"])
         return Response(
             status=HTTPStatus.CREATED,
             data=True
         )
 
     @action(methods=["post"], detail=False, url_name="change-phone", url_path="change-phone/")
+    @idempotent("account.change_phone")
     def change_phone_number(self, request: Request) -> Response | None:
         login_field = request.query_params.get("loginField")
         result = self.account_service.change_phone_number(
@@ -150,9 +204,10 @@ class AccountViewSet(ModelViewSet):
         if isinstance(result, ErrorResponse):
             return Response(status=HTTPStatus.BAD_REQUEST, exception=True, data=result.asdict())
 
-        Response(status=HTTPStatus.CREATED, data=result)
+        return Response(status=HTTPStatus.CREATED, data=result)
 
     @action(methods=["post"], detail=False, url_name="change-account-email", url_path="change-account-email/")
+    @idempotent("account.change_email")
     def change_account_email(self, request: Request) -> Response | None:
         login_field = request.query_params.get("loginField")
         result = self.account_service.change_email(
@@ -165,6 +220,78 @@ class AccountViewSet(ModelViewSet):
 
         return Response(status=HTTPStatus.CREATED, data=result)
 
+    @action(methods=["post"], detail=False, url_name="batch", url_path="batch")
+    def batch(self, request: Request) -> Response:
+        serializer = AccountBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        result = self.account_service.get_accounts(serializer.validated_data["ids"])
+        if isinstance(result, ErrorResponse):
+            return Response(status=HTTPStatus.BAD_REQUEST, data=result.asdict())
+
+        return Response(status=HTTPStatus.OK, data={"accounts": result})
+
+    @action(methods=["post"], detail=False, url_name="otp", url_path="otp")
+    @idempotent("account.otp")
+    def otp(self, request: Request) -> Response:
+        serializer = SendOtpSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        result = self.otp_service.issue(serializer.validated_data["to"])
+        if isinstance(result, ErrorResponse):
+            return Response(status=HTTPStatus.BAD_REQUEST, data=result.to_dict())
+
+        return Response(status=HTTPStatus.ACCEPTED, data=True)
+
+    @action(methods=["post"], detail=False, url_name="verify-otp", url_path="verify-otp")
+    def verify_otp(self, request: Request) -> Response:
+        serializer = VerifyOtpSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        result = self.otp_service.verify(serializer.validated_data["to"], serializer.validated_data["code"])
+        if isinstance(result, ErrorResponse):
+            return Response(status=HTTPStatus.BAD_REQUEST, data=result.to_dict())
+
+        return Response(status=HTTPStatus.OK, data=True)
+
+    @action(methods=["post"], detail=False, url_name="logout", url_path="logout")
+    def logout(self, request: Request) -> Response:
+        serializer = LogoutSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        revocations = get_token_revocations()
+        if serializer.validated_data["all"]:
+            revocations.revoke_account(request.user.id)
+            return Response(status=HTTPStatus.OK, data=True)
+
+        if "refresh" in serializer.validated_data:
+            try:
+                refresh = RefreshToken(serializer.validated_data["refresh"])
+            except TokenError as exc:
+                raise InvalidToken(exc.args[0])
+            if refresh.get(jwt_settings.USER_ID_CLAIM) != request.user.id:
+                raise PermissionDenied()
+            revocations.revoke(refresh)
+        revocations.revoke(request.auth)
+        return Response(status=HTTPStatus.OK, data=True)
+
+
+@functools.lru_cache(maxsize=None)
+def _account_service() -> AccountService:
+    return ServiceFactory.create_account_service()
+
+
+@functools.lru_cache(maxsize=None)
+def _otp_service() -> OtpService:
+    return ServiceFactory.create_otp_service()
+
+
+def _revoke_account_tokens(account_id: int):
+    try:
+        get_token_revocations().revoke_account(account_id)
+    except RedisError:
+        Logger.error("account tokens not revoked", account_id=account_id, exc_info=True)
+
 
 class TokenObtainPairView(TokenViewBase):
     """
@@ -173,3 +300,4 @@ class TokenObtainPairView(TokenViewBase):
     """
 
     _serializer_class = TokenObtainPairSerializer
+    throttle_scope = "login"
@@ -56,6 +56,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    "helpers.query_budget.QueryCountMiddleware",
 ]
 
 ROOT_URLCONF = 'account_serv.urls'
@@ -96,6 +97,8 @@ DATABASES = {
     }
 }
 
+AUTH_USER_MODEL = "account.Account"
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -156,6 +159,169 @@ REDIS_CONFIG = RedisConfig(
     ttl=os.getenv(f"{REDIS_PREFIX}TTL", REDIS_TTL)
 )
 
+AccountCacheConfig = namedtuple("AccountCacheConfig", "codec,compress_threshold,compress_level")
+
+# "account" writes the compact binary records of helpers/cache_codecs.py, "json" plain JSON; both read either,
+# and so does bm_dispatch_service, which reads the same entries
+ACCOUNT_CACHE = AccountCacheConfig(
+    codec=os.getenv("ACCOUNT_CACHE_CODEC", "account"),
+    compress_threshold=int(os.getenv("ACCOUNT_CACHE_COMPRESS_THRESHOLD", 1024)),
+    compress_level=int(os.getenv("ACCOUNT_CACHE_COMPRESS_LEVEL", 1)),
+)
+
+QueryBudgetConfig = namedtuple("QueryBudgetConfig", "enabled,strict")
+
+# strict budgets raise instead of logging, the test suite turns this on
+QUERY_BUDGET = QueryBudgetConfig(
+    enabled=os.getenv("QUERY_BUDGET_ENABLED", "true").lower() == "true",
+    strict=os.getenv("QUERY_BUDGET_STRICT", "false").lower() == "true",
+)
+
+EventDispatchConfig = namedtuple("EventDispatchConfig", "workers,queue_size,max_retries,retry_backoff")
+
+# account signals are delivered to receivers on a worker pool
+EVENT_DISPATCH = EventDispatchConfig(
+    workers=int(os.getenv("EVENT_DISPATCH_WORKERS", 4)),
+    queue_size=int(os.getenv("EVENT_DISPATCH_QUEUE_SIZE", 10_000)),
+    max_retries=int(os.getenv("EVENT_DISPATCH_MAX_RETRIES", 3)),
+    retry_backoff=float(os.getenv("EVENT_DISPATCH_RETRY_BACKOFF", 0.5)),
+)
+
+OutboxConfig = namedtuple("OutboxConfig", "stream,stream_max_length,batch_size,poll_interval")
+
+# outbox rows are relayed to a Redis stream that downstream services consume incrementally
+ACCOUNT_OUTBOX = OutboxConfig(
+    stream=os.getenv("ACCOUNT_EVENT_STREAM", "account:events"),
+    stream_max_length=int(os.getenv("ACCOUNT_EVENT_STREAM_MAX_LENGTH", 1_000_000)),
+    batch_size=int(os.getenv("ACCOUNT_OUTBOX_BATCH_SIZE", 500)),
+    poll_interval=float(os.getenv("ACCOUNT_OUTBOX_POLL_INTERVAL", 0.5)),
+)
+
+AccountReadConfig = namedtuple(
+    "AccountReadConfig", "ttl,negative_ttl,lock_ttl,lock_wait,poll_interval,early_refresh_beta,initial_load_seconds"
+)
+
+# single account reads: a miss is loaded once under a short Redis lock, hot entries are refreshed early and
+# lookups that find nothing are remembered for negative_ttl seconds
+ACCOUNT_READS = AccountReadConfig(
+    ttl=int(REDIS_CONFIG.ttl),
+    negative_ttl=int(os.getenv("ACCOUNT_READS_NEGATIVE_TTL", 30)),
+    lock_ttl=float(os.getenv("ACCOUNT_READS_LOCK_TTL", 5)),
+    lock_wait=float(os.getenv("ACCOUNT_READS_LOCK_WAIT", 2)),
+    poll_interval=float(os.getenv("ACCOUNT_READS_POLL_INTERVAL", 0.02)),
+    early_refresh_beta=float(os.getenv("ACCOUNT_READS_EARLY_REFRESH_BETA", 1.0)),
+    initial_load_seconds=0.005,
+)
+
+AccountL1Config = namedtuple("AccountL1Config", "enabled,max_entries,max_bytes,ttl,channel")
+
+# in-process cache in front of Redis; kept coherent by invalidations published on `channel`, ttl bounds how
+# stale an entry can get if one is missed
+ACCOUNT_L1 = AccountL1Config(
+    enabled=os.getenv("ACCOUNT_L1_ENABLED", "true").lower() == "true",
+    max_entries=int(os.getenv("ACCOUNT_L1_MAX_ENTRIES", 10_000)),
+    max_bytes=int(os.getenv("ACCOUNT_L1_MAX_BYTES", 32 * 1024 * 1024)),
+    ttl=float(os.getenv("ACCOUNT_L1_TTL", 5)),
+    channel=os.getenv("ACCOUNT_L1_CHANNEL", "account:cache:invalidate"),
+)
+
+AccountBatchConfig = namedtuple("AccountBatchConfig", "max_ids,chunk_size")
+
+# batch lookups resolve ids a chunk at a time: one MGET, one IN query and one cache backfill per chunk
+ACCOUNT_BATCH = AccountBatchConfig(
+    max_ids=int(os.getenv("ACCOUNT_BATCH_MAX_IDS", 5000)),
+    chunk_size=int(os.getenv("ACCOUNT_BATCH_CHUNK_SIZE", 500)),
+)
+
+RateLimitConfig = namedtuple("RateLimitConfig", "enabled,prefix,local_max_keys,redis_retry_interval,scopes")
+
+# token buckets per view scope, by client ip, by the login (phone, email or username) a request names and by
+# authenticated account; "5/min" allows five requests at once, then one every twelve seconds. When Redis is
+# unreachable each process counts on its own, retrying Redis every redis_retry_interval seconds
+RATE_LIMITS = RateLimitConfig(
+    enabled=os.getenv("RATE_LIMITS_ENABLED", "true").lower() == "true",
+    prefix=os.getenv("RATE_LIMITS_PREFIX", "ratelimit"),
+    local_max_keys=int(os.getenv("RATE_LIMITS_LOCAL_MAX_KEYS", 100_000)),
+    redis_retry_interval=float(os.getenv("RATE_LIMITS_REDIS_RETRY_INTERVAL", 5)),
+    scopes={
+        "login": {
+            "ip": os.getenv("RATE_LIMITS_LOGIN_IP", "30/min"),
+            "login": os.getenv("RATE_LIMITS_LOGIN_LOGIN", "5/min"),
+        },
+        "signup": {
+            "ip": os.getenv("RATE_LIMITS_SIGNUP_IP", "10/hour"),
+            "login": os.getenv("RATE_LIMITS_SIGNUP_LOGIN", "3/hour"),
+        },
+        "reset_password": {
+            "ip": os.getenv("RATE_LIMITS_RESET_PASSWORD_IP", "10/hour"),
+            "login": os.getenv("RATE_LIMITS_RESET_PASSWORD_LOGIN", "3/hour"),
+        },
+        "otp": {
+            "ip": os.getenv("RATE_LIMITS_OTP_IP", "20/hour"),
+            "login": os.getenv("RATE_LIMITS_OTP_LOGIN", "5/hour"),
+            "account": os.getenv("RATE_LIMITS_OTP_ACCOUNT", "5/hour"),
+        },
+    },
+)
+
+OtpConfig = namedtuple("OtpConfig", "digits,ttl,max_attempts,secret,message")
+
+# phone verification codes: only an HMAC of each code is stored, under `secret`, for ttl seconds; a code is
+# dropped after max_attempts wrong guesses
+OTP = OtpConfig(
+    digits=int(os.getenv("OTP_DIGITS", 6)),
+    ttl=int(os.getenv("OTP_TTL", 300)),
+    max_attempts=int(os.getenv("OTP_MAX_ATTEMPTS", 5)),
+    secret=os.getenv("OTP_SECRET", SECRET_KEY),
+    message=os.getenv("OTP_MESSAGE", "Your verification code is {code}. It expires in {minutes} minutes."),
+)
+
+SmsConfig = namedtuple("SmsConfig", "provider,batch_size,flush_interval,queue_size")
+
+# messages are queued and handed to the provider in batches of up to batch_size, flush_interval seconds
+# apart at most; the console provider only logs them
+SMS = SmsConfig(
+    provider=os.getenv("SMS_PROVIDER", "helpers.sms.ConsoleSmsProvider"),
+    batch_size=int(os.getenv("SMS_BATCH_SIZE", 100)),
+    flush_interval=float(os.getenv("SMS_FLUSH_INTERVAL", 0.05)),
+    queue_size=int(os.getenv("SMS_QUEUE_SIZE", 10_000)),
+)
+
+TokenRevocationConfig = namedtuple(
+    "TokenRevocationConfig", "prefix,refresh_interval,rebuild_interval,capacity,error_rate"
+)
+
+# revoked tokens live in Redis and are mirrored in each process, in a Bloom filter sized for `capacity` jtis
+# at `error_rate` false positives; the mirror reads new revocations at most every refresh_interval seconds
+# and is rebuilt every rebuild_interval
+TOKEN_REVOCATION = TokenRevocationConfig(
+    prefix=os.getenv("TOKEN_REVOCATION_PREFIX", "revoked"),
+    refresh_interval=float(os.getenv("TOKEN_REVOCATION_REFRESH_INTERVAL", 1)),
+    rebuild_interval=float(os.getenv("TOKEN_REVOCATION_REBUILD_INTERVAL", 3600)),
+    capacity=int(os.getenv("TOKEN_REVOCATION_CAPACITY", 100_000)),
+    error_rate=float(os.getenv("TOKEN_REVOCATION_ERROR_RATE", 0.001)),
+)
+
+IdempotencyConfig = namedtuple("IdempotencyConfig", "prefix,ttl,lock_ttl,wait,poll_interval,max_key_length")
+
+# responses to requests sent with an Idempotency-Key are replayed to retries for ttl seconds; a retry of a
+# request still running waits up to `wait` seconds for it, a request holds its key for lock_ttl at most
+IDEMPOTENCY = IdempotencyConfig(
+    prefix=os.getenv("IDEMPOTENCY_PREFIX", "idempotency"),
+    ttl=int(os.getenv("IDEMPOTENCY_TTL", 24 * 60 * 60)),
+    lock_ttl=float(os.getenv("IDEMPOTENCY_LOCK_TTL", 30)),
+    wait=float(os.getenv("IDEMPOTENCY_WAIT", 10)),
+    poll_interval=float(os.getenv("IDEMPOTENCY_POLL_INTERVAL", 0.05)),
+    max_key_length=int(os.getenv("IDEMPOTENCY_MAX_KEY_LENGTH", 255)),
+)
+
+ErrorReportingConfig = namedtuple("ErrorReportingConfig", "traceback_sample_rate")
+
+# share of unexpected account errors logged with their full traceback, expected errors never are
+ERROR_REPORTING = ErrorReportingConfig(
+    traceback_sample_rate=float(os.getenv("ERROR_REPORTING_TRACEBACK_SAMPLE_RATE", 0.1)),
+)
+
 CREATE_SESSION_ON_LOGIN = True
 
 VERIFYING_KEY = os.environ.get("VERIFYING_KEY")
@@ -164,7 +330,8 @@ SIGNING_KEY = os.environ.get("SIGNING_KEY")
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=5),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
-    "ROTATE_REFRESH_TOKENS": False,
+    # the refreshed token is revoked through TOKEN_REVOCATION, not the database backed blacklist app
+    "ROTATE_REFRESH_TOKENS": True,
     "BLACKLIST_AFTER_ROTATION": False,
     "UPDATE_LAST_LOGIN": False,
     "ALGORITHM": "RS256",
@@ -179,4 +346,13 @@ SIMPLE_JWT = {
     "AUTH_HEADER_NAME": "HTTP_AUTHORIZATION",
     "USER_ID_FIELD": "id",
     "USER_ID_CLAIM": "account_id",
+    "TOKEN_USER_CLASS": "helpers.authentication.AccountTokenUser",
+    "TOKEN_REFRESH_SERIALIZER": "serializers.token_serializer.TokenRefreshSerializer",
+}
+
+REST_FRAMEWORK = {
+    # the account is built from the access token's claims, see helpers/authentication.py
+    "DEFAULT_AUTHENTICATION_CLASSES": ("helpers.authentication.StatelessJWTAuthentication",),
+    # limits only views with a throttle_scope, see helpers/throttling.py and RATE_LIMITS
+    "DEFAULT_THROTTLE_CLASSES": ("helpers.throttling.RateLimitThrottle",),
 }
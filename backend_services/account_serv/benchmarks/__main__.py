@@ -0,0 +1,88 @@
+"""
+Usage (from the account_serv directory):
+
+    python -m benchmarks micro --output results/micro.json --baseline benchmarks/baseline.json
+    python -m benchmarks load --base-url http://localhost:8000 --phone +233200000000 --password secret
+
+Exits with status 1 when a benchmark regresses past the threshold against the baseline.
+"""
+import argparse
+import os
+import sys
+
+import django
+
+
+def _parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="account_serv benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    micro = sub.add_parser("micro", help="run microbenchmarks")
+    micro.add_argument("--suite", action="append", help="suite to run, may be repeated (default: all)")
+
+    load = sub.add_parser("load", help="drive load against a running service")
+    load.add_argument("--base-url", default="http://localhost:8000")
+    load.add_argument("--phone", required=True, help="login of an existing, active account")
+    load.add_argument("--password", required=True)
+    load.add_argument("--concurrency", type=int, default=8)
+    load.add_argument("--duration", type=float, default=10.0, help="seconds per scenario")
+    load.add_argument("--scenario", action="append", help="scenario to run, may be repeated (default: all)")
+
+    for command in (micro, load):
+        command.add_argument("--output", default="benchmark-results.json", help="machine readable results file")
+        command.add_argument("--baseline", help="results file to compare against")
+        command.add_argument("--threshold", type=float, default=None, help="allowed regression, e.g. 0.2 for 20%%")
+
+    return parser
+
+
+def main(argv=None) -> int:
+    args = _parser().parse_args(argv)
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "account_serv.settings")
+    django.setup()
+
+    from benchmarks import harness
+    from helpers.structlog_helpers import configure_handlers
+
+    configure_handlers(sterr_log=True, file_log_path="", verbose=False)
+
+    if args.command == "micro":
+        from benchmarks import micro
+
+        results = micro.run(args.suite)
+    else:
+        from benchmarks import load
+
+        config = load.LoadConfig(
+            base_url=args.base_url,
+            phone=args.phone,
+            password=args.password,
+            concurrency=args.concurrency,
+            duration=args.duration,
+        )
+        results = load.run(config, args.scenario)
+
+    for result in results:
+        print(
+            f"{result.name:<48} {result.ops_per_sec:>14,.0f} ops/s  "
+            f"p50 {result.p50_us:>10.2f}us  p95 {result.p95_us:>10.2f}us  p99 {result.p99_us:>10.2f}us"
+            + (f"  errors {result.errors}" if result.errors else "")
+            + "".join(f"  {name} {value}" for name, value in result.extra.items())
+        )
+
+    harness.write_results(args.output, results)
+
+    if not args.baseline:
+        return 0
+
+    threshold = args.threshold if args.threshold is not None else harness.DEFAULT_THRESHOLD
+    regressions = harness.compare(results, harness.load_results(args.baseline), threshold)
+    for regression in regressions:
+        print(f"REGRESSION {regression}", file=sys.stderr)
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
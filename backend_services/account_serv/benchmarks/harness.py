@@ -0,0 +1,154 @@
+"""
+Timing, result files and baseline comparison shared by the micro benchmarks and the load driver.
+"""
+import asyncio
+import json
+import platform
+import statistics
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Iterable, List
+
+RESULTS_VERSION = 1
+
+# A benchmark regresses when its throughput drops, or its p95 latency grows, by more than this fraction
+DEFAULT_THRESHOLD = 0.2
+
+
+@dataclass
+class BenchmarkResult:
+    name: str
+    kind: str
+    operations: int
+    seconds: float
+    ops_per_sec: float
+    mean_us: float
+    p50_us: float
+    p95_us: float
+    p99_us: float
+    errors: int = 0
+    extra: Dict = field(default_factory=dict)
+
+
+@dataclass
+class Regression:
+    name: str
+    metric: str
+    baseline: float
+    current: float
+    change: float
+
+    def __str__(self) -> str:
+        return f"{self.name}: {self.metric} {self.baseline:.2f} -> {self.current:.2f} ({self.change:+.1%})"
+
+
+def percentile(sorted_samples: List[float], pct: float) -> float:
+    if not sorted_samples:
+        return 0.0
+
+    index = min(len(sorted_samples) - 1, max(0, round(pct / 100 * len(sorted_samples)) - 1))
+    return sorted_samples[index]
+
+
+def summarize(name: str, kind: str, samples_us: List[float], operations: int, seconds: float, errors=0, **extra):
+    samples_us = sorted(samples_us)
+
+    return BenchmarkResult(
+        name=name,
+        kind=kind,
+        operations=operations,
+        seconds=round(seconds, 6),
+        ops_per_sec=round(operations / seconds, 2) if seconds else 0.0,
+        mean_us=round(statistics.fmean(samples_us), 3) if samples_us else 0.0,
+        p50_us=round(percentile(samples_us, 50), 3),
+        p95_us=round(percentile(samples_us, 95), 3),
+        p99_us=round(percentile(samples_us, 99), 3),
+        errors=errors,
+        extra=extra,
+    )
+
+
+def run_micro(name: str, func: Callable[[], object], rounds=200, inner=100, warmup=20) -> BenchmarkResult:
+    """
+    Time `rounds` batches of `inner` calls. Batching keeps timer overhead out of sub-microsecond operations,
+    latency percentiles are per call averaged within a batch.
+    """
+    for _ in range(warmup):
+        func()
+
+    samples = []
+    started = time.perf_counter()
+    for _ in range(rounds):
+        batch_started = time.perf_counter_ns()
+        for _ in range(inner):
+            func()
+        samples.append((time.perf_counter_ns() - batch_started) / inner / 1000)
+    elapsed = time.perf_counter() - started
+
+    return summarize(name, "micro", samples, rounds * inner, elapsed)
+
+
+def run_async_micro(name: str, func: Callable[[], Awaitable], rounds=200, inner=100, warmup=20) -> BenchmarkResult:
+    """
+    Same as run_micro, but the whole loop runs inside a single event loop so loop start-up isn't measured.
+    """
+
+    async def _run():
+        for _ in range(warmup):
+            await func()
+
+        samples = []
+        started = time.perf_counter()
+        for _ in range(rounds):
+            batch_started = time.perf_counter_ns()
+            for _ in range(inner):
+                await func()
+            samples.append((time.perf_counter_ns() - batch_started) / inner / 1000)
+
+        return samples, time.perf_counter() - started
+
+    samples, elapsed = asyncio.run(_run())
+    return summarize(name, "micro", samples, rounds * inner, elapsed)
+
+
+def write_results(path: str | Path, results: Iterable[BenchmarkResult]):
+    payload = {
+        "version": RESULTS_VERSION,
+        "created": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.platform(),
+        "results": [asdict(result) for result in results],
+    }
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(payload, indent=2))
+
+
+def load_results(path: str | Path) -> Dict[str, Dict]:
+    payload = json.loads(Path(path).read_text())
+    return {result["name"]: result for result in payload["results"]}
+
+
+def compare(results: Iterable[BenchmarkResult], baseline: Dict[str, Dict], threshold=DEFAULT_THRESHOLD):
+    """
+    Benchmarks missing from the baseline are ignored, so new benchmarks never fail the comparison.
+    """
+    regressions = []
+
+    for result in results:
+        base = baseline.get(result.name)
+        if base is None:
+            continue
+
+        if base["ops_per_sec"] and result.ops_per_sec < base["ops_per_sec"] * (1 - threshold):
+            change = result.ops_per_sec / base["ops_per_sec"] - 1
+            regressions.append(Regression(result.name, "ops_per_sec", base["ops_per_sec"], result.ops_per_sec, change))
+
+        if base["p95_us"] and result.p95_us > base["p95_us"] * (1 + threshold):
+            change = result.p95_us / base["p95_us"] - 1
+            regressions.append(Regression(result.name, "p95_us", base["p95_us"], result.p95_us, change))
+
+    return regressions
@@ -0,0 +1,160 @@
+"""
+End-to-end load driver for a running account service (backed by a local Postgres and Redis).
+
+Each scenario runs `concurrency` worker threads for `duration` seconds, every worker keeps its own
+keep-alive connection. Only the standard library is used so the driver runs anywhere the service does.
+"""
+import http.client
+import itertools
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Tuple
+from urllib.parse import urlsplit
+
+from benchmarks.harness import BenchmarkResult, summarize
+
+Request = Tuple[str, str, Dict | None, Dict[str, str]]
+
+
+@dataclass
+class LoadConfig:
+    base_url: str
+    phone: str
+    password: str
+    concurrency: int = 8
+    duration: float = 10.0
+    timeout: float = 10.0
+
+
+class _Client:
+    __slots__ = ("_host", "_port", "_timeout", "_connection")
+
+    def __init__(self, base_url: str, timeout: float):
+        parts = urlsplit(base_url)
+        self._host = parts.hostname
+        self._port = parts.port or 80
+        self._timeout = timeout
+        self._connection = None
+
+    def request(self, method: str, path: str, body: Dict | None = None, headers: Dict[str, str] | None = None):
+        if self._connection is None:
+            self._connection = http.client.HTTPConnection(self._host, self._port, timeout=self._timeout)
+
+        payload = json.dumps(body) if body is not None else None
+        all_headers = {"Content-Type": "application/json", **(headers or {})}
+
+        try:
+            self._connection.request(method, path, body=payload, headers=all_headers)
+            response = self._connection.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException):
+            self._connection.close()
+            self._connection = None
+            raise
+
+        return response.status, data
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+
+
+def obtain_access_token(config: LoadConfig) -> str:
+    client = _Client(config.base_url, config.timeout)
+    try:
+        status, data = client.request("POST", "/token/access/", _credentials(config))
+    finally:
+        client.close()
+
+    if status != 200:
+        raise RuntimeError(f"could not obtain an access token, status {status}: {data[:200]!r}")
+
+    return json.loads(data)["access"]
+
+
+def _credentials(config: LoadConfig) -> Dict:
+    return {"loginField": config.phone, "phone": config.phone, "password": config.password}
+
+
+def scenarios(config: LoadConfig, access_token: str) -> Dict[str, Callable[[], Request]]:
+    auth = {"Authorization": f"Bearer {access_token}"}
+    # phone numbers for new accounts must not collide between runs
+    phones = itertools.count(random.randint(0, 10 ** 6) * 1000)
+
+    def token():
+        return "POST", "/token/access/", _credentials(config), {}
+
+    def me():
+        return "GET", "/account/me/", None, auth
+
+    def create():
+        return "POST", "/account/me/", {"phone": f"+2339{next(phones):08d}", "password": "Load-test-secret@1"}, {}
+
+    def listing():
+        return "GET", "/account/", None, auth
+
+    return {"token_access": token, "account_me": me, "account_create": create, "account_list": listing}
+
+
+def run_scenario(name: str, make_request: Callable[[], Request], config: LoadConfig) -> BenchmarkResult:
+    deadline = time.monotonic() + config.duration
+    lock = threading.Lock()
+    samples: List[float] = []
+    statuses: Dict[int, int] = {}
+    errors = 0
+
+    def worker():
+        nonlocal errors
+        client = _Client(config.base_url, config.timeout)
+        local_samples, local_statuses, local_errors = [], {}, 0
+
+        try:
+            while time.monotonic() < deadline:
+                method, path, body, headers = make_request()
+                started = time.perf_counter_ns()
+                try:
+                    status, _ = client.request(method, path, body, headers)
+                except (OSError, http.client.HTTPException):
+                    local_errors += 1
+                    continue
+
+                local_samples.append((time.perf_counter_ns() - started) / 1000)
+                local_statuses[status] = local_statuses.get(status, 0) + 1
+                if status >= 400:
+                    local_errors += 1
+        finally:
+            client.close()
+
+        with lock:
+            samples.extend(local_samples)
+            errors += local_errors
+            for status, count in local_statuses.items():
+                statuses[status] = statuses.get(status, 0) + count
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=config.concurrency) as pool:
+        for future in [pool.submit(worker) for _ in range(config.concurrency)]:
+            future.result()
+    elapsed = time.perf_counter() - started
+
+    return summarize(
+        f"load.{name}",
+        "load",
+        samples,
+        len(samples),
+        elapsed,
+        errors=errors,
+        concurrency=config.concurrency,
+        statuses={str(status): count for status, count in sorted(statuses.items())},
+    )
+
+
+def run(config: LoadConfig, names=None) -> List[BenchmarkResult]:
+    access_token = obtain_access_token(config)
+    available = scenarios(config, access_token)
+
+    return [run_scenario(name, available[name], config) for name in names or available]
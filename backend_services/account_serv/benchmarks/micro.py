@@ -0,0 +1,171 @@
+"""
+Microbenchmarks for the hot, dependency free parts of the service.
+Django must be set up before this module is imported (see benchmarks/__main__.py).
+"""
+import datetime
+import itertools
+from typing import Callable, List
+
+from account.models import Account
+from benchmarks.harness import BenchmarkResult, run_micro
+from benchmarks.stand_ins import InMemoryRedis
+from helpers import validators_helpers as vh
+from helpers.cache_codecs import AccountCodec, JsonCodec
+from helpers.local_cache import LocalCache
+from libs.id_gen import id_gen
+from repositories.redis_repository import RedisRepository
+from serializers.account_serializer import AccountSerializer
+from serializers.otp_serializer import VerifyOtpSerializer
+from services.account_cache import AccountCache
+from services.otp_service import OtpService
+
+
+def _sample_account(pk: int) -> Account:
+    now = datetime.datetime(2023, 8, 10, 9, 23, 23, 336561, tzinfo=datetime.timezone.utc)
+
+    return Account(
+        id=pk,
+        dateJoined=now,
+        lastUpdated=now,
+        phoneVerified=True,
+        roles="user",
+        phone=f"+233{200000000 + pk % 100000000}",
+        email=f"user{pk}@pipa.com",
+        timezone="Africa/Accra",
+        lang="en",
+        displayName=f"User {pk}",
+        location="Accra",
+        entities={"devices": ["android"], "referrer": None, "marketing": {"sms": True, "email": False}},
+    )
+
+
+def bench_id_generation() -> List[BenchmarkResult]:
+    return [
+        run_micro("id_gen.next_id", id_gen.gen.next_id, rounds=200, inner=500),
+        run_micro("id_gen.get_id", id_gen.get_id, rounds=100, inner=100),
+    ]
+
+
+def bench_validators() -> List[BenchmarkResult]:
+    return [
+        run_micro("validators.is_email", lambda: vh.is_email("test.email@pipa.com"), inner=1000),
+        run_micro("validators.is_phone_number", lambda: vh.is_phone_number("+233200000000"), inner=1000),
+    ]
+
+
+def bench_serializers() -> List[BenchmarkResult]:
+    account = _sample_account(7095354049319022592)
+    accounts = [_sample_account(pk) for pk in range(100)]
+    otp = {"to": "+233200000000", "code": "123456"}
+
+    def verify_otp():
+        serializer = VerifyOtpSerializer(data=otp)
+        serializer.is_valid()
+
+    return [
+        run_micro("serializers.account.single", lambda: AccountSerializer(account).data, inner=50),
+        run_micro("serializers.account.page_100", lambda: AccountSerializer(accounts, many=True).data, inner=2),
+        run_micro("serializers.verify_otp.is_valid", verify_otp, inner=50),
+    ]
+
+
+def bench_redis_repository() -> List[BenchmarkResult]:
+    repository = RedisRepository(redis=InMemoryRedis())
+    payload = AccountSerializer(_sample_account(7095354049319022592)).data
+    ids = itertools.cycle(range(1000))
+
+    def set_item():
+        repository.set_item(next(ids), payload)
+
+    def set_item_with_expiration():
+        repository.set_item_with_expiration(next(ids), payload, ttl=60)
+
+    def get_item():
+        repository.get_item_and_set_expiration(next(ids), ttl=60)
+
+    batch = {pk: payload for pk in range(100)}
+    repository.set_items_with_expiration(batch, ttl=600)
+
+    return [
+        run_micro("redis_repository.set_item", set_item),
+        run_micro("redis_repository.set_item_with_expiration", set_item_with_expiration),
+        run_micro("redis_repository.get_item_and_set_expiration", get_item),
+        run_micro("redis_repository.get_items_100", lambda: repository.get_items(batch), inner=10),
+        run_micro("redis_repository.set_items_with_expiration_100",
+                  lambda: repository.set_items_with_expiration(batch, ttl=600), inner=10),
+    ]
+
+
+def bench_cache_codecs() -> List[BenchmarkResult]:
+    payload = AccountSerializer(_sample_account(7095354049319022592)).data
+    results = []
+    for name, codec in (("json", JsonCodec()), ("account", AccountCodec())):
+        encoded = codec.encode(payload)
+
+        def read_phone(codec=codec, encoded=encoded):
+            return codec.decode(encoded)["phone"]
+
+        def read_all(codec=codec, encoded=encoded):
+            return dict(codec.decode(encoded))
+
+        encode = run_micro(f"cache_codec.{name}.encode", lambda codec=codec: codec.encode(payload), inner=200)
+        encode.extra["bytes_per_account"] = len(encoded)
+        results.extend((
+            encode,
+            run_micro(f"cache_codec.{name}.decode_one_field", read_phone, inner=200),
+            run_micro(f"cache_codec.{name}.decode_all_fields", read_all, inner=200),
+        ))
+    return results
+
+
+def bench_account_cache() -> List[BenchmarkResult]:
+    from django.conf import settings
+
+    payload = AccountSerializer(_sample_account(7095354049319022592)).data
+    repository = RedisRepository(redis=InMemoryRedis(), codec=AccountCodec())
+    repository.set_item_with_expiration("42", payload, ttl=600)
+    l2_only = AccountCache(repository, settings.ACCOUNT_READS)
+    two_tier = AccountCache(repository, settings.ACCOUNT_READS, local=LocalCache(1000, 1 << 20, ttl=3600))
+
+    def load():
+        raise AssertionError("benchmark reads are all hits")
+
+    return [
+        run_micro("account_cache.l2_hit", lambda: l2_only.get("42", load)["phone"]),
+        run_micro("account_cache.l1_hit", lambda: two_tier.get("42", load)["phone"], inner=500),
+    ]
+
+
+def bench_otp() -> List[BenchmarkResult]:
+    from django.conf import settings
+
+    repository = RedisRepository(redis=InMemoryRedis())
+    # only the Redis side of verifying runs for a wrong code
+    otp = OtpService(repository, account_repository=None, account_service=None, sms_sender=None,
+                     config=settings.OTP._replace(max_attempts=10 ** 9))
+    repository.set_item_with_expiration(
+        "otp:+233200000042", {"hash": otp._hash("+233200000042", "123456"), "accountId": 42}, ttl=600
+    )
+
+    return [
+        run_micro("otp.verify.wrong_code", lambda: otp.verify("+233200000042", "654321"), inner=200),
+    ]
+
+
+SUITES: dict[str, Callable[[], List[BenchmarkResult]]] = {
+    "id_gen": bench_id_generation,
+    "validators": bench_validators,
+    "serializers": bench_serializers,
+    "redis_repository": bench_redis_repository,
+    "cache_codecs": bench_cache_codecs,
+    "account_cache": bench_account_cache,
+    "otp": bench_otp,
+}
+
+
+def run(suites=None) -> List[BenchmarkResult]:
+    results = []
+    for name in suites or SUITES:
+        results.extend(SUITES[name]())
+
+    return results
@@ -0,0 +1,106 @@
+import time
+
+
+class InMemoryRedis:
+    """
+    Local stand-in for redis.Redis covering the commands RedisRepository uses.
+    Benchmarks against it measure our own overhead (key building, encoding) without the network.
+    """
+
+    __slots__ = ("_data", "_expires")
+
+    def __init__(self):
+        self._data = {}
+        self._expires = {}
+
+    def _alive(self, name):
+        expires = self._expires.get(name)
+        if expires is not None and expires <= _now():
+            self._data.pop(name, None)
+            self._expires.pop(name, None)
+
+        return name in self._data
+
+    @staticmethod
+    def _encode(value):
+        return value.encode() if isinstance(value, str) else value
+
+    def set(self, name, value):
+        self._data[name] = self._encode(value)
+        self._expires.pop(name, None)
+        return True
+
+    def setex(self, name, time, value):
+        self._data[name] = self._encode(value)
+        self._expires[name] = _now() + int(time)
+        return True
+
+    def get(self, name):
+        return self._data.get(name) if self._alive(name) else None
+
+    def getex(self, name, ex=None):
+        if not self._alive(name):
+            return None
+
+        if ex is not None:
+            self._expires[name] = _now() + int(ex)
+        return self._data[name]
+
+    def pttl(self, name):
+        if not self._alive(name):
+            return -2
+        expires = self._expires.get(name)
+        return -1 if expires is None else int((expires - _now()) * 1000)
+
+    def incr(self, name):
+        value = int(self.get(name) or 0) + 1
+        self._data[name] = str(value).encode()
+        return value
+
+    def expire(self, name, time, nx=False):
+        if not self._alive(name) or (nx and name in self._expires):
+            return False
+        self._expires[name] = _now() + int(time)
+        return True
+
+    def mget(self, names):
+        return [self.get(name) for name in names]
+
+    def pipeline(self, transaction=True):
+        return _Pipeline(self)
+
+    def exists(self, *names):
+        return sum(1 for name in names if self._alive(name))
+
+    def delete(self, *names):
+        deleted = 0
+        for name in names:
+            if self._alive(name):
+                del self._data[name]
+                self._expires.pop(name, None)
+                deleted += 1
+        return deleted
+
+
+class _Pipeline:
+    """
+    Queues commands and runs them on execute(), like a redis.client.Pipeline
+    """
+
+    __slots__ = ("_redis", "_commands")
+
+    def __init__(self, redis: InMemoryRedis):
+        self._redis = redis
+        self._commands = []
+
+    def __getattr__(self, name):
+        command = getattr(self._redis, name)
+        return lambda *args, **kwargs: self._commands.append((command, args, kwargs)) or self
+
+    def execute(self):
+        commands, self._commands = self._commands, []
+        return [command(*args, **kwargs) for command, args, kwargs in commands]
+
+
+def _now():
+    return time.monotonic()
@@ -1,2 +1,46 @@
+from typing import Dict, List
+
+
 class AccountError(Exception):
-    pass
+    """
+    An account operation that failed. The subclasses are the expected failures, part of normal traffic (bad
+    input, missing accounts, conflicts): each has a code, a message fit for the client, and is reported
+    without a traceback. A bare AccountError stands for an unexpected failure, the exception behind it
+    chained as its __cause__.
+    """
+
+    code = "account_error"
+    expected = False
+
+    def __init__(self, detail: str = ""):
+        super().__init__(detail)
+        self.detail = detail
+
+
+class InvalidAccountData(AccountError):
+    code = "invalid_data"
+    expected = True
+
+    @classmethod
+    def from_errors(cls, errors: Dict[str, List]) -> "InvalidAccountData":
+        """
+        The error of a serializer's validation errors; a value taken by another account is a conflict
+        """
+        if any(getattr(error, "code", None) == "unique" for messages in errors.values() for error in messages):
+            cls = AccountConflict
+        return cls("; ".join(f"{field}: {' '.join(str(message) for message in messages)}"
+                             for field, messages in errors.items()))
+
+
+class AccountConflict(InvalidAccountData):
+    code = "account_conflict"
+
+
+class AccountNotFound(AccountError):
+    code = "account_not_found"
+    expected = True
+
+
+class AccountPermissionDenied(AccountError):
+    code = "permission_denied"
+    expected = True
@@ -0,0 +1,7 @@
+class QueryBudgetExceeded(Exception):
+    def __init__(self, name: str, budget: int, executed: int, statements: list[str]):
+        super().__init__(f"{name} executed {executed} queries, budget is {budget}")
+        self.name = name
+        self.budget = budget
+        self.executed = executed
+        self.statements = statements
@@ -19,4 +19,71 @@ class RepositoryFactory:
             password_serializer=PasswordSerializer,
             change_phone_serializer=ChangePhoneSerializer,
             set_password_serializer=SetPasswordSerializer,
-        )
\ No newline at end of file
+            outbox_repository=RepositoryFactory.create_outbox_repository(),
+        )
+
+    @staticmethod
+    def create_outbox_repository():
+        from account.models import OutboxEvent
+        from repositories.outbox_repository import OutboxRepository
+
+        return OutboxRepository(outbox_event=OutboxEvent)
+
+    @staticmethod
+    def create_event_stream_repository():
+        from django.conf import settings
+        from helpers.redis_helpers import create_redis_client
+        from redis import Redis
+        from repositories.event_stream_repository import AccountEventStreamRepository
+
+        return AccountEventStreamRepository(
+            redis=create_redis_client(Redis),
+            stream=settings.ACCOUNT_OUTBOX.stream,
+            max_length=settings.ACCOUNT_OUTBOX.stream_max_length,
+        )
+
+    @staticmethod
+    def create_redis_repository():
+        from django.conf import settings
+        from helpers.cache_codecs import create_cache_codec
+        from helpers.redis_helpers import create_redis_client
+        from redis import Redis
+        from repositories.redis_repository import RedisRepository
+
+        return RedisRepository(redis=create_redis_client(Redis), codec=create_cache_codec(settings.ACCOUNT_CACHE))
+
+    @staticmethod
+    def create_rate_limit_repository():
+        from helpers.redis_helpers import create_redis_client
+        from redis import Redis
+        from repositories.rate_limit_repository import RateLimitRepository
+
+        return RateLimitRepository(redis=create_redis_client(Redis))
+
+    @staticmethod
+    def create_otp_redis_repository():
+        from helpers.redis_helpers import create_redis_client
+        from redis import Redis
+        from repositories.redis_repository import RedisRepository
+
+        # codes are small JSON records, not accounts
+        return RedisRepository(redis=create_redis_client(Redis))
+
+    @staticmethod
+    def create_revocation_repository(max_ttl: int):
+        from django.conf import settings
+        from helpers.redis_helpers import create_redis_client
+        from redis import Redis
+        from repositories.revocation_repository import RevocationRepository
+
+        return RevocationRepository(redis=create_redis_client(Redis), prefix=settings.TOKEN_REVOCATION.prefix,
+                                    max_ttl=max_ttl)
+
+    @staticmethod
+    def create_idempotency_repository():
+        from django.conf import settings
+        from helpers.redis_helpers import create_redis_client
+        from redis import Redis
+        from repositories.idempotency_repository import IdempotencyRepository
+
+        return IdempotencyRepository(redis=create_redis_client(Redis), prefix=settings.IDEMPOTENCY.prefix)
@@ -4,7 +4,42 @@ class ServiceFactory:
         from factories.repository_factory import RepositoryFactory
 
         account_repo = RepositoryFactory.create_account_repository()
+        redis_repo = RepositoryFactory.create_redis_repository()
 
+        from services.account_cache import get_account_cache
         from services.account_service import AccountService
 
-        return AccountService(account_repository=account_repo)
+        account_cache = get_account_cache()
+        account_repo.on_change = account_cache.invalidate
+        return AccountService(account_repository=account_repo, redis_repository=redis_repo,
+                              account_cache=account_cache)
+
+    @staticmethod
+    def create_otp_service():
+        from django.conf import settings
+        from factories.repository_factory import RepositoryFactory
+        from helpers.sms import get_sms_sender
+        from services.account_cache import get_account_cache
+        from services.otp_service import OtpService
+
+        account_repo = RepositoryFactory.create_account_repository()
+        account_repo.on_change = get_account_cache().invalidate
+        return OtpService(
+            redis_repository=RepositoryFactory.create_otp_redis_repository(),
+            account_repository=account_repo,
+            account_service=ServiceFactory.create_account_service(),
+            sms_sender=get_sms_sender(),
+            config=settings.OTP,
+        )
+
+    @staticmethod
+    def create_outbox_relay():
+        from django.conf import settings
+        from factories.repository_factory import RepositoryFactory
+        from services.outbox_relay import OutboxRelay
+
+        return OutboxRelay(
+            outbox_repository=RepositoryFactory.create_outbox_repository(),
+            event_stream_repository=RepositoryFactory.create_event_stream_repository(),
+            batch_size=settings.ACCOUNT_OUTBOX.batch_size,
+        )
@@ -0,0 +1,72 @@
+"""
+Stateless JWT authentication.
+
+The access token already carries the account id and roles, so authenticating a request builds the user from
+its claims without a query, and permission checks such as IsAuthenticated stay off the database. The Account
+behind the token is only loaded when a handler reads one of its fields, from the Redis account cache first.
+Revoked tokens are refused, checked against the in-memory mirror of services/token_revocation.py.
+"""
+from functools import cached_property, lru_cache
+from typing import Tuple
+
+from account.models import Account
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+_ACCOUNT_FIELDS = frozenset(
+    name for field in Account._meta.concrete_fields for name in (field.name, field.attname)
+)
+
+
+@lru_cache(maxsize=None)
+def _account_service():
+    from factories.service_factory import ServiceFactory
+
+    return ServiceFactory.create_account_service()
+
+
+class AccountTokenUser(TokenUser):
+    """
+    The account of a validated access token. `id` and `roles` come from the claims, any other Account field
+    loads the account once per request.
+    """
+
+    @cached_property
+    def roles(self) -> Tuple[str, ...]:
+        roles = self.token.get("roles") or ""
+        return tuple(role.strip() for role in roles.split(",") if role.strip())
+
+    @cached_property
+    def account(self) -> Account:
+        account = _account_service().load_account(self.id)
+        if account is None:
+            raise AuthenticationFailed(_("Account not found"), code="account_not_found")
+        return account
+
+    def __getattr__(self, attr):
+        # `token` is only missing while unpickling, before __init__ has run
+        if attr == "token":
+            raise AttributeError(attr)
+        if attr in _ACCOUNT_FIELDS:
+            return getattr(self.account, attr)
+        return super().__getattr__(attr)
+
+
+class StatelessJWTAuthentication(JWTStatelessUserAuthentication):
+    def get_validated_token(self, raw_token):
+        from services.token_revocation import get_token_revocations
+
+        validated_token = super().get_validated_token(raw_token)
+        # in memory unless the token is probably revoked, see TokenRevocations
+        if get_token_revocations().is_revoked(validated_token):
+            raise InvalidToken(_("Token has been revoked"))
+        return validated_token
+
+    def get_user(self, validated_token) -> AccountTokenUser:
+        if api_settings.USER_ID_CLAIM not in validated_token:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+        return AccountTokenUser(validated_token)
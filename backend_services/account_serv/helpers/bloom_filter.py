@@ -0,0 +1,40 @@
+"""
+A Bloom filter: a compact set that can say an item is certainly absent or probably present.
+"""
+import hashlib
+import math
+
+
+class BloomFilter:
+    """
+    Sized for `capacity` items at a false positive rate of `error_rate`; adding more than capacity raises the
+    rate, callers rebuild a bigger filter instead. Items are positioned by double hashing one blake2b digest.
+    """
+
+    __slots__ = ("capacity", "error_rate", "_bits", "_size", "_hashes", "count")
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self._hashes = max(1, round(self._size / capacity * math.log(2)))
+        self._bits = bytearray((self._size + 7) // 8)
+        self.count = 0
+
+    def add(self, item: str):
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        bits = self._bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._bits)
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return ((first + i * second) % self._size for i in range(self._hashes))
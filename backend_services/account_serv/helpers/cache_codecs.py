@@ -0,0 +1,307 @@
+"""
+Codecs for the payloads RedisRepository caches.
+
+JsonCodec stores JSON text, as the cache always has. AccountCodec stores accounts in a compact binary
+record laid out by a versioned schema, so field names are never stored and datetimes, ints and bools take
+a fixed few bytes:
+
+    version byte | flags byte | body, zlib compressed when flags & COMPRESSED
+
+    body: null bitmap (uint32), the fixed width fields in schema order (ints as int64, bools as int8,
+          datetimes as int64 microseconds since the epoch and int16 UTC offset minutes, the length of
+          strings and JSON fields as uint32), then the UTF-8 bytes of the strings and JSON fields in order
+          and last the JSON of any keys the schema does not know.
+
+Decoding unpacks the fixed part in one call and hands out a read-only mapping that decodes each field the
+first time it is read, so a hit that only needs a few fields never parses `entities` or formats a datetime.
+Datetimes read back as the ISO text the account serializer produces.
+
+Both codecs read the other's entries: JSON starts with "{" and a binary record with its version byte, so
+entries written before a switch stay readable until they expire. A payload that does not fit the schema
+(a string where an int is expected, say) is written as JSON.
+
+bm_dispatch_service decodes the records too (src/helpers/account_records.py), from the same Redis. A new
+schema version goes into its reader first and is written here only once that is deployed.
+"""
+import datetime
+import json
+import struct
+import zlib
+from itertools import accumulate
+from typing import Any, Dict, Iterator, Mapping, NamedTuple, Tuple
+
+COMPRESSED = 0x01
+
+_PREAMBLE = struct.Struct("<BB")
+_JSON_START = b"{"
+_EPOCH = datetime.datetime(1970, 1, 1)
+_NAIVE = -0x8000
+
+INT = "int"
+BOOL = "bool"
+DATETIME = "datetime"
+STR = "str"
+JSON = "json"
+
+_FORMATS = {INT: "q", BOOL: "b", DATETIME: "qh", STR: "I", JSON: "I"}
+
+
+class Schema(NamedTuple):
+    version: int
+    # (name, kind) in record order; a released schema never changes, a new layout is a new version
+    fields: Tuple[Tuple[str, str], ...]
+
+
+ACCOUNT_SCHEMA_V1 = Schema(1, (
+    ("id", INT), ("last_login", DATETIME), ("dateJoined", DATETIME), ("phoneVerified", BOOL), ("roles", STR),
+    ("phone", STR), ("email", STR), ("isDeleted", BOOL), ("timezone", STR), ("geoEnabled", BOOL), ("lang", STR),
+    ("displayName", STR), ("location", STR), ("entities", JSON), ("lastUpdated", DATETIME),
+))
+
+
+class _Unencodable(Exception):
+    pass
+
+
+class JsonCodec:
+    def encode(self, data: Mapping) -> bytes:
+        return json.dumps(dict(data)).encode()
+
+    def decode(self, raw: bytes | str) -> Mapping:
+        return json.loads(raw)
+
+
+class _Layout:
+    __slots__ = ("schema", "fixed", "names", "kinds", "index", "slots", "variable", "segments", "plan")
+
+    def __init__(self, schema: Schema):
+        if len(schema.fields) > 32:
+            raise ValueError("a schema has at most 32 fields")
+        self.schema = schema
+        self.names = tuple(name for name, _ in schema.fields)
+        self.kinds = tuple(kind for _, kind in schema.fields)
+        self.index = {name: position for position, name in enumerate(self.names)}
+        # where each field's values start among the unpacked fixed values, datetimes take two
+        self.slots = tuple(accumulate((len(_FORMATS[kind]) for kind in self.kinds[:-1]), initial=0))
+        # positions of the string and JSON fields, whose bytes follow the fixed part in this order
+        self.variable = tuple(position for position, kind in enumerate(self.kinds) if kind in (STR, JSON))
+        self.segments = {position: segment for segment, position in enumerate(self.variable)}
+        self.fixed = struct.Struct("<I" + "".join(_FORMATS[kind] for kind in self.kinds) + "I")
+        self.plan = tuple(
+            (position, name, kind, self.slots[position], self.segments.get(position))
+            for position, (name, kind) in enumerate(schema.fields)
+        )
+
+
+class AccountCodec:
+    def __init__(self, schemas=(ACCOUNT_SCHEMA_V1,), compress_threshold=1024, compress_level=1):
+        """
+        Writes with the newest of `schemas` and reads any of them
+        """
+        self._layouts = {schema.version: _Layout(schema) for schema in schemas}
+        self._layout = self._layouts[max(self._layouts)]
+        self._compress_threshold = compress_threshold
+        self._compress_level = compress_level
+        self._json = JsonCodec()
+
+    def encode(self, data: Mapping) -> bytes:
+        try:
+            body = self._encode_body(data)
+        except _Unencodable:
+            return self._json.encode(data)
+
+        flags = 0
+        if self._compress_threshold and len(body) >= self._compress_threshold:
+            compressed = zlib.compress(body, self._compress_level)
+            if len(compressed) < len(body):
+                body, flags = compressed, COMPRESSED
+        return _PREAMBLE.pack(self._layout.schema.version, flags) + body
+
+    def decode(self, raw: bytes | str) -> Mapping:
+        if isinstance(raw, str) or raw[:1] == _JSON_START or raw[:1].isspace():
+            return self._json.decode(raw)
+
+        version, flags = _PREAMBLE.unpack_from(raw)
+        layout = self._layouts.get(version)
+        if layout is None:
+            raise ValueError(f"unknown cache schema version {version}")
+        body = zlib.decompress(memoryview(raw)[_PREAMBLE.size:]) if flags & COMPRESSED else raw[_PREAMBLE.size:]
+        return CachedRecord(layout, body)
+
+    def _encode_body(self, data: Mapping) -> bytes:
+        layout = self._layout
+        nulls = 0
+        fixed = []
+        variable = []
+        for position, (name, kind) in enumerate(layout.schema.fields):
+            value = data.get(name)
+            if value is None:
+                nulls |= 1 << position
+                fixed.extend((0, 0) if kind == DATETIME else (0,))
+                if kind in (STR, JSON):
+                    variable.append(b"")
+                continue
+            if kind == INT:
+                if type(value) is not int:
+                    raise _Unencodable(name)
+                fixed.append(value)
+            elif kind == BOOL:
+                if type(value) is not bool:
+                    raise _Unencodable(name)
+                fixed.append(value)
+            elif kind == DATETIME:
+                fixed.extend(_pack_datetime(value))
+            else:
+                if kind == STR and not isinstance(value, str):
+                    raise _Unencodable(name)
+                encoded = (value if kind == STR else json.dumps(value, separators=(",", ":"))).encode()
+                fixed.append(len(encoded))
+                variable.append(encoded)
+
+        extra = {key: value for key, value in data.items() if key not in layout.index}
+        extra = json.dumps(extra, separators=(",", ":")).encode() if extra else b""
+        try:
+            header = layout.fixed.pack(nulls, *fixed, len(extra))
+        except struct.error:
+            raise _Unencodable("out of range")
+        return b"".join((header, *variable, extra))
+
+
+class CachedRecord(Mapping):
+    """
+    A decoded binary record, fields are decoded on first read
+    """
+    __slots__ = ("_layout", "_body", "_nulls", "_fixed", "_offsets", "_decoded", "_extra")
+
+    def __init__(self, layout: _Layout, body: bytes):
+        self._layout = layout
+        self._body = body
+        values = layout.fixed.unpack_from(body)
+        self._nulls = values[0]
+        self._fixed = values[1:]
+        lengths = [self._fixed[layout.slots[position]] for position in layout.variable]
+        lengths.append(values[-1])
+        self._offsets = tuple(accumulate(lengths, initial=layout.fixed.size))
+        self._decoded: Dict[str, Any] = {}
+        self._extra: Dict | None = None
+
+    def __getitem__(self, key: str):
+        try:
+            return self._decoded[key]
+        except KeyError:
+            pass
+
+        position = self._layout.index.get(key)
+        if position is None:
+            return self._extras()[key]
+        value = None if self._nulls >> position & 1 else self._decode(position)
+        self._decoded[key] = value
+        return value
+
+    def __iter__(self) -> Iterator[str]:
+        self._decode_all()
+        yield from self._layout.names
+        yield from self._extra
+
+    def _decode_all(self):
+        """
+        Decode every field not read yet: iterating is a read of the whole record (dict(record), serializing
+        it), done here in one pass
+        """
+        decoded = self._decoded
+        if len(decoded) >= len(self._layout.names) and self._extra is not None:
+            return
+
+        fixed, body, offsets, nulls = self._fixed, self._body, self._offsets, self._nulls
+        for position, name, kind, slot, segment in self._layout.plan:
+            if name in decoded:
+                continue
+            if nulls >> position & 1:
+                decoded[name] = None
+            elif kind == STR:
+                decoded[name] = body[offsets[segment]:offsets[segment + 1]].decode()
+            elif kind == INT:
+                decoded[name] = fixed[slot]
+            elif kind == BOOL:
+                decoded[name] = bool(fixed[slot])
+            elif kind == DATETIME:
+                decoded[name] = _datetime_text(fixed[slot], fixed[slot + 1])
+            else:
+                decoded[name] = json.loads(body[offsets[segment]:offsets[segment + 1]])
+        self._extras()
+
+    def __len__(self) -> int:
+        return len(self._layout.names) + len(self._extras())
+
+    def __contains__(self, key) -> bool:
+        return key in self._layout.index or key in self._extras()
+
+    def __repr__(self) -> str:
+        return f"CachedRecord({dict(self)!r})"
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Rough memory held: the record's bytes, as decoded fields take about as much again
+        """
+        return 2 * len(self._body)
+
+    def _decode(self, position: int):
+        layout = self._layout
+        kind = layout.kinds[position]
+        slot = layout.slots[position]
+        if kind == INT:
+            return self._fixed[slot]
+        if kind == BOOL:
+            return bool(self._fixed[slot])
+        if kind == DATETIME:
+            return _datetime_text(self._fixed[slot], self._fixed[slot + 1])
+
+        segment = layout.segments[position]
+        encoded = self._body[self._offsets[segment]:self._offsets[segment + 1]]
+        return encoded.decode() if kind == STR else json.loads(encoded)
+
+    def _extras(self) -> Dict:
+        if self._extra is None:
+            encoded = self._body[self._offsets[-2]:self._offsets[-1]]
+            self._extra = json.loads(encoded) if encoded else {}
+        return self._extra
+
+
+def _pack_datetime(value) -> Tuple[int, int]:
+    if isinstance(value, str):
+        try:
+            value = datetime.datetime.fromisoformat(value)
+        except ValueError:
+            raise _Unencodable(value)
+    if not isinstance(value, datetime.datetime):
+        raise _Unencodable(value)
+
+    offset = value.utcoffset()
+    if offset is None:
+        return (value - _EPOCH) // datetime.timedelta(microseconds=1), _NAIVE
+    if offset % datetime.timedelta(minutes=1):
+        raise _Unencodable(value)
+    utc = value.replace(tzinfo=None) - offset
+    return (utc - _EPOCH) // datetime.timedelta(microseconds=1), offset // datetime.timedelta(minutes=1)
+
+
+def _datetime_text(micros: int, offset: int) -> str:
+    value = _EPOCH + datetime.timedelta(0, 0, micros)
+    # as DRF renders UTC
+    if offset == 0:
+        return value.isoformat() + "Z"
+    if offset == _NAIVE:
+        return value.isoformat()
+
+    hours, minutes = divmod(abs(offset), 60)
+    sign = "-" if offset < 0 else "+"
+    return f"{(value + datetime.timedelta(minutes=offset)).isoformat()}{sign}{hours:02d}:{minutes:02d}"
+
+
+def create_cache_codec(config) -> JsonCodec | AccountCodec:
+    if config.codec == "json":
+        return JsonCodec()
+    if config.codec == "account":
+        return AccountCodec(compress_threshold=config.compress_threshold, compress_level=config.compress_level)
+    raise ValueError(f"unknown cache codec {config.codec!r}")
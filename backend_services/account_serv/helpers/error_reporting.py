@@ -0,0 +1,31 @@
+"""
+Logging of AccountErrors that keeps the error path cheap. Expected errors are logged with their code and
+message only; unexpected ones carry the traceback of their cause for a sample of
+ERROR_REPORTING.traceback_sample_rate of them, formatting a traceback being the costly part of a failure.
+"""
+import random
+import traceback
+
+from django.conf import settings
+from errors.account_error import AccountError
+from opentelemetry import metrics
+
+_meter = metrics.get_meter(__name__)
+
+_errors_counter = _meter.create_counter(
+    "account.errors",
+    unit="{error}",
+    description="Account errors by code and whether they were expected",
+)
+
+
+def report_error(logger, event: str, error: AccountError, rand=random.random, **fields):
+    _errors_counter.add(1, {"code": error.code, "expected": error.expected})
+    if error.expected:
+        logger.info(event, code=error.code, detail=error.detail, **fields)
+        return
+
+    cause = error.__cause__ or error
+    if rand() < settings.ERROR_REPORTING.traceback_sample_rate:
+        fields["traceback"] = "".join(traceback.format_exception(cause))
+    logger.error(event, code=error.code, detail=error.detail, error=repr(cause), **fields)
@@ -0,0 +1,152 @@
+"""
+Asynchronous delivery of account signals.
+
+Signal.send runs every receiver inside the request. The dispatcher instead queues the send once the
+surrounding transaction commits, and a small pool of worker threads delivers it with send_robust, retrying
+the receivers that failed, so request latency does not depend on how many receivers are connected. Receivers
+run on another thread after the request is gone: signals carry plain values (ids, field names), never the
+request or model instances.
+
+Delivery is best effort. Account changes that must reach other services go through the outbox, which
+AccountRepository writes in the transaction making the change.
+"""
+import atexit
+import functools
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, NamedTuple
+
+import structlog
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, connections, transaction
+from django.dispatch import Signal
+
+_Logger = structlog.getLogger(__name__)
+
+
+class _Delivery(NamedTuple):
+    signal: Signal
+    sender: Any
+    kwargs: Dict
+
+
+class EventDispatcher:
+    def __init__(self, workers: int, queue_size: int, max_retries: int, retry_backoff: float):
+        self._workers = workers
+        self._max_retries = max_retries
+        self._retry_backoff = retry_backoff
+        self._queue: queue.Queue[_Delivery | None] = queue.Queue(maxsize=queue_size)
+        self._threads: list[threading.Thread] = []
+        self._lock = threading.Lock()
+
+    def send(self, signal: Signal, sender, using=DEFAULT_DB_ALIAS, **kwargs):
+        """
+        Same arguments as Signal.send. Receivers run after the current transaction commits, or straight away
+        when there is none.
+        """
+        enqueue = functools.partial(self._enqueue, signal, sender, kwargs)
+        if connections[using].in_atomic_block:
+            transaction.on_commit(enqueue, using=using)
+        else:
+            enqueue()
+
+    def flush(self):
+        """
+        Block until every queued delivery has been attempted
+        """
+        self._queue.join()
+
+    def shutdown(self):
+        with self._lock:
+            threads, self._threads = self._threads, []
+
+        for _ in threads:
+            self._queue.put(None)
+        for thread in threads:
+            thread.join()
+
+    def _enqueue(self, signal, sender, kwargs):
+        if not signal.has_listeners(sender):
+            return
+
+        self._ensure_workers()
+        delivery = _Delivery(signal, sender, kwargs)
+        try:
+            self._queue.put_nowait(delivery)
+        except queue.Full:
+            _Logger.warning("event queue full, delivering inline")
+            self._deliver(delivery)
+
+    def _ensure_workers(self):
+        if self._threads:
+            return
+
+        with self._lock:
+            while len(self._threads) < self._workers:
+                thread = threading.Thread(
+                    target=self._work, name=f"event-dispatcher-{len(self._threads)}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def _work(self):
+        try:
+            while True:
+                delivery = self._queue.get()
+                try:
+                    if delivery is None:
+                        return
+                    # receivers use this thread's own connections, which no request cycle ever closes
+                    close_old_connections()
+                    try:
+                        self._deliver(delivery)
+                    finally:
+                        close_old_connections()
+                finally:
+                    self._queue.task_done()
+        finally:
+            connections.close_all()
+
+    def _deliver(self, delivery: _Delivery):
+        results = delivery.signal.send_robust(delivery.sender, **delivery.kwargs)
+        failed = [(receiver, result) for receiver, result in results if isinstance(result, Exception)]
+        for attempt in range(self._max_retries):
+            if not failed:
+                return
+
+            time.sleep(self._retry_backoff * 2 ** attempt)
+            failed = [(receiver, error) for receiver, error in (
+                (receiver, _call(receiver, delivery)) for receiver, _ in failed
+            ) if error is not None]
+
+        for receiver, error in failed:
+            _Logger.error(
+                "event delivery failed", receiver=_name(receiver), attempts=self._max_retries + 1, exc_info=error
+            )
+
+
+def _call(receiver: Callable, delivery: _Delivery) -> Exception | None:
+    try:
+        receiver(signal=delivery.signal, sender=delivery.sender, **delivery.kwargs)
+    except Exception as exc:
+        return exc
+    return None
+
+
+def _name(receiver) -> str:
+    return getattr(receiver, "__qualname__", repr(receiver))
+
+
+@functools.lru_cache(maxsize=None)
+def get_event_dispatcher() -> EventDispatcher:
+    config = settings.EVENT_DISPATCH
+    dispatcher = EventDispatcher(
+        workers=config.workers,
+        queue_size=config.queue_size,
+        max_retries=config.max_retries,
+        retry_backoff=config.retry_backoff,
+    )
+    atexit.register(dispatcher.shutdown)
+
+    return dispatcher
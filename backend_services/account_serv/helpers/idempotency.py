@@ -0,0 +1,118 @@
+"""
+Idempotency keys for mutating endpoints.
+
+A client retrying a request sends the same Idempotency-Key header. The first request with a key runs and
+its response is kept in Redis for IDEMPOTENCY.ttl seconds; a retry gets that response back, marked with an
+Idempotent-Replayed header, instead of running again. A retry arriving while the first request still runs
+waits for its response, up to IDEMPOTENCY.wait seconds, then gets a 409 to retry later. Reusing a key for a
+different request is a 422. Requests without the header, and every request while Redis is unreachable,
+run as usual.
+"""
+import functools
+import hashlib
+import json
+import time
+from http import HTTPStatus
+
+import structlog
+from django.conf import settings
+from redis.exceptions import RedisError
+from repositories.idempotency_repository import IdempotencyRepository
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+Logger = structlog.getLogger(__name__)
+
+HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+_MUTATING_METHODS = frozenset(("POST", "PUT", "PATCH", "DELETE"))
+
+
+def idempotent(scope: str):
+    """
+    Make a view method honour idempotency keys. Keys are scoped to `scope` and to the authenticated account,
+    so clients cannot see each other's responses.
+    """
+
+    def decorator(view_method):
+        @functools.wraps(view_method)
+        def wrapper(view, request: Request, *args, **kwargs):
+            key = request.headers.get(HEADER)
+            if not key or request.method not in _MUTATING_METHODS:
+                return view_method(view, request, *args, **kwargs)
+            if len(key) > settings.IDEMPOTENCY.max_key_length:
+                return _error(HTTPStatus.BAD_REQUEST, f"{HEADER} is longer than {settings.IDEMPOTENCY.max_key_length}")
+
+            account_id = request.user.id if request.user and request.user.is_authenticated else "anonymous"
+            return _run(get_idempotency_repository(), f"{scope}:{account_id}:{key}", _fingerprint(request),
+                        lambda: view_method(view, request, *args, **kwargs))
+
+        return wrapper
+
+    return decorator
+
+
+def _run(repository: IdempotencyRepository, key: str, fingerprint: str, handle, clock=time.monotonic,
+         sleep=time.sleep) -> Response:
+    config = settings.IDEMPOTENCY
+    try:
+        claimed, record = repository.claim(key, fingerprint, ttl=config.lock_ttl)
+    except RedisError:
+        Logger.warning("idempotency key not claimed, running the request", key=key, exc_info=True)
+        return handle()
+
+    if not claimed:
+        deadline = clock() + config.wait
+        while record is not None and record["pending"] and clock() < deadline:
+            sleep(config.poll_interval)
+            try:
+                record = repository.get(key)
+            except RedisError:
+                break
+        if record is None:
+            # the first request failed and released the key meanwhile
+            return _run(repository, key, fingerprint, handle, clock, sleep)
+        if record["fingerprint"] != fingerprint:
+            return _error(HTTPStatus.UNPROCESSABLE_ENTITY, f"{HEADER} was used for a different request")
+        if record["pending"]:
+            return _error(HTTPStatus.CONFLICT, "A request with this Idempotency-Key is still in progress")
+        return Response(status=record["status"], data=record["data"], headers={REPLAYED_HEADER: "true"})
+
+    try:
+        response = handle()
+    except BaseException:
+        _release(repository, key)
+        raise
+
+    try:
+        if response.status_code >= 500:
+            # nothing was done, or not completely; let the retry run again
+            repository.release(key)
+        else:
+            repository.complete(key, fingerprint, response.status_code, response.data, ttl=config.ttl)
+    except RedisError:
+        Logger.warning("idempotent response not stored", key=key, exc_info=True)
+    return response
+
+
+def _release(repository: IdempotencyRepository, key: str):
+    try:
+        repository.release(key)
+    except RedisError:
+        Logger.warning("idempotency key not released", key=key, exc_info=True)
+
+
+def _fingerprint(request: Request) -> str:
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(f"{request.method} {request.path}\n{body}".encode()).hexdigest()
+
+
+def _error(status: HTTPStatus, detail: str) -> Response:
+    return Response(status=status, data={"detail": detail})
+
+
+@functools.lru_cache(maxsize=None)
+def get_idempotency_repository() -> IdempotencyRepository:
+    from factories.repository_factory import RepositoryFactory
+
+    return RepositoryFactory.create_idempotency_repository()
@@ -0,0 +1,76 @@
+"""
+A bounded in-process LRU cache with per-entry expiry, capped by entry count and by approximate bytes.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, NamedTuple
+
+
+class _Entry(NamedTuple):
+    value: Any
+    size: int
+    expires_at: float
+
+
+class LocalCache:
+    def __init__(self, max_entries: int, max_bytes: int, ttl: float, clock=time.monotonic):
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[Hashable, _Entry] = OrderedDict()
+        self.nbytes = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            if entry.expires_at <= self._clock():
+                self._remove(key)
+                return default
+            self._entries.move_to_end(key)
+            return entry.value
+
+    def set(self, key: Hashable, value, size: int, ttl: float | None = None):
+        """
+        Keep `value` for `ttl` seconds at most (the cache's ttl when None or longer), least recently used
+        entries making room for it. A value bigger than the whole cache is not kept.
+        """
+        ttl = self._ttl if ttl is None else min(ttl, self._ttl)
+        if ttl <= 0 or size > self._max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = _Entry(value, size, self._clock() + ttl)
+            self.nbytes += size
+            while len(self._entries) > self._max_entries or self.nbytes > self._max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def evict(self, *keys: Hashable) -> int:
+        with self._lock:
+            return sum(1 for key in keys if self._remove(key))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def as_dict(self) -> Dict:
+        return {"entries": len(self._entries), "bytes": self.nbytes, "evictions": self.evictions}
+
+    def _remove(self, key: Hashable) -> bool:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        self.nbytes -= entry.size
+        return True
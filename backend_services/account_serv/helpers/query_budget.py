@@ -0,0 +1,138 @@
+"""
+Query budgets for repository and service methods.
+
+A budget declares the maximum number of SQL statements a block of code may run.
+In strict mode (tests) going over the budget raises QueryBudgetExceeded, otherwise
+the overrun is logged and counted so it shows up in production metrics.
+"""
+from contextlib import ContextDecorator, ExitStack
+
+import structlog
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from errors.query_budget_error import QueryBudgetExceeded
+from opentelemetry import metrics
+
+_Logger = structlog.getLogger(__name__)
+_meter = metrics.get_meter(__name__)
+
+_budget_exceeded_counter = _meter.create_counter(
+    "account.db.query_budget.exceeded",
+    unit="{violation}",
+    description="Number of times a block ran more queries than its budget allows",
+)
+_request_queries_histogram = _meter.create_histogram(
+    "account.db.queries_per_request",
+    unit="{query}",
+    description="Number of SQL statements executed per HTTP request",
+)
+
+# Only the first few statements are kept for the error message
+MAX_RECORDED_STATEMENTS = 10
+
+
+class QueryBudget(ContextDecorator):
+    def __init__(self, max_queries: int, name: str | None = None, using: str = DEFAULT_DB_ALIAS):
+        self.max_queries = max_queries
+        self.name = name
+        self.using = using
+        self.executed = 0
+        self.statements: list[str] = []
+        self._stack: ExitStack | None = None
+
+    def __call__(self, func):
+        if self.name is None:
+            self.name = func.__qualname__
+        return super().__call__(func)
+
+    def _recreate_cm(self):
+        # every decorated call gets its own counter, so budgets are reentrant and thread safe
+        return QueryBudget(self.max_queries, name=self.name, using=self.using)
+
+    def __enter__(self):
+        self.executed = 0
+        self.statements = []
+
+        if settings.QUERY_BUDGET.enabled:
+            self._stack = ExitStack()
+            self._stack.enter_context(connections[self.using].execute_wrapper(self._count))
+
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self._stack is None:
+            return False
+
+        self._stack.close()
+        self._stack = None
+
+        if self.executed > self.max_queries:
+            self._report(propagating=exc_type is not None)
+
+        return False
+
+    def _count(self, execute, sql, params, many, context):
+        self.executed += 1
+        if len(self.statements) < MAX_RECORDED_STATEMENTS:
+            self.statements.append(sql)
+
+        return execute(sql, params, many, context)
+
+    def _report(self, propagating: bool):
+        name = self.name or "anonymous block"
+        _budget_exceeded_counter.add(1, {"budget.name": name})
+
+        if settings.QUERY_BUDGET.strict and not propagating:
+            raise QueryBudgetExceeded(name, self.max_queries, self.executed, self.statements)
+
+        _Logger.warning(
+            "query budget exceeded",
+            budget_name=name,
+            budget=self.max_queries,
+            executed=self.executed,
+            statements=self.statements,
+        )
+
+
+def query_budget(max_queries: int, name: str | None = None, using: str = DEFAULT_DB_ALIAS) -> QueryBudget:
+    """
+    Use as a decorator or a context manager:
+
+        @query_budget(1)
+        def get_account(...): ...
+
+        with query_budget(2, name="list accounts"):
+            ...
+    """
+    return QueryBudget(max_queries, name=name, using=using)
+
+
+class QueryCountMiddleware:
+    """
+    Records the number of SQL statements executed by every request, labelled with the matched route.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.QUERY_BUDGET.enabled:
+            return self.get_response(request)
+
+        executed = 0
+
+        def count(execute, sql, params, many, context):
+            nonlocal executed
+            executed += 1
+            return execute(sql, params, many, context)
+
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(count))
+            response = self.get_response(request)
+
+        match = getattr(request, "resolver_match", None)
+        route = match.route if match is not None else "unmatched"
+        _request_queries_histogram.record(executed, {"http.route": route, "http.method": request.method})
+
+        return response
@@ -0,0 +1,19 @@
+from typing import Type
+
+from django.conf import settings
+from redis import Redis
+from redis.asyncio import Redis as AsyncRedis
+
+
+def create_redis_client(client_class: Type[Redis | AsyncRedis] = AsyncRedis) -> Redis | AsyncRedis:
+    config = settings.REDIS_CONFIG
+
+    if config.url:
+        return client_class.from_url(config.url)
+
+    return client_class(
+        host=config.host,
+        port=int(config.port),
+        db=int(config.db or 0),
+        password=config.password or None,
+    )
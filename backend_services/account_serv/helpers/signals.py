@@ -1,11 +1,11 @@
 from django.dispatch import Signal
 
-# New auth is created. Args: auth, request
+# New auth is created. Args: account_id
 
 account_registered = Signal()
 
-# Account has been activated, Args: auth, request
+# Account has been activated, Args: account_id
 account_activated = Signal()
 
-# Account has been updated. Args: auth, request
+# Account has been updated. Args: account_id, fields
 account_updated = Signal()
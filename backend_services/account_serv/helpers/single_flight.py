@@ -0,0 +1,60 @@
+"""
+In-process request coalescing: concurrent calls for the same key share the result of one of them.
+"""
+import threading
+from typing import Callable, Dict, Generic, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class _Call(Generic[T]):
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: T | None = None
+        self.error: BaseException | None = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, func: Callable[[], T]) -> T:
+        """
+        Run `func` unless a call for `key` is already running, in which case wait for its result (or error)
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+            return call.result
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def waiting(self, key: Hashable) -> int:
+        """
+        Callers currently waiting on the call for `key`
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            return call.waiters if call is not None else 0
@@ -0,0 +1,121 @@
+"""
+Outgoing SMS, queued and handed to the provider in batches by a background thread so that a request sending
+one never waits on the provider. The provider is settings.SMS.provider, ConsoleSmsProvider logs the messages
+instead of sending them, for local runs.
+"""
+import atexit
+import functools
+import queue
+import threading
+import time
+from typing import List, NamedTuple, Protocol, Sequence
+
+import structlog
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+Logger = structlog.getLogger(__name__)
+
+
+class SmsMessage(NamedTuple):
+    to: str
+    body: str
+
+
+class SmsProvider(Protocol):
+    def send_batch(self, messages: Sequence[SmsMessage]):
+        ...
+
+
+class ConsoleSmsProvider:
+    def send_batch(self, messages: Sequence[SmsMessage]):
+        for message in messages:
+            Logger.info("sms", to=message.to, body=message.body)
+
+
+class BatchingSmsSender:
+    def __init__(self, provider: SmsProvider, batch_size: int, flush_interval: float, queue_size: int):
+        self._provider = provider
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._queue: queue.Queue[SmsMessage | None] = queue.Queue(maxsize=queue_size)
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def send(self, to: str, body: str):
+        """
+        Queue the message; it goes out with the next batch, at most flush_interval seconds later
+        """
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait(SmsMessage(to, body))
+        except queue.Full:
+            Logger.warning("sms queue full, sending inline", to=to)
+            self._send([SmsMessage(to, body)])
+
+    def flush(self):
+        """
+        Block until every queued message has been handed to the provider
+        """
+        self._queue.join()
+
+    def shutdown(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+
+    def _ensure_worker(self):
+        if self._thread is not None:
+            return
+
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._work, name="sms-sender", daemon=True)
+                self._thread.start()
+
+    def _work(self):
+        while True:
+            message = self._queue.get()
+            if message is None:
+                self._queue.task_done()
+                return
+
+            # the first message opens a batch, which closes when full or after flush_interval
+            batch, stop = [message], False
+            deadline = time.monotonic() + self._flush_interval
+            try:
+                while len(batch) < self._batch_size:
+                    message = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                    if message is None:
+                        stop = True
+                        break
+                    batch.append(message)
+            except queue.Empty:
+                pass
+
+            self._send(batch)
+            for _ in range(len(batch) + stop):
+                self._queue.task_done()
+            if stop:
+                return
+
+    def _send(self, batch: List[SmsMessage]):
+        try:
+            self._provider.send_batch(batch)
+        except Exception:
+            Logger.exception("sms batch failed", size=len(batch))
+
+
+@functools.lru_cache(maxsize=None)
+def get_sms_sender() -> BatchingSmsSender:
+    config = settings.SMS
+    sender = BatchingSmsSender(
+        provider=import_string(config.provider)(),
+        batch_size=config.batch_size,
+        flush_interval=config.flush_interval,
+        queue_size=config.queue_size,
+    )
+    atexit.register(sender.shutdown)
+    return sender
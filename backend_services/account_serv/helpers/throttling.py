@@ -0,0 +1,185 @@
+"""
+Rate limits for the endpoints that take requests before anyone is authenticated (login, sign up, password
+resets and OTPs), where a burst of guesses would otherwise turn into password hashing and database reads.
+"""
+import functools
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Mapping, Sequence, Tuple
+
+import structlog
+from django.conf import settings
+from opentelemetry import metrics
+from redis.exceptions import RedisError
+from repositories.rate_limit_repository import Bucket, RateLimitRepository
+from rest_framework.exceptions import ParseError
+from rest_framework.throttling import BaseThrottle
+
+Logger = structlog.getLogger(__name__)
+_meter = metrics.get_meter(__name__)
+
+_decisions_counter = _meter.create_counter(
+    "account.rate_limit.decisions",
+    unit="{request}",
+    description="Rate limited requests by scope, outcome (allowed, limited) and the backend deciding (redis, local)",
+)
+
+_PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_rate(rate: str) -> Tuple[float, int]:
+    """
+    Tokens per second and burst of a rate like "5/min": five requests at once, then one every twelve seconds
+    """
+    count, period = rate.split("/")
+    burst = int(count)
+    return burst / _PERIODS[period[0]], burst
+
+
+class LocalTokenBuckets:
+    """
+    The token buckets of RateLimitRepository kept in process, for when Redis cannot be reached. Each process
+    counts on its own, so limits are looser by the number of processes. The least recently used buckets are
+    dropped beyond max_keys.
+    """
+
+    def __init__(self, max_keys: int, clock=time.monotonic):
+        self._max_keys = max_keys
+        self._clock = clock
+        self._lock = threading.Lock()
+        # key -> [tokens, last taken]
+        self._buckets: OrderedDict[str, List[float]] = OrderedDict()
+
+    def take(self, buckets: Sequence[Bucket]) -> float:
+        now = self._clock()
+        with self._lock:
+            tokens, wait = [], 0.0
+            for bucket in buckets:
+                available, taken_at = self._buckets.get(bucket.key) or (bucket.burst, now)
+                available = min(bucket.burst, available + max(0.0, now - taken_at) * bucket.rate)
+                tokens.append(available)
+                if available < 1:
+                    wait = max(wait, (1 - available) / bucket.rate)
+            if wait > 0:
+                return wait
+
+            for bucket, available in zip(buckets, tokens):
+                self._buckets[bucket.key] = [available - 1, now]
+                self._buckets.move_to_end(bucket.key)
+            while len(self._buckets) > self._max_keys:
+                self._buckets.popitem(last=False)
+            return 0.0
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class RateLimiter:
+    """
+    Token buckets in Redis, falling back to LocalTokenBuckets when Redis fails. After a failure Redis is left
+    alone for retry_interval seconds, so an outage does not add a connection timeout to every request.
+    """
+
+    def __init__(self, repository: RateLimitRepository, local: LocalTokenBuckets, retry_interval: float,
+                 clock=time.monotonic):
+        self._repository = repository
+        self._local = local
+        self._retry_interval = retry_interval
+        self._clock = clock
+        self._redis_down_until = 0.0
+
+    def take(self, buckets: Sequence[Bucket]) -> Tuple[float, str]:
+        """
+        The seconds to wait before the request is allowed, 0 if it is, and which backend decided
+        """
+        if self._clock() >= self._redis_down_until:
+            try:
+                return self._repository.take(buckets), "redis"
+            except RedisError:
+                Logger.warning("rate limiting falls back to in-process buckets", retry_in=self._retry_interval,
+                               exc_info=True)
+                self._redis_down_until = self._clock() + self._retry_interval
+        return self._local.take(buckets), "local"
+
+
+class RateLimitThrottle(BaseThrottle):
+    """
+    Limits the requests of the view's `throttle_scope` per client ip, per login (the phone, email or username
+    a request is about) and per authenticated account, with the rates of settings.RATE_LIMITS.scopes; a request
+    takes a token from each of its buckets in one Redis round trip. Views without a scope are not limited.
+
+    Throttles run in APIView.initial, ahead of the handler, so a rejected request never reaches password
+    hashing or the database.
+    """
+
+    def __init__(self):
+        self._wait = None
+
+    def allow_request(self, request, view) -> bool:
+        config = settings.RATE_LIMITS
+        scope = getattr(view, "throttle_scope", None)
+        if not config.enabled or scope is None:
+            return True
+
+        buckets = self.get_buckets(request, scope, config.scopes[scope], config.prefix)
+        if not buckets:
+            return True
+
+        wait, backend = get_rate_limiter().take(buckets)
+        _decisions_counter.add(1, {"scope": scope, "outcome": "limited" if wait else "allowed", "backend": backend})
+        if wait:
+            Logger.info("request rate limited", scope=scope, wait=wait, backend=backend)
+            self._wait = wait
+            return False
+        return True
+
+    def wait(self) -> float | None:
+        return self._wait
+
+    def get_buckets(self, request, scope: str, rates: Mapping[str, str], prefix: str) -> List[Bucket]:
+        identities = {
+            "ip": self.get_ident(request),
+            "login": _login_of(request),
+            "account": request.user.id if request.user and request.user.is_authenticated else None,
+        }
+        buckets = []
+        for kind, rate in rates.items():
+            identity = identities[kind]
+            if identity:
+                # hashed, to keep phone numbers and emails out of key names
+                digest = hashlib.blake2b(str(identity).encode(), digest_size=12).hexdigest()
+                buckets.append(Bucket(f"{prefix}:{scope}:{kind}:{digest}", *parse_rate(rate)))
+        return buckets
+
+
+def _login_of(request) -> str | None:
+    try:
+        data = request.data
+    except ParseError:
+        data = {}
+    if not isinstance(data, Mapping):
+        data = {}
+
+    for source, field in ((data, "loginField"), (data, "phone"), (data, "to"), (data, "email"), (data, "username"),
+                          (request.query_params, "loginField")):
+        value = source.get(field)
+        if value:
+            return "".join(str(value).split()).lower()
+    return None
+
+
+@functools.lru_cache(maxsize=None)
+def get_rate_limiter() -> RateLimiter:
+    """
+    The process wide rate limiter, its local buckets shared by all of the process's threads
+    """
+    from factories.repository_factory import RepositoryFactory
+
+    config = settings.RATE_LIMITS
+    return RateLimiter(
+        RepositoryFactory.create_rate_limit_repository(),
+        LocalTokenBuckets(config.local_max_keys),
+        retry_interval=config.redis_retry_interval,
+    )
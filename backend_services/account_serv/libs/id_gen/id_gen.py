@@ -58,9 +58,7 @@ class IdGenerator:
 
         self.last_timestamp = current_timestamp
 
-        new_id = current_timestamp << Time_Shift | \
-                 (Data_Center_Bit << Datacenter_shift) | \
-                 (self.worker_id << worker_shift) | self.sequence
+        new_id = compose_id(current_timestamp, self.worker_id, self.sequence)
 
         if self.sequence >= MaxSequence or self.sequence < 0:
             self.sequence = 0
@@ -91,6 +89,15 @@ class IdGenerator:
         return timestamp
 
 
+def compose_id(timestamp: int, worker_id: int, sequence: int) -> int:
+    """
+    Pack the id parts with the same bit layout next_id uses
+    """
+    return timestamp << Time_Shift | \
+        (Data_Center_Bit << Datacenter_shift) | \
+        ((worker_id & MaxWorkerId) << worker_shift) | (sequence & MaxSequence)
+
+
 # get this to work on multiple threads
 gen = IdGenerator()
 
@@ -102,4 +109,4 @@ def get_id():
     return new_id
 
 
-__all__ = ["get_id"]
+__all__ = ["get_id", "compose_id"]
@@ -1,11 +1,27 @@
-from dataclasses_json import dataclass_json
-from dataclasses import dataclass
+from dataclasses import dataclass, fields
+from operator import attrgetter
+from typing import Dict, Mapping
 
 
-@dataclass_json
-@dataclass
+@dataclass(slots=True)
 class ErrorResponse:
     title: str
     type: str
     detail: str
-    reason: str | None
+    reason: str | None = None
+    # the AccountError code, for clients to tell failures apart without parsing messages
+    code: str | None = None
+
+    def to_dict(self) -> Dict:
+        return dict(zip(_FIELDS, _values(self)))
+
+    asdict = to_dict
+
+    @classmethod
+    def from_dict(cls, data: Mapping) -> "ErrorResponse":
+        return cls(**{name: data[name] for name in _FIELDS if name in data})
+
+
+# worked out once rather than on every (de)serialization
+_FIELDS = tuple(field.name for field in fields(ErrorResponse))
+_values = attrgetter(*_FIELDS)
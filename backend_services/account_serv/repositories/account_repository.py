@@ -1,14 +1,19 @@
 import datetime
-import traceback
-from typing import Dict, Tuple, Type
+import functools
+from typing import Callable, Dict, Iterable, Tuple, Type
 
 from account.models import Account
 from django.core.exceptions import ObjectDoesNotExist
 from django.core.paginator import Paginator
+from django.db import IntegrityError, transaction
 from django.db.models import Q
-from errors.account_error import AccountError
-from helpers import validators_helpers as vh
+from errors.account_error import (AccountConflict, AccountError,
+                                  AccountNotFound, AccountPermissionDenied,
+                                  InvalidAccountData)
+from helpers.query_budget import query_budget
 from libs.id_gen import id_gen
+from repositories.outbox_repository import (ACCOUNT_CREATED, ACCOUNT_DELETED,
+                                            ACCOUNT_UPDATED, OutboxRepository)
 from serializers.account_serializer import (AccountCreateSerializer,
                                             AccountSerializer,
                                             ChangePhoneSerializer,
@@ -17,11 +22,41 @@ from serializers.account_serializer import (AccountCreateSerializer,
                                             SetPasswordSerializer)
 
 
+def _wrap_unexpected(message: str):
+    """
+    Let the expected AccountErrors through and turn any other exception into an AccountError chained to it,
+    leaving formatting its traceback to whoever reports it
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                return func(*args, **kwargs)
+            except AccountError:
+                raise
+            except IntegrityError as exc:
+                # a unique value taken by a concurrent request, after validation found it free
+                raise AccountConflict(message) from exc
+            except Exception as exc:
+                raise AccountError(message) from exc
+
+        return wrapper
+
+    return decorator
+
+
+def _validate(serializer):
+    if not serializer.is_valid():
+        raise InvalidAccountData.from_errors(serializer.errors)
+
+
 class AccountRepository:
     def __init__(self, account: Account, account_serializer: Type[AccountSerializer],
                  account_create_serializer: Type[AccountCreateSerializer],
                  set_password_serializer: Type[SetPasswordSerializer], email_serializer: Type[EmailSerializer],
-                 password_serializer: Type[PasswordSerializer], change_phone_serializer: Type[ChangePhoneSerializer]):
+                 password_serializer: Type[PasswordSerializer], change_phone_serializer: Type[ChangePhoneSerializer],
+                 outbox_repository: OutboxRepository):
         self._account = account
         self._account_serializer = account_serializer
         self._account_create_serializer = account_create_serializer
@@ -29,152 +64,225 @@ class AccountRepository:
         self._password_serializer = password_serializer
         self._change_phone_serializer = change_phone_serializer
         self._email_serializer = email_serializer
-
+        self._outbox_repository = outbox_repository
+        # called with the cache keys of an account (id, phones and emails) once a change to it commits
+        self.on_change: Callable[..., None] | None = None
+
+    def _record_change(self, topic: str, account_id: int, fields=(), using='default', keys=()):
+        """
+        Write the change event to the outbox, callers must be inside the transaction making the change.
+        `keys` are the account's lookup values besides its id, before and after the change.
+        """
+        self._outbox_repository.append(topic=topic, account_id=account_id, payload={"fields": list(fields)},
+                                       using=using)
+        if self.on_change is not None:
+            transaction.on_commit(functools.partial(self.on_change, account_id, *keys), using=using)
+
+    @query_budget(6)
+    @_wrap_unexpected("Error occurred creating account")
     def create_account(self, data: dict,using='default'):
         serializer = self._account_create_serializer(data=data)
+        _validate(serializer)
 
-        try:
-            if not vh.is_valid_serializer(serializer):
-                raise AccountError(str(serializer.errors))
-
-            pk = id_gen.get_id()
-            serializer.save(id=pk, using=using)
+        pk = id_gen.get_id()
+        with transaction.atomic(using=using):
+            account = serializer.save(id=pk)
+            # lookups of the phone or email may have been cached as not found
+            self._record_change(ACCOUNT_CREATED, pk, using=using, keys=(account.phone, account.email))
 
-            return serializer.data
-        except Exception:
-            raise AccountError(traceback.format_exc())
+        # the create serializer only renders the phone, callers need the whole account and its id
+        return self._account_serializer(account).data
 
+    @query_budget(1)
     def get_account(self, lookup_field,using='default') -> Tuple[Account, Dict]:
         try:
-            filter_query = Q(email=lookup_field) | Q(phone=lookup_field) | Q(id=lookup_field)
-
-            account_instance = self._account.objects.using(using).filter(filter_query).first()
+            account_instance = self._find_account(lookup_field, using=using)
             serialized = self._account_serializer(account_instance)
             return account_instance, serialized.data
         except Exception:
             raise ObjectDoesNotExist()
 
+    @query_budget(1)
+    @_wrap_unexpected("Error occurred finding account")
+    def find_account(self, lookup_field, using='default') -> Dict | None:
+        """
+        The serialized account of the id, phone or email, None when there is none
+        """
+        account = self._find_account(lookup_field, using=using)
+        return None if account is None else dict(self._account_serializer(account).data)
+
+    def _find_account(self, lookup_field, using='default') -> Account | None:
+        """
+        Fetch the account instance only, for callers that have no use for the serialized payload
+        """
+        filter_query = Q(email=lookup_field) | Q(phone=lookup_field)
+        if str(lookup_field).isdigit():
+            filter_query |= Q(id=lookup_field)
+
+        return self._account.objects.using(using).filter(filter_query).first()
+
+    @query_budget(1)
+    @_wrap_unexpected("Error occurred getting account")
     def get_account_by_id(self, account_id,using='default'):
         try:
-            account = self._account.objects.using(using).get(id=account_id)
-            return account
-        except Exception:
-            raise AccountError(traceback.format_exc())
-
+            return self._account.objects.using(using).get(id=account_id)
+        except self._account.DoesNotExist:
+            raise AccountNotFound(f"Account with id {account_id} not found")
+
+    @query_budget(1)
+    @_wrap_unexpected("Error occurred getting accounts")
+    def get_accounts(self, account_ids: Iterable[int], using='default') -> Dict[int, Dict]:
+        """
+        The serialized accounts of the ids that exist, by id, in a single IN query
+        """
+        # unordered, the caller puts the accounts back in the order it asked for them
+        accounts = self._account.objects.using(using).filter(id__in=list(account_ids)).order_by()
+        return {row["id"]: dict(row) for row in self._account_serializer(accounts, many=True).data}
+
+    def to_cache(self, account: Account) -> Dict:
+        return dict(self._account_serializer(account).data)
+
+    def from_cache(self, data: Dict) -> Account:
+        """
+        An account rebuilt from its cached fields, as if loaded from the database; the password is never cached
+        """
+        values = {
+            field.attname: field.to_python(data[field.name])
+            for field in self._account._meta.concrete_fields if field.name in data
+        }
+        account = self._account(**values)
+        account._state.adding = False
+        account._state.db = "default"
+        return account
+
+    @query_budget(2)
+    @_wrap_unexpected("Error occurred getting accounts")
     def get_all_accounts(self, page=0, limit=500,using='default'):
-        try:
-            accounts = self._account.objects.using(using).all()
-            _paginator = Paginator(accounts, limit)
+        accounts = self._account.objects.using(using).all()
+        _paginator = Paginator(accounts, limit)
 
-            page_obj = _paginator.get_page(page)
-            serializer = self._account_serializer(page_obj, many=True)
+        page_obj = _paginator.get_page(page)
+        serializer = self._account_serializer(page_obj, many=True)
 
-            return {
-                "page": page,
-                "has_next_page": page_obj.has_next(),
-                "accounts": serializer.data
-            }
-        except Exception:
-            raise AccountError(traceback.format_exc())
+        return {
+            "page": page,
+            "has_next_page": page_obj.has_next(),
+            "accounts": serializer.data
+        }
 
+    @query_budget(5)
+    @_wrap_unexpected("Error occurred deleting account")
     def delete_account(self, lookup_field):
-        try:
-            obj, _ = self.get_account(lookup_field=lookup_field)
+        obj = self._find_account(lookup_field)
 
-            if obj is not None:
+        if obj is not None:
+            with transaction.atomic():
+                account_id = obj.id
                 obj.delete()
+                self._record_change(ACCOUNT_DELETED, account_id, keys=(obj.phone, obj.email))
 
-            serializer = self._account_serializer(obj)
-            return serializer.data
-        except Exception:
-            raise AccountError(traceback.format_exc())
+        serializer = self._account_serializer(obj)
+        return serializer.data
 
+    @query_budget(4)
+    @_wrap_unexpected("Error occurred changing phone number")
     def change_phone_number(self, data, lookup_field, instance=None):
-        try:
-            account, _ = self.get_account(lookup_field=lookup_field)
-
-            if account is None:
-                raise AccountError(f"Account object not found: lookup_field-> {lookup_field}")
+        account = self._find_account(lookup_field)
 
-            if instance is not None and account != instance:
-                raise AccountError("Not authorized to change phone number of this account")
-            serializer = self._change_phone_serializer(account, data=data)
+        if account is None:
+            raise AccountNotFound(f"Account object not found: lookup_field-> {lookup_field}")
 
-            if not vh.is_valid_serializer(serializer):
-                raise AccountError(str(serializer.errors))
+        if instance is not None and account.id != instance.id:
+            raise AccountPermissionDenied("Not authorized to change phone number of this account")
+        serializer = self._change_phone_serializer(account, data=data)
+        _validate(serializer)
 
-            setattr(account, Account.PHONE_FIELD, serializer.data["phone"])
+        old_phone = account.phone
+        setattr(account, Account.PHONE_FIELD, serializer.data["phone"])
+        account.lastUpdated = datetime.datetime.now()
+        with transaction.atomic():
+            account.save(update_fields=[Account.PHONE_FIELD, "lastUpdated"])
+            self._record_change(ACCOUNT_UPDATED, account.id, fields=[Account.PHONE_FIELD],
+                                keys=(old_phone, account.phone, account.email))
 
-            return serializer.data
-        except Exception:
-            raise AccountError("Error occurred changing phone number")
+        return serializer.data
 
+    @query_budget(3)
+    @_wrap_unexpected("Error occurred resetting password")
     def reset_password(self, data, lookup_field: int | str):
-        try:
-            account, _ = self.get_account(lookup_field=lookup_field)
-            if account is None:
-                raise AccountError(f"Account object not found: lookup_field->{lookup_field}")
+        account = self._find_account(lookup_field)
+        if account is None:
+            raise AccountNotFound(f"Account object not found: lookup_field->{lookup_field}")
 
-            serializer = self._password_serializer(data=data)
-            if not vh.is_valid_serializer(serializer):
-                raise AccountError(str(serializer.errors))
+        serializer = self._password_serializer(data=data)
+        _validate(serializer)
 
-            account.set_password(serializer.data["newPassword"])
-            now = datetime.datetime.now()
-            account.save(lastUpdated=now)
+        self._save_password(account, serializer.data["newPassword"])
 
-            return self._account_serializer(account).data
-        except Exception:
-            raise AccountError(f"Error occurred resetting password: lookup_field-> {lookup_field}")
+        return self._account_serializer(account).data
 
+    @query_budget(3)
+    @_wrap_unexpected("Error occurred setting password")
     def set_password(self, data, account_id=None, account=None):
-        if not account_id or not account:
-            raise AccountError("Either account Id or Account data is required")
-
-        try:
-            serializer = self._set_password_serializer(data=data)
+        if not account_id and not account:
+            raise InvalidAccountData("Either account Id or Account data is required")
 
-            if not vh.is_valid_serializer(serializer):
-                raise AccountError(str(serializer.errors))
+        serializer = self._set_password_serializer(data=data)
+        _validate(serializer)
 
-            if account is not None and isinstance(account, Account):
-                account.set_password(serializer.data['newPassword'])
-                now = datetime.datetime.now()
-                account.save(lastUpdated=now)
+        if account is not None and isinstance(account, Account):
+            self._save_password(account, serializer.data['newPassword'])
 
-                return self._account_serializer(account).data
+            return self._account_serializer(account).data
 
-            if account_id is not None:
-                account, _ = self.get_account_by_id(account_id)
+        if account_id is not None:
+            account = self.get_account_by_id(account_id)
 
-                if account is None:
-                    raise AccountError("Account with id {} not found!!".format(account_id))
+            self._save_password(account, serializer.data['newPassword'])
 
-                account.set_password(serializer.data['newPassword'])
-                now = datetime.datetime.now()
-                account.save(lastUpdated=now)
+            return self._account_serializer(account).data
 
-                return self._account_serializer(account).data
-        except Exception:
-            raise AccountError("Error occurred setting password")
+    def _save_password(self, account: Account, password: str):
+        account.set_password(password)
+        account.lastUpdated = datetime.datetime.now()
+        with transaction.atomic():
+            account.save(update_fields=["password", "lastUpdated"])
+            self._record_change(ACCOUNT_UPDATED, account.id, fields=["password"], keys=(account.phone, account.email))
 
+    @query_budget(4)
+    @_wrap_unexpected("Error occurred changing email on account")
     def change_email(self, data, lookup_field):
-        try:
-            account, _ = self.get_account(lookup_field=lookup_field)
-
-            if account is None:
-                raise AccountError(f"Account object not found: lookup_field->{lookup_field}")
-
-            serializer = self._email_serializer(data=data)
-            if not vh.is_valid_serializer(serializer):
-                raise AccountError(str(serializer.errors))
-
-            setattr(account, Account.EMAIL_FIELD, serializer.data["newEmail"])
-            now = datetime.datetime.now()
-            account.save(lastUpdated=now)
-            return self._account_serializer(account).data
-        except Exception:
-            raise AccountError(f"Error occurred changing email on account: lookup_field->{lookup_field}")
+        account = self._find_account(lookup_field)
+
+        if account is None:
+            raise AccountNotFound(f"Account object not found: lookup_field->{lookup_field}")
+
+        serializer = self._email_serializer(data=data)
+        _validate(serializer)
+
+        old_email = account.email
+        setattr(account, Account.EMAIL_FIELD, serializer.data["newEmail"])
+        account.lastUpdated = datetime.datetime.now()
+        with transaction.atomic():
+            account.save(update_fields=[Account.EMAIL_FIELD, "lastUpdated"])
+            self._record_change(ACCOUNT_UPDATED, account.id, fields=[Account.EMAIL_FIELD],
+                                keys=(old_email, account.phone, account.email))
+        return self._account_serializer(account).data
+
+    @query_budget(2)
+    @_wrap_unexpected("Error occurred verifying phone number")
+    def verify_phone(self, account_id: int, phone: str, email: str | None = None) -> bool:
+        """
+        Mark the phone of the account verified with a single UPDATE, nothing is read first. False when the
+        account no longer has that phone or it was verified already.
+        """
+        with transaction.atomic():
+            updated = self._account.objects.filter(id=account_id, phone=phone, phoneVerified=False).update(
+                phoneVerified=True, lastUpdated=datetime.datetime.now()
+            )
+            if updated:
+                self._record_change(ACCOUNT_UPDATED, account_id, fields=["phoneVerified"], keys=(phone, email))
+        return bool(updated)
 
     def update_location(self):
         pass
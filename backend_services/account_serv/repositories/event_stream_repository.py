@@ -0,0 +1,98 @@
+import json
+from typing import Dict, Iterable, List, NamedTuple, Tuple
+
+from account.models import OutboxEvent
+from redis import Redis
+
+# Offsets are Redis stream entry ids, "0-0" reads the stream from its oldest retained entry
+START_OFFSET = "0-0"
+
+
+class AccountChangeEvent(NamedTuple):
+    offset: str
+    event_id: int
+    topic: str
+    account_id: int
+    payload: Dict
+    created_at: int
+
+
+class AccountEventStreamRepository:
+    """
+    Account change events on a Redis stream. Producers append outbox rows, consumers read from an offset
+    and store the offset of the last event they handled so they can resume after a restart.
+    """
+
+    __slots__ = ("_redis", "_stream", "_max_length")
+
+    def __init__(self, redis: Redis, stream: str, max_length: int):
+        self._redis = redis
+        self._stream = stream
+        self._max_length = max_length
+
+    def publish(self, events: Iterable[OutboxEvent]) -> List[str]:
+        pipeline = self._redis.pipeline(transaction=False)
+        for event in events:
+            pipeline.xadd(
+                self._stream,
+                {
+                    "id": event.id,
+                    "topic": event.topic,
+                    "account": event.accountId,
+                    "payload": json.dumps(event.payload, separators=(",", ":")),
+                    "ts": int(event.createdAt.timestamp() * 1000),
+                },
+                maxlen=self._max_length,
+                approximate=True,
+            )
+
+        return [_text(offset) for offset in pipeline.execute()]
+
+    def read(self, offset: str = START_OFFSET, count: int = 500, block_ms: int | None = None
+             ) -> Tuple[List[AccountChangeEvent], str]:
+        """
+        Events after `offset`, oldest first, and the offset to read from next time
+        """
+        response = self._redis.xread({self._stream: offset}, count=count, block=block_ms)
+        if not response:
+            return [], offset
+
+        _, entries = response[0]
+        events = [_to_event(entry_id, fields) for entry_id, fields in entries]
+
+        return events, events[-1].offset
+
+    def oldest_offset(self) -> str | None:
+        """
+        Consumers whose offset is older than this have missed trimmed events and must resync
+        """
+        entries = self._redis.xrange(self._stream, count=1)
+        return _text(entries[0][0]) if entries else None
+
+    def load_offset(self, consumer: str) -> str:
+        offset = self._redis.hget(self._offsets_key, consumer)
+        return _text(offset) if offset is not None else START_OFFSET
+
+    def commit_offset(self, consumer: str, offset: str):
+        self._redis.hset(self._offsets_key, consumer, offset)
+
+    @property
+    def _offsets_key(self) -> str:
+        return f"{self._stream}:offsets"
+
+
+def _text(value) -> str:
+    return value.decode() if isinstance(value, bytes) else str(value)
+
+
+def _to_event(entry_id, fields) -> AccountChangeEvent:
+    fields = {_text(key): _text(value) for key, value in fields.items()}
+
+    return AccountChangeEvent(
+        offset=_text(entry_id),
+        event_id=int(fields["id"]),
+        topic=fields["topic"],
+        account_id=int(fields["account"]),
+        payload=json.loads(fields["payload"]),
+        created_at=int(fields["ts"]),
+    )
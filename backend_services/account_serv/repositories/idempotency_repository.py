@@ -0,0 +1,42 @@
+import json
+from typing import Dict, Tuple
+
+from redis import Redis
+
+
+class IdempotencyRepository:
+    """
+    The responses of requests made with an idempotency key. A key is claimed with a pending record while
+    its first request runs, then holds the response for ttl seconds.
+    """
+
+    __slots__ = ("_redis", "_prefix")
+
+    def __init__(self, redis: Redis, prefix: str):
+        self._redis = redis
+        self._prefix = prefix
+
+    def claim(self, key: str, fingerprint: str, ttl: float) -> Tuple[bool, Dict | None]:
+        """
+        Claim the key for the caller's request when nobody holds it, in one round trip (SET NX GET); otherwise
+        return the record it holds, pending or complete
+        """
+        record = json.dumps({"pending": True, "fingerprint": fingerprint})
+        current = self._redis.set(self._name(key), record, nx=True, get=True, px=int(ttl * 1000))
+        if current is None:
+            return True, None
+        return False, json.loads(current)
+
+    def get(self, key: str) -> Dict | None:
+        current = self._redis.get(self._name(key))
+        return None if current is None else json.loads(current)
+
+    def complete(self, key: str, fingerprint: str, status: int, data, ttl: int):
+        record = {"pending": False, "fingerprint": fingerprint, "status": status, "data": data}
+        self._redis.set(self._name(key), json.dumps(record, default=str), ex=int(ttl))
+
+    def release(self, key: str):
+        self._redis.delete(self._name(key))
+
+    def _name(self, key: str) -> str:
+        return f"{self._prefix}:{key}"
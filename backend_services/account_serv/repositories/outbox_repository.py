@@ -0,0 +1,32 @@
+from typing import Dict, Iterable, List, Type
+
+from account.models import OutboxEvent
+
+# the only topics in the outbox and on the account event stream, each with a payload of {"fields": [...]}
+# naming the fields the change touched
+ACCOUNT_CREATED = "account.created"
+ACCOUNT_UPDATED = "account.updated"
+ACCOUNT_DELETED = "account.deleted"
+
+
+class OutboxRepository:
+    def __init__(self, outbox_event: Type[OutboxEvent]):
+        self._outbox_event = outbox_event
+
+    def append(self, topic: str, account_id: int, payload: Dict | None = None, using="default") -> OutboxEvent:
+        """
+        Must be called inside the transaction that makes the change, so the event and the change commit together
+        """
+        return self._outbox_event.objects.using(using).create(topic=topic, accountId=account_id, payload=payload or {})
+
+    def claim_batch(self, limit: int, using="default") -> List[OutboxEvent]:
+        """
+        Lock the oldest unpublished events. Rows locked by another relay are skipped rather than waited on,
+        so several relays can drain the outbox side by side. Must be called inside a transaction.
+        """
+        queryset = self._outbox_event.objects.using(using).select_for_update(skip_locked=True).order_by("id")
+        return list(queryset[:limit])
+
+    def delete_batch(self, event_ids: Iterable[int], using="default") -> int:
+        deleted, _ = self._outbox_event.objects.using(using).filter(id__in=list(event_ids)).delete()
+        return deleted
@@ -0,0 +1,65 @@
+from typing import NamedTuple, Sequence
+
+from redis import Redis
+
+
+class Bucket(NamedTuple):
+    key: str
+    # tokens added back per second
+    rate: float
+    # tokens the bucket holds when full, the burst it allows
+    burst: int
+
+
+# Takes one token from every bucket in KEYS, or from none of them when any is empty, and returns the
+# milliseconds until all of them hold a token again (0 when taken). ARGV holds each bucket's rate in tokens
+# per millisecond and its burst, in the order of KEYS. Buckets are hashes of their tokens and the time they
+# were last taken from, by the Redis clock so that app servers need not agree on the time.
+_TAKE = """
+local time = redis.call("TIME")
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local tokens = {}
+local wait = 0
+for i, key in ipairs(KEYS) do
+    local rate, burst = tonumber(ARGV[2 * i - 1]), tonumber(ARGV[2 * i])
+    local bucket = redis.call("HMGET", key, "tokens", "ts")
+    local available = tonumber(bucket[1]) or burst
+    local elapsed = math.max(0, now - (tonumber(bucket[2]) or now))
+    available = math.min(burst, available + elapsed * rate)
+    tokens[i] = available
+    if available < 1 then
+        wait = math.max(wait, math.ceil((1 - available) / rate))
+    end
+end
+if wait > 0 then
+    return wait
+end
+for i, key in ipairs(KEYS) do
+    local rate, burst = tonumber(ARGV[2 * i - 1]), tonumber(ARGV[2 * i])
+    redis.call("HSET", key, "tokens", tostring(tokens[i] - 1), "ts", now)
+    redis.call("PEXPIRE", key, math.ceil(burst / rate))
+end
+return 0
+"""
+
+
+class RateLimitRepository:
+    """
+    Token buckets in Redis, all the buckets of a request checked and taken from in one script call
+    """
+
+    __slots__ = ("_take",)
+
+    def __init__(self, redis: Redis):
+        # EVALSHA, loading the script only the first time a server has not seen it
+        self._take = redis.register_script(_TAKE)
+
+    def take(self, buckets: Sequence[Bucket]) -> float:
+        """
+        Take a token from each bucket if all of them have one; the seconds to wait until they do otherwise, 0 if taken
+        """
+        args = []
+        for bucket in buckets:
+            args.extend((repr(bucket.rate / 1000), bucket.burst))
+        wait_ms = self._take(keys=[bucket.key for bucket in buckets], args=args)
+        return int(wait_ms) / 1000
@@ -1,34 +1,122 @@
-import json
-from typing import Optional
+import math
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
 
-from redis.asyncio import Redis
 from django.conf import settings
+from helpers.cache_codecs import AccountCodec, JsonCodec
+from redis import Redis
+from redis.client import PubSub
 
 _settings = settings.REDIS_CONFIG
 
+# stored for lookups known to find nothing; neither JSON nor a codec version byte
+_MISSING_VALUE = b"\x00"
+# read back in place of an item for those lookups
+MISSING = object()
+
+# deletes the lock only while it still holds the caller's token, not a lock taken over after it expired
+_RELEASE_LOCK = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
 
 class RedisRepository:
-    __slots__ = ("_redis",)
+    """
+    Account records cached in Redis, keyed by the bare account id and encoded by `codec` (JSON by default).
+    Synchronous, like the views and services calling it.
 
-    def __init__(self, redis: Redis):
+    bm_dispatch_service reads these entries straight from Redis (its src/helpers/account_records.py): the
+    JSON, the binary records and the missing marker are a format shared with it.
+    """
+    __slots__ = ("_redis", "_codec")
+
+    def __init__(self, redis: Redis, codec: JsonCodec | AccountCodec | None = None):
         self._redis = redis
+        self._codec = codec or JsonCodec()
 
-    async def set_item_with_expiration(self, item_id, data, ttl=None):
-        result = self._redis.setex(name=str(item_id), time=ttl or _settings.ttl, value=json.dumps(data))
+    def set_item_with_expiration(self, item_id, data, ttl=None):
+        result = self._redis.setex(name=str(item_id), time=int(ttl or _settings.ttl), value=self._codec.encode(data))
         return result
 
-    async def set_item(self, item_id, item):
-        result = await self._redis.set(str(item_id), json.dumps(item))
+    def set_item(self, item_id, item):
+        result = self._redis.set(str(item_id), self._codec.encode(item))
         return result
 
-    async def delete_item(self, item_id):
-        result = 0
-        if self._redis.exists(str(item_id)):
-            result = await self._redis.delete(str(item_id))
-        return result
+    def delete_item(self, item_id):
+        return self._redis.delete(str(item_id))
+
+    def delete_items(self, *item_ids):
+        return self._redis.delete(*(str(item_id) for item_id in item_ids))
+
+    def get_item_and_set_expiration(self, item_id, ttl=None) -> Mapping | None:
+        data: Optional[str | bytes] = self._redis.getex(str(item_id), ex=int(ttl or _settings.ttl))
+        return self._decode(data)
+
+    def get_item_with_ttl(self, item_id) -> Tuple[Mapping | object | None, float]:
+        """
+        The item, MISSING or None, and the seconds it has left to live, in one round trip
+        """
+        pipeline = self._redis.pipeline(transaction=False)
+        pipeline.get(str(item_id))
+        pipeline.pttl(str(item_id))
+        data, ttl_ms = pipeline.execute()
+        # -1 is a key without an expiry
+        return self._decode(data), math.inf if ttl_ms == -1 else max(0, ttl_ms) / 1000
+
+    def get_item_and_count(self, item_id, counter: str, ttl) -> Tuple[Mapping | object | None, int]:
+        """
+        The item, and `counter` incremented, in one round trip. The counter expires ttl seconds after its first
+        increment.
+        """
+        pipeline = self._redis.pipeline(transaction=False)
+        pipeline.get(str(item_id))
+        pipeline.incr(counter)
+        pipeline.expire(counter, int(ttl), nx=True)
+        data, count, _ = pipeline.execute()
+        return self._decode(data), int(count)
+
+    def set_missing(self, item_id, ttl):
+        return self._redis.setex(name=str(item_id), time=int(ttl), value=_MISSING_VALUE)
+
+    def acquire_lock(self, name, token: str, ttl: float) -> bool:
+        return bool(self._redis.set(f"lock:{name}", token, nx=True, px=int(ttl * 1000)))
+
+    def release_lock(self, name, token: str) -> bool:
+        return bool(self._redis.eval(_RELEASE_LOCK, 1, f"lock:{name}", token))
+
+    def get_items(self, item_ids: Iterable) -> List[Mapping | None]:
+        """
+        The items of all the ids in one MGET, None for the ones not cached and MISSING for the ones known not
+        to exist, in the order of the ids
+        """
+        values = self._redis.mget([str(item_id) for item_id in item_ids])
+        return [self._decode(value) for value in values]
+
+    def set_items_with_expiration(self, items: Dict, ttl=None, missing: Iterable = (), missing_ttl=None):
+        """
+        Cache every (id, item) of `items`, and mark the ids of `missing` as not existing, in one round trip
+        """
+        ttl = int(ttl or _settings.ttl)
+        pipeline = self._redis.pipeline(transaction=False)
+        for item_id, data in items.items():
+            pipeline.setex(name=str(item_id), time=ttl, value=self._codec.encode(data))
+        for item_id in missing:
+            pipeline.setex(name=str(item_id), time=int(missing_ttl or ttl), value=_MISSING_VALUE)
+        return pipeline.execute()
+
+    def publish(self, channel: str, message: str) -> int:
+        return self._redis.publish(channel, message)
+
+    def subscribe(self, channel: str) -> PubSub:
+        pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(channel)
+        return pubsub
 
-    async def get_item_and_set_expiration(self, item_id, ttl=None):
-        data: Optional[str | bytes] = await self._redis.getex(str(item_id), ttl or _settings.ttl)
-        if data is not None:
-            return json.loads(data)
-        return None
+    def _decode(self, data: str | bytes | None):
+        if data is None:
+            return None
+        if data == _MISSING_VALUE:
+            return MISSING
+        return self._codec.decode(data)
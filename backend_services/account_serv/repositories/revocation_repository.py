@@ -0,0 +1,47 @@
+from typing import List, Tuple
+
+from redis import Redis
+
+# members of the revocation log, scored by the time of the revocation
+JTI = "jti:"
+ACCOUNT = "account:"
+
+
+class RevocationRepository:
+    """
+    Revoked tokens in Redis. A revoked jti is a key that expires with the token; revoking an account stores
+    the time before which all of its tokens are revoked, for as long as the longest lived token. Every
+    revocation is also appended to a sorted set scored by its time, the log processes read to keep their
+    in-memory copy up to date, trimmed past max_ttl.
+    """
+
+    __slots__ = ("_redis", "_prefix", "_log", "_max_ttl")
+
+    def __init__(self, redis: Redis, prefix: str, max_ttl: int):
+        self._redis = redis
+        self._prefix = prefix
+        self._log = f"{prefix}:log"
+        self._max_ttl = max_ttl
+
+    def revoke_token(self, jti: str, ttl: int, now: float):
+        self._append(f"{self._prefix}:{JTI}{jti}", 1, ttl, f"{JTI}{jti}", now)
+
+    def revoke_account(self, account_id: int, now: float):
+        self._append(f"{self._prefix}:{ACCOUNT}{account_id}", now, self._max_ttl, f"{ACCOUNT}{account_id}", now)
+
+    def is_token_revoked(self, jti: str) -> bool:
+        return bool(self._redis.exists(f"{self._prefix}:{JTI}{jti}"))
+
+    def changes_since(self, since: float) -> List[Tuple[str, float]]:
+        """
+        The log's (member, time) entries from `since` on, inclusive, oldest first
+        """
+        entries = self._redis.zrangebyscore(self._log, since, "+inf", withscores=True)
+        return [(member.decode() if isinstance(member, bytes) else member, score) for member, score in entries]
+
+    def _append(self, key: str, value, ttl: int, member: str, now: float):
+        pipeline = self._redis.pipeline(transaction=False)
+        pipeline.set(key, value, ex=max(1, int(ttl)))
+        pipeline.zadd(self._log, {member: now})
+        pipeline.zremrangebyscore(self._log, "-inf", now - self._max_ttl)
+        pipeline.execute()
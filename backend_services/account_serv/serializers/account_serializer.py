@@ -1,5 +1,6 @@
 from typing import Any, Dict
 
+from django.conf import settings
 from django.db import IntegrityError, transaction
 from django.contrib.auth.password_validation import validate_password
 from django.core import exceptions as django_exceptions
@@ -69,7 +70,7 @@ class AccountSerializer(ModelSerializer):
 
     class Meta:
         model = Account
-        fields = "__all__"
+        exclude = ("password",)
 
     def validate(self, attrs):
         account = Account(**attrs)
@@ -225,3 +226,14 @@ class ChangePhoneSerializer(PhoneSerializer, CurrentPasswordSerializer):
         model = Account
         fields = ("currentPhone", "phone", "currentPassword")
 
+
+class AccountBatchSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=True, max_length=settings.ACCOUNT_BATCH.max_ids,
+    )
+
+    def update(self, instance, validated_data):
+        pass
+
+    def create(self, validated_data):
+        pass
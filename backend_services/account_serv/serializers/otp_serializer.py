@@ -9,3 +9,13 @@ class VerifyOtpSerializer(serializers.ModelSerializer):
     class Meta:
         model = Account
         fields = ("to", "code",)
+
+
+class SendOtpSerializer(serializers.Serializer):
+    to = serializers.CharField(required=True, max_length=25)
+
+    def update(self, instance, validated_data):
+        pass
+
+    def create(self, validated_data):
+        pass
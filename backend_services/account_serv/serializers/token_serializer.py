@@ -1,18 +1,25 @@
+import time
 from typing import Any
 
+import structlog
 from django.contrib.auth import authenticate
 from django.contrib.auth.models import update_last_login
 from django.utils.translation import gettext_lazy as _
+from redis.exceptions import RedisError
 from rest_framework.serializers import CharField
 from rest_framework import serializers, exceptions
 from rest_framework.settings import api_settings
+from rest_framework_simplejwt.exceptions import InvalidToken
 from rest_framework_simplejwt.serializers import PasswordField
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
 from rest_framework_simplejwt.tokens import RefreshToken
 
 from account.models import Account
 from helpers import validators_helpers as vh
 from serializers.account_serializer import AccountSerializer
 
+Logger = structlog.getLogger(__name__)
+
 
 class TokenCreateSerializer(serializers.Serializer):
     def __init__(self, *args, **kwargs):
@@ -107,7 +114,14 @@ class TokenObtainSerializer(serializers.Serializer):
 
     @classmethod
     def get_token(cls, account):
-        return cls.token_class.for_user(account)
+        from services.token_revocation import ISSUED_AT_CLAIM
+
+        token = cls.token_class.for_user(account)
+        # carried into the access token, for authentication to build the user without loading the account
+        token["roles"] = account.roles
+        # to the microsecond, for a login right after its account's tokens were revoked to stay valid
+        token[ISSUED_AT_CLAIM] = round(time.time(), 6)
+        return token
 
     def update(self, instance, validated_data):
         pass
@@ -133,3 +147,56 @@ class TokenObtainPairSerializer(TokenObtainSerializer):
         update_last_login(None, self.account)
 
         return data
+
+
+class TokenRefreshSerializer(serializers.Serializer):
+    """
+    Refreshes like simplejwt's serializer, refusing revoked refresh tokens and, with ROTATE_REFRESH_TOKENS,
+    revoking the token it rotates so that each refresh token is used once
+    """
+
+    refresh = serializers.CharField()
+    access = serializers.CharField(read_only=True)
+    token_class = RefreshToken
+
+    def validate(self, attrs):
+        from services.token_revocation import get_token_revocations
+
+        revocations = get_token_revocations()
+        refresh = self.token_class(attrs["refresh"])
+        if revocations.is_revoked(refresh):
+            raise InvalidToken(_("Token has been revoked"))
+
+        data = {"access": str(refresh.access_token)}
+
+        if jwt_settings.ROTATE_REFRESH_TOKENS:
+            try:
+                revocations.revoke(refresh)
+            except RedisError:
+                # the old token stays usable until it expires, as it would without rotation
+                Logger.warning("rotated refresh token not revoked", jti=refresh.get("jti"), exc_info=True)
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+
+            data["refresh"] = str(refresh)
+
+        return data
+
+    def update(self, instance, validated_data):
+        pass
+
+    def create(self, validated_data):
+        pass
+
+
+class LogoutSerializer(serializers.Serializer):
+    refresh = serializers.CharField(required=False)
+    # revoke every token of the account, on every device
+    all = serializers.BooleanField(default=False)
+
+    def update(self, instance, validated_data):
+        pass
+
+    def create(self, validated_data):
+        pass
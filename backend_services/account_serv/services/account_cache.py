@@ -0,0 +1,313 @@
+import atexit
+import functools
+import json
+import math
+import os
+import random
+import threading
+import time
+import uuid
+from typing import Callable, Dict, Iterable, Mapping
+
+import structlog
+from django.conf import settings
+from helpers.local_cache import LocalCache
+from helpers.single_flight import SingleFlight
+from opentelemetry import metrics
+from opentelemetry.metrics import CallbackOptions, Observation
+from redis.exceptions import RedisError
+from repositories.redis_repository import MISSING, RedisRepository
+
+Logger = structlog.getLogger(__name__)
+_meter = metrics.get_meter(__name__)
+
+_reads_counter = _meter.create_counter(
+    "account.cache.reads",
+    unit="{read}",
+    description="Account cache reads by tier (l1, l2) and outcome: hit, negative_hit, miss, early_refresh, waited, "
+                "wait_timeout",
+)
+
+
+class CacheStats:
+    __slots__ = ("l1_hits", "l1_misses", "l2_hits", "l2_misses", "loads", "invalidations", "resubscribes")
+
+    def __init__(self):
+        self.l1_hits = 0
+        self.l1_misses = 0
+        self.l2_hits = 0
+        self.l2_misses = 0
+        self.loads = 0
+        self.invalidations = 0
+        self.resubscribes = 0
+
+    def hit_rate(self, tier: str) -> float:
+        hits, misses = getattr(self, f"{tier}_hits"), getattr(self, f"{tier}_misses")
+        return hits / (hits + misses) if hits + misses else 0.0
+
+    def as_dict(self) -> Dict:
+        return {
+            **{name: getattr(self, name) for name in self.__slots__},
+            "l1_hit_rate": round(self.hit_rate("l1"), 4),
+            "l2_hit_rate": round(self.hit_rate("l2"), 4),
+        }
+
+
+class AccountCache:
+    """
+    Read-through account cache that keeps a cache miss from becoming a stampede on the database.
+
+    - A miss is loaded once per key: concurrent callers in the process wait on the one loading, and across
+      processes the loader holds a short Redis lock while the others poll the cache for the value it fills,
+      loading themselves only if it has not appeared within lock_wait.
+    - Entries are refreshed early with probability growing as their expiry nears (XFetch), scaled by how
+      long a load takes, so a hot key is usually reloaded by one request before it expires rather than by
+      all of them after.
+    - Lookups that find nothing are cached as missing for negative_ttl.
+
+    With a `local` cache, values read from Redis are also kept in process for a few seconds (L1 in front of
+    Redis, L2). Invalidations delete from Redis and are published on `channel`; every process evicts the
+    keys from its own L1 when they arrive, and drops its whole L1 when it had to resubscribe, as messages
+    may have been missed meanwhile. The listener starts with the first read of each process, so commands
+    that never read accounts do not subscribe, and workers forked after import get one of their own.
+    """
+
+    def __init__(self, redis_repository: RedisRepository, config, flights: SingleFlight | None = None,
+                 local: LocalCache | None = None, channel: str | None = None, clock=time.monotonic,
+                 sleep=time.sleep, rand=random.random):
+        self._redis_repo = redis_repository
+        self._config = config
+        self._flights = flights or SingleFlight()
+        self._local = local
+        self._channel = channel
+        self._clock = clock
+        self._sleep = sleep
+        self._rand = rand
+        # seconds a load takes, a moving average, the delta of XFetch
+        self._load_seconds = config.initial_load_seconds
+        self._listener: threading.Thread | None = None
+        # the process the listener runs in; a forked child inherits the attribute but not the thread
+        self._listener_pid: int | None = None
+        self._starting = threading.Lock()
+        self._stopped = threading.Event()
+        self.stats = CacheStats()
+
+    def get(self, key, load: Callable[[], Mapping | None]) -> Mapping | None:
+        """
+        The cached value of `key`, or what `load` returns for it, None if it does not exist
+        """
+        if self._local is not None:
+            if self._channel is not None and self._listener_pid != os.getpid():
+                self.start()
+            cached = self._local.get(key)
+            if cached is not None:
+                self.stats.l1_hits += 1
+                _reads_counter.add(1, {"tier": "l1", "outcome": "hit"})
+                return None if cached is MISSING else cached
+            self.stats.l1_misses += 1
+
+        try:
+            cached, ttl = self._redis_repo.get_item_with_ttl(key)
+        except RedisError:
+            Logger.warning("account cache read failed", key=key, exc_info=True)
+            return load()
+
+        if cached is not None:
+            self.stats.l2_hits += 1
+            self._keep(key, cached, ttl)
+        else:
+            self.stats.l2_misses += 1
+        if cached is MISSING:
+            _reads_counter.add(1, {"tier": "l2", "outcome": "negative_hit"})
+            return None
+        if cached is not None:
+            if not self._refresh_early(ttl):
+                _reads_counter.add(1, {"tier": "l2", "outcome": "hit"})
+                return cached
+            # whoever takes the lock refreshes, everyone else keeps serving the cached value meanwhile
+            token = uuid.uuid4().hex
+            if not self._try_lock(key, token):
+                _reads_counter.add(1, {"tier": "l2", "outcome": "hit"})
+                return cached
+            _reads_counter.add(1, {"tier": "l2", "outcome": "early_refresh"})
+            try:
+                return self._load_and_fill(key, load)
+            finally:
+                self._unlock(key, token)
+
+        _reads_counter.add(1, {"tier": "l2", "outcome": "miss"})
+        return self._flights.do(key, lambda: self._fill(key, load))
+
+    def invalidate(self, *keys):
+        """
+        Drop the keys from Redis and from the L1 of every process
+        """
+        keys = [str(key) for key in keys if key]
+        if not keys:
+            return
+        self.stats.invalidations += 1
+        if self._local is not None:
+            self._local.evict(*keys)
+        try:
+            self._redis_repo.delete_items(*keys)
+            if self._channel is not None:
+                self._redis_repo.publish(self._channel, json.dumps(keys))
+        except RedisError:
+            Logger.warning("account cache invalidation failed", keys=keys, exc_info=True)
+
+    def start(self):
+        """
+        Listen for the invalidations of other processes, in a daemon thread of this process
+        """
+        if self._local is None or self._channel is None:
+            return
+        with self._starting:
+            if self._listener_pid == os.getpid() or self._stopped.is_set():
+                return
+            self._listener_pid = os.getpid()
+            self._listener = threading.Thread(target=self._listen, name="account-cache-invalidations", daemon=True)
+            self._listener.start()
+
+    def stop(self):
+        self._stopped.set()
+        listener, self._listener = self._listener, None
+        if self._listener_pid != os.getpid():
+            # inherited through a fork, the thread is not ours to join
+            return
+        if listener is not None:
+            listener.join(timeout=5)
+
+    def _listen(self):
+        backoff = self._config.poll_interval
+        while not self._stopped.is_set():
+            try:
+                pubsub = self._redis_repo.subscribe(self._channel)
+            except RedisError:
+                Logger.warning("account cache invalidation subscribe failed", exc_info=True)
+                self._stopped.wait(backoff)
+                backoff = min(backoff * 2, 5.0)
+                continue
+
+            # whatever was published while not subscribed is lost, so nothing in L1 can be trusted
+            self._local.clear()
+            self.stats.resubscribes += 1
+            backoff = self._config.poll_interval
+            try:
+                while not self._stopped.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is not None and message["type"] == "message":
+                        self._local.evict(*json.loads(message["data"]))
+            except (RedisError, ValueError):
+                Logger.warning("account cache invalidation listener failed", exc_info=True)
+            finally:
+                try:
+                    pubsub.close()
+                except RedisError:
+                    pass
+
+    def _keep(self, key, value, ttl: float):
+        if self._local is not None:
+            self._local.set(key, value, size=_size_of(value), ttl=ttl)
+
+    def _fill(self, key, load: Callable[[], Mapping | None]) -> Mapping | None:
+        token = uuid.uuid4().hex
+        if self._try_lock(key, token):
+            try:
+                return self._load_and_fill(key, load)
+            finally:
+                self._unlock(key, token)
+
+        # another process is loading it, wait for the value it fills
+        deadline = self._clock() + self._config.lock_wait
+        while self._clock() < deadline:
+            self._sleep(self._config.poll_interval)
+            try:
+                cached, _ = self._redis_repo.get_item_with_ttl(key)
+            except RedisError:
+                break
+            if cached is not None:
+                _reads_counter.add(1, {"tier": "l2", "outcome": "waited"})
+                self._keep(key, cached, self._config.ttl)
+                return None if cached is MISSING else cached
+
+        _reads_counter.add(1, {"tier": "l2", "outcome": "wait_timeout"})
+        return load()
+
+    def _load_and_fill(self, key, load: Callable[[], Mapping | None]) -> Mapping | None:
+        started = self._clock()
+        value = load()
+        self._load_seconds = 0.9 * self._load_seconds + 0.1 * (self._clock() - started)
+        self.stats.loads += 1
+
+        try:
+            if value is None:
+                self._redis_repo.set_missing(key, ttl=self._config.negative_ttl)
+            else:
+                self._redis_repo.set_item_with_expiration(key, data=value, ttl=self._config.ttl)
+        except RedisError:
+            Logger.warning("account cache write failed", key=key, exc_info=True)
+            return value
+
+        if value is None:
+            self._keep(key, MISSING, self._config.negative_ttl)
+        else:
+            self._keep(key, value, self._config.ttl)
+        return value
+
+    def _refresh_early(self, ttl: float) -> bool:
+        # XFetch: -delta * beta * ln(U) reaches past the remaining ttl ever more often as it shrinks
+        return -self._load_seconds * self._config.early_refresh_beta * math.log(1.0 - self._rand()) >= ttl
+
+    def _try_lock(self, key, token: str) -> bool:
+        try:
+            return self._redis_repo.acquire_lock(key, token, ttl=self._config.lock_ttl)
+        except RedisError:
+            # without Redis there is nothing to coordinate with
+            return True
+
+    def _unlock(self, key, token: str):
+        try:
+            self._redis_repo.release_lock(key, token)
+        except RedisError:
+            Logger.warning("account cache lock release failed", key=key, exc_info=True)
+
+
+def _size_of(value) -> int:
+    if value is MISSING:
+        return 64
+    nbytes = getattr(value, "nbytes", None)
+    if nbytes is not None:
+        return nbytes
+    return 2 * len(json.dumps(value, default=str))
+
+
+def _observe_hit_rates(cache: AccountCache) -> Callable[[CallbackOptions], Iterable[Observation]]:
+    def observe(options: CallbackOptions):
+        return [Observation(cache.stats.hit_rate(tier), {"tier": tier}) for tier in ("l1", "l2")]
+
+    return observe
+
+
+@functools.lru_cache(maxsize=None)
+def get_account_cache() -> AccountCache:
+    """
+    The process wide account cache, with its L1; the invalidation listener keeping it coherent starts with
+    the first read
+    """
+    from factories.repository_factory import RepositoryFactory
+
+    config = settings.ACCOUNT_L1
+    cache = AccountCache(
+        RepositoryFactory.create_redis_repository(),
+        settings.ACCOUNT_READS,
+        local=LocalCache(config.max_entries, config.max_bytes, config.ttl) if config.enabled else None,
+        channel=config.channel,
+    )
+    _meter.create_observable_gauge(
+        "account.cache.hit_rate",
+        callbacks=[_observe_hit_rates(cache)],
+        unit="1",
+        description="Share of account cache reads served by each tier (l1 in process, l2 Redis)",
+    )
+    atexit.register(cache.stop)
+    return cache
@@ -1,21 +1,26 @@
-import traceback
-from typing import Dict
+from typing import Dict, List, Sequence
 
 import structlog
-from django.core.exceptions import ObjectDoesNotExist
-from errors.account_error import AccountError
+from account.models import Account
+from django.conf import settings
+from errors.account_error import AccountError, InvalidAccountData
 from helpers import validators_helpers as vh
+from helpers.error_reporting import report_error
 from models.error_response import ErrorResponse
+from redis.exceptions import RedisError
 from repositories.account_repository import AccountRepository
-from repositories.redis_repository import RedisRepository
+from repositories.redis_repository import MISSING, RedisRepository
+from services.account_cache import AccountCache
 
 Logger = structlog.getLogger(__name__)
 
 
 class AccountService:
-    def __init__(self, account_repository: AccountRepository,redis_repository:RedisRepository):
+    def __init__(self, account_repository: AccountRepository,redis_repository:RedisRepository,
+                 account_cache: AccountCache | None = None):
         self._account_repo = account_repository
         self._redis_repo = redis_repository
+        self._account_cache = account_cache or AccountCache(redis_repository, settings.ACCOUNT_READS)
 
     def create_account(self, data: dict):
         try:
@@ -26,18 +31,34 @@ class AccountService:
 
             new_account = self._account_repo.create_account(data=data)
 
-            # save new account to redis
-            self._redis_repo.set_item(item_id=new_account["id"],item=new_account)
+            self._cache_account(new_account["id"], new_account)
 
             return new_account
-        except AccountError:
-            Logger.error("create account error", phone=data.get("phone"), traceback=traceback.format_exc())
-            _err = {
-                "type": "create entity error",
-                "title": "Couldn't create account",
-                "detail": traceback.format_exc()
-            }
-            return ErrorResponse.from_dict(_err)
+        except AccountError as exc:
+            report_error(Logger, "create account error", exc, phone=data.get("phone"))
+            return ErrorResponse(
+                type="create entity error",
+                title="Couldn't create account",
+                detail=exc.detail,
+                code=exc.code,
+            )
+
+    def load_account(self, account_id: int) -> Account | None:
+        """
+        The account from the Redis cache, or from the database, caching it, on a miss. None when it does not exist
+        """
+        try:
+            data = self._account_cache.get(str(account_id), lambda: self._account_repo.find_account(account_id))
+        except AccountError as exc:
+            report_error(Logger, "load account error", exc, account_id=account_id)
+            return None
+        return None if data is None else self._account_repo.from_cache(data)
+
+    def _cache_account(self, account_id, data: Dict):
+        try:
+            self._redis_repo.set_item_with_expiration(item_id=account_id, data=data)
+        except RedisError:
+            Logger.warning("account cache write failed", account_id=account_id, exc_info=True)
 
     def _validate_create_account_data(self, data) -> ErrorResponse | None:
         phone = data.get("phone")
@@ -52,18 +73,20 @@ class AccountService:
                 )
             }
 
-            return ErrorResponse.from_dict(err)
+            return ErrorResponse(**err, code=InvalidAccountData.code)
 
         return
 
     def get_account(self, lookup_field: int | str) -> Dict | ErrorResponse:
         try:
+            account = self._account_cache.get(
+                str(lookup_field), lambda: self._account_repo.find_account(lookup_field=lookup_field)
+            )
+        except AccountError as exc:
+            report_error(Logger, "get account error", exc, lookup_field=lookup_field)
+            account = None
 
-            _, account_serialized = self._account_repo.get_account(lookup_field=lookup_field)
-
-            return account_serialized
-        except ObjectDoesNotExist:
-            Logger.error("get account error", lookup_field=lookup_field, traceback=traceback.format_exc())
+        if account is None:
             return ErrorResponse(
                 title="Account object does not exist",
                 type="invalid lookup",
@@ -72,21 +95,69 @@ class AccountService:
                     f"Cross check the lookup field {lookup_field} and try again"
                 )
             )
+        return dict(account)
+
+    def get_accounts(self, account_ids: Sequence[int]) -> List[Dict | None] | ErrorResponse:
+        """
+        The serialized accounts of the ids, in their order, None for the ones that do not exist.
+        Ids are resolved a chunk at a time so a large batch never holds more than one chunk of lookups.
+        """
+        chunk_size = settings.ACCOUNT_BATCH.chunk_size
+        unique_ids = list(dict.fromkeys(account_ids))
+        found = {}
+        try:
+            for start in range(0, len(unique_ids), chunk_size):
+                found.update(self._get_accounts_chunk(unique_ids[start:start + chunk_size]))
+        except AccountError as exc:
+            report_error(Logger, "get accounts batch error", exc, count=len(unique_ids))
+            return ErrorResponse(
+                title="Accounts data retrieval error",
+                type="Invalid lookup",
+                detail="Could not retrieve the accounts of the batch",
+                code=exc.code,
+            )
+        return [found.get(account_id) for account_id in account_ids]
+
+    def _get_accounts_chunk(self, account_ids: List[int]) -> Dict[int, Dict]:
+        try:
+            cached = self._redis_repo.get_items(account_ids)
+        except RedisError:
+            Logger.warning("account cache batch read failed", count=len(account_ids), exc_info=True)
+            cached = [None] * len(account_ids)
+
+        found = {account_id: data for account_id, data in zip(account_ids, cached) if data is not None}
+        uncached = [account_id for account_id in account_ids if account_id not in found]
+        # known not to exist
+        found = {account_id: data for account_id, data in found.items() if data is not MISSING}
+        if not uncached:
+            return found
+
+        loaded = self._account_repo.get_accounts(uncached)
+        try:
+            self._redis_repo.set_items_with_expiration(
+                loaded, missing=[account_id for account_id in uncached if account_id not in loaded],
+                missing_ttl=settings.ACCOUNT_READS.negative_ttl,
+            )
+        except RedisError:
+            Logger.warning("account cache batch write failed", count=len(uncached), exc_info=True)
+        found.update(loaded)
+        return found
 
     def get_all_accounts(self, account):
         # check for right permission
         try:
             result = self._account_repo.get_all_accounts()
             return result
-        except AccountError:
-            Logger.error("get accounts error", traceback=traceback.format_exc())
+        except AccountError as exc:
+            report_error(Logger, "get accounts error", exc)
             return ErrorResponse(
                 title="Accounts data retrieval error",
                 type="Invalid lookup",
                 detail=(
                     "Could not retrieve account data"
                     "Suggest a way around"
-                )
+                ),
+                code=exc.code,
             )
 
     def delete_account(self, lookup_field: int) -> bool | ErrorResponse:
@@ -94,39 +165,43 @@ class AccountService:
             result = self._account_repo.delete_account(lookup_field=lookup_field)
             Logger.info("account deleted", account=result)
             return True
-        except AccountError:
-            Logger.error("delete account error", pk=lookup_field, traceback=traceback.format_exc())
+        except AccountError as exc:
+            report_error(Logger, "delete account error", exc, pk=lookup_field)
             return ErrorResponse(
                 type="Invalid lookup",
                 title="Couldn't delete account",
                 detail=(
                     "Account you are trying to delete does not exist"
                     "Error occurred when trying to delete the account"
-                )
+                ),
+                code=exc.code,
             )
 
     def set_password(self, data, account_id=None, account=None):
         try:
             updated_account = self._account_repo.set_password(data, account_id, account)
             return updated_account
-        except AccountError:
-            Logger.error("set password error", data=data, account_id=account_id, traceback=traceback.format_exc())
+        except AccountError as exc:
+            # the request data holds the passwords, never logged
+            report_error(Logger, "set password error", exc, account_id=account_id)
             return ErrorResponse(
                 type="account update",
                 title="Couldn't set account password",
-                detail=(),
+                detail=exc.detail,
+                code=exc.code,
             )
 
     def reset_password(self, data, lookup_field):
         try:
             updated_account = self._account_repo.reset_password(data=data, lookup_field=lookup_field)
             return updated_account
-        except AccountError:
-            Logger.error("reset password error", data=data, lookup_field=lookup_field, traceback=traceback.format_exc())
+        except AccountError as exc:
+            report_error(Logger, "reset password error", exc, lookup_field=lookup_field)
             return ErrorResponse(
                 type="account update",
                 title="Couldn't reset account password",
-                detail=(),
+                detail=exc.detail,
+                code=exc.code,
             )
 
     def change_phone_number(self, data, lookup_field, instance=None):
@@ -134,24 +209,24 @@ class AccountService:
             updated_account = self._account_repo.change_phone_number(data=data, lookup_field=lookup_field,
                                                                      instance=instance)
             return updated_account
-        except AccountError as ac_err:
-            Logger.error("change phone error", data=data, lookup_field=lookup_field, traceback=traceback.format_exc())
+        except AccountError as exc:
+            report_error(Logger, "change phone error", exc, data=data, lookup_field=lookup_field)
             return ErrorResponse(
                 type="account update",
                 title="Couldn't change phone number of this account",
-                detail=(
-                    str(ac_err.args[0])
-                ),
+                detail=exc.detail,
+                code=exc.code,
             )
 
     def change_email(self, data, lookup_field):
         try:
             updated_account = self._account_repo.change_email(data=data, lookup_field=lookup_field)
             return updated_account
-        except AccountError:
-            Logger.error("change email error", data=data, lookup_field=lookup_field, traceback=traceback.format_exc())
+        except AccountError as exc:
+            report_error(Logger, "change email error", exc, data=data, lookup_field=lookup_field)
             return ErrorResponse(
                 type="account update",
                 title="Couldn't change the email of this account",
-                detail="",
+                detail=exc.detail,
+                code=exc.code,
             )
@@ -0,0 +1,111 @@
+import hashlib
+import hmac
+import secrets
+
+import structlog
+from errors.account_error import AccountError
+from helpers import validators_helpers as vh
+from helpers.error_reporting import report_error
+from helpers.sms import BatchingSmsSender
+from models.error_response import ErrorResponse
+from redis.exceptions import RedisError
+from repositories.account_repository import AccountRepository
+from repositories.redis_repository import RedisRepository
+from services.account_service import AccountService
+
+Logger = structlog.getLogger(__name__)
+
+
+class OtpService:
+    """
+    One time codes verifying an account's phone.
+
+    Only an HMAC of the phone and code is kept, in Redis under otp:{phone} for the code's ttl, along with the
+    account it was issued for, so verifying reads nothing from the database: one Redis round trip fetches the
+    code and counts the attempt, and a correct code flips phoneVerified with one UPDATE. A code is dropped
+    after max_attempts wrong guesses, issuing a new one resets the count.
+    """
+
+    def __init__(self, redis_repository: RedisRepository, account_repository: AccountRepository,
+                 account_service: AccountService, sms_sender: BatchingSmsSender, config):
+        self._redis_repo = redis_repository
+        self._account_repo = account_repository
+        self._account_service = account_service
+        self._sms_sender = sms_sender
+        self._config = config
+        self._secret = config.secret.encode()
+
+    def issue(self, to: str) -> bool | ErrorResponse:
+        """
+        Text a new code to the phone of an account that has not verified it yet
+        """
+        if not vh.is_phone_number(to):
+            return _error("invalid field", "Incorrect field value", f"{to} is not a valid phone number")
+
+        # through the account cache, usually without a query
+        account = self._account_service.get_account(to)
+        if isinstance(account, ErrorResponse) or account.get("phone") != to:
+            return _error("Couldn't send code", "invalid lookup", f"No account has the phone number {to}")
+        if account.get("phoneVerified"):
+            return _error("Couldn't send code", "account update", "The phone number is verified already")
+
+        code = f"{secrets.randbelow(10 ** self._config.digits):0{self._config.digits}d}"
+        record = {"hash": self._hash(to, code), "accountId": account["id"], "email": account.get("email")}
+        try:
+            self._redis_repo.set_item_with_expiration(_code_key(to), data=record, ttl=self._config.ttl)
+            self._redis_repo.delete_item(_attempts_key(to))
+        except RedisError:
+            Logger.error("otp issue error", to=to, exc_info=True)
+            return _error("Couldn't send code", "service unavailable", "Try again in a moment")
+
+        self._sms_sender.send(to, self._config.message.format(code=code, minutes=self._config.ttl // 60))
+        return True
+
+    def verify(self, to: str, code: str) -> bool | ErrorResponse:
+        try:
+            record, attempts = self._redis_repo.get_item_and_count(
+                _code_key(to), _attempts_key(to), ttl=self._config.ttl
+            )
+        except RedisError:
+            Logger.error("otp verify error", to=to, exc_info=True)
+            return _error("Couldn't verify code", "service unavailable", "Try again in a moment")
+
+        # hashed whether or not there is a code, so a missing one takes as long as a wrong one
+        digest = self._hash(to, code)
+        if record is None:
+            return _error("Couldn't verify code", "invalid code", "The code has expired, request a new one")
+        if attempts > self._config.max_attempts:
+            self._discard(to)
+            return _error("Couldn't verify code", "invalid code", "Too many attempts, request a new code")
+        if not hmac.compare_digest(digest, record["hash"]):
+            return _error("Couldn't verify code", "invalid code", "The code is not correct")
+
+        self._discard(to)
+        try:
+            self._account_repo.verify_phone(record["accountId"], to, email=record.get("email"))
+        except AccountError as exc:
+            report_error(Logger, "otp verify phone error", exc, to=to)
+            return _error("Couldn't verify code", "account update", "Could not mark the phone number verified",
+                          code=exc.code)
+        return True
+
+    def _hash(self, to: str, code: str) -> str:
+        return hmac.new(self._secret, f"{to}:{code}".encode(), hashlib.sha256).hexdigest()
+
+    def _discard(self, to: str):
+        try:
+            self._redis_repo.delete_items(_code_key(to), _attempts_key(to))
+        except RedisError:
+            Logger.warning("otp discard failed", to=to, exc_info=True)
+
+
+def _code_key(to: str) -> str:
+    return f"otp:{to}"
+
+
+def _attempts_key(to: str) -> str:
+    return f"otp:attempts:{to}"
+
+
+def _error(title: str, type: str, detail: str, code: str | None = None) -> ErrorResponse:
+    return ErrorResponse(title=title, type=type, detail=detail, code=code)
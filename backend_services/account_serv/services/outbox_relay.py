@@ -0,0 +1,43 @@
+import structlog
+from django.db import transaction
+from repositories.event_stream_repository import AccountEventStreamRepository
+from repositories.outbox_repository import OutboxRepository
+
+Logger = structlog.getLogger(__name__)
+
+
+class OutboxRelay:
+    """
+    Moves committed outbox events to the account event stream.
+
+    Delivery is at least once: a crash between publishing and committing the delete republishes the batch,
+    consumers de-duplicate on the event id.
+    """
+
+    def __init__(self, outbox_repository: OutboxRepository, event_stream_repository: AccountEventStreamRepository,
+                 batch_size: int):
+        self._outbox_repo = outbox_repository
+        self._stream_repo = event_stream_repository
+        self._batch_size = batch_size
+
+    def relay_once(self) -> int:
+        with transaction.atomic():
+            events = self._outbox_repo.claim_batch(limit=self._batch_size)
+            if not events:
+                return 0
+
+            self._stream_repo.publish(events)
+            self._outbox_repo.delete_batch(event.id for event in events)
+
+        Logger.debug("outbox events relayed", count=len(events), last_event=events[-1].id)
+        return len(events)
+
+    def drain(self) -> int:
+        """
+        Relay until the outbox is empty
+        """
+        total = 0
+        while relayed := self.relay_once():
+            total += relayed
+
+        return total
@@ -0,0 +1,150 @@
+import functools
+import threading
+import time
+from typing import Dict
+
+import structlog
+from django.conf import settings
+from helpers.bloom_filter import BloomFilter
+from opentelemetry import metrics
+from redis.exceptions import RedisError
+from repositories.revocation_repository import ACCOUNT, JTI, RevocationRepository
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import Token
+
+Logger = structlog.getLogger(__name__)
+_meter = metrics.get_meter(__name__)
+
+_checks_counter = _meter.create_counter(
+    "account.token_revocation.checks",
+    unit="{check}",
+    description="Token revocation checks by outcome: clear (in memory), false_positive (cleared by Redis), revoked",
+)
+
+# when the token's login happened, in fractional seconds: "iat" has whole seconds only, so a login in the
+# same second as a revocation of the account could not be told apart from one before it
+ISSUED_AT_CLAIM = "issued_at"
+
+
+class TokenRevocations:
+    """
+    Revoked tokens, checked without leaving the process in the common case.
+
+    Revocations are written to Redis (see RevocationRepository) and mirrored in every process: revoked jtis in
+    a Bloom filter, revoked accounts in a dict of the time before which their tokens are revoked. At most
+    every refresh_interval seconds a check reads the revocations logged since the last read, so a token
+    revoked in another process is honoured here within that interval. A jti the filter does not hold was not
+    revoked, only one it (probably) holds is confirmed in Redis. The mirror is rebuilt from the whole log every
+    rebuild_interval, dropping revocations of tokens that have expired since, or when it outgrows the filter.
+    """
+
+    def __init__(self, repository: RevocationRepository, config, lifetime: float, clock=time.time):
+        self._repository = repository
+        self._config = config
+        # the longest a token lives, revocations older than that no longer matter
+        self._lifetime = lifetime
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._jtis = BloomFilter(config.capacity, config.error_rate)
+        self._accounts: Dict[int, float] = {}
+        # the log time read up to, None until the first full read
+        self._synced_to: float | None = None
+        self._synced_at = 0.0
+        self._rebuilt_at = 0.0
+
+    def revoke(self, token: Token):
+        """
+        Revoke the token until it expires
+        """
+        jti = token[api_settings.JTI_CLAIM]
+        now = self._clock()
+        self._repository.revoke_token(jti, ttl=token["exp"] - now, now=now)
+        with self._lock:
+            self._jtis.add(jti)
+
+    def revoke_account(self, account_id: int):
+        """
+        Revoke every token issued to the account so far
+        """
+        now = self._clock()
+        self._repository.revoke_account(account_id, now=now)
+        with self._lock:
+            self._accounts[int(account_id)] = now
+
+    def is_revoked(self, token: Token) -> bool:
+        self._sync()
+
+        revoked_before = self._accounts.get(_account_id(token))
+        if revoked_before is not None and _issued_at(token) <= revoked_before:
+            _checks_counter.add(1, {"outcome": "revoked"})
+            return True
+
+        jti = token.get(api_settings.JTI_CLAIM)
+        if jti is None or jti not in self._jtis:
+            _checks_counter.add(1, {"outcome": "clear"})
+            return False
+
+        try:
+            revoked = self._repository.is_token_revoked(jti)
+        except RedisError:
+            # the filter rarely errs, a probable revocation is taken as one
+            Logger.warning("token revocation check failed", jti=jti, exc_info=True)
+            revoked = True
+        _checks_counter.add(1, {"outcome": "revoked" if revoked else "false_positive"})
+        return revoked
+
+    def _sync(self):
+        now = self._clock()
+        if now - self._synced_at < self._config.refresh_interval:
+            return
+        # one thread reads the log, the others go on with the mirror as it is
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._synced_at = now
+            rebuild = (self._synced_to is None or now - self._rebuilt_at >= self._config.rebuild_interval
+                       or self._jtis.count > self._jtis.capacity)
+            since = now - self._lifetime if rebuild else self._synced_to
+            try:
+                changes = self._repository.changes_since(since)
+            except RedisError:
+                Logger.warning("token revocations sync failed", exc_info=True)
+                return
+
+            if rebuild:
+                jtis = sum(1 for member, _ in changes if member.startswith(JTI))
+                self._jtis = BloomFilter(max(self._config.capacity, 2 * jtis), self._config.error_rate)
+                self._accounts = {}
+                self._rebuilt_at = now
+            for member, revoked_at in changes:
+                if member.startswith(JTI):
+                    self._jtis.add(member[len(JTI):])
+                else:
+                    self._accounts[int(member[len(ACCOUNT):])] = revoked_at
+            # entries logged in the same instant as the last one read are read again next time, not missed
+            self._synced_to = max((revoked_at for _, revoked_at in changes), default=since)
+        finally:
+            self._lock.release()
+
+
+def _issued_at(token: Token) -> float:
+    issued_at = token.get(ISSUED_AT_CLAIM)
+    # tokens issued before the claim was added have whole seconds, the same second counts as before
+    return token.get("iat", 0) if issued_at is None else issued_at
+
+
+def _account_id(token: Token) -> int | None:
+    account_id = token.get(api_settings.USER_ID_CLAIM)
+    return None if account_id is None else int(account_id)
+
+
+@functools.lru_cache(maxsize=None)
+def get_token_revocations() -> TokenRevocations:
+    """
+    The process wide revocations, their mirror shared by all of the process's threads
+    """
+    from factories.repository_factory import RepositoryFactory
+
+    lifetime = max(api_settings.ACCESS_TOKEN_LIFETIME, api_settings.REFRESH_TOKEN_LIFETIME).total_seconds()
+    return TokenRevocations(RepositoryFactory.create_revocation_repository(int(lifetime)),
+                            settings.TOKEN_REVOCATION, lifetime=lifetime)
@@ -0,0 +1,57 @@
+from http import HTTPStatus
+from unittest.mock import Mock
+
+import pytest
+from account import views
+from account.models import Account, OutboxEvent
+from account.views import AccountViewSet
+from factories.repository_factory import RepositoryFactory
+from repositories.outbox_repository import ACCOUNT_CREATED, ACCOUNT_DELETED
+from repositories.redis_repository import RedisRepository
+from rest_framework.test import APIRequestFactory, force_authenticate
+from services.account_cache import AccountCache
+from services.account_service import AccountService
+
+SIGNUP = {"phone": "+233200000042", "password": "Str0ng-secret!"}
+
+
+@pytest.fixture
+def account_service(settings):
+    redis_repository = Mock(spec=RedisRepository)
+    return AccountService(
+        account_repository=RepositoryFactory.create_account_repository(),
+        redis_repository=redis_repository,
+        account_cache=AccountCache(redis_repository, settings.ACCOUNT_READS),
+    )
+
+
+def _view(account_service, actions):
+    return AccountViewSet.as_view(actions, account_service=account_service, otp_service=Mock(), throttle_classes=[])
+
+
+@pytest.mark.django_db
+def test_sign_up_writes_the_created_event(account_service):
+    response = _view(account_service, {"post": "create"})(
+        APIRequestFactory().post("/account/", SIGNUP, format="json")
+    )
+
+    assert response.status_code == HTTPStatus.CREATED
+    assert list(OutboxEvent.objects.values_list("topic", "accountId")) == [(ACCOUNT_CREATED, response.data["id"])]
+
+
+@pytest.mark.django_db
+def test_delete_writes_the_deleted_event(account_service, monkeypatch):
+    # the route validates the body against the account serializer, which is not what is tested here
+    monkeypatch.setattr(views, "AccountSerializer", Mock())
+    monkeypatch.setattr(views, "_revoke_account_tokens", Mock())
+    account_id = account_service.create_account(dict(SIGNUP))["id"]
+    request = APIRequestFactory().delete(f"/account/{account_id}/")
+    force_authenticate(request, user=Account.objects.get(id=account_id))
+
+    response = _view(account_service, {"delete": "destroy"})(request, id=account_id)
+
+    assert response.status_code == HTTPStatus.NO_CONTENT
+    assert not Account.objects.filter(id=account_id).exists()
+    assert list(OutboxEvent.objects.values_list("topic", "accountId")) == [
+        (ACCOUNT_CREATED, account_id), (ACCOUNT_DELETED, account_id),
+    ]
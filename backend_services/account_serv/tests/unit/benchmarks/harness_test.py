@@ -0,0 +1,38 @@
+from benchmarks import harness
+
+
+def _result(name, ops_per_sec, p95_us):
+    return harness.summarize(name, "micro", [p95_us], operations=int(ops_per_sec), seconds=1.0)
+
+
+def test_percentile():
+    samples = sorted(float(i) for i in range(1, 101))
+
+    assert harness.percentile(samples, 50) == 50.0
+    assert harness.percentile(samples, 95) == 95.0
+    assert harness.percentile([], 95) == 0.0
+
+
+def test_run_micro_counts_operations():
+    calls = []
+    result = harness.run_micro("append", lambda: calls.append(1), rounds=10, inner=5, warmup=2)
+
+    assert result.operations == 50
+    assert len(calls) == 52
+    assert result.ops_per_sec > 0
+
+
+def test_compare_reports_throughput_and_latency_regressions():
+    baseline = {"fast": {"ops_per_sec": 1000.0, "p95_us": 10.0}, "slow": {"ops_per_sec": 100.0, "p95_us": 10.0}}
+    results = [_result("fast", 950, 10.0), _result("slow", 50, 20.0), _result("new", 1, 1000.0)]
+
+    regressions = harness.compare(results, baseline, threshold=0.2)
+
+    assert [(r.name, r.metric) for r in regressions] == [("slow", "ops_per_sec"), ("slow", "p95_us")]
+
+
+def test_results_round_trip(tmp_path):
+    path = tmp_path / "results.json"
+    harness.write_results(path, [_result("fast", 1000, 10.0)])
+
+    assert harness.load_results(path)["fast"]["ops_per_sec"] == 1000.0
@@ -0,0 +1,54 @@
+from datetime import datetime, timezone
+
+import pytest
+from account.management.commands.generate_accounts import COLUMNS, RowFactory
+
+
+@pytest.fixture
+def factory():
+    return RowFactory(
+        seed=42,
+        since=datetime(2021, 1, 1, tzinfo=timezone.utc),
+        until=datetime(2024, 1, 1, tzinfo=timezone.utc),
+        password="pbkdf2_sha256$hash",
+    )
+
+
+def _column(rows, name):
+    return [row[COLUMNS.index(name)] for row in rows]
+
+
+def test_rows_are_deterministic_for_a_seed(factory):
+    first = list(factory.rows(0, 3000))
+    second = list(RowFactory(42, factory.since, factory.since.replace(year=2024), factory.password).rows(0, 3000))
+
+    assert first == second
+
+
+def test_rows_do_not_depend_on_chunk_boundaries(factory):
+    whole = list(factory.rows(0, 5000))
+    chunked = list(factory.rows(0, 2000)) + list(factory.rows(2000, 3500)) + list(factory.rows(3500, 5000))
+
+    assert whole == chunked
+
+
+def test_ids_phones_and_emails_are_unique(factory):
+    rows = list(factory.rows(0, 20_000))
+    emails = [email for email in _column(rows, "email") if email is not None]
+
+    assert len(set(_column(rows, "id"))) == len(rows)
+    assert len(set(_column(rows, "phone"))) == len(rows)
+    assert len(set(emails)) == len(emails)
+
+
+def test_ids_keep_the_id_generator_layout(factory):
+    ids = _column(factory.rows(0, 10), "id")
+
+    assert all(pk.bit_length() == 63 for pk in ids)
+
+
+def test_date_joined_is_within_range(factory):
+    rows = list(factory.rows(0, 1000))
+
+    assert all(factory.since <= joined <= factory.since.replace(year=2024) for joined in _column(rows, "dateJoined"))
+    assert all(row[COLUMNS.index("lastUpdated")] >= row[COLUMNS.index("dateJoined")] for row in rows)
@@ -0,0 +1,94 @@
+import datetime
+from unittest.mock import Mock
+
+import pytest
+from account.models import Account
+from helpers import authentication
+from helpers.authentication import AccountTokenUser, StatelessJWTAuthentication
+from repositories.account_repository import AccountRepository
+from repositories.outbox_repository import OutboxRepository
+from repositories.redis_repository import RedisRepository
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import IsAuthenticated
+from serializers.account_serializer import (AccountCreateSerializer,
+                                            AccountSerializer,
+                                            ChangePhoneSerializer,
+                                            EmailSerializer,
+                                            PasswordSerializer,
+                                            SetPasswordSerializer)
+from services.account_service import AccountService
+
+TOKEN = {"account_id": 42, "roles": "user,courier"}
+
+
+def _account():
+    now = datetime.datetime(2023, 8, 10, 9, 23, 23, tzinfo=datetime.timezone.utc)
+    return Account(id=42, dateJoined=now, lastUpdated=now, phoneVerified=True, roles="user,courier",
+                   phone="+233200000042", email="user42@pipa.com", lang="en", displayName="Forty Two")
+
+
+@pytest.fixture
+def account_service(monkeypatch):
+    service = Mock(spec=AccountService)
+    service.load_account.return_value = _account()
+    monkeypatch.setattr(authentication, "_account_service", lambda: service)
+    return service
+
+
+@pytest.fixture
+def account_repository():
+    return AccountRepository(
+        account=Account,
+        account_serializer=AccountSerializer,
+        account_create_serializer=AccountCreateSerializer,
+        email_serializer=EmailSerializer,
+        password_serializer=PasswordSerializer,
+        change_phone_serializer=ChangePhoneSerializer,
+        set_password_serializer=SetPasswordSerializer,
+        outbox_repository=Mock(spec=OutboxRepository),
+    )
+
+
+def test_claims_and_permissions_do_not_load_the_account(account_service):
+    user = StatelessJWTAuthentication().get_user(TOKEN)
+
+    assert IsAuthenticated().has_permission(Mock(user=user), None)
+    assert user.id == 42 and user.roles == ("user", "courier")
+    account_service.load_account.assert_not_called()
+
+
+def test_account_fields_load_the_account_once(account_service):
+    user = AccountTokenUser(TOKEN)
+
+    assert user.phone == "+233200000042" and user.displayName == "Forty Two" and user.email == "user42@pipa.com"
+    account_service.load_account.assert_called_once_with(42)
+
+    account_service.load_account.return_value = None
+    with pytest.raises(AuthenticationFailed):
+        assert AccountTokenUser(TOKEN).phone
+
+
+def test_load_account_from_cache_then_database(account_repository):
+    redis_repository = Mock(spec=RedisRepository)
+    redis_repository.acquire_lock.return_value = True
+    account_repository.find_account = Mock(return_value=account_repository.to_cache(_account()))
+    service = AccountService(account_repository=account_repository, redis_repository=redis_repository)
+
+    # a miss reads the database and fills the cache
+    redis_repository.get_item_with_ttl.return_value = (None, 0)
+    account = service.load_account(42)
+    account_repository.find_account.assert_called_once_with(42)
+    cached = redis_repository.set_item_with_expiration.call_args.kwargs["data"]
+    assert cached["phone"] == account.phone and "password" not in cached
+
+    # a hit rebuilds the account without a query
+    redis_repository.get_item_with_ttl.return_value = (cached, 600)
+    from_cache = service.load_account(42)
+    assert account_repository.find_account.call_count == 1
+    assert (from_cache.id, from_cache.phone, from_cache.dateJoined) == (42, account.phone, account.dateJoined)
+    assert not from_cache._state.adding
+
+    account_repository.find_account.return_value = None
+    redis_repository.get_item_with_ttl.return_value = (None, 0)
+    assert service.load_account(7) is None
+    redis_repository.set_missing.assert_called_once()
@@ -0,0 +1,44 @@
+import json
+
+from helpers.cache_codecs import COMPRESSED, AccountCodec, CachedRecord, JsonCodec
+
+ACCOUNT = {
+    "id": 7095354049319022592, "last_login": None, "dateJoined": "2023-08-10T09:23:23.336561Z",
+    "phoneVerified": True, "roles": "user", "phone": "+233219022592", "email": "kofi@pipa.com", "isDeleted": False,
+    "timezone": "Africa/Accra", "geoEnabled": False, "lang": "en", "displayName": "Kofi Ananse", "location": None,
+    "entities": {"devices": ["android"], "referrer": None, "marketing": {"sms": True, "email": False}},
+    "lastUpdated": "2023-08-10T14:53:23+05:30",
+}
+
+
+def test_account_round_trips_smaller_than_json():
+    codec = AccountCodec()
+    encoded = codec.encode(ACCOUNT)
+    record = codec.decode(encoded)
+
+    assert isinstance(record, CachedRecord) and encoded[0] == 1
+    assert len(encoded) < len(JsonCodec().encode(ACCOUNT)) / 2 + 20
+    assert record == ACCOUNT and list(record) == list(ACCOUNT)
+    assert json.loads(json.dumps(dict(record))) == ACCOUNT
+
+
+def test_fields_are_decoded_on_first_read():
+    record = AccountCodec().decode(AccountCodec().encode(ACCOUNT))
+
+    assert record["phone"] == "+233219022592" and record["location"] is None
+    assert set(record._decoded) == {"phone", "location"}
+    assert record["entities"]["marketing"] == {"sms": True, "email": False}
+
+
+def test_json_entries_and_payloads_outside_the_schema():
+    codec = AccountCodec(compress_threshold=256)
+
+    # entries written before the switch
+    assert codec.decode(JsonCodec().encode(ACCOUNT)) == ACCOUNT
+    # a value of the wrong type is written as JSON
+    assert codec.encode({**ACCOUNT, "id": "7095354049319022592"})[:1] == b"{"
+
+    unknown = {**ACCOUNT, "entities": {"notes": "n" * 2000}, "badges": ["early"]}
+    encoded = codec.encode(unknown)
+    assert encoded[1] & COMPRESSED and len(encoded) < 400
+    assert codec.decode(encoded) == unknown and codec.decode(encoded)["badges"] == ["early"]
@@ -0,0 +1,58 @@
+from unittest.mock import Mock
+
+from errors.account_error import (AccountConflict, AccountError,
+                                  AccountNotFound, InvalidAccountData)
+from helpers.error_reporting import report_error
+from models.error_response import ErrorResponse
+from rest_framework.exceptions import ErrorDetail
+
+
+def _unexpected():
+    try:
+        try:
+            raise ValueError("boom")
+        except ValueError as exc:
+            raise AccountError("Error occurred finding account") from exc
+    except AccountError as exc:
+        return exc
+
+
+def test_expected_errors_are_logged_without_a_traceback():
+    logger = Mock()
+
+    report_error(logger, "get account error", AccountNotFound("no account 7"), rand=Mock(return_value=0.0), pk=7)
+
+    logger.info.assert_called_once_with("get account error", code="account_not_found", detail="no account 7", pk=7)
+    logger.error.assert_not_called()
+
+
+def test_unexpected_errors_carry_a_sampled_traceback(settings):
+    settings.ERROR_REPORTING = settings.ERROR_REPORTING._replace(traceback_sample_rate=0.5)
+    logger = Mock()
+
+    report_error(logger, "get account error", _unexpected(), rand=lambda: 0.9)
+    report_error(logger, "get account error", _unexpected(), rand=lambda: 0.1)
+
+    unsampled, sampled = (call.kwargs for call in logger.error.call_args_list)
+    assert unsampled["error"] == "ValueError('boom')" and "traceback" not in unsampled
+    assert "ValueError: boom" in sampled["traceback"]
+
+
+def test_validation_errors_map_to_codes():
+    invalid = InvalidAccountData.from_errors({"phone": [ErrorDetail("Enter a valid phone", code="invalid")]})
+    taken = InvalidAccountData.from_errors({"phone": [ErrorDetail("Phone already exists", code="unique")]})
+
+    assert (type(invalid), invalid.detail) == (InvalidAccountData, "phone: Enter a valid phone")
+    assert type(taken) is AccountConflict and taken.code == "account_conflict" and taken.expected
+
+
+def test_error_response_round_trip():
+    response = ErrorResponse(title="Couldn't create account", type="create entity error", detail="taken",
+                             code="account_conflict")
+
+    assert response.to_dict() == response.asdict() == {
+        "title": "Couldn't create account", "type": "create entity error", "detail": "taken",
+        "reason": None, "code": "account_conflict",
+    }
+    assert ErrorResponse.from_dict({"title": "t", "type": "x", "detail": "d"}) == ErrorResponse("t", "x", "d")
+    assert ErrorResponse.from_dict(response.to_dict()) == response
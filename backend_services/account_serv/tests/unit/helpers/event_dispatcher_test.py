@@ -0,0 +1,71 @@
+import threading
+from unittest.mock import patch
+
+import pytest
+from django.dispatch import Signal
+from helpers.event_dispatcher import EventDispatcher
+
+
+@pytest.fixture
+def signal():
+    return Signal()
+
+
+@pytest.fixture
+def dispatcher():
+    event_dispatcher = EventDispatcher(workers=2, queue_size=100, max_retries=2, retry_backoff=0)
+    yield event_dispatcher
+    event_dispatcher.shutdown()
+
+
+def test_receivers_run_on_worker_threads(dispatcher, signal):
+    calls = []
+
+    def receiver(sender, account_id, **kwargs):
+        calls.append((account_id, threading.current_thread().name))
+
+    signal.connect(receiver, weak=False)
+    dispatcher.send(signal, sender=object, account_id=7)
+    dispatcher.flush()
+
+    assert calls[0][0] == 7
+    assert calls[0][1].startswith("event-dispatcher")
+
+
+def test_failed_delivery_is_retried(dispatcher, signal):
+    attempts = []
+
+    def flaky_receiver(**kwargs):
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ConnectionError("downstream unavailable")
+
+    signal.connect(flaky_receiver, weak=False)
+    dispatcher.send(signal, sender=object, account_id=7)
+    dispatcher.flush()
+
+    assert len(attempts) == 3
+
+
+def test_failing_receiver_does_not_block_other_receivers(dispatcher, signal):
+    delivered = []
+
+    def broken_receiver(**kwargs):
+        raise ValueError("always fails")
+
+    signal.connect(broken_receiver, weak=False)
+    signal.connect(lambda **kwargs: delivered.append(kwargs["account_id"]), weak=False)
+    dispatcher.send(signal, sender=object, account_id=7)
+    dispatcher.flush()
+
+    assert delivered == [7]
+
+
+def test_worker_closes_stale_connections_around_each_delivery(dispatcher, signal):
+    signal.connect(lambda **kwargs: None, weak=False)
+
+    with patch("helpers.event_dispatcher.close_old_connections") as close_old_connections:
+        dispatcher.send(signal, sender=object, account_id=7)
+        dispatcher.flush()
+
+    assert close_old_connections.call_count == 2
@@ -0,0 +1,116 @@
+import threading
+from unittest.mock import Mock
+
+import pytest
+from helpers import idempotency
+from helpers.idempotency import REPLAYED_HEADER, idempotent
+from redis.exceptions import ConnectionError
+from repositories.idempotency_repository import IdempotencyRepository
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory
+from rest_framework.views import APIView
+
+SIGNUP = {"phone": "+233200000042", "password": "secret"}
+
+
+class SignupView(APIView):
+    authentication_classes = []
+    permission_classes = [AllowAny]
+    throttle_classes = []
+    handled = None
+
+    @idempotent("signup")
+    def post(self, request):
+        self.handled.append(dict(request.data))
+        if request.data.get("phone") == "fail":
+            return Response(status=503, data={"detail": "down"})
+        return Response(status=201, data={"id": len(self.handled), **request.data})
+
+
+@pytest.fixture
+def repository(monkeypatch):
+    """
+    The records Redis would hold, with the semantics of SET NX GET
+    """
+    records = {}
+    repository = Mock(spec=IdempotencyRepository)
+
+    def claim(key, fingerprint, ttl):
+        if key in records:
+            return False, records[key]
+        records[key] = {"pending": True, "fingerprint": fingerprint}
+        return True, None
+
+    repository.claim.side_effect = claim
+    repository.get.side_effect = records.get
+    repository.complete.side_effect = lambda key, fingerprint, status, data, ttl: records.update(
+        {key: {"pending": False, "fingerprint": fingerprint, "status": status, "data": data}}
+    )
+    repository.release.side_effect = lambda key: records.pop(key, None)
+    monkeypatch.setattr(idempotency, "get_idempotency_repository", lambda: repository)
+    return repository
+
+
+def _post(view, data, key):
+    headers = {"HTTP_IDEMPOTENCY_KEY": key} if key else {}
+    return view(APIRequestFactory().post("/account/me/", data, format="json", **headers))
+
+
+def test_retries_replay_the_first_response(repository):
+    handled = []
+    view = SignupView.as_view(handled=handled)
+
+    first, retry = _post(view, SIGNUP, "k1"), _post(view, SIGNUP, "k1")
+
+    assert len(handled) == 1
+    assert (retry.status_code, retry.data) == (first.status_code, first.data)
+    assert retry[REPLAYED_HEADER] == "true" and not first.has_header(REPLAYED_HEADER)
+    assert _post(view, {**SIGNUP, "phone": "+233200000043"}, "k1").status_code == 422
+    assert _post(view, SIGNUP, "k2").status_code == 201 and _post(view, SIGNUP, None).status_code == 201
+    assert len(handled) == 3
+
+
+def test_server_errors_are_not_kept(repository):
+    handled = []
+    view = SignupView.as_view(handled=handled)
+
+    assert _post(view, {"phone": "fail"}, "k").status_code == 503
+    assert _post(view, {"phone": "fail"}, "k").status_code == 503
+    assert len(handled) == 2
+
+
+def test_concurrent_duplicates_wait_for_the_first(repository):
+    handled, release = [], threading.Event()
+    view = SignupView.as_view(handled=handled)
+    repository.get.side_effect = lambda key, get=repository.get.side_effect: release.set() or get(key)
+
+    duplicate = {}
+    thread = threading.Thread(target=lambda: duplicate.setdefault("response", _post(view, SIGNUP, "k")))
+    original = SignupView.post
+
+    def slow_post(self, request):
+        # the duplicate arrives while the first request runs, which finishes once the duplicate polls
+        thread.start()
+        release.wait(5)
+        return original.__wrapped__(self, request)
+
+    SignupView.post = idempotent("signup")(slow_post)
+    try:
+        first = _post(view, SIGNUP, "k")
+    finally:
+        SignupView.post = original
+    thread.join(5)
+
+    assert len(handled) == 1
+    assert duplicate["response"].status_code == first.status_code == 201
+    assert duplicate["response"][REPLAYED_HEADER] == "true"
+
+
+def test_requests_run_while_redis_is_down(repository):
+    handled = []
+    view = SignupView.as_view(handled=handled)
+    repository.claim.side_effect = ConnectionError()
+
+    assert _post(view, SIGNUP, "k").status_code == 201 and _post(view, SIGNUP, "k").status_code == 201
+    assert len(handled) == 2
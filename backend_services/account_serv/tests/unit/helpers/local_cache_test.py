@@ -0,0 +1,32 @@
+from helpers.local_cache import LocalCache
+
+
+def test_least_recently_used_entries_make_room():
+    now = [0.0]
+    cache = LocalCache(max_entries=3, max_bytes=100, ttl=10, clock=lambda: now[0])
+    for key in "abc":
+        cache.set(key, key.upper(), size=10)
+    assert cache.get("a") == "A"
+
+    cache.set("d", "D", size=10)
+    assert cache.get("b") is None and len(cache) == 3
+
+    # the byte cap, and values bigger than the cache
+    cache.set("e", "E", size=75)
+    assert [key for key in "acde" if cache.get(key) is not None] == ["a", "d", "e"] and cache.nbytes == 95
+    cache.set("f", "F", size=101)
+    assert cache.get("f") is None and cache.evictions == 2
+
+
+def test_entries_expire():
+    now = [0.0]
+    cache = LocalCache(max_entries=10, max_bytes=100, ttl=10, clock=lambda: now[0])
+    cache.set("a", 1, size=1)
+    cache.set("b", 2, size=1, ttl=2)
+    cache.set("c", 3, size=1, ttl=60)
+
+    now[0] = 5
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == (1, None, 3)
+    now[0] = 10
+    assert cache.get("a") is None and cache.get("c") is None and cache.nbytes == 0
+    assert cache.evict("a") == 0
@@ -0,0 +1,59 @@
+import pytest
+from errors.query_budget_error import QueryBudgetExceeded
+from helpers.query_budget import query_budget
+
+
+def _run_queries(budget, count):
+    for i in range(count):
+        budget._count(lambda *args: None, f"SELECT {i}", (), False, {})
+
+
+def test_query_budget_within_limit():
+    with query_budget(2, name="within limit") as budget:
+        _run_queries(budget, 2)
+
+    assert budget.executed == 2
+
+
+def test_query_budget_exceeded_raises_in_strict_mode():
+    with pytest.raises(QueryBudgetExceeded) as exceeded:
+        with query_budget(1, name="over limit") as budget:
+            _run_queries(budget, 3)
+
+    assert exceeded.value.executed == 3
+    assert exceeded.value.budget == 1
+    assert exceeded.value.statements == ["SELECT 0", "SELECT 1", "SELECT 2"]
+
+
+def test_query_budget_exceeded_logs_when_not_strict(settings):
+    settings.QUERY_BUDGET = settings.QUERY_BUDGET._replace(strict=False)
+
+    with query_budget(1, name="over limit") as budget:
+        _run_queries(budget, 2)
+
+    assert budget.executed == 2
+
+
+def test_query_budget_does_not_mask_errors():
+    with pytest.raises(ValueError):
+        with query_budget(0) as budget:
+            _run_queries(budget, 1)
+            raise ValueError("original error")
+
+
+def test_query_budget_decorator_uses_fresh_counter_per_call():
+    budgets = []
+
+    @query_budget(1)
+    def decorated():
+        from django.db import connection
+
+        budget = connection.execute_wrappers[-1].__self__
+        budgets.append(budget)
+        _run_queries(budget, 1)
+
+    decorated()
+    decorated()
+
+    assert budgets[0] is not budgets[1]
+    assert budgets[0].name.endswith("decorated")
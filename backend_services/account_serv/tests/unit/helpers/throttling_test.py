@@ -0,0 +1,110 @@
+from unittest.mock import Mock
+
+import pytest
+from helpers import throttling
+from helpers.throttling import LocalTokenBuckets, RateLimiter, RateLimitThrottle, parse_rate
+from redis.exceptions import ConnectionError
+from repositories.rate_limit_repository import Bucket, RateLimitRepository
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory
+from rest_framework.views import APIView
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class LoginView(APIView):
+    authentication_classes = []
+    permission_classes = [AllowAny]
+    throttle_classes = [RateLimitThrottle]
+    throttle_scope = "login"
+    handled = 0
+
+    def post(self, request):
+        LoginView.handled += 1
+        return Response({"ok": True})
+
+
+def test_parse_rate():
+    assert parse_rate("5/min") == (5 / 60, 5)
+    assert parse_rate("10/hour") == (10 / 3600, 10)
+
+
+def test_local_buckets_take_from_all_or_none():
+    clock = Clock()
+    buckets = LocalTokenBuckets(max_keys=10, clock=clock)
+    ip, phone = Bucket("ip", rate=1.0, burst=3), Bucket("phone", rate=0.5, burst=1)
+
+    assert buckets.take([ip, phone]) == 0
+    # the phone bucket is empty, so the ip bucket keeps its token
+    assert buckets.take([ip, phone]) == pytest.approx(2.0)
+    assert buckets.take([ip]) == 0 and buckets.take([ip]) == 0
+    assert buckets.take([ip]) == pytest.approx(1.0)
+
+    clock.now += 2
+    assert buckets.take([ip, phone]) == 0
+
+
+def test_local_buckets_drop_least_recently_used():
+    buckets = LocalTokenBuckets(max_keys=2, clock=Clock())
+    for key in ("a", "b", "c"):
+        buckets.take([Bucket(key, rate=1.0, burst=1)])
+
+    assert len(buckets) == 2
+    # "a" was dropped and starts full again
+    assert buckets.take([Bucket("a", rate=1.0, burst=1)]) == 0
+
+
+def test_limiter_falls_back_to_local_buckets_while_redis_is_down():
+    clock = Clock()
+    repository = Mock(spec=RateLimitRepository)
+    repository.take.side_effect = ConnectionError()
+    limiter = RateLimiter(repository, LocalTokenBuckets(10, clock=clock), retry_interval=5, clock=clock)
+    bucket = Bucket("ip", rate=1.0, burst=1)
+
+    assert limiter.take([bucket]) == (0, "local")
+    assert limiter.take([bucket]) == (pytest.approx(1.0), "local")
+    assert repository.take.call_count == 1
+
+    clock.now += 5
+    repository.take.side_effect = None
+    repository.take.return_value = 0.0
+    assert limiter.take([bucket]) == (0, "redis")
+
+
+def test_repository_takes_every_bucket_in_one_call():
+    redis = Mock()
+    script = redis.register_script.return_value
+    script.return_value = 1500
+    repository = RateLimitRepository(redis)
+
+    assert repository.take([Bucket("ip", rate=0.5, burst=30), Bucket("login", rate=1 / 12, burst=5)]) == 1.5
+    script.assert_called_once_with(keys=["ip", "login"], args=["0.0005", 30, repr(1 / 12000), 5])
+
+
+def test_rejected_requests_never_reach_the_view(settings, monkeypatch):
+    settings.RATE_LIMITS = settings.RATE_LIMITS._replace(scopes={"login": {"ip": "10/min", "login": "2/min"}})
+    repository = Mock(spec=RateLimitRepository)
+    repository.take.side_effect = ConnectionError()
+    limiter = RateLimiter(repository, LocalTokenBuckets(10), retry_interval=60)
+    monkeypatch.setattr(throttling, "get_rate_limiter", lambda: limiter)
+    factory, view = APIRequestFactory(), LoginView.as_view()
+    LoginView.handled = 0
+
+    statuses = [
+        view(factory.post("/token/access/", {"loginField": "+233 200 000 042", "password": "x"}, format="json"))
+        .status_code for _ in range(3)
+    ]
+    other = view(factory.post("/token/access/", {"loginField": "+233200000043", "password": "x"}, format="json"))
+
+    assert statuses == [200, 200, 429] and other.status_code == 200
+    assert LoginView.handled == 3
+
+    limited = view(factory.post("/token/access/", {"loginField": "+233200000042"}, format="json"))
+    assert limited.status_code == 429 and int(limited["Retry-After"]) > 0
@@ -5,6 +5,7 @@ import pytest
 from account.models import Account
 from errors.account_error import AccountError
 from repositories.account_repository import AccountRepository
+from repositories.outbox_repository import OutboxRepository
 from serializers.account_serializer import (AccountCreateSerializer,
                                             AccountSerializer,
                                             ChangePhoneSerializer,
@@ -33,6 +34,7 @@ def account_repository(mock_account):
         password_serializer=PasswordSerializer,
         change_phone_serializer=ChangePhoneSerializer,
         set_password_serializer=SetPasswordSerializer,
+        outbox_repository=Mock(spec=OutboxRepository),
     )
 
 
@@ -0,0 +1,57 @@
+from datetime import datetime, timezone
+from unittest.mock import MagicMock, Mock
+
+import pytest
+from redis import Redis
+from repositories.event_stream_repository import START_OFFSET, AccountEventStreamRepository
+
+
+@pytest.fixture
+def redis():
+    return MagicMock(spec=Redis)
+
+
+@pytest.fixture
+def stream_repository(redis):
+    return AccountEventStreamRepository(redis=redis, stream="account:events", max_length=1000)
+
+
+def test_publish_adds_compact_entries_in_one_pipeline(stream_repository, redis):
+    pipeline = redis.pipeline.return_value
+    pipeline.execute.return_value = [b"1700000000000-0"]
+    event = Mock(id=5, topic="account.updated", accountId=42, payload={"fields": ["email"]},
+                 createdAt=datetime(2023, 11, 14, tzinfo=timezone.utc))
+
+    offsets = stream_repository.publish([event])
+
+    assert offsets == ["1700000000000-0"]
+    name, fields = pipeline.xadd.call_args.args
+    assert name == "account:events"
+    assert fields["id"] == 5
+    assert fields["payload"] == '{"fields":["email"]}'
+    assert pipeline.xadd.call_args.kwargs == {"maxlen": 1000, "approximate": True}
+
+
+def test_read_returns_events_and_next_offset(stream_repository, redis):
+    redis.xread.return_value = [[b"account:events", [
+        (b"1-0", {b"id": b"1", b"topic": b"account.created", b"account": b"42", b"payload": b"{}", b"ts": b"10"}),
+        (b"2-0", {b"id": b"2", b"topic": b"account.deleted", b"account": b"42", b"payload": b"{}", b"ts": b"11"}),
+    ]]]
+
+    events, offset = stream_repository.read(START_OFFSET)
+
+    assert [event.topic for event in events] == ["account.created", "account.deleted"]
+    assert events[0].account_id == 42
+    assert offset == "2-0"
+
+
+def test_read_without_new_events_keeps_offset(stream_repository, redis):
+    redis.xread.return_value = []
+
+    assert stream_repository.read("5-0") == ([], "5-0")
+
+
+def test_offsets_default_to_start(stream_repository, redis):
+    redis.hget.return_value = None
+
+    assert stream_repository.load_offset("dispatch") == START_OFFSET
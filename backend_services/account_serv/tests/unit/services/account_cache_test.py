@@ -0,0 +1,165 @@
+import threading
+import time
+from types import SimpleNamespace
+from unittest.mock import Mock
+
+from helpers.local_cache import LocalCache
+from repositories.redis_repository import MISSING, RedisRepository
+from services.account_cache import AccountCache
+
+ACCOUNT = {"id": 42, "phone": "+233200000042"}
+
+
+def _config(settings, **overrides):
+    return settings.ACCOUNT_READS._replace(initial_load_seconds=0.01, **overrides)
+
+
+def _redis(cached=None, ttl=0.0, locked=True):
+    redis_repository = Mock(spec=RedisRepository)
+    redis_repository.get_item_with_ttl.return_value = (cached, ttl)
+    redis_repository.acquire_lock.return_value = locked
+    return redis_repository
+
+
+def test_concurrent_misses_load_once(settings):
+    redis_repository = _redis()
+    cache = AccountCache(redis_repository, _config(settings))
+    flights = cache._flights
+
+    def slow_load():
+        # hold the load until every other reader is waiting on it
+        deadline = time.monotonic() + 5
+        while flights.waiting("42") < 7 and time.monotonic() < deadline:
+            time.sleep(0.001)
+        return ACCOUNT
+
+    load = Mock(side_effect=slow_load)
+    results = []
+
+    def read():
+        results.append(cache.get("42", load))
+
+    threads = [threading.Thread(target=read) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [ACCOUNT] * 8 and load.call_count == 1
+    redis_repository.set_item_with_expiration.assert_called_once()
+    redis_repository.release_lock.assert_called_once()
+
+
+def test_waits_for_the_process_holding_the_lock(settings):
+    redis_repository = _redis(locked=False)
+    redis_repository.get_item_with_ttl.side_effect = [(None, 0), (None, 0), (ACCOUNT, 600)]
+    now = [0.0]
+    cache = AccountCache(redis_repository, _config(settings), clock=lambda: now[0],
+                         sleep=lambda seconds: now.__setitem__(0, now[0] + seconds))
+    load = Mock(return_value={"id": 0})
+
+    assert cache.get("42", load) == ACCOUNT
+    load.assert_not_called()
+
+    # the holder never fills it: load after lock_wait
+    redis_repository.get_item_with_ttl.side_effect = None
+    redis_repository.get_item_with_ttl.return_value = (None, 0)
+    assert cache.get("42", load) == {"id": 0} and now[0] >= settings.ACCOUNT_READS.lock_wait
+
+
+def test_not_found_is_cached(settings):
+    redis_repository = _redis()
+    cache = AccountCache(redis_repository, _config(settings, negative_ttl=30))
+    load = Mock(return_value=None)
+
+    assert cache.get("+233200000000", load) is None
+    redis_repository.set_missing.assert_called_once_with("+233200000000", ttl=30)
+
+    redis_repository.get_item_with_ttl.return_value = (MISSING, 25)
+    assert cache.get("+233200000000", load) is None and load.call_count == 1
+
+
+def test_hot_entries_refresh_early_near_expiry(settings):
+    redis_repository = _redis(cached=ACCOUNT, ttl=0.02)
+    load = Mock(return_value={**ACCOUNT, "phone": "+233200000043"})
+
+    # U close to 1 draws a small -ln(1 - U)
+    assert AccountCache(redis_repository, _config(settings), rand=lambda: 0.1).get("42", load) == ACCOUNT
+    load.assert_not_called()
+
+    refreshed = AccountCache(redis_repository, _config(settings), rand=lambda: 0.95).get("42", load)
+    assert refreshed["phone"] == "+233200000043" and load.call_count == 1
+
+    # far from expiry the chance is negligible
+    redis_repository.get_item_with_ttl.return_value = (ACCOUNT, 600)
+    assert AccountCache(redis_repository, _config(settings), rand=lambda: 0.95).get("42", load) == ACCOUNT
+
+
+def test_l1_serves_reads_until_invalidated(settings):
+    redis_repository = _redis(cached=ACCOUNT, ttl=600)
+    cache = AccountCache(redis_repository, _config(settings), local=LocalCache(100, 1 << 20, ttl=5),
+                         channel="invalidations", rand=lambda: 0.0)
+    load = Mock()
+
+    assert cache.get("42", load) == ACCOUNT and cache.get("42", load) == ACCOUNT
+    assert redis_repository.get_item_with_ttl.call_count == 1 and load.call_count == 0
+    assert (cache.stats.l1_hits, cache.stats.l1_misses, cache.stats.l2_hits) == (1, 1, 1)
+    assert cache.stats.as_dict()["l1_hit_rate"] == 0.5
+
+    cache.invalidate(42, "+233200000042", None)
+    redis_repository.delete_items.assert_called_once_with("42", "+233200000042")
+    redis_repository.publish.assert_called_once_with("invalidations", '["42", "+233200000042"]')
+    assert cache.get("42", load) == ACCOUNT and redis_repository.get_item_with_ttl.call_count == 2
+
+
+def test_invalidations_of_other_processes_evict(settings):
+    local = LocalCache(100, 1 << 20, ttl=5)
+    local.set("stale", {"id": 1}, size=10)
+    received = threading.Event()
+
+    def filled_then_invalidated():
+        local.set("7", {"id": 7}, size=10)
+        local.set("42", ACCOUNT, size=10)
+        yield None
+        yield {"type": "message", "data": b'["42"]'}
+        received.set()
+        while True:
+            yield time.sleep(0.01)
+
+    messages = filled_then_invalidated()
+    pubsub = Mock(get_message=lambda timeout: next(messages))
+    redis_repository = _redis()
+    redis_repository.subscribe.return_value = pubsub
+    cache = AccountCache(redis_repository, _config(settings), local=local, channel="invalidations")
+
+    cache.start()
+    assert received.wait(5)
+    cache.stop()
+
+    # what L1 held before subscribing is dropped, then whatever the messages name
+    assert local.get("stale") is None and local.get("42") is None and local.get("7") == {"id": 7}
+    assert cache.stats.resubscribes == 1
+    redis_repository.subscribe.assert_called_once_with("invalidations")
+
+
+def test_listener_starts_with_the_first_read_of_each_process(settings, monkeypatch):
+    pid = [100]
+    monkeypatch.setattr("services.account_cache.os", SimpleNamespace(getpid=lambda: pid[0]))
+    redis_repository = _redis(cached=ACCOUNT, ttl=600)
+    redis_repository.subscribe.return_value = Mock(get_message=lambda timeout: time.sleep(0.01))
+    cache = AccountCache(redis_repository, _config(settings), local=LocalCache(100, 1 << 20, ttl=5),
+                         channel="invalidations", rand=lambda: 0.0)
+
+    assert cache._listener is None
+    cache.get("42", Mock())
+    cache.get("42", Mock())
+    first = cache._listener
+    # a worker forked after the parent's first read
+    pid[0] = 101
+    cache.get("42", Mock())
+    second = cache._listener
+    cache.stop()
+    first.join(5)
+
+    assert first is not None and second is not first
+    assert not first.is_alive() and not second.is_alive()
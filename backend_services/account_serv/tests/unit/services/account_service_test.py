@@ -1,4 +1,35 @@
 from unittest.mock import Mock
 
 import pytest
-from services.account_service import AccountRepository
+from repositories.redis_repository import RedisRepository
+from services.account_service import AccountRepository, AccountService
+
+
+@pytest.fixture
+def redis_repository():
+    return Mock(spec=RedisRepository)
+
+
+@pytest.fixture
+def account_repository():
+    return Mock(spec=AccountRepository)
+
+
+def test_get_accounts_keeps_input_order_and_backfills_misses(settings, account_repository, redis_repository):
+    settings.ACCOUNT_BATCH = settings.ACCOUNT_BATCH._replace(chunk_size=3)
+    cache = {1: {"id": 1}, 4: {"id": 4}}
+    redis_repository.get_items.side_effect = lambda ids: [cache.get(account_id) for account_id in ids]
+    account_repository.get_accounts.side_effect = lambda ids: {
+        account_id: {"id": account_id} for account_id in ids if account_id != 3
+    }
+    service = AccountService(account_repository=account_repository, redis_repository=redis_repository)
+
+    result = service.get_accounts([5, 1, 3, 2, 1, 4, 6])
+
+    assert result == [{"id": 5}, {"id": 1}, None, {"id": 2}, {"id": 1}, {"id": 4}, {"id": 6}]
+    # one MGET and at most one query and one backfill per chunk of distinct ids
+    assert [call.args[0] for call in redis_repository.get_items.call_args_list] == [[5, 1, 3], [2, 4, 6]]
+    assert [call.args[0] for call in account_repository.get_accounts.call_args_list] == [[5, 3], [2, 6]]
+    assert [call.args[0] for call in redis_repository.set_items_with_expiration.call_args_list] == [
+        {5: {"id": 5}}, {2: {"id": 2}, 6: {"id": 6}}
+    ]
@@ -0,0 +1,89 @@
+from unittest.mock import Mock
+
+import pytest
+from account_serv.settings import OTP
+from helpers.sms import BatchingSmsSender, SmsMessage
+from models.error_response import ErrorResponse
+from repositories.account_repository import AccountRepository
+from repositories.redis_repository import RedisRepository
+from services.account_service import AccountService
+from services.otp_service import OtpService
+
+PHONE = "+233200000042"
+
+
+@pytest.fixture
+def redis_repository():
+    redis_repository = Mock(spec=RedisRepository)
+    stored = {}
+    redis_repository.set_item_with_expiration.side_effect = lambda key, data, ttl: stored.update({key: data})
+    redis_repository.get_item_and_count.side_effect = lambda key, counter, ttl: (
+        stored.get(key), redis_repository.get_item_and_count.call_count
+    )
+    return redis_repository
+
+
+@pytest.fixture
+def otp_service(redis_repository):
+    account_service = Mock(spec=AccountService)
+    account_service.get_account.return_value = {"id": 42, "phone": PHONE, "email": "a@pipa.com",
+                                                "phoneVerified": False}
+    return OtpService(
+        redis_repository=redis_repository,
+        account_repository=Mock(spec=AccountRepository),
+        account_service=account_service,
+        sms_sender=Mock(spec=BatchingSmsSender),
+        config=OTP._replace(max_attempts=3),
+    )
+
+
+def _sent_code(otp_service) -> str:
+    to, body = otp_service._sms_sender.send.call_args.args
+    assert to == PHONE
+    return next(word for word in body.split() if word.rstrip(".").isdigit()).rstrip(".")
+
+
+def test_issue_stores_only_a_hash_and_verify_flips_the_phone(otp_service, redis_repository):
+    assert otp_service.issue(PHONE) is True
+    code = _sent_code(otp_service)
+    record = redis_repository.set_item_with_expiration.call_args.kwargs["data"]
+    assert len(code) == OTP.digits and code not in str(record)
+
+    assert otp_service.verify(PHONE, code) is True
+    otp_service._account_repo.verify_phone.assert_called_once_with(42, PHONE, email="a@pipa.com")
+    redis_repository.delete_items.assert_called_once_with(f"otp:{PHONE}", f"otp:attempts:{PHONE}")
+
+
+def test_wrong_codes_until_the_code_is_dropped(otp_service, redis_repository):
+    otp_service.issue(PHONE)
+    code = _sent_code(otp_service)
+    wrong = "0" * OTP.digits if code != "0" * OTP.digits else "1" * OTP.digits
+
+    results = [otp_service.verify(PHONE, wrong) for _ in range(3)] + [otp_service.verify(PHONE, code)]
+
+    assert all(isinstance(result, ErrorResponse) for result in results)
+    assert results[-1].detail.startswith("Too many attempts")
+    otp_service._account_repo.verify_phone.assert_not_called()
+
+
+def test_no_code_for_unknown_or_verified_phones(otp_service):
+    otp_service._account_service.get_account.return_value = {"id": 42, "phone": PHONE, "phoneVerified": True}
+    assert isinstance(otp_service.issue(PHONE), ErrorResponse)
+    assert isinstance(otp_service.issue("not a phone"), ErrorResponse)
+    assert isinstance(otp_service.verify(PHONE, "123456"), ErrorResponse)
+    otp_service._sms_sender.send.assert_not_called()
+
+
+def test_sms_are_sent_in_batches():
+    provider = Mock()
+    sender = BatchingSmsSender(provider, batch_size=3, flush_interval=0.5, queue_size=100)
+    for number in range(7):
+        sender.send(f"+23320000000{number}", "hi")
+    sender.flush()
+    sender.shutdown()
+
+    batches = [call.args[0] for call in provider.send_batch.call_args_list]
+    assert [message for batch in batches for message in batch] == [
+        SmsMessage(f"+23320000000{number}", "hi") for number in range(7)
+    ]
+    assert all(len(batch) <= 3 for batch in batches) and len(batches) < 7
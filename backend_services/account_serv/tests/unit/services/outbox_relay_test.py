@@ -0,0 +1,47 @@
+from contextlib import nullcontext
+from unittest.mock import Mock, patch
+
+import pytest
+from repositories.event_stream_repository import AccountEventStreamRepository
+from repositories.outbox_repository import OutboxRepository
+from services.outbox_relay import OutboxRelay
+
+
+@pytest.fixture
+def outbox_repository():
+    return Mock(spec=OutboxRepository)
+
+
+@pytest.fixture
+def event_stream_repository():
+    return Mock(spec=AccountEventStreamRepository)
+
+
+@pytest.fixture
+def relay(outbox_repository, event_stream_repository):
+    with patch("services.outbox_relay.transaction.atomic", return_value=nullcontext()):
+        yield OutboxRelay(outbox_repository, event_stream_repository, batch_size=2)
+
+
+def test_relay_once_publishes_and_deletes_claimed_batch(relay, outbox_repository, event_stream_repository):
+    events = [Mock(id=1), Mock(id=2)]
+    outbox_repository.claim_batch.return_value = events
+
+    assert relay.relay_once() == 2
+
+    outbox_repository.claim_batch.assert_called_once_with(limit=2)
+    event_stream_repository.publish.assert_called_once_with(events)
+    assert list(outbox_repository.delete_batch.call_args.args[0]) == [1, 2]
+
+
+def test_relay_once_with_empty_outbox_publishes_nothing(relay, outbox_repository, event_stream_repository):
+    outbox_repository.claim_batch.return_value = []
+
+    assert relay.relay_once() == 0
+    event_stream_repository.publish.assert_not_called()
+
+
+def test_drain_relays_until_outbox_is_empty(relay, outbox_repository):
+    outbox_repository.claim_batch.side_effect = [[Mock(id=1), Mock(id=2)], [Mock(id=3)], []]
+
+    assert relay.drain() == 3
@@ -0,0 +1,109 @@
+from unittest.mock import Mock
+
+import pytest
+from account_serv.settings import TOKEN_REVOCATION
+from helpers.bloom_filter import BloomFilter
+from redis.exceptions import ConnectionError
+from repositories.revocation_repository import RevocationRepository
+from services.token_revocation import ISSUED_AT_CLAIM, TokenRevocations
+
+LIFETIME = 86400
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _token(jti: str, account_id=42, iat=1_699_999_000):
+    return {"jti": jti, "account_id": account_id, "iat": iat, "exp": iat + LIFETIME}
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def repository():
+    """
+    The log of every process's revocations, as Redis would hold it
+    """
+    repository = Mock(spec=RevocationRepository)
+    log = {}
+    repository.revoke_token.side_effect = lambda jti, ttl, now: log.update({f"jti:{jti}": now})
+    repository.revoke_account.side_effect = lambda account_id, now: log.update({f"account:{account_id}": now})
+    repository.changes_since.side_effect = lambda since: sorted(
+        ((member, at) for member, at in log.items() if at >= since), key=lambda entry: entry[1]
+    )
+    repository.is_token_revoked.side_effect = lambda jti: f"jti:{jti}" in log
+    return repository
+
+
+def _revocations(repository, clock):
+    return TokenRevocations(repository, TOKEN_REVOCATION._replace(refresh_interval=1, capacity=100), LIFETIME,
+                            clock=clock)
+
+
+def test_unrevoked_tokens_are_cleared_in_memory(repository, clock):
+    revocations = _revocations(repository, clock)
+
+    assert not any(revocations.is_revoked(_token(f"jti-{n}")) for n in range(50))
+    # one read of the log, no per token lookups
+    assert repository.changes_since.call_count == 1
+    repository.is_token_revoked.assert_not_called()
+
+
+def test_revocations_reach_other_processes_within_the_refresh_interval(repository, clock):
+    here, there = _revocations(repository, clock), _revocations(repository, clock)
+    assert not there.is_revoked(_token("a"))
+
+    clock.now += 0.5
+    here.revoke(_token("a"))
+    here.revoke_account(7)
+    assert here.is_revoked(_token("a"))
+    assert not there.is_revoked(_token("a"))
+
+    clock.now += 1
+    assert there.is_revoked(_token("a"))
+    assert there.is_revoked(_token("b", account_id=7))
+    # issued after the account was revoked
+    assert not there.is_revoked(_token("c", account_id=7, iat=clock.now))
+
+
+def test_logins_in_the_second_of_an_account_revocation(repository, clock):
+    revocations = _revocations(repository, clock)
+    clock.now = 1_700_000_000.25
+    revocations.revoke_account(7)
+
+    before = {**_token("a", account_id=7, iat=1_700_000_000), ISSUED_AT_CLAIM: 1_700_000_000.1}
+    after = {**_token("b", account_id=7, iat=1_700_000_000), ISSUED_AT_CLAIM: 1_700_000_000.4}
+    assert revocations.is_revoked(before)
+    assert not revocations.is_revoked(after)
+    # without the claim only the second is known, and it counts as before
+    assert revocations.is_revoked(_token("c", account_id=7, iat=1_700_000_000))
+
+
+def test_probable_revocations_are_confirmed_in_redis(repository, clock):
+    revocations = _revocations(repository, clock)
+    revocations.revoke(_token("a"))
+
+    repository.is_token_revoked.side_effect = None
+    repository.is_token_revoked.return_value = False
+    assert not revocations.is_revoked(_token("a"))
+
+    repository.is_token_revoked.side_effect = ConnectionError()
+    assert revocations.is_revoked(_token("a"))
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    for n in range(1000):
+        bloom.add(f"jti-{n}")
+
+    assert all(f"jti-{n}" in bloom for n in range(1000))
+    false_positives = sum(f"other-{n}" in bloom for n in range(10_000))
+    assert false_positives < 300 and bloom.nbytes < 1300
@@ -0,0 +1,26 @@
+"""
+Access tokens for benchmarks driving a dispatch server: signed with a key pair generated for the run, the
+server started with its public half as VERIFYING_KEY
+"""
+import time
+from typing import Dict
+
+import jwt
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+
+class BenchTokens:
+    def __init__(self):
+        self._key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+    @property
+    def server_env(self) -> Dict[str, str]:
+        public_pem = self._key.public_key().public_bytes(
+            serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+        )
+        return {"VERIFYING_KEY": public_pem.decode()}
+
+    def issue(self, account_id: int, ttl: float = 3600) -> str:
+        payload = {"token_type": "access", "account_id": account_id, "exp": int(time.time() + ttl)}
+        return jwt.encode(payload, self._key, algorithm="RS256")
@@ -0,0 +1,90 @@
+"""
+ETA benchmark: cost per query of the batch API served from the routing backend one pair at a time, from the
+precomputed tables, and from the cache on a repeated "where is my courier" poll.
+
+The stub backend is local, so the per-pair baseline understates what a remote routing engine costs; add
+`--backend-latency-ms` to model the round trip.
+
+    python -m benchmarks.eta_bench --queries 5000 --batch 2000 --backend-latency-ms 2
+"""
+import argparse
+import asyncio
+
+import numpy as np
+from benchmarks.timing import report, stopwatch, write_results
+from src import settings
+from src.services.eta_service import EtaService
+from src.services.routing import StubRoutingBackend
+
+
+class _RemoteBackend(StubRoutingBackend):
+    def __init__(self, latency_s: float, *args):
+        super().__init__(*args)
+        self.latency_s = latency_s
+
+    async def travel_times(self, *args):
+        if self.latency_s:
+            await asyncio.sleep(self.latency_s)
+        return await super().travel_times(*args)
+
+
+def _trips(rng: np.random.Generator, count: int):
+    config = settings.ETA
+    lats = rng.uniform(config.min_lat, config.max_lat, (2, count))
+    lngs = rng.uniform(config.min_lng, config.max_lng, (2, count))
+    return lats[0], lngs[0], lats[1], lngs[1]
+
+
+async def _batches(service: EtaService, trips, batch: int, depart_at: float):
+    for start in range(0, trips[0].size, batch):
+        await service.eta_many(*(values[start:start + batch] for values in trips), depart_at)
+
+
+async def run(queries: int, batch: int, latency_ms: float, seed: int):
+    config = settings.ETA
+    backend = _RemoteBackend(latency_ms / 1000, config.speed_mps, config.detour_factor, config.utc_offset_hours)
+    service = EtaService(backend, config)
+    trips = _trips(np.random.default_rng(seed), queries)
+    depart_at = 1698825600.0
+    results = {}
+
+    per_pair = min(queries, 500)
+    with stopwatch() as elapsed:
+        for index in range(per_pair):
+            await backend.travel_times(*(values[index:index + 1] for values in trips), depart_at)
+    results["backend_per_pair"] = {"us_per_query": round(elapsed() / per_pair * 1e6, 2)}
+
+    with stopwatch() as elapsed:
+        await service.refresh_tables()
+    results["table_refresh"] = {"cells": service.cells, "seconds": round(elapsed(), 3)}
+
+    for name in ("tables_cold_cache", "tables_warm_cache"):
+        calls = backend.calls
+        with stopwatch() as elapsed:
+            await _batches(service, trips, batch, depart_at)
+        results[name] = {
+            "us_per_query": round(elapsed() / queries * 1e6, 2),
+            "backend_calls": backend.calls - calls,
+        }
+
+    results["stats"] = {**service.stats.as_dict(), "cache_hit_rate": service.cache_stats["hit_rate"]}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--queries", type=int, default=5000)
+    parser.add_argument("--batch", type=int, default=2000)
+    parser.add_argument("--backend-latency-ms", type=float, default=0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.queries, args.batch, args.backend_latency_ms, args.seed))
+    for name, result in results.items():
+        report(name, result)
+    write_results(args.output, {"eta": results})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Heatmap aggregation benchmark: the cost of counting location chunks and orders, and of reading the heatmap.
+
+`--couriers` couriers spread over the HEATMAP box ping once per round for `--rounds` rounds, in chunks the
+size the ingestor applies, with `--orders` orders per round. Reports pings and orders counted per second,
+and the time and payload size of rendering the heatmap, uncached, as JSON and as binary.
+
+    python -m benchmarks.heatmap_bench --couriers 100000 --orders 5000
+"""
+import argparse
+import random
+
+from benchmarks.timing import report, stopwatch, write_results
+from src import settings
+from src.models.job import DispatchJob
+from src.services.demand_heatmap import DemandHeatmap
+
+NOW = 1698825600.0
+
+
+def run(couriers: int, orders: int, rounds: int, chunk: int, seed: int):
+    rng = random.Random(seed)
+    config = settings.HEATMAP
+    heatmap = DemandHeatmap(config)
+
+    def point():
+        return rng.uniform(config.min_lat, config.max_lat), rng.uniform(config.min_lng, config.max_lng)
+
+    pings = [[(courier_id, *point(), NOW) for courier_id in range(couriers)] for _ in range(rounds)]
+    jobs = [[DispatchJob(i, *point(), 1, NOW + 1800, NOW + round_ * config.bucket_s) for i in range(orders)]
+            for round_ in range(rounds)]
+
+    ping_seconds = order_seconds = 0.0
+    for round_ in range(rounds):
+        now = NOW + round_ * config.bucket_s
+        with stopwatch() as elapsed:
+            for start in range(0, couriers, chunk):
+                heatmap.record_positions(pings[round_][start:start + chunk], now)
+        ping_seconds += elapsed()
+        with stopwatch() as elapsed:
+            for job in jobs[round_]:
+                heatmap.record_order(job)
+        order_seconds += elapsed()
+
+    now = NOW + (rounds - 1) * config.bucket_s
+    result = {
+        "cells": heatmap.rows * heatmap.cols,
+        "pings_per_sec": round(couriers * rounds / ping_seconds, 2),
+        "orders_per_sec": round(orders * rounds / order_seconds, 2),
+    }
+    for fmt in ("json", "binary"):
+        with stopwatch() as elapsed:
+            heatmap.version += 1
+            payload, _ = heatmap.render(fmt, now + 2 * config.cache_s)
+        result[f"{fmt}_render_ms"] = round(elapsed() * 1000, 3)
+        result[f"{fmt}_bytes"] = len(payload)
+    with stopwatch() as elapsed:
+        for _ in range(1000):
+            heatmap.render("binary", now + 2 * config.cache_s)
+    result["cached_render_us"] = round(elapsed() * 1000, 3)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--couriers", type=int, default=100_000)
+    parser.add_argument("--orders", type=int, default=5000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--chunk", type=int, default=settings.LOCATION_INGEST.apply_chunk_size)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args()
+
+    result = run(args.couriers, args.orders, args.rounds, args.chunk, args.seed)
+    report(f"heatmap, {args.couriers:,} couriers", result)
+    write_results(args.output, {"heatmap": result})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Dispatch job queue benchmark: enqueue and dequeue throughput and latency, a full scheduler tick and the time
+to recover courier loads after a restart.
+
+Enqueue is one `submit` per job, awaited one after another as the orders endpoint does. Dequeue takes the
+most urgent `--batch` pending jobs and moves them to offered, as a tick does once they are matched, so the
+queue is measured without the matching engine; the tick section adds matching against `--couriers`.
+
+Runs against the in-memory stand-in unless `--redis-url` is given; the Redis keys are under a throwaway
+prefix and deleted afterwards.
+
+    python -m benchmarks.job_queue_bench --jobs 20000 --batch 500
+    python -m benchmarks.job_queue_bench --redis-url redis://localhost:6379/15
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from benchmarks.timing import latency_summary, report, stopwatch, write_results
+from redis.asyncio import Redis
+from src import settings
+from src.models.job import JobState
+from src.repositories.job_store import STATES, MemoryJobStore, RedisJobStore, Transition
+from src.repositories.location_store import CourierLocationStore
+from src.services.job_scheduler import JobScheduler
+from src.services.matching_engine import MatchingEngine
+
+ACCRA = (5.6037, -0.1870)
+
+
+def _point(rng: random.Random, spread: float):
+    return ACCRA[0] + rng.gauss(0, spread), ACCRA[1] + rng.gauss(0, spread)
+
+
+async def _enqueue(scheduler: JobScheduler, rng: random.Random, job_ids: range, now: float):
+    samples = []
+    with stopwatch() as elapsed:
+        for job_id in job_ids:
+            started = time.perf_counter()
+            await scheduler.submit(
+                job_id, *_point(rng, 0.03), tier=rng.randrange(3), deadline=now + rng.uniform(600, 3600), now=now,
+            )
+            samples.append((time.perf_counter() - started) * 1e6)
+    return {"ops_per_s": round(len(job_ids) / elapsed()), **latency_summary(samples)}
+
+
+async def _dequeue(store, batch: int, now: float):
+    samples = []
+    dequeued = 0
+    with stopwatch() as elapsed:
+        while True:
+            started = time.perf_counter()
+            jobs = await store.lowest(JobState.PENDING, batch)
+            if not jobs:
+                break
+            offered = [job._replace(state=JobState.OFFERED, courier_id=0, offer_expires_at=now) for job in jobs]
+            await store.apply([
+                Transition(job.job_id, JobState.PENDING, JobState.OFFERED, now, job, "offered") for job in offered
+            ])
+            samples.append((time.perf_counter() - started) * 1e6)
+            dequeued += len(jobs)
+    return {
+        "ops_per_s": round(dequeued / elapsed()), "batches": len(samples),
+        **{f"batch_{name}": value for name, value in latency_summary(samples).items()},
+    }
+
+
+async def run(jobs: int, batch: int, couriers: int, redis_url: str | None, seed: int):
+    rng = random.Random(seed)
+    redis = Redis.from_url(redis_url) if redis_url else None
+    prefix = f"bench:jobs:{seed}:{time.time_ns()}"
+    store = MemoryJobStore() if redis is None else RedisJobStore(redis, prefix, settings.JOBS.events_max_length)
+
+    positions = CourierLocationStore()
+    for courier_id in range(couriers):
+        positions.update(courier_id, *_point(rng, 0.06), 0.0)
+    config = settings.JOBS._replace(batch_size=batch)
+    scheduler = JobScheduler(store, MatchingEngine(positions, settings.MATCHING), config)
+    now = time.time()
+    results = {}
+
+    try:
+        results["enqueue"] = await _enqueue(scheduler, rng, range(jobs), now)
+        results["dequeue"] = await _dequeue(store, batch, now)
+
+        # every offer taken by the dequeue run has expired: a worst case tick, retrying a batch of expired
+        # offers before matching a batch of jobs
+        with stopwatch() as elapsed:
+            offered = await scheduler.tick(now + config.offer_timeout_s + 1)
+        results["tick"] = {
+            "expired": scheduler.stats.expired, "offered": len(offered), "ms": round(elapsed() * 1000, 2),
+        }
+
+        for job in offered:
+            await scheduler.accept(job.job_id, job.courier_id)
+        restarted = JobScheduler(store, MatchingEngine(positions, settings.MATCHING), config)
+        with stopwatch() as elapsed:
+            recovered = await restarted.recover()
+        results["recovery"] = {"jobs_held": recovered, "ms": round(elapsed() * 1000, 2)}
+        results["counts"] = await store.counts()
+    finally:
+        if redis is not None:
+            await redis.delete(*[f"{prefix}:{name}" for name in (*STATES, "records", "events")])
+            await redis.aclose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--jobs", type=int, default=20_000)
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("--couriers", type=int, default=2000)
+    parser.add_argument("--redis-url", help="benchmark the Redis store instead of the in-memory one")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.jobs, args.batch, args.couriers, args.redis_url, args.seed))
+    for name, result in results.items():
+        report(name, result)
+    write_results(args.output, {"job_queue": results})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Courier location store benchmark: update throughput, query latency and memory per courier.
+
+    python -m benchmarks.location_store_bench --couriers 100000 1000000
+"""
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+
+from benchmarks.timing import latency_summary, report, stopwatch, write_results
+from src.repositories.location_store import CourierLocationStore
+
+CITIES = ((5.6037, -0.1870), (6.6885, -1.6244), (6.5244, 3.3792), (-1.2921, 36.8219))
+
+
+def _random_point(rng: random.Random):
+    lat, lng = rng.choice(CITIES)
+    return lat + rng.gauss(0, 0.08), lng + rng.gauss(0, 0.08)
+
+
+def run(couriers: int, queries: int, seed: int):
+    rng = random.Random(seed)
+    points = [_random_point(rng) for _ in range(couriers)]
+
+    gc.collect()
+    tracemalloc.start()
+    store = CourierLocationStore()
+    with stopwatch() as elapsed:
+        for courier_id, (lat, lng) in enumerate(points):
+            store.update(courier_id, lat, lng, 0.0)
+    load_seconds = elapsed()
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # couriers move a few metres between pings, occasionally across a cell boundary
+    moves = [(rng.randrange(couriers), rng.gauss(0, 0.0005), rng.gauss(0, 0.0005)) for _ in range(200_000)]
+    with stopwatch() as elapsed:
+        for courier_id, d_lat, d_lng in moves:
+            lat, lng = points[courier_id]
+            store.update(courier_id, lat + d_lat, lng + d_lng, 1.0)
+    update_seconds = elapsed()
+
+    query_points = [_random_point(rng) for _ in range(queries)]
+    nearest_samples, radius_samples = [], []
+    for lat, lng in query_points:
+        started = time.perf_counter_ns()
+        store.nearest(lat, lng, k=10)
+        nearest_samples.append((time.perf_counter_ns() - started) / 1000)
+
+        started = time.perf_counter_ns()
+        store.within_radius(lat, lng, radius_m=1000)
+        radius_samples.append((time.perf_counter_ns() - started) / 1000)
+
+    return {
+        "couriers": couriers,
+        "initial_load_per_sec": round(couriers / load_seconds, 2),
+        "updates_per_sec": round(len(moves) / update_seconds, 2),
+        "bytes_per_courier": round(memory / couriers, 2),
+        "nearest_k10": latency_summary(nearest_samples),
+        "radius_1km": latency_summary(radius_samples),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--couriers", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args()
+
+    results = [run(count, args.queries, args.seed) for count in args.couriers]
+    for result in results:
+        report(f"location store, {result['couriers']:,} couriers", result)
+    write_results(args.output, {"location_store": results})
+
+
+if __name__ == "__main__":
+    main()
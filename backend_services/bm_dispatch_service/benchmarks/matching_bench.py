@@ -0,0 +1,103 @@
+"""
+Matching engine benchmark: matches/sec and solution quality of each solver against one-at-a-time greedy.
+
+Every solver runs on the same cost matrix for a batch. Quality is the mean pickup ETA of the matched
+orders and the total cost relative to greedy (lower is better); the exact Hungarian result is the
+reference for the optimality gap where the batch is small enough to solve it.
+
+    python -m benchmarks.matching_bench --couriers 10000 --batches 50 200 1000 3000
+"""
+import argparse
+import random
+
+import numpy as np
+from benchmarks.timing import report, stopwatch, write_results
+from src import settings
+from src.helpers import assignment
+from src.models.order import PendingOrder
+from src.repositories.location_store import CourierLocationStore
+from src.services.matching_engine import MatchingEngine
+
+ACCRA = (5.6037, -0.1870)
+
+SOLVERS = {
+    "greedy": assignment.greedy,
+    "regret": assignment.greedy_regret,
+    "hungarian": assignment.hungarian,
+}
+
+
+def _point(rng: random.Random, spread: float):
+    return ACCRA[0] + rng.gauss(0, spread), ACCRA[1] + rng.gauss(0, spread)
+
+
+def run(couriers: int, batch_size: int, hungarian_limit: int, seed: int):
+    rng = random.Random(seed)
+    store = CourierLocationStore()
+    for courier_id in range(couriers):
+        store.update(courier_id, *_point(rng, 0.06), 0.0)
+
+    # demand is more concentrated than supply, so nearby orders compete for the same couriers
+    orders = [PendingOrder(order_id, *_point(rng, 0.03), 0.0) for order_id in range(batch_size)]
+    engine = MatchingEngine(store, settings.MATCHING)
+
+    with stopwatch() as elapsed:
+        candidates = {}
+        engine._collect_candidates(orders, candidates)
+        batch = engine._build_batch(orders, engine._positions(candidates))
+    prepare_seconds = elapsed()
+
+    max_pickup = settings.MATCHING.max_pickup_m
+    result = {
+        "batch_size": batch_size,
+        "candidate_couriers": len(batch.courier_ids),
+        "prepare_ms": round(prepare_seconds * 1000, 2),
+    }
+    totals = {}
+    for name, solver in SOLVERS.items():
+        if name == "hungarian" and min(batch.cost.shape) > hungarian_limit:
+            continue
+
+        with stopwatch() as elapsed:
+            rows, cols = solver(batch.cost)
+        solve_seconds = elapsed()
+
+        feasible = batch.distance[rows, cols] <= max_pickup
+        totals[name] = assignment.total_cost(batch.cost, (rows, cols))
+        result[name] = {
+            "solve_ms": round(solve_seconds * 1000, 2),
+            "matches_per_sec": round(int(feasible.sum()) / (solve_seconds + prepare_seconds), 2),
+            "matched": int(feasible.sum()),
+            "mean_eta_s": round(float(batch.eta[rows[feasible], cols[feasible]].mean()), 2),
+            "cost_vs_greedy": round(totals[name] / totals["greedy"], 4),
+        }
+
+    if "hungarian" in totals:
+        for name in SOLVERS:
+            result[name]["optimality_gap"] = round(totals[name] / totals["hungarian"] - 1, 4)
+
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--couriers", type=int, default=10_000)
+    parser.add_argument("--batches", type=int, nargs="+", default=[50, 200, 1000, 3000])
+    parser.add_argument("--hungarian-limit", type=int, default=1000, help="largest batch to solve exactly")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args()
+
+    np.random.seed(args.seed)
+    results = [run(args.couriers, size, args.hungarian_limit, args.seed) for size in args.batches]
+    for result in results:
+        print(f"== matching, batch of {result['batch_size']:,} orders, {result['candidate_couriers']:,} candidates, "
+              f"prepared in {result['prepare_ms']:,.2f} ms")
+        for name in SOLVERS:
+            if name in result:
+                report(f"  {name}", result[name])
+    write_results(args.output, {"matching": results})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+Offer push load test: simulated couriers on push sockets against a dispatch server in a child process.
+
+Each courier reports one position, then holds its offer socket open. A burst of `--orders` orders is
+submitted and every courier acknowledges and accepts what it is offered, except that a `--silent` fraction
+of them never answer and a `--decline` fraction decline. Silent couriers time out on the acknowledgement and
+their offers fall back to other couriers.
+
+Reports the time from submitting an order to its first offer reaching a courier, as the couriers see it, the
+server's push-to-acknowledgement latency and ack rate, and how long the burst took to be fully dispatched.
+
+    python -m benchmarks.offer_push_bench --couriers 2000 --orders 2000 --silent 0.05 --decline 0.1
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import uvloop
+import websockets
+from benchmarks.auth import BenchTokens
+from benchmarks.server import free_port, request_json, start_server
+from benchmarks.timing import latency_summary, report, stopwatch, write_results
+from src.helpers.location_frames import encode_binary
+
+ACCRA = (5.6037, -0.1870)
+
+
+class _Courier:
+    def __init__(self, courier_id: int, behaviour: str, first_offers: dict):
+        self.courier_id = courier_id
+        self.behaviour = behaviour
+        self.first_offers = first_offers
+        self.offers = 0
+        self.socket = None
+
+    async def run(self, port: int, tokens: BenchTokens):
+        url = f"ws://127.0.0.1:{port}/ws/offers/{self.courier_id}?token={tokens.issue(self.courier_id)}"
+        self.socket = await websockets.connect(url, ping_interval=None)
+        asyncio.get_running_loop().create_task(self._answer())
+
+    async def _answer(self):
+        try:
+            async for message in self.socket:
+                offer = json.loads(message)
+                if offer["type"] != "offer":
+                    continue
+                self.offers += 1
+                self.first_offers.setdefault(offer["job_id"], time.time())
+                if self.behaviour == "silent":
+                    continue
+                await self.socket.send(json.dumps({"type": "ack", "job_id": offer["job_id"]}))
+                answer = "decline" if self.behaviour == "decline" else "accept"
+                await self.socket.send(json.dumps({"type": answer, "job_id": offer["job_id"]}))
+        except websockets.ConnectionClosed:
+            pass
+
+
+async def _report_position(port: int, tokens: BenchTokens, courier_id: int, rng: random.Random):
+    url = f"ws://127.0.0.1:{port}/ws/locations/{courier_id}?token={tokens.issue(courier_id)}"
+    async with websockets.connect(url, ping_interval=None) as socket:
+        await socket.send(encode_binary(ACCRA[0] + rng.gauss(0, 0.03), ACCRA[1] + rng.gauss(0, 0.03), time.time()))
+
+
+async def _scenario(port: int, tokens: BenchTokens, couriers: int, orders: int, silent: float, decline: float,
+                    seed: int):
+    rng = random.Random(seed)
+    token = tokens.issue(0)
+    first_offers = {}
+
+    for start in range(0, couriers, 500):
+        batch = range(start, min(couriers, start + 500))
+        await asyncio.gather(*(_report_position(port, tokens, courier_id, rng) for courier_id in batch))
+    while request_json(port, "GET", "/locations/ingest/stats", token)["applied"] < couriers:
+        await asyncio.sleep(0.05)
+
+    simulated = []
+    for courier_id in range(couriers):
+        draw = rng.random()
+        behaviour = "silent" if draw < silent else "decline" if draw < silent + decline else "accept"
+        simulated.append(_Courier(courier_id, behaviour, first_offers))
+    for start in range(0, couriers, 500):
+        await asyncio.gather(*(courier.run(port, tokens) for courier in simulated[start:start + 500]))
+
+    submitted = {}
+    with stopwatch() as elapsed:
+        for order_id in range(orders):
+            lat, lng = ACCRA[0] + rng.gauss(0, 0.02), ACCRA[1] + rng.gauss(0, 0.02)
+            submitted[order_id] = time.time()
+            await asyncio.to_thread(
+                request_json, port, "POST", "/dispatch/orders", token, {"order_id": order_id, "lat": lat, "lng": lng}
+            )
+        submit_seconds = elapsed()
+
+        # done once nothing is on offer and the jobs left pending, if any, have stopped moving: every courier
+        # that could take them has passed on them or is full
+        last_change, last_counts = elapsed(), None
+        deadline = time.monotonic() + 120
+        while time.monotonic() < deadline:
+            stats = await asyncio.to_thread(request_json, port, "GET", "/dispatch/stats", token)
+            counts = (stats["pending"], stats["offered"], stats["accepted"])
+            if counts != last_counts:
+                last_change, last_counts = elapsed(), counts
+            if stats["offered"] == 0 and (stats["pending"] == 0 or elapsed() - last_change > 2):
+                break
+            await asyncio.sleep(0.05)
+        dispatch_seconds = last_change
+
+    offers = request_json(port, "GET", "/offers/stats", token)
+    for courier in simulated:
+        await courier.socket.close()
+
+    return {
+        "couriers": couriers,
+        "orders": orders,
+        "submit_per_sec": round(orders / submit_seconds, 2),
+        "dispatch_seconds": round(dispatch_seconds, 2),
+        "accepted": stats["accepted"],
+        "still_pending": stats["pending"],
+        "failed": stats["scheduler"]["failed"],
+        "offers_received": sum(courier.offers for courier in simulated),
+        **{
+            f"first_offer_{name.replace('_us', '_ms')}": round(value / 1000, 2)
+            for name, value in latency_summary(
+                [(first_offers[order_id] - submitted[order_id]) * 1e6 for order_id in first_offers]
+            ).items()
+        },
+        "ack_rate": offers["ack_rate"],
+        "ack_p50_ms": offers["ack_p50_ms"],
+        "ack_p99_ms": offers["ack_p99_ms"],
+        "ack_timeouts": offers["ack_timeouts"],
+        "withdrawn": offers["withdrawn"],
+    }
+
+
+def run(couriers: int, orders: int, silent: float, decline: float, seed: int):
+    port = free_port()
+    tokens = BenchTokens()
+    server = start_server(port, tokens, {
+        "LOCATION_FLUSH_INTERVAL": "0.05", "JOBS_TICK_INTERVAL": "0.1", "PUSH_ACK_TIMEOUT_S": "1",
+    })
+    try:
+        return asyncio.run(_scenario(port, tokens, couriers, orders, silent, decline, seed))
+    finally:
+        server.terminate()
+        server.wait(timeout=20)
+
+
+def main():
+    uvloop.install()
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--couriers", type=int, default=2000)
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--silent", type=float, default=0.05, help="fraction of couriers that never answer")
+    parser.add_argument("--decline", type=float, default=0.1, help="fraction of couriers that decline")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args()
+
+    result = run(args.couriers, args.orders, args.silent, args.decline, args.seed)
+    report(f"offer push, {args.couriers:,} couriers", result)
+    write_results(args.output, {"offer_push": result})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+Dispatch journal benchmark: group commit throughput, snapshot cost and recovery time.
+
+Journals `--couriers` courier positions and `--jobs` jobs, a quarter of them offered and a quarter accepted,
+then measures how long a restarted process takes to get back to the same state from the newest snapshot
+plus a tail of `--tail-positions` position updates and `--tail-jobs` job transitions, against replaying the
+whole log without a snapshot. Appending is measured with fsync on, on the disk `--directory` is on.
+
+    python -m benchmarks.recovery_bench --couriers 1000000 --jobs 100000
+"""
+import argparse
+import asyncio
+import random
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from benchmarks.timing import latency_summary, report, stopwatch, write_results
+from src import settings
+from src.models.job import DispatchJob, JobState
+from src.repositories.job_store import MemoryJobStore, Transition
+from src.repositories.location_store import CourierLocationStore
+from src.services.dispatch_journal import DispatchJournal
+
+ACCRA = (5.6037, -0.1870)
+NOW = 1698825600.0
+CHUNK = 2000
+
+
+def _journal(directory: Path, fsync: bool = True):
+    couriers = CourierLocationStore()
+    jobs = MemoryJobStore()
+    journal = DispatchJournal(couriers, jobs, settings.JOURNAL._replace(directory=str(directory), fsync=fsync))
+    jobs.on_applied = journal.record_transitions
+    return journal, couriers, jobs
+
+
+def _positions(rng: random.Random, courier_ids, at: float):
+    return [(courier_id, ACCRA[0] + rng.gauss(0, 0.05), ACCRA[1] + rng.gauss(0, 0.05), at)
+            for courier_id in courier_ids]
+
+
+def _job_transition(rng: random.Random, job_id: int, couriers: int) -> Transition:
+    state = (JobState.PENDING, JobState.PENDING, JobState.OFFERED, JobState.ACCEPTED)[job_id % 4]
+    courier_id = None if state == JobState.PENDING else rng.randrange(couriers)
+    job = DispatchJob(
+        job_id, ACCRA[0] + rng.gauss(0, 0.05), ACCRA[1] + rng.gauss(0, 0.05), job_id % 3, NOW + 1800, NOW,
+        attempts=1 if courier_id is not None else 0, state=state, courier_id=courier_id,
+        offer_expires_at=NOW + 30 if state == JobState.OFFERED else None,
+        excluded=tuple(rng.randrange(couriers) for _ in range(job_id % 3)),
+    )
+    return Transition(job_id, None, state, NOW + job_id % 1800, job)
+
+
+async def _fill(journal: DispatchJournal, couriers: CourierLocationStore, jobs: MemoryJobStore, count: int,
+                job_count: int, rng: random.Random):
+    for start in range(0, count, CHUNK):
+        chunk = _positions(rng, range(start, min(count, start + CHUNK)), NOW)
+        couriers.update_many(chunk)
+        journal.record_positions(chunk)
+    transitions = [_job_transition(rng, job_id, count) for job_id in range(job_count)]
+    for start in range(0, job_count, CHUNK):
+        await jobs.apply(transitions[start:start + CHUNK])
+
+
+async def _append_throughput(directory: Path, count: int, concurrent: int, rng: random.Random):
+    journal, couriers, jobs = _journal(directory)
+    journal.log.open()
+    journal.log.start()
+
+    rows = [_positions(rng, range(start, start + CHUNK), NOW) for start in range(0, count, CHUNK)]
+    with stopwatch() as elapsed:
+        for chunk in rows:
+            journal.record_positions(chunk)
+        await journal.log.sync()
+        position_seconds = elapsed()
+    appended_bytes = journal.log.stats.appended_bytes
+
+    # transitions are acknowledged once fsynced: many small batches in flight share each fsync
+    commits_before = journal.log.stats.commits
+    transitions = [_job_transition(rng, job_id, count) for job_id in range(concurrent)]
+    latencies = []
+
+    async def one(transition):
+        started = time.perf_counter()
+        await jobs.apply([transition])
+        latencies.append((time.perf_counter() - started) * 1e6)
+
+    with stopwatch() as elapsed:
+        await asyncio.gather(*(one(transition) for transition in transitions))
+        transition_seconds = elapsed()
+    commits = journal.log.stats.commits - commits_before
+    await journal.log.close()
+
+    return {
+        "positions_per_sec": round(count / position_seconds, 2),
+        "position_mb_per_sec": round(appended_bytes / position_seconds / 1e6, 2),
+        "synced_transitions_per_sec": round(concurrent / transition_seconds, 2),
+        "transitions_per_fsync": round(concurrent / max(1, commits), 2),
+        **{f"synced_{name}": value for name, value in latency_summary(latencies).items()},
+    }
+
+
+async def _build(directory: Path, couriers_count: int, job_count: int, tail_positions: int, tail_jobs: int,
+                 with_snapshot: bool, rng: random.Random):
+    journal, couriers, jobs = _journal(directory, fsync=False)
+    journal.log.open()
+    await _fill(journal, couriers, jobs, couriers_count, job_count, rng)
+
+    snapshot = {}
+    if with_snapshot:
+        with stopwatch() as elapsed:
+            await journal.snapshot()
+        snapshot = {
+            "snapshot_write_ms": round(elapsed() * 1000, 2),
+            "snapshot_mb": round(sum(path.stat().st_size for _, path in journal.snapshots.paths()) / 1e6, 2),
+        }
+
+    for start in range(0, tail_positions, CHUNK):
+        chunk = _positions(rng, (rng.randrange(couriers_count) for _ in range(min(CHUNK, tail_positions - start))),
+                           NOW + 60)
+        couriers.update_many(chunk)
+        journal.record_positions(chunk)
+    moved = [
+        _job_transition(rng, job_id, couriers_count)._replace(destination=JobState.ACCEPTED)
+        for job_id in rng.sample(range(job_count), tail_jobs)
+    ]
+    for start in range(0, tail_jobs, 100):
+        await journal.record_transitions(moved[start:start + 100])
+        jobs.restore(moved[start:start + 100])
+    await journal.log.close()
+    return couriers, jobs, snapshot
+
+
+def _recover(directory: Path, expected_couriers: CourierLocationStore, expected_jobs: MemoryJobStore):
+    journal, couriers, jobs = _journal(directory)
+    with stopwatch() as elapsed:
+        stats = journal.recover()
+        seconds = elapsed()
+    assert len(couriers) == len(expected_couriers)
+    assert asyncio.run(jobs.counts()) == asyncio.run(expected_jobs.counts())
+    assert np.array_equal(np.sort(couriers.export(), order="courier_id"),
+                          np.sort(expected_couriers.export(), order="courier_id"))
+    asyncio.run(journal.log.close())
+    return {"recovery_ms": round(seconds * 1000, 2), "replayed_records": stats["replayed"]}
+
+
+def run(directory: Path, couriers: int, jobs: int, tail_positions: int, tail_jobs: int, seed: int):
+    rng = random.Random(seed)
+    results = {"append": asyncio.run(_append_throughput(directory / "append", min(couriers, 200_000), 5000, rng))}
+
+    for name, with_snapshot in (("snapshot_and_tail", True), ("full_log", False)):
+        expected_couriers, expected_jobs, snapshot = asyncio.run(
+            _build(directory / name, couriers, jobs, tail_positions, tail_jobs, with_snapshot, rng)
+        )
+        results[name] = {**snapshot, **_recover(directory / name, expected_couriers, expected_jobs)}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--couriers", type=int, default=1_000_000)
+    parser.add_argument("--jobs", type=int, default=100_000)
+    parser.add_argument("--tail-positions", type=int, default=100_000)
+    parser.add_argument("--tail-jobs", type=int, default=10_000)
+    parser.add_argument("--directory", help="where to journal, a temporary directory by default")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args()
+
+    directory = Path(args.directory or tempfile.mkdtemp(prefix="dispatch-journal-"))
+    try:
+        results = run(directory, args.couriers, args.jobs, args.tail_positions, args.tail_jobs, args.seed)
+    finally:
+        if not args.directory:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    for name, result in results.items():
+        report(f"journal {name}, {args.couriers:,} couriers, {args.jobs:,} jobs", result)
+    write_results(args.output, results)
+
+
+if __name__ == "__main__":
+    main()
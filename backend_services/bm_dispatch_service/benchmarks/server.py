@@ -0,0 +1,62 @@
+"""
+A dispatch server in a child process for the benchmarks that drive it over the network, accepting the tokens
+of a BenchTokens
+"""
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+from benchmarks.auth import BenchTokens
+from src import settings
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def request_json(port: int, method: str, path: str, token: str, body=None):
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    try:
+        headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+        connection.request(method, path, body=None if body is None else json.dumps(body), headers=headers)
+        response = connection.getresponse()
+        payload = response.read()
+        if response.status >= 400:
+            raise RuntimeError(f"{method} {path} returned {response.status}: {payload[:200]!r}")
+        return json.loads(payload) if payload else None
+    finally:
+        connection.close()
+
+
+def start_server(
+        port: int, tokens: BenchTokens, env: Dict[str, str] | None = None, deflate: bool = False,
+        ready_path: str = "/dispatch/stats",
+) -> subprocess.Popen:
+    command: List[str] = [
+        sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--loop", "uvloop",
+        "--http", "httptools", "--ws", "websockets", "--ws-max-size", str(settings.SERVER.ws_max_size),
+        "--ws-max-queue", str(settings.SERVER.ws_max_queue),
+        "--ws-ping-interval", str(settings.SERVER.ws_ping_interval),
+        "--ws-per-message-deflate", str(deflate or settings.SERVER.ws_per_message_deflate).lower(),
+        "--log-level", "warning", "--backlog", "4096",
+    ]
+    server = subprocess.Popen(command, env={**os.environ, **tokens.server_env, **(env or {})})
+
+    token = tokens.issue(0)
+    deadline = time.monotonic() + 20
+    while time.monotonic() < deadline:
+        try:
+            request_json(port, "GET", ready_path, token)
+            return server
+        except OSError:
+            time.sleep(0.1)
+
+    server.kill()
+    raise RuntimeError("dispatch server did not start")
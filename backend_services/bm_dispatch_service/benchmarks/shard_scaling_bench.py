@@ -0,0 +1,123 @@
+"""
+Shard scaling benchmark: spatial query and matching throughput of the sharded pool against the number of
+worker processes, with the single-process store as the baseline (shards 0).
+
+Couriers and orders are spread over several cities, each mostly inside its own tiles, the way a multi-city
+deployment shards. Queries are issued with `--concurrency` in flight so every shard has work queued.
+Speedup is relative to one shard and cannot exceed the number of cores of the machine.
+
+    python -m benchmarks.shard_scaling_bench --shards 0 1 2 4 --couriers 50000 --queries 20000
+"""
+import argparse
+import asyncio
+import os
+import random
+
+from benchmarks.timing import report, stopwatch, write_results
+from src import settings
+from src.models.order import PendingOrder
+from src.repositories.location_store import CourierLocationStore
+from src.services.matching_engine import MatchingEngine
+from src.services.shard_pool import ShardPool
+from src.services.sharded_matching_engine import ShardedMatchingEngine
+
+CITIES = [
+    (5.6037, -0.1870),  # Accra
+    (6.6885, -1.6244),  # Kumasi
+    (6.5244, 3.3792),  # Lagos
+    (9.0765, 7.3986),  # Abuja
+    (-1.2921, 36.8219),  # Nairobi
+    (0.3476, 32.5825),  # Kampala
+    (-6.7924, 39.2083),  # Dar es Salaam
+    (14.7167, -17.4677),  # Dakar
+]
+
+
+def _point(rng: random.Random):
+    lat, lng = rng.choice(CITIES)
+    return lat + rng.gauss(0, 0.04), lng + rng.gauss(0, 0.04)
+
+
+async def _queries(store, points, radius_m: float, concurrency: int):
+    for start in range(0, len(points), concurrency):
+        found = [store.nearest(lat, lng, 8, radius_m) for lat, lng in points[start:start + concurrency]]
+        if isinstance(store, ShardPool):
+            await asyncio.gather(*found)
+
+
+async def run(shards: int, couriers: int, queries: int, orders: int, concurrency: int, seed: int):
+    rng = random.Random(seed)
+    updates = [(courier_id, *_point(rng), 0.0) for courier_id in range(couriers)]
+    points = [_point(rng) for _ in range(queries)]
+    batch = [PendingOrder(order_id, *_point(rng), 0.0) for order_id in range(orders)]
+    config = settings.MATCHING
+
+    if shards:
+        store = ShardPool(shards, capacity=couriers, tile_deg=settings.SHARDING.tile_deg,
+                          cell_size=settings.LOCATION_STORE.cell_size, config=config)
+        store.start()
+        # spawn the workers before timing anything
+        await store.shard_stats()
+        engine = ShardedMatchingEngine(store, config)
+    else:
+        store = CourierLocationStore(cell_size=settings.LOCATION_STORE.cell_size)
+        engine = MatchingEngine(store, config)
+
+    try:
+        with stopwatch() as elapsed:
+            store.update_many(updates)
+            if shards:
+                # returns once every shard has worked through its queued updates
+                await store.shard_stats()
+        ingest_seconds = elapsed()
+
+        with stopwatch() as elapsed:
+            await _queries(store, points, config.max_pickup_m, concurrency)
+        query_seconds = elapsed()
+
+        with stopwatch() as elapsed:
+            assignments, _ = await engine._match_batch(batch)
+        match_seconds = elapsed()
+
+        result = {
+            "shards": shards,
+            "updates_per_sec": round(couriers / ingest_seconds, 2),
+            "queries_per_sec": round(queries / query_seconds, 2),
+            "match_ms": round(match_seconds * 1000, 2),
+            "matched": len(assignments),
+        }
+        if shards:
+            result.update(fanned_out=store.stats.fanned_out, boundary_orders=len(store.split(batch)[1]))
+        return result
+    finally:
+        if shards:
+            store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--shards", type=int, nargs="+", default=[0, 1, 2, 4])
+    parser.add_argument("--couriers", type=int, default=50_000)
+    parser.add_argument("--queries", type=int, default=20_000)
+    parser.add_argument("--orders", type=int, default=2_000)
+    parser.add_argument("--concurrency", type=int, default=256)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args()
+
+    print(f"== {os.cpu_count()} cores")
+    results = [
+        asyncio.run(run(shards, args.couriers, args.queries, args.orders, args.concurrency, args.seed))
+        for shards in args.shards
+    ]
+    single = next((result for result in results if result["shards"] == 1), None)
+    for result in results:
+        if single is not None and result["shards"]:
+            result["query_speedup"] = round(result["queries_per_sec"] / single["queries_per_sec"], 2)
+            result["match_speedup"] = round(single["match_ms"] / result["match_ms"], 2)
+        report(f"shards={result['shards']}", result)
+    write_results(args.output, {"shard_scaling": results})
+
+
+if __name__ == "__main__":
+    main()
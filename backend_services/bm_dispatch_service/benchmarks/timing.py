@@ -0,0 +1,55 @@
+"""
+Small timing helpers shared by the dispatch benchmarks
+"""
+import json
+import statistics
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List
+
+
+def percentile(sorted_samples: List[float], pct: float) -> float:
+    if not sorted_samples:
+        return 0.0
+
+    index = min(len(sorted_samples) - 1, max(0, round(pct / 100 * len(sorted_samples)) - 1))
+    return sorted_samples[index]
+
+
+def latency_summary(samples_us: List[float]) -> Dict[str, float]:
+    samples_us = sorted(samples_us)
+    return {
+        "mean_us": round(statistics.fmean(samples_us), 2) if samples_us else 0.0,
+        "p50_us": round(percentile(samples_us, 50), 2),
+        "p95_us": round(percentile(samples_us, 95), 2),
+        "p99_us": round(percentile(samples_us, 99), 2),
+    }
+
+
+@contextmanager
+def stopwatch():
+    """
+    with stopwatch() as elapsed: ...; elapsed() returns seconds since the block started
+    """
+    started = time.perf_counter()
+    finished = None
+
+    def elapsed():
+        return (finished or time.perf_counter()) - started
+
+    try:
+        yield elapsed
+    finally:
+        finished = time.perf_counter()
+
+
+def report(name: str, results: Dict):
+    print(f"== {name}")
+    for key, value in results.items():
+        print(f"  {key:<28} {value:,.2f}" if isinstance(value, float) else f"  {key:<28} {value}")
+
+
+def write_results(path: str | None, results: Dict):
+    if path:
+        Path(path).write_text(json.dumps(results, indent=2))
@@ -0,0 +1,118 @@
+"""
+Location ingestion benchmark: per-connection memory of the server and ping throughput.
+
+Starts the dispatch app in a child process, opens `--connections` courier websockets from this process
+and reads the server's resident memory before and after. Each courier then sends `--rounds` pings and the
+ingest stats endpoint confirms they reached the store.
+
+    python -m benchmarks.ws_ingest_bench --connections 1000 10000
+"""
+import argparse
+import asyncio
+import random
+import time
+
+import uvloop
+import websockets
+from benchmarks.auth import BenchTokens
+from benchmarks.server import free_port, request_json, start_server
+from benchmarks.timing import report, stopwatch, write_results
+from src.helpers.location_frames import encode_binary
+
+
+def _rss_bytes(pid: int) -> int:
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+    raise RuntimeError("VmRSS not reported")
+
+
+async def _open(port: int, courier_id: int, tokens: BenchTokens, deflate: bool):
+    return await websockets.connect(
+        f"ws://127.0.0.1:{port}/ws/locations/{courier_id}?token={tokens.issue(courier_id)}", ping_interval=None,
+        compression="deflate" if deflate else None, max_queue=1
+    )
+
+
+async def _scenario(
+        port: int, server_pid: int, tokens: BenchTokens, connections: int, rounds: int, seed: int, deflate: bool
+):
+    rng = random.Random(seed)
+    token = tokens.issue(0)
+    baseline = _rss_bytes(server_pid)
+
+    sockets = []
+    with stopwatch() as elapsed:
+        for start in range(0, connections, 500):
+            batch = range(start, min(connections, start + 500))
+            sockets += await asyncio.gather(*(_open(port, courier_id, tokens, deflate) for courier_id in batch))
+    connect_seconds = elapsed()
+    await asyncio.sleep(0.5)
+    connected = _rss_bytes(server_pid)
+
+    with stopwatch() as elapsed:
+        for ping in range(rounds):
+            await asyncio.gather(*(
+                ws.send(encode_binary(5.6 + rng.gauss(0, 0.05), -0.18 + rng.gauss(0, 0.05), ping + 1.0))
+                for ws in sockets
+            ))
+        # wait until the server has read every frame
+        deadline = time.monotonic() + 60
+        while request_json(port, "GET", "/locations/ingest/stats", token)["received"] < connections * rounds:
+            if time.monotonic() > deadline:
+                break
+            await asyncio.sleep(0.05)
+    ping_seconds = elapsed()
+    await asyncio.sleep(0.3)
+    stats = request_json(port, "GET", "/locations/ingest/stats", token)
+    loaded = _rss_bytes(server_pid)
+
+    await asyncio.gather(*(ws.close() for ws in sockets))
+
+    return {
+        "connections": connections,
+        "deflate": deflate,
+        "connects_per_sec": round(connections / connect_seconds, 2),
+        "server_rss_idle_mb": round(baseline / 2 ** 20, 2),
+        "bytes_per_connection": round((connected - baseline) / connections, 2),
+        "bytes_per_connection_after_pings": round((loaded - baseline) / connections, 2),
+        "pings_per_sec": round(stats["received"] / ping_seconds, 2),
+        "pings_received": stats["received"],
+        "pings_applied": stats["applied"],
+        "flushes": stats["flushes"],
+    }
+
+
+def run(connections: int, rounds: int, seed: int, deflate: bool):
+    port = free_port()
+    tokens = BenchTokens()
+    server = start_server(
+        port, tokens, {"LOCATION_FLUSH_INTERVAL": "0.1", "LOCATION_FRAMES_PER_SECOND": "1000"}, deflate,
+        ready_path="/locations/ingest/stats",
+    )
+    try:
+        return asyncio.run(_scenario(port, server.pid, tokens, connections, rounds, seed, deflate))
+    finally:
+        server.terminate()
+        server.wait(timeout=20)
+
+
+def main():
+    uvloop.install()
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--connections", type=int, nargs="+", default=[1000, 10_000])
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--deflate", action="store_true", help="negotiate per-message compression, for comparison")
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args()
+
+    results = [run(count, args.rounds, args.seed, args.deflate) for count in args.connections]
+    for result in results:
+        report(f"websocket ingestion, {result['connections']:,} connections", result)
+    write_results(args.output, {"ws_ingest": results})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+import uvicorn
+from src import settings
+from src.factories.app_factory import create_app
+
+app = create_app()
+
+if __name__ == "__main__":
+    uvicorn.run(
+        "main:app",
+        host=settings.SERVER.host,
+        port=settings.SERVER.port,
+        loop="uvloop",
+        http="httptools",
+        ws="websockets",
+        ws_max_size=settings.SERVER.ws_max_size,
+        ws_max_queue=settings.SERVER.ws_max_queue,
+        ws_ping_interval=settings.SERVER.ws_ping_interval,
+        ws_per_message_deflate=settings.SERVER.ws_per_message_deflate,
+    )
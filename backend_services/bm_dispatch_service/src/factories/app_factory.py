@@ -0,0 +1,112 @@
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI
+from src import settings
+from src.helpers.auth import TokenVerifier
+from src.helpers.redis_helpers import create_redis_client
+from src.repositories.job_store import MemoryJobStore, RedisJobStore
+from src.repositories.location_store import CourierLocationStore
+from src.routers import couriers, dispatch, eta, heatmap, locations, offers
+from src.services.account_directory import AccountDirectory
+from src.services.connection_registry import ConnectionRegistry
+from src.services.demand_heatmap import DemandHeatmap
+from src.services.dispatch_journal import DispatchJournal
+from src.services.eta_service import EtaService
+from src.services.job_scheduler import JobScheduler
+from src.services.location_ingestor import LocationIngestor
+from src.services.matching_engine import MatchingEngine
+from src.services.offer_dispatcher import OfferDispatcher
+from src.services.routing import StubRoutingBackend
+from src.services.shard_pool import ShardPool
+from src.services.sharded_matching_engine import ShardedMatchingEngine
+
+
+@asynccontextmanager
+async def _lifespan(app: FastAPI):
+    ingestor = app.state.location_ingestor
+    scheduler = app.state.job_scheduler
+    eta_service = app.state.eta_service
+    store = app.state.location_store
+    sharded = isinstance(store, ShardPool)
+    journal = app.state.dispatch_journal
+    if sharded:
+        store.start()
+    if journal is not None:
+        # the stores are filled back in before anything reads or writes them
+        journal.recover()
+        journal.start()
+    ingestor.start()
+    # the scheduler runs the matching batches, the engine's own window loop stays off
+    scheduler.start()
+    app.state.offer_dispatcher.start()
+    eta_service.start()
+    yield
+    await eta_service.stop()
+    await scheduler.stop()
+    await app.state.offer_dispatcher.stop()
+    await app.state.connection_registry.close()
+    await ingestor.stop()
+    if journal is not None:
+        await journal.stop()
+    if sharded:
+        store.close()
+    await app.state.account_directory.close()
+    await app.state.job_store.close()
+
+
+def create_app() -> FastAPI:
+    app = FastAPI(title="dispatch", lifespan=_lifespan)
+
+    if settings.SHARDING.workers:
+        app.state.location_store = ShardPool(
+            settings.SHARDING.workers,
+            capacity=settings.SHARDING.capacity,
+            tile_deg=settings.SHARDING.tile_deg,
+            cell_size=settings.LOCATION_STORE.cell_size,
+            config=settings.MATCHING,
+        )
+        app.state.matching_engine = ShardedMatchingEngine(app.state.location_store, settings.MATCHING)
+    else:
+        app.state.location_store = CourierLocationStore(cell_size=settings.LOCATION_STORE.cell_size)
+        app.state.matching_engine = MatchingEngine(app.state.location_store, settings.MATCHING)
+
+    jobs_redis = create_redis_client(settings.REDIS)
+    if jobs_redis is None:
+        app.state.job_store = MemoryJobStore(settings.JOBS.events_max_length)
+    else:
+        app.state.job_store = RedisJobStore(jobs_redis, settings.JOBS.key_prefix, settings.JOBS.events_max_length)
+    app.state.job_scheduler = JobScheduler(app.state.job_store, app.state.matching_engine, settings.JOBS)
+    app.state.connection_registry = ConnectionRegistry(settings.PUSH.max_outbox)
+    app.state.offer_dispatcher = OfferDispatcher(app.state.connection_registry, app.state.job_scheduler, settings.PUSH)
+    app.state.job_scheduler.on_offered = app.state.offer_dispatcher.offer
+
+    app.state.location_ingestor = LocationIngestor(
+        app.state.location_store,
+        flush_interval=settings.LOCATION_INGEST.flush_interval,
+        apply_chunk_size=settings.LOCATION_INGEST.apply_chunk_size,
+    )
+    app.state.demand_heatmap = DemandHeatmap(settings.HEATMAP)
+    app.state.location_ingestor.on_applied.append(app.state.demand_heatmap.record_positions)
+    app.state.job_scheduler.on_submitted = app.state.demand_heatmap.record_order
+    app.state.dispatch_journal = None
+    if settings.JOURNAL.directory:
+        # Redis keeps jobs durable itself, only the in-memory store needs journaling
+        memory_jobs = app.state.job_store if isinstance(app.state.job_store, MemoryJobStore) else None
+        journal = app.state.dispatch_journal = DispatchJournal(app.state.location_store, memory_jobs, settings.JOURNAL)
+        app.state.location_ingestor.on_applied.append(journal.record_positions)
+        if memory_jobs is not None:
+            memory_jobs.on_applied = journal.record_transitions
+    app.state.eta_service = EtaService(
+        StubRoutingBackend(settings.ETA.speed_mps, settings.ETA.detour_factor, settings.ETA.utc_offset_hours),
+        settings.ETA,
+    )
+    app.state.token_verifier = TokenVerifier(settings.AUTH)
+    app.state.account_directory = AccountDirectory(create_redis_client(settings.REDIS), settings.ACCOUNTS)
+    app.include_router(locations.router)
+    app.include_router(dispatch.router)
+    app.include_router(couriers.router)
+    app.include_router(eta.router)
+    app.include_router(offers.router)
+    app.include_router(heatmap.router)
+
+    return app
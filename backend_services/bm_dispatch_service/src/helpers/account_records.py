@@ -0,0 +1,99 @@
+"""
+Account entries as account_serv caches them in Redis, under the bare account id.
+
+An entry is one of
+- the JSON object account_serv's serializer renders, starting with "{"
+- a single 0x00 byte, for an id account_serv looked up and found nothing
+- a binary record (account_serv's helpers/cache_codecs.py): a version byte, a flags byte and the body,
+  zlib compressed when flags & 1. The body is a uint32 null bitmap, the fixed width fields of the version's
+  schema (ints as int64, bools as int8, datetimes as int64 and int16, strings and JSON as their uint32
+  length), then the bytes of the strings and JSON fields in schema order.
+
+Only the fields an AccountProfile needs are read out of a record. account_serv must not write a schema
+version before it is added to _SCHEMAS here; until then the entries are read as unreadable and the accounts
+are looked up over HTTP.
+"""
+import json
+import struct
+import zlib
+from typing import Dict, Tuple
+
+# the value of an entry for an account account_serv does not know
+MISSING = object()
+
+_MISSING_VALUE = b"\x00"
+_COMPRESSED = 0x01
+_PREAMBLE = struct.Struct("<BB")
+_FORMATS = {"int": "q", "bool": "b", "datetime": "qh", "str": "I", "json": "I"}
+_PROFILE_FIELDS = ("id", "displayName", "phone", "timezone")
+
+_SCHEMAS = {
+    1: (
+        ("id", "int"), ("last_login", "datetime"), ("dateJoined", "datetime"), ("phoneVerified", "bool"),
+        ("roles", "str"), ("phone", "str"), ("email", "str"), ("isDeleted", "bool"), ("timezone", "str"),
+        ("geoEnabled", "bool"), ("lang", "str"), ("displayName", "str"), ("location", "str"), ("entities", "json"),
+        ("lastUpdated", "datetime"),
+    ),
+}
+
+
+class _Layout:
+    __slots__ = ("fixed", "fields")
+
+    def __init__(self, fields: Tuple[Tuple[str, str], ...]):
+        self.fixed = struct.Struct("<I" + "".join(_FORMATS[kind] for _, kind in fields) + "I")
+        # (name, kind, position, index among the unpacked fixed values, index among the variable fields)
+        fields_at = []
+        slot = 0
+        segment = 0
+        for position, (name, kind) in enumerate(fields):
+            fields_at.append((name, kind, position, slot, segment if kind in ("str", "json") else None))
+            slot += len(_FORMATS[kind])
+            segment += kind in ("str", "json")
+        self.fields = tuple(fields_at)
+
+
+_LAYOUTS = {version: _Layout(fields) for version, fields in _SCHEMAS.items()}
+
+
+def decode_account(raw: bytes | str) -> Dict | object:
+    """
+    The account of a cache entry, holding at least the profile fields, or MISSING. Raises ValueError on
+    anything else.
+    """
+    if isinstance(raw, str):
+        raw = raw.encode()
+    if raw == _MISSING_VALUE:
+        return MISSING
+    if raw[:1] == b"{" or raw[:1].isspace():
+        return json.loads(raw)
+    if len(raw) < _PREAMBLE.size:
+        raise ValueError("truncated cached account")
+
+    version, flags = _PREAMBLE.unpack_from(raw)
+    layout = _LAYOUTS.get(version)
+    if layout is None:
+        raise ValueError(f"unknown cached account version {version}")
+    body = raw[_PREAMBLE.size:]
+    try:
+        if flags & _COMPRESSED:
+            body = zlib.decompress(body)
+        values = layout.fixed.unpack_from(body)
+    except (zlib.error, struct.error) as exc:
+        raise ValueError("malformed cached account") from exc
+
+    nulls = values[0]
+    fixed = values[1:]
+    account = {}
+    offset = layout.fixed.size
+    for name, kind, position, slot, segment in layout.fields:
+        if segment is None:
+            if name in _PROFILE_FIELDS and not nulls >> position & 1:
+                account[name] = fixed[slot]
+            continue
+
+        end = offset + fixed[slot]
+        if name in _PROFILE_FIELDS and not nulls >> position & 1:
+            account[name] = body[offset:end].decode()
+        offset = end
+    return account
@@ -0,0 +1,154 @@
+"""
+Solvers for the rectangular assignment problem: given a cost matrix, pair rows with columns, each used at
+most once, so that min(rows, cols) pairs are made at the lowest total cost.
+
+`hungarian` is exact and O(n^2 m), fine for a few hundred rows. `greedy_regret` gives up a little optimality
+for a handful of vectorized passes over the matrix and is meant for large batches. `greedy` pairs columns in
+their given order with the cheapest free row and is the baseline the others are measured against.
+
+Every solver returns (rows, cols) index arrays sorted by row.
+"""
+from typing import Tuple
+
+import numpy as np
+
+Pairs = Tuple[np.ndarray, np.ndarray]
+
+
+def _as_wide(cost) -> Tuple[np.ndarray, bool]:
+    cost = np.asarray(cost, dtype=np.float64)
+    if cost.ndim != 2:
+        raise ValueError("cost must be a 2d matrix")
+    if not np.isfinite(cost).all():
+        raise ValueError("cost must be finite, use a large value for infeasible pairs")
+
+    # the solvers assign every row, so work on the orientation with no more rows than columns
+    return (cost.T, True) if cost.shape[0] > cost.shape[1] else (cost, False)
+
+
+def _pairs(rows: np.ndarray, cols: np.ndarray, transposed: bool) -> Pairs:
+    if transposed:
+        rows, cols = cols, rows
+    order = np.argsort(rows, kind="stable")
+    return rows[order].astype(np.intp), cols[order].astype(np.intp)
+
+
+def total_cost(cost, pairs: Pairs) -> float:
+    rows, cols = pairs
+    return float(np.asarray(cost)[rows, cols].sum())
+
+
+def hungarian(cost) -> Pairs:
+    """
+    Shortest augmenting path with row and column potentials, one row added per outer iteration
+    """
+    cost, transposed = _as_wide(cost)
+    n, m = cost.shape
+    if n == 0:
+        return _pairs(np.empty(0), np.empty(0), transposed)
+
+    # 1-based as in the textbook formulation: column 0 is a virtual column holding the row being added
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    row_of = np.zeros(m + 1, dtype=np.intp)
+    way = np.zeros(m + 1, dtype=np.intp)
+
+    for row in range(1, n + 1):
+        row_of[0] = row
+        col = 0
+        min_slack = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+
+        while True:
+            used[col] = True
+            current = row_of[col]
+            free = ~used[1:]
+
+            slack = cost[current - 1] - u[current] - v[1:]
+            improved = free & (slack < min_slack[1:])
+            min_slack[1:][improved] = slack[improved]
+            way[1:][improved] = col
+
+            candidates = np.where(free, min_slack[1:], np.inf)
+            next_col = int(np.argmin(candidates)) + 1
+            delta = candidates[next_col - 1]
+
+            used_cols = np.flatnonzero(used)
+            u[row_of[used_cols]] += delta
+            v[used_cols] -= delta
+            min_slack[1:][free] -= delta
+
+            col = next_col
+            if row_of[col] == 0:
+                break
+
+        while col:
+            previous = way[col]
+            row_of[col] = row_of[previous]
+            col = previous
+
+    cols = np.flatnonzero(row_of[1:])
+    return _pairs(row_of[1:][cols] - 1, cols, transposed)
+
+
+def greedy_regret(cost) -> Pairs:
+    """
+    Rows whose cheapest column is much cheaper than their second cheapest are placed first, since they lose
+    the most by waiting. Placed in rounds: each round every open row takes its cheapest free column in order
+    of regret, and rows that collide with an earlier pick in the same round retry in the next one. Rows with
+    no regret at all, typically left with nothing but equally infeasible columns, wait until the others are
+    placed so they do not take a column someone else could use.
+    """
+    cost, transposed = _as_wide(cost)
+    n, m = cost.shape
+    rows_out, cols_out = [], []
+
+    open_rows = np.arange(n)
+    free_cols = np.ones(m, dtype=bool)
+    while open_rows.size:
+        col_index = np.flatnonzero(free_cols)
+        sub = cost[np.ix_(open_rows, col_index)]
+
+        best_cols = np.argmin(sub, axis=1)
+        best = sub[np.arange(open_rows.size), best_cols]
+        second = np.partition(sub, 1, axis=1)[:, 1] if col_index.size > 1 else best
+        regret = second - best
+        by_regret = np.argsort(-regret, kind="stable")
+        if regret[by_regret[0]] > 0:
+            by_regret = by_regret[regret[by_regret] > 0]
+
+        taken = np.zeros(col_index.size, dtype=bool)
+        placed = np.zeros(open_rows.size, dtype=bool)
+        for position in by_regret:
+            col = best_cols[position]
+            if taken[col]:
+                continue
+            taken[col] = True
+            placed[position] = True
+            rows_out.append(open_rows[position])
+            cols_out.append(col_index[col])
+
+        free_cols[col_index[taken]] = False
+        open_rows = open_rows[~placed]
+
+    return _pairs(np.asarray(rows_out, dtype=np.intp), np.asarray(cols_out, dtype=np.intp), transposed)
+
+
+def greedy(cost) -> Pairs:
+    """
+    Columns in order, each taking the cheapest row still free: one-at-a-time nearest-courier dispatch
+    """
+    cost = np.asarray(cost, dtype=np.float64)
+    n, m = cost.shape
+    free = np.ones(n, dtype=bool)
+    rows_out, cols_out = [], []
+
+    for col in range(m):
+        if not free.any():
+            break
+        row = int(np.argmin(np.where(free, cost[:, col], np.inf)))
+        free[row] = False
+        rows_out.append(row)
+        cols_out.append(col)
+
+    return _pairs(np.asarray(rows_out), np.asarray(cols_out), False)
@@ -0,0 +1,138 @@
+"""
+Authentication of dispatch requests with the access tokens account_serv issues.
+
+Tokens are RS256 JWTs verified here against account_serv's public key, so no request waits on account_serv.
+Decoded claims are memoized until the token expires: a courier app polling every few seconds pays for one
+signature check per token rather than one per request. The caller's profile comes from the account
+directory, which never blocks a request on account_serv either.
+"""
+import asyncio
+import logging
+import time
+from typing import Dict
+
+import jwt
+from fastapi import Depends, HTTPException, WebSocketException, status
+from jwt.algorithms import RSAAlgorithm
+from starlette.requests import HTTPConnection
+from src.helpers.dependencies import get_account_directory
+from src.helpers.ttl_cache import TTLCache
+from src.models.account import CurrentAccount
+from src.services.account_directory import AccountDirectory
+from src.settings import AuthConfig
+
+_Logger = logging.getLogger(__name__)
+
+
+class InvalidToken(Exception):
+    pass
+
+
+class AuthStats:
+    __slots__ = ("verified", "memoized", "rejected")
+
+    def __init__(self):
+        self.verified = 0
+        self.memoized = 0
+        self.rejected = 0
+
+    def as_dict(self) -> Dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class TokenVerifier:
+    def __init__(self, config: AuthConfig, verifying_key=None):
+        """
+        `verifying_key`, a PEM string or a public key, overrides the configured one
+        """
+        self._config = config
+        verifying_key = verifying_key or config.verifying_key
+        # parsed once here, PyJWT would otherwise load the PEM again on every decode
+        self._key = RSAAlgorithm(RSAAlgorithm.SHA256).prepare_key(verifying_key) if verifying_key else None
+        self._jwk_client = jwt.PyJWKClient(config.jwk_url, cache_keys=True) if config.jwk_url else None
+        self._jwks: Dict[str, object] = {}
+        # each entry lives until its token expires
+        self._claims = TTLCache(config.claims_cache_size, ttl=0)
+        self.stats = AuthStats()
+
+    @property
+    def user_id_claim(self) -> str:
+        return self._config.user_id_claim
+
+    async def verify(self, token: str) -> Dict:
+        claims = self._claims.get(token)
+        if claims is not None:
+            self.stats.memoized += 1
+            return claims
+
+        config = self._config
+        try:
+            claims = jwt.decode(
+                token, await self._key_for(token), algorithms=list(config.algorithms), audience=config.audience,
+                issuer=config.issuer, leeway=config.leeway, options={"require": ["exp", config.user_id_claim]},
+            )
+        except jwt.InvalidTokenError as e:
+            self.stats.rejected += 1
+            raise InvalidToken(str(e)) from e
+
+        self.stats.verified += 1
+        self._claims.put(token, claims, ttl=claims["exp"] + config.leeway - time.time())
+        return claims
+
+    async def _key_for(self, token: str):
+        if self._key is not None:
+            return self._key
+        if self._jwk_client is None:
+            raise InvalidToken("no verifying key is configured")
+
+        try:
+            kid = jwt.get_unverified_header(token).get("kid")
+        except jwt.InvalidTokenError as e:
+            raise InvalidToken(str(e)) from e
+
+        key = self._jwks.get(kid)
+        if key is None:
+            # only unknown key ids reach the network, and not on the event loop
+            try:
+                signing_key = await asyncio.to_thread(self._jwk_client.get_signing_key_from_jwt, token)
+            except jwt.PyJWKClientError as e:
+                raise InvalidToken(str(e)) from e
+            key = self._jwks[kid] = signing_key.key
+        return key
+
+
+def get_token_verifier(connection: HTTPConnection) -> TokenVerifier:
+    return connection.app.state.token_verifier
+
+
+def _bearer_token(connection: HTTPConnection) -> str | None:
+    scheme, _, token = connection.headers.get("authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and token.strip():
+        return token.strip()
+
+    if connection.scope["type"] == "websocket":
+        # browsers cannot set headers on a websocket handshake
+        return connection.query_params.get("token")
+    return None
+
+
+async def get_current_account(
+        connection: HTTPConnection,
+        verifier: TokenVerifier = Depends(get_token_verifier),
+        directory: AccountDirectory = Depends(get_account_directory),
+) -> CurrentAccount:
+    """
+    The account the request's bearer token was issued to. A websocket may pass the token as `?token=`.
+    """
+    try:
+        token = _bearer_token(connection)
+        if token is None:
+            raise InvalidToken("missing bearer token")
+        claims = await verifier.verify(token)
+    except InvalidToken as e:
+        if connection.scope["type"] == "websocket":
+            raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason=str(e))
+        raise HTTPException(status.HTTP_401_UNAUTHORIZED, detail=str(e), headers={"WWW-Authenticate": "Bearer"})
+
+    account_id = int(claims[verifier.user_id_claim])
+    return CurrentAccount(account_id, claims, await directory.get(account_id))
@@ -0,0 +1,52 @@
+from starlette.requests import HTTPConnection
+from src.repositories.location_store import CourierLocationStore
+from src.services.account_directory import AccountDirectory
+from src.services.connection_registry import ConnectionRegistry
+from src.services.demand_heatmap import DemandHeatmap
+from src.services.dispatch_journal import DispatchJournal
+from src.services.eta_service import EtaService
+from src.services.job_scheduler import JobScheduler
+from src.services.location_ingestor import LocationIngestor
+from src.services.matching_engine import MatchingEngine
+from src.services.offer_dispatcher import OfferDispatcher
+from src.services.shard_pool import ShardPool
+
+
+def get_location_store(connection: HTTPConnection) -> CourierLocationStore | ShardPool:
+    return connection.app.state.location_store
+
+
+def get_location_ingestor(connection: HTTPConnection) -> LocationIngestor:
+    return connection.app.state.location_ingestor
+
+
+def get_matching_engine(connection: HTTPConnection) -> MatchingEngine:
+    return connection.app.state.matching_engine
+
+
+def get_eta_service(connection: HTTPConnection) -> EtaService:
+    return connection.app.state.eta_service
+
+
+def get_account_directory(connection: HTTPConnection) -> AccountDirectory:
+    return connection.app.state.account_directory
+
+
+def get_job_scheduler(connection: HTTPConnection) -> JobScheduler:
+    return connection.app.state.job_scheduler
+
+
+def get_connection_registry(connection: HTTPConnection) -> ConnectionRegistry:
+    return connection.app.state.connection_registry
+
+
+def get_offer_dispatcher(connection: HTTPConnection) -> OfferDispatcher:
+    return connection.app.state.offer_dispatcher
+
+
+def get_dispatch_journal(connection: HTTPConnection) -> DispatchJournal | None:
+    return connection.app.state.dispatch_journal
+
+
+def get_demand_heatmap(connection: HTTPConnection) -> DemandHeatmap:
+    return connection.app.state.demand_heatmap
@@ -0,0 +1,37 @@
+import math
+
+import numpy as np
+
+EARTH_RADIUS_M = 6_371_008.8
+METRES_PER_DEGREE_LAT = math.pi * EARTH_RADIUS_M / 180
+
+
+def haversine_m(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """
+    Great circle distance in metres between two points given in degrees
+    """
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lng2 - lng1)
+
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def metres_per_degree_lng(lat: float) -> float:
+    # clamp so cells near the poles keep a positive width
+    return METRES_PER_DEGREE_LAT * max(math.cos(math.radians(min(abs(lat), 89.9))), 1e-6)
+
+
+def haversine_np_m(lats_a, lngs_a, lats_b, lngs_b) -> np.ndarray:
+    """
+    Vectorized haversine_m over numpy arrays, following numpy broadcasting: equal length vectors give the
+    elementwise distances, a column against a row gives the full pairwise matrix
+    """
+    phi_a = np.radians(lats_a)
+    phi_b = np.radians(lats_b)
+    d_lambda = np.radians(lngs_b) - np.radians(lngs_a)
+
+    a = np.sin((phi_b - phi_a) / 2) ** 2 + np.cos(phi_a) * np.cos(phi_b) * np.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.minimum(1.0, np.sqrt(a)))
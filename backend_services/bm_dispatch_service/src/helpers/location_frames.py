@@ -0,0 +1,38 @@
+"""
+Location frames sent by couriers.
+
+Text frames are JSON objects {"lat": .., "lng": .., "ts": ..}, binary frames pack the same three values
+as little-endian doubles. "ts" is the unix time the ping was taken and may be left out (JSON) or set to 0
+(binary), in which case the time the frame was received is used.
+"""
+import json
+import math
+import struct
+from typing import Tuple
+
+BINARY_FRAME = struct.Struct("<ddd")
+
+
+def encode_binary(lat: float, lng: float, sent_at: float = 0.0) -> bytes:
+    return BINARY_FRAME.pack(lat, lng, sent_at)
+
+
+def decode_frame(frame: str | bytes) -> Tuple[float, float, float | None]:
+    """
+    Raises ValueError on anything that is not a well formed location frame
+    """
+    if isinstance(frame, bytes):
+        if len(frame) != BINARY_FRAME.size:
+            raise ValueError(f"binary frames must be {BINARY_FRAME.size} bytes")
+        lat, lng, sent_at = BINARY_FRAME.unpack(frame)
+    else:
+        try:
+            payload = json.loads(frame)
+            lat, lng, sent_at = float(payload["lat"]), float(payload["lng"]), float(payload.get("ts") or 0)
+        except (TypeError, KeyError, AttributeError) as exc:
+            raise ValueError("malformed location frame") from exc
+
+    if not (math.isfinite(lat) and math.isfinite(lng) and math.isfinite(sent_at)):
+        raise ValueError("coordinates must be finite")
+
+    return lat, lng, sent_at or None
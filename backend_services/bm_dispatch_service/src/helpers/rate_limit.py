@@ -0,0 +1,28 @@
+import time
+
+
+class TokenBucket:
+    """
+    Allows `rate` events per second on average with bursts of up to `burst`. Kept to a few slots since one
+    is held per open connection.
+    """
+
+    __slots__ = ("rate", "burst", "_tokens", "_stamp")
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._stamp = time.monotonic()
+
+    def take(self, now: float | None = None) -> bool:
+        if now is None:
+            now = time.monotonic()
+
+        self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+        if self._tokens < 1:
+            return False
+
+        self._tokens -= 1
+        return True
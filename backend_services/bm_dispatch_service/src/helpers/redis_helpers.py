@@ -0,0 +1,11 @@
+from redis.asyncio import Redis
+from src.settings import RedisConfig
+
+
+def create_redis_client(config: RedisConfig) -> Redis | None:
+    if config.url:
+        return Redis.from_url(config.url)
+    if not config.host:
+        return None
+
+    return Redis(host=config.host, port=config.port, db=config.db, password=config.password or None)
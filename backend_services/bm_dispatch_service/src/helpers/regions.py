@@ -0,0 +1,65 @@
+import math
+from typing import Set, Tuple
+
+from src.helpers.geo import METRES_PER_DEGREE_LAT, metres_per_degree_lng
+
+# bounding boxes spanning more tiles than this are sent to every shard rather than enumerated
+_MAX_TILES_PER_QUERY = 256
+
+_MASK_64 = (1 << 64) - 1
+
+
+class RegionPartitioner:
+    """
+    Splits the map into square tiles of `tile_deg` degrees and spreads the tiles over the shards. Tiles are
+    hashed rather than striped so that a busy city covering many tiles is shared by every shard.
+    """
+
+    __slots__ = ("shards", "tile_deg", "_cols")
+
+    def __init__(self, shards: int, tile_deg: float):
+        if shards < 1:
+            raise ValueError("at least one shard is required")
+
+        self.shards = shards
+        self.tile_deg = tile_deg
+        self._cols = math.ceil(360 / tile_deg)
+
+    def tile_of(self, lat: float, lng: float) -> Tuple[int, int]:
+        row = int((min(max(lat, -90.0), 90.0) + 90) // self.tile_deg)
+        col = int(((lng + 180) % 360) // self.tile_deg) % self._cols
+        return row, col
+
+    def shard_of(self, lat: float, lng: float) -> int:
+        return self._shard_of_tile(*self.tile_of(lat, lng))
+
+    def shards_for_circle(self, lat: float, lng: float, radius_m: float) -> Set[int]:
+        """
+        Shards owning any tile that overlaps the circle's bounding box
+        """
+        d_lat = radius_m / METRES_PER_DEGREE_LAT
+        d_lng = radius_m / metres_per_degree_lng(abs(lat) + d_lat)
+        if d_lng >= 180:
+            return set(range(self.shards))
+
+        min_row, min_col = self.tile_of(lat - d_lat, lng - d_lng)
+        max_row, max_col = self.tile_of(lat + d_lat, lng + d_lng)
+        span = (max_col - min_col) % self._cols
+        if (max_row - min_row + 1) * (span + 1) > _MAX_TILES_PER_QUERY:
+            return set(range(self.shards))
+
+        shards = set()
+        for row in range(min_row, max_row + 1):
+            for step in range(span + 1):
+                shards.add(self._shard_of_tile(row, (min_col + step) % self._cols))
+                if len(shards) == self.shards:
+                    return shards
+        return shards
+
+    def _shard_of_tile(self, row: int, col: int) -> int:
+        # 64 bit finalizer mix, a plain multiply-xor keeps the low bits of neighbouring tiles correlated
+        # and with an even shard count every tile edge would become a shard boundary
+        key = (row * self._cols + col) & _MASK_64
+        key = ((key ^ (key >> 33)) * 0xFF51AFD7ED558CCD) & _MASK_64
+        key = ((key ^ (key >> 33)) * 0xC4CEB9FE1A85EC53) & _MASK_64
+        return (key ^ (key >> 33)) % self.shards
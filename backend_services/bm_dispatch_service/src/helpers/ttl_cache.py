@@ -0,0 +1,68 @@
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable
+
+
+class CacheStats:
+    __slots__ = ("hits", "misses", "expired", "evictions")
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return round(self.hits / lookups, 4) if lookups else 0.0
+
+    def as_dict(self) -> Dict:
+        return {**{name: getattr(self, name) for name in self.__slots__}, "hit_rate": self.hit_rate}
+
+
+class TTLCache:
+    """
+    LRU cache whose entries also expire `ttl` seconds after they were stored. Expired entries are dropped
+    when looked up, and the least recently used ones once the cache is over `max_size`.
+    """
+
+    def __init__(self, max_size: int, ttl: float, clock: Callable[[], float] = time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: OrderedDict = OrderedDict()
+        self.stats = CacheStats()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, default=None):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats.misses += 1
+            return default
+
+        expires_at, value = entry
+        if expires_at <= self._clock():
+            del self._entries[key]
+            self.stats.expired += 1
+            self.stats.misses += 1
+            return default
+
+        self._entries.move_to_end(key)
+        self.stats.hits += 1
+        return value
+
+    def put(self, key: Hashable, value, ttl: float | None = None):
+        """
+        `ttl` overrides the cache's for this entry
+        """
+        self._entries[key] = (self._clock() + (self.ttl if ttl is None else ttl), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
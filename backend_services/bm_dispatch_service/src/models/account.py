@@ -0,0 +1,22 @@
+from typing import Dict, NamedTuple
+
+
+class AccountProfile(NamedTuple):
+    account_id: int
+    display_name: str
+    phone: str | None
+    timezone: str | None
+
+    @classmethod
+    def from_account(cls, account: Dict) -> "AccountProfile":
+        """
+        From an account as account_serv serializes it
+        """
+        return cls(int(account["id"]), account.get("displayName") or "", account.get("phone"), account.get("timezone"))
+
+
+class CurrentAccount(NamedTuple):
+    account_id: int
+    claims: Dict
+    # None until the profile has been cached, the request is never held up looking it up
+    profile: AccountProfile | None
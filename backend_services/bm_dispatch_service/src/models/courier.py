@@ -0,0 +1,18 @@
+class CourierPosition:
+    __slots__ = ("courier_id", "lat", "lng", "updated_at")
+
+    def __init__(self, courier_id: int, lat: float, lng: float, updated_at: float):
+        self.courier_id = courier_id
+        self.lat = lat
+        self.lng = lng
+        self.updated_at = updated_at
+
+    def __repr__(self) -> str:
+        return f"CourierPosition({self.courier_id}, {self.lat:.6f}, {self.lng:.6f}, {self.updated_at:.3f})"
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, CourierPosition):
+            return NotImplemented
+        return (self.courier_id, self.lat, self.lng, self.updated_at) == (
+            other.courier_id, other.lat, other.lng, other.updated_at
+        )
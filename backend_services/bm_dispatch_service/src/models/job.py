@@ -0,0 +1,30 @@
+from typing import Dict, NamedTuple, Tuple
+
+
+class JobState:
+    PENDING = "pending"
+    OFFERED = "offered"
+    ACCEPTED = "accepted"
+
+
+class DispatchJob(NamedTuple):
+    job_id: int
+    lat: float
+    lng: float
+    # 0 is the most urgent service level
+    tier: int
+    deadline: float
+    created_at: float
+    attempts: int = 0
+    state: str = JobState.PENDING
+    courier_id: int | None = None
+    offer_expires_at: float | None = None
+    # couriers the job was offered to without being accepted, it is not offered to them again
+    excluded: Tuple[int, ...] = ()
+
+    def to_dict(self) -> Dict:
+        return self._asdict()
+
+    @classmethod
+    def from_dict(cls, values: Dict) -> "DispatchJob":
+        return cls(**{**values, "excluded": tuple(values.get("excluded", ()))})
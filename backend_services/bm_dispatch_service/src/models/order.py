@@ -0,0 +1,18 @@
+from typing import NamedTuple, Tuple
+
+
+class PendingOrder(NamedTuple):
+    order_id: int
+    lat: float
+    lng: float
+    created_at: float
+    # couriers the order must not be matched with, those that already passed on it
+    excluded: Tuple[int, ...] = ()
+
+
+class Assignment(NamedTuple):
+    order_id: int
+    courier_id: int
+    distance_m: float
+    eta_s: float
+    cost: float
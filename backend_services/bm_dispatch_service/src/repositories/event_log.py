@@ -0,0 +1,271 @@
+"""
+Append-only log of binary records in segment files.
+
+A record is a 17 byte header (sequence number, kind, payload length, CRC32 of the payload) followed by the
+payload. Appending only buffers the record; a writer task writes whatever has accumulated over
+commit_interval in one write and one fsync, so a burst of appends shares a single disk flush, and `sync`
+waits until a record is on disk. A segment is closed once it passes segment_bytes and the next one is named
+after its first sequence number, so segments wholly covered by a snapshot can be deleted whole.
+
+A crash can leave the last segment ending in a partial record: reading stops at the first record that is
+short or fails its checksum, and `open` truncates the segment there.
+"""
+import asyncio
+import logging
+import os
+import struct
+import time
+import zlib
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, List, Tuple
+
+_Logger = logging.getLogger(__name__)
+
+_HEADER = struct.Struct("<QBII")
+_SUFFIX = ".log"
+
+
+class LogStats:
+    __slots__ = ("appended", "appended_bytes", "commits", "last_commit_ms", "segments_deleted")
+
+    def __init__(self):
+        self.appended = 0
+        self.appended_bytes = 0
+        self.commits = 0
+        self.last_commit_ms = 0.0
+        self.segments_deleted = 0
+
+    def as_dict(self) -> Dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class EventLog:
+    def __init__(self, directory: str | Path, segment_bytes: int, commit_interval: float, fsync: bool = True):
+        self.directory = Path(directory)
+        self._segment_bytes = segment_bytes
+        self._commit_interval = commit_interval
+        self._fsync = fsync
+        self._file: BinaryIO | None = None
+        self._segment_size = 0
+        self._last_seq = 0
+        self._synced_seq = 0
+        self._buffer: List[bytes] = []
+        self._waiters: List[Tuple[int, asyncio.Future]] = []
+        self._pending = asyncio.Event()
+        self._committing = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+        self.stats = LogStats()
+
+    @property
+    def last_seq(self) -> int:
+        return self._last_seq
+
+    def segments(self) -> List[Tuple[int, Path]]:
+        """
+        (first sequence number, path) of every segment, oldest first
+        """
+        return sorted((int(path.stem), path) for path in self.directory.glob(f"*{_SUFFIX}"))
+
+    def records(self, after_seq: int = 0) -> Iterator[Tuple[int, int, memoryview]]:
+        """
+        (seq, kind, payload) of every intact record after `after_seq`, oldest first
+        """
+        segments = self.segments()
+        for index, (first_seq, path) in enumerate(segments):
+            following = segments[index + 1][0] if index + 1 < len(segments) else None
+            if following is not None and following <= after_seq + 1:
+                continue
+            for seq, kind, payload, _ in _read_segment(path):
+                if seq > after_seq:
+                    yield seq, kind, payload
+
+    def open(self, after_seq: int = 0):
+        """
+        Truncate a torn tail and start a new segment after the last intact record of any segment, or after
+        `after_seq` when a snapshot or the replay is ahead of the log
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        last_seq = after_seq
+        segments = self.segments()
+        if segments:
+            path = segments[-1][1]
+            end = 0
+            for seq, _, _, end in _read_segment(path):
+                last_seq = max(last_seq, seq)
+            if end < path.stat().st_size:
+                _Logger.warning("truncating %s at %s bytes, past its last intact record", path.name, end)
+                with open(path, "r+b") as segment:
+                    segment.truncate(end)
+                    os.fsync(segment.fileno())
+            if not end:
+                # empty right after a rotation, or torn at its first record: the older segments hold the last seq
+                path.unlink()
+                last_seq = max(last_seq, _last_intact_seq(segments[:-1]))
+
+        self._last_seq = self._synced_seq = last_seq
+        self._open_segment(last_seq)
+
+    def append(self, kind: int, payload: bytes) -> int:
+        """
+        Buffer a record, returning its sequence number; it is on disk once `sync` of it returns
+        """
+        self._last_seq += 1
+        self._buffer.append(_HEADER.pack(self._last_seq, kind, len(payload), zlib.crc32(payload)))
+        self._buffer.append(payload)
+        self.stats.appended += 1
+        self.stats.appended_bytes += _HEADER.size + len(payload)
+        self._pending.set()
+        return self._last_seq
+
+    async def sync(self, seq: int | None = None):
+        seq = self._last_seq if seq is None else seq
+        if seq <= self._synced_seq:
+            return
+        if self._task is None:
+            await self.commit()
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append((seq, future))
+        await future
+
+    async def commit(self):
+        """
+        Write and fsync everything appended so far
+        """
+        async with self._committing:
+            await self._commit()
+
+    async def rotate(self):
+        """
+        Commit, then start a new segment, so everything up to now can be dropped once a snapshot covers it
+        """
+        async with self._committing:
+            await self._commit()
+            if self._segment_size:
+                self._file.close()
+                self._open_segment(self._synced_seq)
+
+    def drop_through(self, seq: int) -> int:
+        """
+        Delete the segments holding nothing after `seq`, returning how many
+        """
+        segments = self.segments()
+        dropped = 0
+        # a segment ends where the next begins; the one being written is never dropped
+        for (_, path), (following, _) in zip(segments, segments[1:]):
+            if following > seq + 1:
+                break
+            path.unlink()
+            dropped += 1
+        self.stats.segments_deleted += dropped
+        return dropped
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run(), name="event-log")
+
+    async def close(self):
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+        await self.commit()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    async def _run(self):
+        while True:
+            await self._pending.wait()
+            # group commit: whatever else is appended meanwhile shares the fsync
+            await asyncio.sleep(self._commit_interval)
+            self._pending.clear()
+            try:
+                await self.commit()
+            except Exception as exc:
+                _Logger.exception("committing the event log failed")
+                waiting, self._waiters = self._waiters, []
+                for _, future in waiting:
+                    if not future.done():
+                        future.set_exception(exc)
+
+    async def _commit(self):
+        if not self._buffer:
+            return
+
+        buffer, self._buffer = self._buffer, []
+        last_seq = self._last_seq
+        started = time.perf_counter()
+        # the write and fsync block, off the event loop
+        await asyncio.to_thread(self._write, b"".join(buffer))
+        self._synced_seq = last_seq
+        self.stats.commits += 1
+        self.stats.last_commit_ms = round((time.perf_counter() - started) * 1000, 3)
+
+        waiting, self._waiters = self._waiters, []
+        for seq, future in waiting:
+            if seq > last_seq:
+                self._waiters.append((seq, future))
+            elif not future.done():
+                future.set_result(None)
+
+        if self._segment_size >= self._segment_bytes:
+            self._file.close()
+            self._open_segment(last_seq)
+
+    def _open_segment(self, after_seq: int):
+        path = self.directory / f"{after_seq + 1:020d}{_SUFFIX}"
+        self._file = open(path, "ab")
+        self._segment_size = self._file.tell()
+        if self._fsync:
+            # the new file's directory entry has to survive a crash too
+            fsync_directory(self.directory)
+
+    def _write(self, data: bytes):
+        self._file.write(data)
+        self._file.flush()
+        if self._fsync:
+            os.fsync(self._file.fileno())
+        self._segment_size += len(data)
+
+
+def _read_segment(path: Path) -> Iterator[Tuple[int, int, memoryview, int]]:
+    """
+    (seq, kind, payload, end offset) of each intact record of the segment
+    """
+    data = memoryview(path.read_bytes())
+    offset = 0
+    while offset + _HEADER.size <= len(data):
+        seq, kind, length, crc = _HEADER.unpack_from(data, offset)
+        start = offset + _HEADER.size
+        payload = data[start:start + length]
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            return
+        offset = start + length
+        yield seq, kind, payload, offset
+
+
+def _last_intact_seq(segments: List[Tuple[int, Path]]) -> int:
+    """
+    Sequence number of the newest intact record of the segments, 0 when they hold none
+    """
+    for _, path in reversed(segments):
+        last_seq = 0
+        for seq, _, _, _ in _read_segment(path):
+            last_seq = seq
+        if last_seq:
+            return last_seq
+    return 0
+
+
+def fsync_directory(directory: Path):
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
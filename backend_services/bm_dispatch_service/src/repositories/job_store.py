@@ -0,0 +1,272 @@
+"""
+Durable state of dispatch jobs.
+
+Every live job is in exactly one of three sorted sets, by state: pending jobs scored by priority, offered
+jobs by the time their offer expires and accepted jobs by when they were accepted, with the job itself kept
+as a record beside them. Jobs only ever move through `Transition`s, each applied atomically: the job leaves
+its source set only if it is still there, and only if its offer is still the one the transition was made
+for, so a transition racing another one (an offer expiring as the courier accepts it, and going to another
+courier) is refused rather than applied twice. Every transition applied is appended to an event
+log.
+
+RedisJobStore keeps the sets, a hash of records and a stream of events in Redis, applying each transition in
+one Lua script and a batch of them in one pipeline. Nothing has to be rebuilt after a restart, the sets are
+the scheduler's state. MemoryJobStore is the stand-in used without Redis; it forgets everything on restart
+unless a journal is attached through `on_applied` and restores it.
+"""
+import heapq
+import json
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import AsyncIterator, Awaitable, Callable, Deque, Dict, List, NamedTuple, Sequence, Tuple
+
+from redis.asyncio import Redis
+from src.models.job import DispatchJob, JobState
+
+STATES = (JobState.PENDING, JobState.OFFERED, JobState.ACCEPTED)
+
+
+class Transition(NamedTuple):
+    job_id: int
+    # the state the job must be in, None for a job that must not exist yet
+    source: str | None
+    # None once the job is done and its record is dropped
+    destination: str | None
+    score: float = 0.0
+    job: DispatchJob | None = None
+    event: str = ""
+    # the attempt the job's offer must still be on, 0 for any: an offer expired and made again meanwhile is
+    # another courier's
+    offer: int = 0
+
+
+class JobStore(ABC):
+    @abstractmethod
+    async def apply(self, transitions: Sequence[Transition]) -> List[bool]:
+        """
+        Apply the transitions in order, returning for each whether its job was in its source state
+        """
+
+    @abstractmethod
+    async def get(self, job_id: int) -> DispatchJob | None:
+        pass
+
+    @abstractmethod
+    async def lowest(self, state: str, limit: int, max_score: float = float("inf")) -> List[DispatchJob]:
+        """
+        Up to `limit` jobs in the state, lowest score first, leaving them there
+        """
+
+    @abstractmethod
+    def scan(self, state: str, chunk: int) -> AsyncIterator[List[DispatchJob]]:
+        """
+        Every job in the state, `chunk` at a time
+        """
+
+    @abstractmethod
+    async def counts(self) -> Dict[str, int]:
+        pass
+
+    async def close(self):
+        pass
+
+
+class _Queue:
+    """
+    A sorted set: scores by id, and a heap of (score, id) whose entries no longer matching the scores are
+    skipped lazily
+    """
+    __slots__ = ("scores", "heap")
+
+    def __init__(self):
+        self.scores: Dict[int, float] = {}
+        self.heap: List[Tuple[float, int]] = []
+
+    def add(self, job_id: int, score: float):
+        self.scores[job_id] = score
+        heapq.heappush(self.heap, (score, job_id))
+        if len(self.heap) > 2 * len(self.scores) + 1024:
+            self.heap = [(score, job_id) for job_id, score in self.scores.items()]
+            heapq.heapify(self.heap)
+
+    def remove(self, job_id: int) -> bool:
+        return self.scores.pop(job_id, None) is not None
+
+    def lowest(self, limit: int, max_score: float) -> List[int]:
+        taken = []
+        seen = set()
+        while self.heap and len(taken) < limit:
+            score, job_id = self.heap[0]
+            # a job that left and came back with the same score has a second entry, matching just as well
+            if self.scores.get(job_id) != score or job_id in seen:
+                heapq.heappop(self.heap)
+            elif score > max_score:
+                break
+            else:
+                taken.append(heapq.heappop(self.heap))
+                seen.add(job_id)
+        for entry in taken:
+            heapq.heappush(self.heap, entry)
+        return [job_id for _, job_id in taken]
+
+
+class MemoryJobStore(JobStore):
+    def __init__(self, events_max_length: int = 10_000):
+        self._jobs: Dict[int, DispatchJob] = {}
+        self._queues = {state: _Queue() for state in STATES}
+        self.events: Deque[Tuple[int, str]] = deque(maxlen=events_max_length)
+        # awaited with each batch's applied transitions before `apply` returns, to make them durable
+        self.on_applied: Callable[[List[Transition]], Awaitable] | None = None
+
+    async def apply(self, transitions: Sequence[Transition]) -> List[bool]:
+        applied = []
+        done = []
+        for transition in transitions:
+            job_id = transition.job_id
+            if transition.source is None:
+                allowed = job_id not in self._jobs
+            elif transition.offer and job_id in self._jobs and self._jobs[job_id].attempts != transition.offer:
+                allowed = False
+            else:
+                allowed = self._queues[transition.source].remove(job_id)
+            applied.append(allowed)
+            if not allowed:
+                continue
+
+            if transition.destination is None:
+                self._jobs.pop(job_id, None)
+            else:
+                self._queues[transition.destination].add(job_id, transition.score)
+                self._jobs[job_id] = transition.job
+            self.events.append((job_id, transition.event))
+            done.append(transition)
+
+        if done and self.on_applied is not None:
+            await self.on_applied(done)
+        return applied
+
+    def restore(self, transitions: Sequence[Transition]):
+        """
+        Put each job in its transition's destination, whatever state it is in now, without checks or events
+        """
+        for transition in transitions:
+            job_id = transition.job_id
+            for queue in self._queues.values():
+                queue.remove(job_id)
+            if transition.destination is None:
+                self._jobs.pop(job_id, None)
+            else:
+                self._queues[transition.destination].add(job_id, transition.score)
+                self._jobs[job_id] = transition.job
+
+    def export(self) -> List[Transition]:
+        """
+        Every job as the transition that would restore it
+        """
+        return [
+            Transition(job_id, None, state, score, self._jobs[job_id])
+            for state, queue in self._queues.items() for job_id, score in queue.scores.items()
+        ]
+
+    async def get(self, job_id: int) -> DispatchJob | None:
+        return self._jobs.get(job_id)
+
+    async def lowest(self, state: str, limit: int, max_score: float = float("inf")) -> List[DispatchJob]:
+        return [self._jobs[job_id] for job_id in self._queues[state].lowest(limit, max_score)]
+
+    async def scan(self, state: str, chunk: int) -> AsyncIterator[List[DispatchJob]]:
+        job_ids = list(self._queues[state].scores)
+        for start in range(0, len(job_ids), chunk):
+            yield [self._jobs[job_id] for job_id in job_ids[start:start + chunk]]
+
+    async def counts(self) -> Dict[str, int]:
+        return {state: len(queue.scores) for state, queue in self._queues.items()}
+
+
+# KEYS: the pending, offered and accepted sorted sets, the record hash and the event stream
+# ARGV: job id, source state ('' for a new job), destination state ('' to drop the job), score, record,
+# event, stream max length, the attempt the offer must be on ('0' for any)
+_TRANSITION = """
+local sets = {pending = KEYS[1], offered = KEYS[2], accepted = KEYS[3]}
+local id = ARGV[1]
+if ARGV[8] ~= '0' then
+    local current = redis.call('HGET', KEYS[4], id)
+    if current and cjson.decode(current)['attempts'] ~= tonumber(ARGV[8]) then return 0 end
+end
+if ARGV[2] == '' then
+    if redis.call('HEXISTS', KEYS[4], id) == 1 then return 0 end
+elseif redis.call('ZREM', sets[ARGV[2]], id) == 0 then
+    return 0
+end
+if ARGV[3] == '' then
+    redis.call('HDEL', KEYS[4], id)
+else
+    redis.call('ZADD', sets[ARGV[3]], ARGV[4], id)
+    redis.call('HSET', KEYS[4], id, ARGV[5])
+end
+redis.call('XADD', KEYS[5], 'MAXLEN', '~', ARGV[7], '*', 'job', id, 'event', ARGV[6], 'record', ARGV[5])
+return 1
+"""
+
+
+class RedisJobStore(JobStore):
+    def __init__(self, redis: Redis, key_prefix: str, events_max_length: int):
+        self._redis = redis
+        self._sets = {state: f"{key_prefix}:{state}" for state in STATES}
+        self._records = f"{key_prefix}:records"
+        self._events = f"{key_prefix}:events"
+        self._keys = [*self._sets.values(), self._records, self._events]
+        self._events_max_length = events_max_length
+        self._transition = redis.register_script(_TRANSITION)
+
+    async def apply(self, transitions: Sequence[Transition]) -> List[bool]:
+        if not transitions:
+            return []
+
+        # one round trip for the batch; each script is atomic on its own, which is all a transition needs
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for transition in transitions:
+                record = "" if transition.job is None else json.dumps(transition.job.to_dict())
+                await self._transition(keys=self._keys, args=[
+                    transition.job_id, transition.source or "", transition.destination or "", transition.score,
+                    record, transition.event, self._events_max_length, transition.offer,
+                ], client=pipe)
+            results = await pipe.execute()
+        return [result == 1 for result in results]
+
+    async def get(self, job_id: int) -> DispatchJob | None:
+        return self._decode(await self._redis.hget(self._records, job_id))
+
+    async def lowest(self, state: str, limit: int, max_score: float = float("inf")) -> List[DispatchJob]:
+        maximum = "+inf" if max_score == float("inf") else max_score
+        job_ids = await self._redis.zrangebyscore(self._sets[state], "-inf", maximum, start=0, num=limit)
+        return await self._records_of(job_ids)
+
+    async def scan(self, state: str, chunk: int) -> AsyncIterator[List[DispatchJob]]:
+        job_ids = []
+        async for job_id, _ in self._redis.zscan_iter(self._sets[state], count=chunk):
+            job_ids.append(job_id)
+            if len(job_ids) >= chunk:
+                yield await self._records_of(job_ids)
+                job_ids = []
+        if job_ids:
+            yield await self._records_of(job_ids)
+
+    async def counts(self) -> Dict[str, int]:
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for key in self._sets.values():
+                pipe.zcard(key)
+            return dict(zip(self._sets, await pipe.execute()))
+
+    async def close(self):
+        await self._redis.aclose()
+
+    async def _records_of(self, job_ids: List) -> List[DispatchJob]:
+        if not job_ids:
+            return []
+        # a job done with between the two reads has no record left, and is skipped
+        return [job for job in map(self._decode, await self._redis.hmget(self._records, job_ids)) if job]
+
+    @staticmethod
+    def _decode(record: bytes | None) -> DispatchJob | None:
+        return None if record is None else DispatchJob.from_dict(json.loads(record))
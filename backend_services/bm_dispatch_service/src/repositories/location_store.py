@@ -0,0 +1,356 @@
+"""
+In-memory courier location index.
+
+Positions live in parallel typed arrays indexed by a slot number, so a courier costs a few dozen bytes
+instead of a Python object per field. A uniform lat/lng grid maps each cell to a compact array of the
+slots inside it: moving a courier is O(1) (swap-remove from the old cell, append to the new one), radius
+queries scan the cells overlapping the circle and k-nearest queries expand ring by ring around the
+query cell until no unvisited cell can hold a closer courier.
+"""
+import heapq
+import math
+import time
+from array import array
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+from src.helpers.geo import METRES_PER_DEGREE_LAT, haversine_m, metres_per_degree_lng
+from src.models.courier import CourierPosition
+
+DEFAULT_CELL_SIZE_DEG = 0.01  # about 1.1km at the equator
+
+_NO_SLOT = -1
+
+# a courier's position as a row of a numpy array, the form positions are exported, snapshotted and loaded in
+POSITION_ROW = np.dtype([("courier_id", "<i8"), ("lat", "<f8"), ("lng", "<f8"), ("updated_at", "<f8")])
+
+# the equirectangular pre-filter may be off by a fraction of a percent over long distances
+_PREFILTER_MARGIN = 1.01
+
+
+def _cos_deg(lat: float) -> float:
+    return math.cos(math.radians(min(lat, 90.0)))
+
+
+def _wrap_lng(d_lng: float) -> float:
+    if d_lng > 180:
+        return d_lng - 360
+    if d_lng < -180:
+        return d_lng + 360
+    return d_lng
+
+
+class CourierLocationStore:
+    __slots__ = (
+        "cell_size",
+        "_rows",
+        "_cols",
+        "_slots",
+        "_ids",
+        "_lats",
+        "_lngs",
+        "_updated_at",
+        "_slot_cell",
+        "_slot_offset",
+        "_cells",
+        "_free",
+    )
+
+    def __init__(self, cell_size: float = DEFAULT_CELL_SIZE_DEG):
+        self.cell_size = cell_size
+        self._rows = math.ceil(180 / cell_size) + 1
+        self._cols = math.ceil(360 / cell_size)
+
+        self._slots: Dict[int, int] = {}
+        self._ids = array("q")
+        self._lats = array("d")
+        self._lngs = array("d")
+        self._updated_at = array("d")
+        self._slot_cell = array("q")
+        # position of the slot inside its cell's array, for O(1) removal
+        self._slot_offset = array("q")
+        self._cells: Dict[int, array] = {}
+        self._free = array("q")
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __contains__(self, courier_id: int) -> bool:
+        return courier_id in self._slots
+
+    def cell_of(self, lat: float, lng: float) -> int:
+        row, col = self._row_col(lat, lng)
+        return row * self._cols + col
+
+    def update(self, courier_id: int, lat: float, lng: float, updated_at: float | None = None):
+        if not -90 <= lat <= 90 or not -180 <= lng <= 180:
+            raise ValueError(f"invalid coordinates ({lat}, {lng})")
+
+        cell = self.cell_of(lat, lng)
+        slot = self._slots.get(courier_id)
+
+        if slot is None:
+            slot = self._allocate(courier_id)
+            self._add_to_cell(slot, cell)
+        elif self._slot_cell[slot] != cell:
+            self._remove_from_cell(slot)
+            self._add_to_cell(slot, cell)
+
+        self._lats[slot] = lat
+        self._lngs[slot] = lng
+        self._updated_at[slot] = time.time() if updated_at is None else updated_at
+
+    def update_many(self, updates: Iterable[Tuple[int, float, float, float]]):
+        for courier_id, lat, lng, updated_at in updates:
+            self.update(courier_id, lat, lng, updated_at)
+
+    def load(self, rows: np.ndarray):
+        """
+        Bulk load POSITION_ROW rows of distinct couriers, building the arrays and cells in a few vectorised
+        passes instead of one update per courier. Only an empty store is loaded in bulk.
+        """
+        if self._slots:
+            self.update_many(rows.tolist())
+            return
+
+        lats, lngs = rows["lat"], rows["lng"]
+        if len(rows) and ((np.abs(lats) > 90).any() or (np.abs(lngs) > 180).any()):
+            raise ValueError("invalid coordinates")
+
+        count = len(rows)
+        # the same arithmetic as _row_col, element-wise
+        row = np.minimum(self._rows - 1, ((lats + 90) // self.cell_size).astype(np.int64))
+        col = (((lngs + 180) % 360) // self.cell_size).astype(np.int64) % self._cols
+        cells = row * self._cols + col
+
+        order = np.argsort(cells, kind="stable")
+        members = cells[order]
+        cell_ids, starts, sizes = np.unique(members, return_index=True, return_counts=True)
+        offsets = np.empty(count, dtype=np.int64)
+        offsets[order] = np.arange(count) - np.repeat(starts, sizes)
+
+        self._ids = array("q", rows["courier_id"].astype(np.int64).tobytes())
+        self._lats = array("d", lats.astype(np.float64).tobytes())
+        self._lngs = array("d", lngs.astype(np.float64).tobytes())
+        self._updated_at = array("d", rows["updated_at"].astype(np.float64).tobytes())
+        self._slot_cell = array("q", cells.tobytes())
+        self._slot_offset = array("q", offsets.tobytes())
+        self._free = array("q")
+        self._slots = dict(zip(self._ids, range(count)))
+        self._cells = {
+            cell: array("q", order[start:start + size].tobytes())
+            for cell, start, size in zip(cell_ids.tolist(), starts.tolist(), sizes.tolist())
+        }
+
+    def export(self) -> np.ndarray:
+        """
+        Every courier's position as POSITION_ROW rows
+        """
+        ids = np.frombuffer(self._ids, dtype=np.int64)
+        live = ids != _NO_SLOT
+        rows = np.empty(int(live.sum()), dtype=POSITION_ROW)
+        rows["courier_id"] = ids[live]
+        rows["lat"] = np.frombuffer(self._lats, dtype=np.float64)[live]
+        rows["lng"] = np.frombuffer(self._lngs, dtype=np.float64)[live]
+        rows["updated_at"] = np.frombuffer(self._updated_at, dtype=np.float64)[live]
+        return rows
+
+    def remove(self, courier_id: int) -> bool:
+        slot = self._slots.pop(courier_id, None)
+        if slot is None:
+            return False
+
+        self._remove_from_cell(slot)
+        self._ids[slot] = _NO_SLOT
+        self._free.append(slot)
+        return True
+
+    def get(self, courier_id: int) -> CourierPosition | None:
+        slot = self._slots.get(courier_id)
+        return None if slot is None else self._position(slot)
+
+    def within_radius(self, lat: float, lng: float, radius_m: float, limit: int | None = None
+                      ) -> List[Tuple[CourierPosition, float]]:
+        """
+        Couriers within `radius_m` of the point, nearest first
+        """
+        d_lat = radius_m / METRES_PER_DEGREE_LAT
+        # the circle is widest, in degrees of longitude, on its edge furthest from the equator
+        d_lng = radius_m / metres_per_degree_lng(abs(lat) + d_lat)
+        min_row, min_col = self._row_col(max(-90.0, lat - d_lat), lng - d_lng)
+        max_row, max_col = self._row_col(min(90.0, lat + d_lat), lng + d_lng)
+        span = (max_col - min_col) % self._cols if d_lng < 180 else self._cols - 1
+
+        # cos of the latitude furthest from the equator keeps the planar pre-filter an underestimate
+        cos_lat = _cos_deg(abs(lat) + d_lat)
+        found = []
+        if (max_row - min_row + 1) * (span + 1) > len(self._cells):
+            # more cells in the bounding box than occupied cells: check every courier instead
+            self._collect_within(self._slots.values(), lat, lng, cos_lat, radius_m, found)
+        else:
+            for row in range(min_row, max_row + 1):
+                for step in range(span + 1):
+                    members = self._cells.get(row * self._cols + (min_col + step) % self._cols)
+                    if members:
+                        self._collect_within(members, lat, lng, cos_lat, radius_m, found)
+
+        found.sort()
+        if limit is not None:
+            found = found[:limit]
+
+        return [(self._position(slot), distance) for distance, slot in found]
+
+    def nearest(self, lat: float, lng: float, k: int, max_radius_m: float | None = None
+                ) -> List[Tuple[CourierPosition, float]]:
+        """
+        The k couriers nearest to the point, optionally no further than `max_radius_m`, nearest first
+        """
+        if k <= 0 or not self._slots:
+            return []
+
+        center_row, center_col = self._row_col(lat, lng)
+        cell_height_m = self.cell_size * METRES_PER_DEGREE_LAT
+        max_ring = max(self._rows, self._cols)
+        best: List[Tuple[float, int]] = []  # max-heap of (-distance, slot)
+        lats, lngs = self._lats, self._lngs
+        visited = 0
+
+        for ring in range(max_ring):
+            # sparse data far from the point: scanning occupied cells beats walking empty rings
+            if visited > len(self._cells):
+                return self._nearest_by_scan(lat, lng, k, max_radius_m)
+
+            cos_lat = _cos_deg(abs(lat) + (ring + 1) * self.cell_size)
+            for cell in self._ring_cells(center_row, center_col, ring):
+                visited += 1
+                members = self._cells.get(cell)
+                if not members:
+                    continue
+                for slot in members:
+                    if len(best) == k:
+                        # skip the haversine for couriers that clearly can't beat the current k-th best
+                        d_lat = lats[slot] - lat
+                        d_lng = _wrap_lng(lngs[slot] - lng) * cos_lat
+                        worst = -best[0][0] * _PREFILTER_MARGIN / METRES_PER_DEGREE_LAT
+                        if d_lat * d_lat + d_lng * d_lng > worst * worst:
+                            continue
+
+                    distance = haversine_m(lat, lng, lats[slot], lngs[slot])
+                    if max_radius_m is not None and distance > max_radius_m:
+                        continue
+                    if len(best) < k:
+                        heapq.heappush(best, (-distance, slot))
+                    elif distance < -best[0][0]:
+                        heapq.heapreplace(best, (-distance, slot))
+
+            # every cell outside the rings visited so far is at least this far from the point
+            cell_width_m = self.cell_size * metres_per_degree_lng(abs(lat) + (ring + 1) * self.cell_size)
+            bound = ring * min(cell_height_m, cell_width_m)
+            if len(best) == k and -best[0][0] <= bound:
+                break
+            if max_radius_m is not None and bound > max_radius_m:
+                break
+            if len(best) == len(self._slots):
+                break
+
+        return [(self._position(slot), -negative) for negative, slot in sorted(best, reverse=True)]
+
+    def _nearest_by_scan(self, lat: float, lng: float, k: int, max_radius_m: float | None):
+        lats, lngs = self._lats, self._lngs
+        candidates = (
+            (haversine_m(lat, lng, lats[slot], lngs[slot]), slot) for slot in self._slots.values()
+        )
+        if max_radius_m is not None:
+            candidates = ((distance, slot) for distance, slot in candidates if distance <= max_radius_m)
+
+        return [(self._position(slot), distance) for distance, slot in heapq.nsmallest(k, candidates)]
+
+    def _collect_within(self, slots: Iterable[int], lat: float, lng: float, cos_lat: float, radius_m: float,
+                        found: List[Tuple[float, int]]):
+        lats, lngs = self._lats, self._lngs
+        limit = (radius_m * _PREFILTER_MARGIN / METRES_PER_DEGREE_LAT) ** 2
+
+        for slot in slots:
+            d_lat = lats[slot] - lat
+            d_lng = _wrap_lng(lngs[slot] - lng) * cos_lat
+            if d_lat * d_lat + d_lng * d_lng > limit:
+                continue
+
+            distance = haversine_m(lat, lng, lats[slot], lngs[slot])
+            if distance <= radius_m:
+                found.append((distance, slot))
+
+    def positions(self) -> Iterable[CourierPosition]:
+        for slot in self._slots.values():
+            yield self._position(slot)
+
+    def _row_col(self, lat: float, lng: float) -> Tuple[int, int]:
+        row = min(self._rows - 1, int((lat + 90) // self.cell_size))
+        col = int(((lng + 180) % 360) // self.cell_size) % self._cols
+        return row, col
+
+    def _ring_cells(self, center_row: int, center_col: int, ring: int):
+        if ring == 0:
+            yield center_row * self._cols + center_col
+            return
+
+        cols = self._cols
+        # a ring wider than the grid would visit columns twice
+        if 2 * ring + 1 > cols:
+            col_steps = range(-(cols // 2), cols - cols // 2)
+        else:
+            col_steps = range(-ring, ring + 1)
+
+        for row in (center_row - ring, center_row + ring):
+            if 0 <= row < self._rows:
+                for step in col_steps:
+                    yield row * cols + (center_col + step) % cols
+
+        if 2 * ring + 1 > cols:
+            return
+        for row in range(max(0, center_row - ring + 1), min(self._rows, center_row + ring)):
+            yield row * cols + (center_col - ring) % cols
+            yield row * cols + (center_col + ring) % cols
+
+    def _allocate(self, courier_id: int) -> int:
+        if self._free:
+            slot = self._free.pop()
+            self._ids[slot] = courier_id
+        else:
+            slot = len(self._ids)
+            self._ids.append(courier_id)
+            self._lats.append(0.0)
+            self._lngs.append(0.0)
+            self._updated_at.append(0.0)
+            self._slot_cell.append(_NO_SLOT)
+            self._slot_offset.append(_NO_SLOT)
+
+        self._slots[courier_id] = slot
+        return slot
+
+    def _add_to_cell(self, slot: int, cell: int):
+        members = self._cells.get(cell)
+        if members is None:
+            members = self._cells[cell] = array("q")
+
+        self._slot_cell[slot] = cell
+        self._slot_offset[slot] = len(members)
+        members.append(slot)
+
+    def _remove_from_cell(self, slot: int):
+        cell = self._slot_cell[slot]
+        members = self._cells[cell]
+        offset = self._slot_offset[slot]
+
+        last = members.pop()
+        if last != slot:
+            members[offset] = last
+            self._slot_offset[last] = offset
+        if not members:
+            del self._cells[cell]
+
+        self._slot_cell[slot] = _NO_SLOT
+        self._slot_offset[slot] = _NO_SLOT
+
+    def _position(self, slot: int) -> CourierPosition:
+        return CourierPosition(self._ids[slot], self._lats[slot], self._lngs[slot], self._updated_at[slot])
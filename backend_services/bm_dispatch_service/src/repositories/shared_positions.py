@@ -0,0 +1,160 @@
+"""
+Courier positions in shared memory.
+
+One fixed-capacity block holds a row per courier slot: id, lat, lng, update time and the number of orders
+the courier carries. The owning process is the only writer and keeps the courier -> slot mapping; shard
+workers attach to the same block by name and read rows by slot, so an update crosses the process boundary
+as an 8 byte slot number instead of a pickled position.
+"""
+from collections.abc import MutableMapping
+from multiprocessing import shared_memory
+from typing import Callable, Dict, Iterator
+
+import numpy as np
+
+NO_COURIER = -1
+
+_FIELDS = (("ids", np.int64), ("lats", np.float64), ("lngs", np.float64), ("updated_at", np.float64),
+           ("loads", np.int32))
+
+
+class SharedPositionTable:
+    def __init__(self, capacity: int, name: str | None = None):
+        """
+        `open` creates the block, or attaches to an existing one when `name` is given
+        """
+        self.capacity = capacity
+        self._attach_to = name
+        self._shm: shared_memory.SharedMemory | None = None
+        for field, _ in _FIELDS:
+            setattr(self, field, None)
+
+        self._slots: Dict[int, int] = {}
+        self._free = []
+        self._next_slot = 0
+
+    def open(self) -> "SharedPositionTable":
+        if self._shm is not None:
+            return self
+
+        size = sum(np.dtype(dtype).itemsize for _, dtype in _FIELDS) * self.capacity
+        self._shm = shared_memory.SharedMemory(name=self._attach_to, create=self._owner, size=size)
+
+        offset = 0
+        for field, dtype in _FIELDS:
+            column = np.ndarray((self.capacity,), dtype=dtype, buffer=self._shm.buf, offset=offset)
+            setattr(self, field, column)
+            offset += column.nbytes
+
+        if self._owner:
+            self.ids[:] = NO_COURIER
+            self.loads[:] = 0
+        return self
+
+    @property
+    def _owner(self) -> bool:
+        return self._attach_to is None
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def slot_of(self, courier_id: int) -> int | None:
+        return self._slots.get(courier_id)
+
+    def live_slots(self) -> np.ndarray:
+        """
+        The slots holding a courier, in slot order
+        """
+        return np.flatnonzero(self.ids[:self._next_slot] != NO_COURIER)
+
+    def write(self, courier_id: int, lat: float, lng: float, updated_at: float) -> int:
+        slot = self._slots.get(courier_id)
+        if slot is None:
+            slot = self._allocate(courier_id)
+
+        self.lats[slot] = lat
+        self.lngs[slot] = lng
+        self.updated_at[slot] = updated_at
+        return slot
+
+    def release(self, courier_id: int) -> int | None:
+        slot = self._slots.pop(courier_id, None)
+        if slot is not None:
+            self.ids[slot] = NO_COURIER
+            self.loads[slot] = 0
+            self._free.append(slot)
+        return slot
+
+    def close(self):
+        shm, self._shm = self._shm, None
+        if shm is None:
+            return
+
+        # the numpy views hold exports of the buffer, drop them before closing the mapping
+        for field, _ in _FIELDS:
+            setattr(self, field, None)
+        shm.close()
+        if self._owner:
+            shm.unlink()
+
+    def _allocate(self, courier_id: int) -> int:
+        if self._free:
+            slot = self._free.pop()
+        elif self._next_slot < self.capacity:
+            slot = self._next_slot
+            self._next_slot += 1
+        else:
+            raise MemoryError(f"shared position table is full ({self.capacity} couriers)")
+
+        self.ids[slot] = courier_id
+        self._slots[courier_id] = slot
+        return slot
+
+
+class SharedLoads(MutableMapping):
+    """
+    Orders each courier carries, read from and written to the table's loads column. Couriers carrying
+    nothing are absent, as in the engine's own dict. `slot_of` resolves a courier to its row; a row that
+    now belongs to another courier reads as absent.
+    """
+
+    def __init__(self, table: SharedPositionTable, slot_of: Callable[[int], int | None]):
+        self._table = table
+        self._slot_of = slot_of
+
+    def __getitem__(self, courier_id: int) -> int:
+        slot = self._slot(courier_id)
+        load = 0 if slot is None else int(self._table.loads[slot])
+        if not load:
+            raise KeyError(courier_id)
+        return load
+
+    def __setitem__(self, courier_id: int, load: int):
+        slot = self._slot(courier_id)
+        if slot is None:
+            raise KeyError(courier_id)
+        self._table.loads[slot] = load
+
+    def __delitem__(self, courier_id: int):
+        slot = self._slot(courier_id)
+        if slot is None or not self._table.loads[slot]:
+            raise KeyError(courier_id)
+        self._table.loads[slot] = 0
+
+    def __iter__(self) -> Iterator[int]:
+        table = self._table
+        return iter(table.ids[(table.loads > 0) & (table.ids != NO_COURIER)].tolist())
+
+    def __len__(self) -> int:
+        table = self._table
+        return int(((table.loads > 0) & (table.ids != NO_COURIER)).sum())
+
+    def _slot(self, courier_id: int) -> int | None:
+        slot = self._slot_of(courier_id)
+        if slot is None or self._table.ids[slot] != courier_id:
+            return None
+        return slot
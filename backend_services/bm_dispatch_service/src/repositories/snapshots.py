@@ -0,0 +1,131 @@
+"""
+Point-in-time snapshots of dispatch state as files of named numpy arrays.
+
+A snapshot is the 4 byte magic, a version byte, the length of a JSON header and the header itself (the
+log sequence number the snapshot is current to, and each array's dtype, length, offset and CRC32),
+followed by the arrays' raw bytes, each aligned to 64 bytes. Loading maps the file and hands out arrays
+viewing the mapping, so a snapshot of a million couriers is read without being copied or parsed row by row.
+
+A snapshot is written to a temporary file, flushed and renamed into place, so a crash leaves either the
+whole new snapshot or none of it. The newest `keep` snapshots are kept; one that fails its checksums on
+load is skipped for the one before it.
+"""
+import json
+import logging
+import mmap
+import os
+import struct
+import zlib
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Tuple
+
+import numpy as np
+from src.repositories.event_log import fsync_directory
+
+_Logger = logging.getLogger(__name__)
+
+_MAGIC = b"DSNP"
+_VERSION = 1
+_PREAMBLE = struct.Struct("<4sBI")
+_ALIGNMENT = 64
+_SUFFIX = ".snap"
+
+
+class Snapshot(NamedTuple):
+    # the last log record the snapshot includes
+    seq: int
+    arrays: Dict[str, np.ndarray]
+    path: Path
+
+
+class SnapshotStore:
+    def __init__(self, directory: str | Path, keep: int = 2, fsync: bool = True):
+        self.directory = Path(directory)
+        self._keep = max(1, keep)
+        self._fsync = fsync
+
+    def paths(self) -> List[Tuple[int, Path]]:
+        """
+        (seq, path) of every snapshot, newest first
+        """
+        if not self.directory.exists():
+            return []
+        return sorted(((int(path.stem), path) for path in self.directory.glob(f"*{_SUFFIX}")), reverse=True)
+
+    def write(self, seq: int, arrays: Dict[str, np.ndarray]) -> Path:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+
+        entries = {}
+        offset = 0
+        for name, array in arrays.items():
+            entries[name] = {
+                "dtype": np.lib.format.dtype_to_descr(array.dtype),
+                "length": len(array),
+                "offset": offset,
+                "crc": zlib.crc32(array),
+            }
+            offset = _aligned(offset + array.nbytes)
+        header = json.dumps({"seq": seq, "arrays": entries}).encode()
+        data_start = _aligned(_PREAMBLE.size + len(header))
+
+        path = self.directory / f"{seq:020d}{_SUFFIX}"
+        partial = path.with_suffix(".tmp")
+        with open(partial, "wb") as file:
+            file.write(_PREAMBLE.pack(_MAGIC, _VERSION, len(header)))
+            file.write(header)
+            for name, array in arrays.items():
+                file.seek(data_start + entries[name]["offset"])
+                file.write(array.data)
+            file.flush()
+            if self._fsync:
+                os.fsync(file.fileno())
+        os.replace(partial, path)
+        if self._fsync:
+            fsync_directory(self.directory)
+
+        for _, stale in self.paths()[self._keep:]:
+            stale.unlink()
+        return path
+
+    def load(self) -> Snapshot | None:
+        """
+        The newest intact snapshot, None without one
+        """
+        for _, path in self.paths():
+            try:
+                return _read(path)
+            except (ValueError, KeyError, OSError, struct.error) as exc:
+                _Logger.warning("skipping snapshot %s: %s", path.name, exc)
+        return None
+
+
+def _read(path: Path) -> Snapshot:
+    with open(path, "rb") as file:
+        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    magic, version, header_length = _PREAMBLE.unpack_from(mapped)
+    if magic != _MAGIC or version != _VERSION:
+        raise ValueError(f"not a version {_VERSION} snapshot")
+    header = json.loads(mapped[_PREAMBLE.size:_PREAMBLE.size + header_length])
+    data_start = _aligned(_PREAMBLE.size + header_length)
+
+    arrays = {}
+    for name, entry in header["arrays"].items():
+        dtype = np.lib.format.descr_to_dtype(entry["dtype"])
+        if not entry["length"]:
+            arrays[name] = np.empty(0, dtype=dtype)
+            continue
+        start = data_start + entry["offset"]
+        if start + entry["length"] * dtype.itemsize > len(mapped):
+            raise ValueError(f"{name} is truncated")
+        # the arrays view the mapping, which stays open for as long as any of them is referenced
+        array = np.frombuffer(mapped, dtype=dtype, count=entry["length"], offset=start)
+        if zlib.crc32(array) != entry["crc"]:
+            raise ValueError(f"{name} fails its checksum")
+        arrays[name] = array
+    return Snapshot(header["seq"], arrays, path)
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // _ALIGNMENT) * _ALIGNMENT
@@ -0,0 +1,32 @@
+import inspect
+
+from fastapi import APIRouter, Depends, Query
+from src.helpers.auth import get_current_account
+from src.helpers.dependencies import get_location_store
+from src.repositories.location_store import CourierLocationStore
+from src.services.shard_pool import ShardPool
+
+router = APIRouter(prefix="/couriers", tags=["couriers"], dependencies=[Depends(get_current_account)])
+
+
+@router.get("/nearby")
+async def nearby_couriers(
+        lat: float = Query(ge=-90, le=90),
+        lng: float = Query(ge=-180, le=180),
+        radius_m: float = Query(1000, gt=0, le=50_000),
+        limit: int = Query(20, ge=1, le=500),
+        store: CourierLocationStore | ShardPool = Depends(get_location_store),
+):
+    """
+    Couriers within `radius_m` of the point, nearest first
+    """
+    found = store.within_radius(lat, lng, radius_m, limit)
+    if inspect.isawaitable(found):
+        # a sharded store answers from its worker processes
+        found = await found
+
+    return [
+        {"courier_id": position.courier_id, "lat": position.lat, "lng": position.lng,
+         "updated_at": position.updated_at, "distance_m": round(distance, 1)}
+        for position, distance in found
+    ]
@@ -0,0 +1,92 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from pydantic import BaseModel, Field
+from src.helpers.auth import get_current_account
+from src.helpers.dependencies import get_dispatch_journal, get_job_scheduler, get_matching_engine, get_offer_dispatcher
+from src.models.account import CurrentAccount
+from src.services.dispatch_journal import DispatchJournal
+from src.services.job_scheduler import JobScheduler
+from src.services.matching_engine import MatchingEngine
+from src.services.offer_dispatcher import OfferDispatcher
+
+router = APIRouter(prefix="/dispatch", tags=["dispatch"], dependencies=[Depends(get_current_account)])
+
+
+class OrderRequest(BaseModel):
+    order_id: int
+    lat: float = Field(ge=-90, le=90)
+    lng: float = Field(ge=-180, le=180)
+    # service level, 0 is the most urgent; the configured default when left out
+    tier: int | None = Field(None, ge=0, le=9)
+    # epoch seconds the order should be picked up by, the tier's SLA from now when left out
+    deadline: float | None = None
+
+
+@router.post("/orders", status_code=status.HTTP_202_ACCEPTED)
+async def submit_order(order: OrderRequest, scheduler: JobScheduler = Depends(get_job_scheduler)):
+    """
+    Queue an order for dispatch, most urgent first
+    """
+    job = await scheduler.submit(order.order_id, order.lat, order.lng, order.tier, order.deadline)
+    if job is None:
+        raise HTTPException(status.HTTP_409_CONFLICT, detail=f"order {order.order_id} is already being dispatched")
+    return job.to_dict()
+
+
+@router.get("/orders/{order_id}")
+async def order_job(order_id: int, scheduler: JobScheduler = Depends(get_job_scheduler)):
+    job = await scheduler.get(order_id)
+    if job is None:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, detail=f"order {order_id} is not being dispatched")
+    return job.to_dict()
+
+
+@router.delete("/orders/{order_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def cancel_order(order_id: int, scheduler: JobScheduler = Depends(get_job_scheduler)):
+    await scheduler.cancel(order_id)
+
+
+@router.post("/orders/{order_id}/accept", status_code=status.HTTP_204_NO_CONTENT)
+async def accept_offer(
+        order_id: int,
+        account: CurrentAccount = Depends(get_current_account),
+        scheduler: JobScheduler = Depends(get_job_scheduler),
+        dispatcher: OfferDispatcher = Depends(get_offer_dispatcher),
+):
+    # answering over HTTP rather than the push socket still acknowledges the offer
+    dispatcher.acknowledge(account.account_id, order_id)
+    if not await scheduler.accept(order_id, account.account_id):
+        raise HTTPException(status.HTTP_409_CONFLICT, detail=f"order {order_id} is not on offer to you")
+
+
+@router.post("/orders/{order_id}/decline", status_code=status.HTTP_204_NO_CONTENT)
+async def decline_offer(
+        order_id: int,
+        account: CurrentAccount = Depends(get_current_account),
+        scheduler: JobScheduler = Depends(get_job_scheduler),
+        dispatcher: OfferDispatcher = Depends(get_offer_dispatcher),
+):
+    dispatcher.acknowledge(account.account_id, order_id)
+    if not await scheduler.decline(order_id, account.account_id):
+        raise HTTPException(status.HTTP_409_CONFLICT, detail=f"order {order_id} is not on offer to you")
+
+
+@router.post("/orders/{order_id}/complete", status_code=status.HTTP_204_NO_CONTENT)
+async def complete_order(
+        order_id: int,
+        account: CurrentAccount = Depends(get_current_account),
+        scheduler: JobScheduler = Depends(get_job_scheduler),
+):
+    if not await scheduler.complete(order_id, account.account_id):
+        raise HTTPException(status.HTTP_409_CONFLICT, detail=f"order {order_id} is not accepted by you")
+
+
+@router.get("/stats")
+async def dispatch_stats(
+        engine: MatchingEngine = Depends(get_matching_engine),
+        scheduler: JobScheduler = Depends(get_job_scheduler),
+        journal: DispatchJournal | None = Depends(get_dispatch_journal),
+):
+    stats = {**await scheduler.counts(), **engine.stats.as_dict(), "scheduler": scheduler.stats.as_dict()}
+    if journal is not None:
+        stats["journal"] = {**journal.stats.as_dict(), "log": journal.log.stats.as_dict()}
+    return stats
@@ -0,0 +1,47 @@
+from typing import List, Tuple
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from pydantic import BaseModel, Field
+from src import settings
+from src.helpers.auth import get_current_account
+from src.helpers.dependencies import get_eta_service
+from src.services.eta_service import EtaService
+
+router = APIRouter(prefix="/eta", tags=["eta"], dependencies=[Depends(get_current_account)])
+
+
+class EtaBatchRequest(BaseModel):
+    # (from_lat, from_lng, to_lat, to_lng)
+    pairs: List[Tuple[float, float, float, float]] = Field(min_length=1, max_length=settings.ETA.max_batch)
+    depart_at: float | None = None
+
+
+@router.get("")
+async def eta(
+        from_lat: float = Query(ge=-90, le=90),
+        from_lng: float = Query(ge=-180, le=180),
+        to_lat: float = Query(ge=-90, le=90),
+        to_lng: float = Query(ge=-180, le=180),
+        depart_at: float | None = None,
+        service: EtaService = Depends(get_eta_service),
+):
+    return {"eta_s": round(await service.eta(from_lat, from_lng, to_lat, to_lng, depart_at), 1)}
+
+
+@router.post("/batch")
+async def eta_batch(request: EtaBatchRequest, service: EtaService = Depends(get_eta_service)):
+    """
+    ETAs of up to ETA.max_batch pairs in one call, in request order
+    """
+    from_lats, from_lngs, to_lats, to_lngs = zip(*request.pairs)
+    try:
+        etas = await service.eta_many(from_lats, from_lngs, to_lats, to_lngs, request.depart_at)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+
+    return {"eta_s": etas.round(1).tolist()}
+
+
+@router.get("/stats")
+async def eta_stats(service: EtaService = Depends(get_eta_service)):
+    return {**service.stats.as_dict(), "cache": service.cache_stats, "table_cells": service.cells}
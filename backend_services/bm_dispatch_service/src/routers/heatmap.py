@@ -0,0 +1,30 @@
+from fastapi import APIRouter, Depends, Header, Query, Response, status
+from src.helpers.auth import get_current_account
+from src.helpers.dependencies import get_demand_heatmap
+from src.services.demand_heatmap import DemandHeatmap
+
+router = APIRouter(prefix="/heatmap", tags=["heatmap"], dependencies=[Depends(get_current_account)])
+
+_MEDIA_TYPES = {"json": "application/json", "binary": "application/octet-stream"}
+
+
+@router.get("")
+async def heatmap(
+        fmt: str = Query("json", alias="format", pattern="^(json|binary)$"),
+        if_none_match: str | None = Header(None),
+        heatmap: DemandHeatmap = Depends(get_demand_heatmap),
+):
+    """
+    Orders and average couriers per cell over the window; the ETag lets pollers skip unchanged heatmaps
+    """
+    payload, version = heatmap.render(fmt)
+    etag = f'"{fmt}-{version}"'
+    headers = {"ETag": etag, "Cache-Control": f"max-age={heatmap.cache_s:g}"}
+    if if_none_match == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(payload, media_type=_MEDIA_TYPES[fmt], headers=headers)
+
+
+@router.get("/stats")
+async def heatmap_stats(heatmap: DemandHeatmap = Depends(get_demand_heatmap)):
+    return {**heatmap.stats.as_dict(), "rows": heatmap.rows, "cols": heatmap.cols, "version": heatmap.version}
@@ -0,0 +1,64 @@
+from fastapi import APIRouter, Depends, WebSocket, status
+from src import settings
+from src.helpers.auth import get_current_account
+from src.helpers.dependencies import get_location_ingestor
+from src.helpers.location_frames import decode_frame
+from src.helpers.rate_limit import TokenBucket
+from src.models.account import CurrentAccount
+from src.services.location_ingestor import LocationIngestor
+
+router = APIRouter(tags=["locations"])
+
+
+@router.websocket("/ws/locations/{courier_id}")
+async def stream_locations(
+        websocket: WebSocket, courier_id: int, ingestor: LocationIngestor = Depends(get_location_ingestor),
+        account: CurrentAccount = Depends(get_current_account),
+):
+    """
+    Location pings from one courier, authenticated with the courier's own access token. Frames over the
+    rate limit are dropped, since a newer ping supersedes them anyway; a client that has max_dropped frames
+    in a row dropped, or sends a malformed frame, is disconnected.
+    """
+    if account.account_id != courier_id:
+        await websocket.close(status.WS_1008_POLICY_VIOLATION, "token was issued to another account")
+        return
+
+    config = settings.LOCATION_INGEST
+    await websocket.accept()
+
+    bucket = TokenBucket(config.frames_per_second, config.burst)
+    # dropped since the last frame accepted, so a long lived connection is not closed for bursts long apart
+    dropped = 0
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            return
+
+        frame = message.get("bytes")
+        if frame is None:
+            frame = message.get("text", "")
+
+        if len(frame) > config.max_frame_bytes:
+            await websocket.close(status.WS_1009_MESSAGE_TOO_BIG, "frame too large")
+            return
+
+        if not bucket.take():
+            dropped += 1
+            if dropped > config.max_dropped:
+                await websocket.close(status.WS_1008_POLICY_VIOLATION, "rate limit exceeded")
+                return
+            continue
+        dropped = 0
+
+        try:
+            lat, lng, sent_at = decode_frame(frame)
+            ingestor.submit(courier_id, lat, lng, sent_at)
+        except ValueError as exc:
+            await websocket.close(status.WS_1007_INVALID_FRAME_PAYLOAD_DATA, str(exc))
+            return
+
+
+@router.get("/locations/ingest/stats", dependencies=[Depends(get_current_account)])
+async def ingest_stats(ingestor: LocationIngestor = Depends(get_location_ingestor)):
+    return {"pending": ingestor.pending, **ingestor.stats.as_dict()}
@@ -0,0 +1,56 @@
+import json
+
+from fastapi import APIRouter, Depends, WebSocket, status
+from src.helpers.auth import get_current_account
+from src.helpers.dependencies import get_connection_registry, get_offer_dispatcher
+from src.models.account import CurrentAccount
+from src.services.connection_registry import ConnectionRegistry
+from src.services.offer_dispatcher import OfferDispatcher
+
+router = APIRouter(tags=["offers"])
+
+
+@router.websocket("/ws/offers/{courier_id}")
+async def offer_stream(
+        websocket: WebSocket, courier_id: int,
+        registry: ConnectionRegistry = Depends(get_connection_registry),
+        dispatcher: OfferDispatcher = Depends(get_offer_dispatcher),
+        account: CurrentAccount = Depends(get_current_account),
+):
+    """
+    Offers pushed to one courier, authenticated with the courier's own access token. The courier answers
+    each with an ack as soon as it is shown, then an accept or a decline.
+    """
+    if account.account_id != courier_id:
+        await websocket.close(status.WS_1008_POLICY_VIOLATION, "token was issued to another account")
+        return
+
+    await websocket.accept()
+    connection = registry.connect(courier_id, websocket)
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+
+            try:
+                request = json.loads(message.get("text") or message.get("bytes") or "")
+                reply = await dispatcher.handle(courier_id, request["type"], int(request["job_id"]))
+            except (ValueError, KeyError, TypeError) as exc:
+                connection.close(status.WS_1007_INVALID_FRAME_PAYLOAD_DATA, str(exc)[:120])
+                return
+            if reply is not None:
+                connection.push(reply)
+    finally:
+        await registry.disconnect(connection)
+
+
+@router.get("/offers/stats", dependencies=[Depends(get_current_account)])
+async def offer_stats(
+        registry: ConnectionRegistry = Depends(get_connection_registry),
+        dispatcher: OfferDispatcher = Depends(get_offer_dispatcher),
+):
+    return {
+        "connections": len(registry), "unacknowledged": dispatcher.unacknowledged,
+        **dispatcher.stats.as_dict(), "registry": registry.stats.as_dict(),
+    }
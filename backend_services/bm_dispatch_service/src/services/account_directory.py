@@ -0,0 +1,183 @@
+"""
+Minimal account profiles for dispatch, without calling account_serv while a request waits.
+
+account_serv caches every account in Redis under its bare id, as JSON or as a versioned binary record, and
+marks ids it found nothing for (src/helpers/account_records.py reads all three). Lookups go to a local TTL'd
+LRU first, then to that Redis, with the lookups of one event loop iteration sent as a single MGET. Accounts Redis does
+not have are fetched from account_serv's batch endpoint in the background, a lookup_delay_s window of misses
+per request, and are found in the local cache from then on; the request that missed carries on without a
+profile.
+"""
+import asyncio
+import json
+import logging
+import urllib.request
+from typing import Dict, Iterable, List, Set
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from src.helpers.account_records import MISSING, decode_account
+from src.helpers.ttl_cache import TTLCache
+from src.models.account import AccountProfile
+from src.settings import AccountDirectoryConfig
+
+_Logger = logging.getLogger(__name__)
+
+# cached for accounts account_serv does not know, so repeated lookups of them stay local
+_NOT_FOUND = object()
+
+
+class DirectoryStats:
+    __slots__ = ("redis_batches", "redis_hits", "redis_errors", "lookups", "lookup_errors")
+
+    def __init__(self):
+        self.redis_batches = 0
+        self.redis_hits = 0
+        self.redis_errors = 0
+        self.lookups = 0
+        self.lookup_errors = 0
+
+    def as_dict(self) -> Dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class AccountDirectory:
+    def __init__(self, redis: Redis | None, config: AccountDirectoryConfig):
+        self._redis = redis
+        self._config = config
+        self._profiles = TTLCache(config.cache_size, config.cache_ttl_s)
+        self._waiting: Dict[int, asyncio.Future] = {}
+        self._missing: Set[int] = set()
+        self._lookup_task: asyncio.Task | None = None
+        # the loop only keeps weak references to running tasks
+        self._reads: Set[asyncio.Task] = set()
+        self.stats = DirectoryStats()
+
+    @property
+    def cache_stats(self) -> Dict:
+        return {"size": len(self._profiles), **self._profiles.stats.as_dict()}
+
+    async def get(self, account_id: int) -> AccountProfile | None:
+        profile = self._profiles.get(account_id)
+        if profile is not None:
+            return None if profile is _NOT_FOUND else profile
+        if self._redis is None:
+            self._schedule_lookup([account_id])
+            return None
+
+        future = self._waiting.get(account_id)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            if not self._waiting:
+                loop.call_soon(self._read_waiting)
+            future = self._waiting[account_id] = loop.create_future()
+        # shielded: the MGET answers every request waiting on the id, not only this one
+        return await asyncio.shield(future)
+
+    async def close(self):
+        task, self._lookup_task = self._lookup_task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        if self._redis is not None:
+            await self._redis.aclose()
+
+    def _read_waiting(self):
+        waiting, self._waiting = self._waiting, {}
+        task = asyncio.get_running_loop().create_task(self._read_redis(waiting))
+        self._reads.add(task)
+        task.add_done_callback(self._reads.discard)
+
+    async def _read_redis(self, waiting: Dict[int, asyncio.Future]):
+        ids = list(waiting)
+        missing = []
+        try:
+            try:
+                values = await self._redis.mget([str(account_id) for account_id in ids])
+                self.stats.redis_batches += 1
+            except RedisError:
+                _Logger.exception("reading %s accounts from redis failed", len(ids))
+                self.stats.redis_errors += 1
+                values = [None] * len(ids)
+
+            for account_id, value in zip(ids, values):
+                profile = None
+                if value is not None:
+                    try:
+                        account = decode_account(value)
+                        profile = _NOT_FOUND if account is MISSING else AccountProfile.from_account(account)
+                    except (ValueError, KeyError, TypeError):
+                        _Logger.warning("unreadable cached account %s", account_id)
+                if profile is _NOT_FOUND:
+                    self._profiles.put(account_id, _NOT_FOUND, ttl=self._config.not_found_ttl_s)
+                    waiting[account_id].set_result(None)
+                    continue
+                if profile is None:
+                    missing.append(account_id)
+                    continue
+
+                self.stats.redis_hits += 1
+                self._profiles.put(account_id, profile)
+                waiting[account_id].set_result(profile)
+        finally:
+            # whatever went wrong, nobody is left waiting
+            for future in waiting.values():
+                if not future.done():
+                    future.set_result(None)
+
+        self._schedule_lookup(missing)
+
+    def _schedule_lookup(self, account_ids: Iterable[int]):
+        if not self._config.base_url:
+            return
+
+        self._missing.update(account_ids)
+        if self._missing and self._lookup_task is None:
+            self._lookup_task = asyncio.get_running_loop().create_task(self._lookup_missing())
+
+    async def _lookup_missing(self):
+        try:
+            await asyncio.sleep(self._config.lookup_delay_s)
+            while self._missing:
+                missing, self._missing = list(self._missing), set()
+                for start in range(0, len(missing), self._config.max_batch):
+                    await self._lookup(missing[start:start + self._config.max_batch])
+        finally:
+            self._lookup_task = None
+
+    async def _lookup(self, account_ids: List[int]):
+        self.stats.lookups += 1
+        try:
+            accounts = await asyncio.to_thread(self._post_batch, account_ids)
+        except (OSError, ValueError, KeyError):
+            # left uncached, the next request for these accounts asks again
+            _Logger.exception("looking up %s accounts in account_serv failed", len(account_ids))
+            self.stats.lookup_errors += 1
+            return
+
+        for account_id, account in zip(account_ids, accounts):
+            if account is None:
+                self._profiles.put(account_id, _NOT_FOUND, ttl=self._config.not_found_ttl_s)
+            else:
+                self._profiles.put(account_id, AccountProfile.from_account(account))
+
+    def _post_batch(self, account_ids: List[int]) -> List[Dict | None]:
+        """
+        account_serv's POST /account/batch/: the accounts in request order, null for unknown ids
+        """
+        config = self._config
+        request = urllib.request.Request(
+            f"{config.base_url.rstrip('/')}/account/batch/",
+            data=json.dumps({"ids": account_ids}).encode(),
+            headers={"Content-Type": "application/json", "Authorization": f"Bearer {config.service_token}"},
+            method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=config.lookup_timeout_s) as response:
+            accounts = json.loads(response.read())["accounts"]
+
+        if len(accounts) != len(account_ids):
+            raise ValueError(f"asked for {len(account_ids)} accounts, account_serv returned {len(accounts)}")
+        return accounts
@@ -0,0 +1,162 @@
+"""
+Push connections to couriers.
+
+A courier holds one push socket, a newer one replacing the older. Pushing never awaits a socket: the message
+is appended to the connection's outbox and the connection's own writer task sends it. Fanning out a batch
+of offers is a loop of appends that runs within one event loop iteration however many sockets it reaches,
+and a slow socket only holds up itself; one with max_outbox messages still unsent is not sent more.
+"""
+import asyncio
+import logging
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Tuple
+
+from starlette import status
+from starlette.websockets import WebSocket
+
+_Logger = logging.getLogger(__name__)
+
+
+class RegistryStats:
+    __slots__ = ("connected", "disconnected", "replaced", "pushed", "not_connected", "overflowed", "send_errors")
+
+    def __init__(self):
+        self.connected = 0
+        self.disconnected = 0
+        self.replaced = 0
+        self.pushed = 0
+        self.not_connected = 0
+        self.overflowed = 0
+        self.send_errors = 0
+
+    def as_dict(self) -> Dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class CourierConnection:
+    __slots__ = ("courier_id", "_websocket", "_stats", "_max_outbox", "_outbox", "_ready", "_close", "_task")
+
+    def __init__(self, courier_id: int, websocket: WebSocket, stats: RegistryStats, max_outbox: int):
+        self.courier_id = courier_id
+        self._websocket = websocket
+        self._stats = stats
+        self._max_outbox = max_outbox
+        self._outbox: Deque[str] = deque()
+        self._ready = asyncio.Event()
+        self._close: Tuple[int, str] | None = None
+        self._task: asyncio.Task | None = None
+
+    @property
+    def open(self) -> bool:
+        return self._close is None and self._task is not None and not self._task.done()
+
+    def push(self, message: str) -> bool:
+        if not self.open:
+            return False
+        if len(self._outbox) >= self._max_outbox:
+            self._stats.overflowed += 1
+            return False
+
+        self._outbox.append(message)
+        self._ready.set()
+        return True
+
+    def close(self, code: int = status.WS_1000_NORMAL_CLOSURE, reason: str = ""):
+        """
+        Close the socket once the messages already pushed are sent
+        """
+        if self._close is None:
+            self._close = (code, reason)
+            self._ready.set()
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._write(), name=f"push-{self.courier_id}")
+
+    async def stop(self, timeout: float = 1):
+        """
+        Stop the writer; a closing connection gets up to `timeout` seconds to send its close frame first
+        """
+        task, self._task = self._task, None
+        if task is not None and self._close is not None:
+            await asyncio.wait({task}, timeout=timeout)
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _write(self):
+        websocket = self._websocket
+        try:
+            while True:
+                await self._ready.wait()
+                self._ready.clear()
+                while self._outbox:
+                    await websocket.send_text(self._outbox.popleft())
+                if self._close is not None:
+                    await websocket.close(*self._close)
+                    return
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # the courier went away mid-send; its handler sees the disconnect and unregisters it
+            _Logger.debug("push to courier %s failed", self.courier_id, exc_info=True)
+            self._stats.send_errors += 1
+            self._outbox.clear()
+
+
+class ConnectionRegistry:
+    def __init__(self, max_outbox: int):
+        self._max_outbox = max_outbox
+        self._connections: Dict[int, CourierConnection] = {}
+        self.stats = RegistryStats()
+
+    def __len__(self) -> int:
+        return len(self._connections)
+
+    def get(self, courier_id: int) -> CourierConnection | None:
+        return self._connections.get(courier_id)
+
+    def connect(self, courier_id: int, websocket: WebSocket) -> CourierConnection:
+        """
+        Register an accepted socket, closing the courier's previous one
+        """
+        previous = self._connections.get(courier_id)
+        if previous is not None:
+            previous.close(status.WS_1000_NORMAL_CLOSURE, "replaced by a newer connection")
+            self.stats.replaced += 1
+
+        connection = self._connections[courier_id] = CourierConnection(
+            courier_id, websocket, self.stats, self._max_outbox
+        )
+        connection.start()
+        self.stats.connected += 1
+        return connection
+
+    async def disconnect(self, connection: CourierConnection):
+        if self._connections.get(connection.courier_id) is connection:
+            del self._connections[connection.courier_id]
+        await connection.stop()
+        self.stats.disconnected += 1
+
+    def push_many(self, messages: Iterable[Tuple[int, str]]) -> List[bool]:
+        """
+        Push each message to its courier, returning for each whether it was
+        """
+        pushed = []
+        for courier_id, message in messages:
+            connection = self._connections.get(courier_id)
+            if connection is None:
+                self.stats.not_connected += 1
+                pushed.append(False)
+            else:
+                pushed.append(connection.push(message))
+        self.stats.pushed += sum(pushed)
+        return pushed
+
+    async def close(self):
+        connections, self._connections = list(self._connections.values()), {}
+        for connection in connections:
+            connection.close(status.WS_1001_GOING_AWAY, "server shutting down")
+        await asyncio.gather(*(connection.stop() for connection in connections))
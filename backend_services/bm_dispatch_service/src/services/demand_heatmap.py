@@ -0,0 +1,228 @@
+"""
+Demand and supply per grid cell over a sliding window, for surge pricing and courier repositioning.
+
+The box of the HEATMAP config is cut into cells of cell_deg. Each cell keeps two counters per time bucket of
+bucket_s, in ring buffers of window_buckets: orders submitted in the cell, and distinct couriers seen in it
+during the bucket. Running totals over the window are kept beside the rings, a bucket leaving the window is
+subtracted from them as its slot is reused, so reading the heatmap is one pass over the cells whatever the
+number of orders and couriers behind it. Supply is reported as couriers present on average over the window.
+
+Rendered heatmaps are cached until the counters change, and even then served for up to cache_s seconds, so
+however many clients poll, the heatmap is encoded at most once per cache_s and format. Only cells with any
+demand or supply are sent, as parallel columns: in JSON
+    {"generated_at", "window_s", "bucket_s", "min_lat", "min_lng", "cell_deg", "rows", "cols",
+     "cells": [...], "demand": [...], "supply": [...]}
+and in binary the HEADER below followed by `count` uint32 cells, `count` uint32 demands and `count` float32
+supplies. Cell c covers row c // cols and column c % cols of the grid from (min_lat, min_lng).
+"""
+import json
+import math
+import struct
+import time
+from typing import Dict, List, NamedTuple, Set, Tuple
+
+import numpy as np
+from src.models.job import DispatchJob
+from src.settings import HeatmapConfig
+
+# version, generated_at, min_lat, min_lng, cell_deg, rows, cols, window_s, count
+HEADER = struct.Struct("<BddddIIdI")
+_VERSION = 1
+
+FORMATS = ("json", "binary")
+
+
+class HeatmapStats:
+    __slots__ = ("orders", "pings", "outside", "buckets_expired", "renders", "cache_hits")
+
+    def __init__(self):
+        self.orders = 0
+        self.pings = 0
+        self.outside = 0
+        self.buckets_expired = 0
+        self.renders = 0
+        self.cache_hits = 0
+
+    def as_dict(self) -> Dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class Heatmap(NamedTuple):
+    generated_at: float
+    cells: np.ndarray
+    demand: np.ndarray
+    supply: np.ndarray
+
+
+class _Rendered(NamedTuple):
+    version: int
+    rendered_at: float
+    payload: bytes
+
+
+class DemandHeatmap:
+    def __init__(self, config: HeatmapConfig):
+        self._config = config
+        self.rows = math.ceil((config.max_lat - config.min_lat) / config.cell_deg)
+        self.cols = math.ceil((config.max_lng - config.min_lng) / config.cell_deg)
+        cells = self.rows * self.cols
+        self._demand = np.zeros((config.window_buckets, cells), dtype=np.int32)
+        self._supply = np.zeros((config.window_buckets, cells), dtype=np.int32)
+        self._demand_total = np.zeros(cells, dtype=np.int64)
+        self._supply_total = np.zeros(cells, dtype=np.int64)
+        # absolute number of the newest bucket, and the (courier, cell) pairs already counted in it
+        self._bucket: int | None = None
+        self._counted: Set[int] = set()
+        # bumped on every change, renders of an older version are stale
+        self.version = 0
+        self._rendered: Dict[str, _Rendered] = {}
+        self.stats = HeatmapStats()
+
+    @property
+    def cache_s(self) -> float:
+        return self._config.cache_s
+
+    @property
+    def window_s(self) -> float:
+        return self._config.bucket_s * self._config.window_buckets
+
+    def cell_of(self, lat: float, lng: float) -> int | None:
+        """
+        The cell of the point, None outside the box
+        """
+        config = self._config
+        row = math.floor((lat - config.min_lat) / config.cell_deg)
+        col = math.floor((lng - config.min_lng) / config.cell_deg)
+        if not (0 <= row < self.rows and 0 <= col < self.cols):
+            return None
+        return row * self.cols + col
+
+    def record_order(self, job: DispatchJob):
+        slot = self._advance(job.created_at)
+        self.stats.orders += 1
+        cell = self.cell_of(job.lat, job.lng)
+        if cell is None:
+            self.stats.outside += 1
+            return
+
+        self._demand[slot, cell] += 1
+        self._demand_total[cell] += 1
+        self.version += 1
+
+    def record_positions(self, updates: List[Tuple[int, float, float, float]], now: float | None = None):
+        """
+        Count each courier once per cell it is seen in during the current bucket
+        """
+        if not updates:
+            return
+        slot = self._advance(time.time() if now is None else now)
+        config = self._config
+        values = np.array(updates, dtype=np.float64)
+        rows = np.floor((values[:, 1] - config.min_lat) / config.cell_deg).astype(np.int64)
+        cols = np.floor((values[:, 2] - config.min_lng) / config.cell_deg).astype(np.int64)
+        inside = (rows >= 0) & (rows < self.rows) & (cols >= 0) & (cols < self.cols)
+        cells = rows * self.cols + cols
+
+        self.stats.pings += len(updates)
+        self.stats.outside += len(updates) - int(inside.sum())
+        counted = self._counted
+        total = len(self._demand_total)
+        seen = []
+        for (courier_id, *_), cell, ok in zip(updates, cells.tolist(), inside.tolist()):
+            key = courier_id * total + cell
+            if ok and key not in counted:
+                counted.add(key)
+                seen.append(cell)
+        if seen:
+            np.add.at(self._supply[slot], seen, 1)
+            np.add.at(self._supply_total, seen, 1)
+            self.version += 1
+
+    def snapshot(self, now: float | None = None) -> Heatmap:
+        """
+        The cells with any demand or supply over the window, with their orders and average couriers
+        """
+        now = time.time() if now is None else now
+        self._advance(now)
+        cells = np.flatnonzero(self._demand_total | self._supply_total)
+        return Heatmap(
+            now, cells.astype(np.uint32), self._demand_total[cells].astype(np.uint32),
+            self._supply_total[cells] / self._config.window_buckets,
+        )
+
+    def render(self, fmt: str, now: float | None = None) -> Tuple[bytes, int]:
+        """
+        The heatmap encoded as `fmt`, and the version of the counters it shows
+        """
+        if fmt not in FORMATS:
+            raise ValueError(f"unknown heatmap format {fmt!r}")
+        now = time.time() if now is None else now
+        self._advance(now)
+        rendered = self._rendered.get(fmt)
+        if rendered is not None and (
+                rendered.version == self.version or now - rendered.rendered_at < self._config.cache_s
+        ):
+            self.stats.cache_hits += 1
+            return rendered.payload, rendered.version
+
+        heatmap = self.snapshot(now)
+        payload = self._encode_binary(heatmap) if fmt == "binary" else self._encode_json(heatmap)
+        self._rendered[fmt] = _Rendered(self.version, now, payload)
+        self.stats.renders += 1
+        return payload, self.version
+
+    def _advance(self, now: float) -> int:
+        """
+        Move the window up to the bucket of `now`, clearing the buckets it leaves behind; returns the slot of
+        the newest bucket. A time before the newest bucket counts in it.
+        """
+        window = self._config.window_buckets
+        bucket = int(now // self._config.bucket_s)
+        if self._bucket is None:
+            self._bucket = bucket
+        elif bucket > self._bucket:
+            for expired in range(self._bucket + 1, min(bucket, self._bucket + window) + 1):
+                slot = expired % window
+                self._demand_total -= self._demand[slot]
+                self._supply_total -= self._supply[slot]
+                self._demand[slot] = 0
+                self._supply[slot] = 0
+            self.stats.buckets_expired += bucket - self._bucket
+            self._bucket = bucket
+            self._counted = set()
+            self.version += 1
+        return self._bucket % window
+
+    def _encode_json(self, heatmap: Heatmap) -> bytes:
+        config = self._config
+        return json.dumps({
+            "generated_at": heatmap.generated_at, "window_s": self.window_s, "bucket_s": config.bucket_s,
+            "min_lat": config.min_lat, "min_lng": config.min_lng, "cell_deg": config.cell_deg, "rows": self.rows,
+            "cols": self.cols, "cells": heatmap.cells.tolist(), "demand": heatmap.demand.tolist(),
+            "supply": heatmap.supply.round(2).tolist(),
+        }, separators=(",", ":")).encode()
+
+    def _encode_binary(self, heatmap: Heatmap) -> bytes:
+        config = self._config
+        header = HEADER.pack(
+            _VERSION, heatmap.generated_at, config.min_lat, config.min_lng, config.cell_deg, self.rows, self.cols,
+            self.window_s, len(heatmap.cells),
+        )
+        return b"".join((header, heatmap.cells.astype("<u4").tobytes(), heatmap.demand.astype("<u4").tobytes(),
+                         heatmap.supply.astype("<f4").tobytes()))
+
+
+def decode_binary(payload: bytes) -> Dict:
+    """
+    A binary heatmap back as the fields of the JSON one
+    """
+    version, generated_at, min_lat, min_lng, cell_deg, rows, cols, window_s, count = HEADER.unpack_from(payload)
+    if version != _VERSION:
+        raise ValueError(f"unknown heatmap version {version}")
+    columns = np.frombuffer(payload, dtype="<u4", count=2 * count, offset=HEADER.size)
+    supply = np.frombuffer(payload, dtype="<f4", count=count, offset=HEADER.size + columns.nbytes)
+    return {
+        "generated_at": generated_at, "window_s": window_s, "min_lat": min_lat, "min_lng": min_lng,
+        "cell_deg": cell_deg, "rows": rows, "cols": cols, "cells": columns[:count].tolist(),
+        "demand": columns[count:].tolist(), "supply": supply.tolist(),
+    }
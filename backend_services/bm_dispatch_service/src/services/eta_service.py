@@ -0,0 +1,219 @@
+"""
+Estimated travel times between two points.
+
+Matching and customer polling both need ETAs by the thousand, and asking the routing backend for each one
+dominates their cost. Inside the configured bounding box the service keeps a cell to cell travel time table
+per time-of-day bucket, refreshed from the backend in the background, and scales the table entry by the
+ratio of the actual distance to the distance between the cell centres. Trips too short for the cell size to
+be accurate, or leaving the box, are routed, with recent answers kept in a TTL'd LRU cache.
+"""
+import asyncio
+import logging
+import math
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np
+from src.helpers.geo import haversine_np_m
+from src.helpers.ttl_cache import TTLCache
+from src.services.routing import RoutingBackend
+from src.settings import EtaConfig
+
+_Logger = logging.getLogger(__name__)
+
+# origin cells per backend call while refreshing a table
+_REFRESH_CHUNK = 64
+# tables grow with the square of the number of cells
+_MAX_CELLS = 5000
+
+
+class EtaStats:
+    __slots__ = ("queries", "from_table", "from_cache", "routed", "backend_calls", "table_refreshes",
+                 "last_batch_ms")
+
+    def __init__(self):
+        self.queries = 0
+        self.from_table = 0
+        self.from_cache = 0
+        self.routed = 0
+        self.backend_calls = 0
+        self.table_refreshes = 0
+        self.last_batch_ms = 0.0
+
+    def as_dict(self) -> Dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class EtaService:
+    def __init__(self, backend: RoutingBackend, config: EtaConfig):
+        self._backend = backend
+        self._config = config
+        self._rows = math.ceil((config.max_lat - config.min_lat) / config.cell_deg)
+        self._cols = math.ceil((config.max_lng - config.min_lng) / config.cell_deg)
+        if self._rows * self._cols > _MAX_CELLS:
+            raise ValueError(f"{self._rows * self._cols} ETA cells, at most {_MAX_CELLS} are supported")
+
+        cells = np.arange(self._rows * self._cols)
+        self._center_lats = config.min_lat + (cells // self._cols + 0.5) * config.cell_deg
+        self._center_lngs = config.min_lng + (cells % self._cols + 0.5) * config.cell_deg
+        self._buckets = 24 // config.bucket_hours
+        # buckets x origin cell x destination cell, seconds; None until the first refresh
+        self._tables: np.ndarray | None = None
+        self._cache = TTLCache(config.cache_size, config.cache_ttl_s)
+        self._task: asyncio.Task | None = None
+        self.stats = EtaStats()
+
+    @property
+    def cache_stats(self) -> Dict:
+        return {"size": len(self._cache), **self._cache.stats.as_dict()}
+
+    @property
+    def cells(self) -> int:
+        return self._rows * self._cols
+
+    def bucket_of(self, depart_at: float) -> int:
+        hour = (depart_at / 3600 + self._config.utc_offset_hours) % 24
+        return int(hour // self._config.bucket_hours) % self._buckets
+
+    def cell_of(self, lats: np.ndarray, lngs: np.ndarray) -> np.ndarray:
+        """
+        Table cell of each point, -1 outside the bounding box
+        """
+        config = self._config
+        rows = np.floor((lats - config.min_lat) / config.cell_deg).astype(np.int64)
+        cols = np.floor((lngs - config.min_lng) / config.cell_deg).astype(np.int64)
+        inside = (rows >= 0) & (rows < self._rows) & (cols >= 0) & (cols < self._cols)
+        return np.where(inside, rows * self._cols + cols, -1)
+
+    async def eta(self, from_lat: float, from_lng: float, to_lat: float, to_lng: float,
+                  depart_at: float | None = None) -> float:
+        [seconds] = await self.eta_many([from_lat], [from_lng], [to_lat], [to_lng], depart_at)
+        return float(seconds)
+
+    async def eta_many(self, from_lats, from_lngs, to_lats, to_lngs, depart_at: float | None = None) -> np.ndarray:
+        """
+        Seconds from each origin to the destination at the same index
+        """
+        started = time.perf_counter()
+        from_lats, from_lngs, to_lats, to_lngs = (
+            np.asarray(values, dtype=np.float64) for values in (from_lats, from_lngs, to_lats, to_lngs)
+        )
+        if not from_lats.shape == from_lngs.shape == to_lats.shape == to_lngs.shape or from_lats.ndim != 1:
+            raise ValueError("origins and destinations must be equal length vectors")
+        for lats, lngs in ((from_lats, from_lngs), (to_lats, to_lngs)):
+            if not (np.all(np.abs(lats) <= 90) and np.all(np.abs(lngs) <= 180)):
+                raise ValueError("invalid coordinates")
+
+        if depart_at is None:
+            depart_at = time.time()
+        bucket = self.bucket_of(depart_at)
+        etas = np.empty(from_lats.size)
+        routed = np.ones(from_lats.size, dtype=bool)
+
+        if self._tables is not None:
+            from_cells = self.cell_of(from_lats, from_lngs)
+            to_cells = self.cell_of(to_lats, to_lngs)
+            distance = haversine_np_m(from_lats, from_lngs, to_lats, to_lngs)
+            in_table = (from_cells >= 0) & (to_cells >= 0) & (from_cells != to_cells)
+            in_table &= distance >= self._config.near_m
+            if in_table.any():
+                from_cells, to_cells = from_cells[in_table], to_cells[in_table]
+                centers = haversine_np_m(self._center_lats[from_cells], self._center_lngs[from_cells],
+                                         self._center_lats[to_cells], self._center_lngs[to_cells])
+                etas[in_table] = self._tables[bucket, from_cells, to_cells] * (distance[in_table] / centers)
+                routed &= ~in_table
+                self.stats.from_table += int(in_table.sum())
+
+        indexes = np.flatnonzero(routed)
+        if indexes.size:
+            await self._route(indexes, from_lats, from_lngs, to_lats, to_lngs, depart_at, bucket, etas)
+
+        self.stats.queries += from_lats.size
+        self.stats.last_batch_ms = round((time.perf_counter() - started) * 1000, 3)
+        return etas
+
+    async def refresh_tables(self):
+        """
+        Rebuild the table of every bucket from the backend, swapped in once complete
+        """
+        config = self._config
+        cells = self.cells
+        tables = np.empty((self._buckets, cells, cells), dtype=np.float32)
+        today = (time.time() // 86400) * 86400
+        for bucket in range(self._buckets):
+            # the middle of the bucket, in local time
+            depart_at = today + ((bucket + 0.5) * config.bucket_hours - config.utc_offset_hours) * 3600
+            for start in range(0, cells, _REFRESH_CHUNK):
+                origins = np.arange(start, min(start + _REFRESH_CHUNK, cells))
+                from_cells = np.repeat(origins, cells)
+                to_cells = np.tile(np.arange(cells), origins.size)
+                seconds = await self._backend.travel_times(
+                    self._center_lats[from_cells], self._center_lngs[from_cells],
+                    self._center_lats[to_cells], self._center_lngs[to_cells], depart_at,
+                )
+                tables[bucket, origins] = np.reshape(seconds, (origins.size, cells))
+                self.stats.backend_calls += 1
+                # a local backend never suspends, let requests in between chunks
+                await asyncio.sleep(0)
+
+        self._tables = tables
+        self.stats.table_refreshes += 1
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run(), name="eta-tables")
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh_tables()
+            except Exception:
+                _Logger.exception("refreshing ETA tables failed")
+            await asyncio.sleep(self._config.table_refresh_s)
+
+    async def _route(self, indexes: np.ndarray, from_lats: np.ndarray, from_lngs: np.ndarray, to_lats: np.ndarray,
+                     to_lngs: np.ndarray, depart_at: float, bucket: int, etas: np.ndarray):
+        """
+        Fill the given indexes from the cache, routing the misses in one backend call. Pairs are cached by
+        their coordinates rounded to coordinate_decimals and the time-of-day bucket.
+        """
+        decimals = self._config.coordinate_decimals
+        keys = zip(
+            np.round(from_lats[indexes], decimals).tolist(), np.round(from_lngs[indexes], decimals).tolist(),
+            np.round(to_lats[indexes], decimals).tolist(), np.round(to_lngs[indexes], decimals).tolist(),
+        )
+        missing: Dict[Tuple, List[int]] = {}
+        for index, key in zip(indexes.tolist(), keys):
+            key = (*key, bucket)
+            if key in missing:
+                missing[key].append(index)
+                continue
+
+            seconds = self._cache.get(key)
+            if seconds is None:
+                missing[key] = [index]
+            else:
+                etas[index] = seconds
+                self.stats.from_cache += 1
+
+        if not missing:
+            return
+
+        first = np.fromiter((positions[0] for positions in missing.values()), dtype=np.int64, count=len(missing))
+        seconds = await self._backend.travel_times(
+            from_lats[first], from_lngs[first], to_lats[first], to_lngs[first], depart_at
+        )
+        self.stats.backend_calls += 1
+        for (key, positions), value in zip(missing.items(), seconds.tolist()):
+            self._cache.put(key, value)
+            etas[positions] = value
+            self.stats.routed += len(positions)
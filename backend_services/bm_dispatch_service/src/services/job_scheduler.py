@@ -0,0 +1,290 @@
+"""
+Dispatch jobs: an order from submission until its courier delivers it.
+
+A submitted order waits as a pending job, ordered by its deadline with each SLA tier after the first counting
+tier_spacing_s later, so an urgent tier jumps the queue without starving the others. Every tick the scheduler
+1. takes back offers that were neither accepted nor declined within offer_timeout_s; the job is pending
+   again for another courier, or dropped as failed once it has been offered max_attempts times
+2. matches the batch_size most urgent pending jobs in one matching engine batch and offers each match to its
+   courier. Jobs no courier could take stay pending, in order, for the next tick.
+
+A job is never offered again to a courier that declined it, let the offer expire or never received it.
+
+All job state is in the job store. After a restart `recover` gives back to the matching engine the loads of
+the couriers holding offered and accepted jobs, and offers that expired meanwhile are retried on the first
+tick.
+"""
+import asyncio
+import inspect
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Sequence
+
+from src.models.job import DispatchJob, JobState
+from src.models.order import PendingOrder
+from src.repositories.job_store import JobStore, Transition
+from src.services.matching_engine import MatchingEngine
+from src.settings import JobsConfig
+
+_Logger = logging.getLogger(__name__)
+
+
+class SchedulerStats:
+    __slots__ = (
+        "submitted", "offered", "accepted", "declined", "expired", "withdrawn", "failed", "cancelled", "completed",
+        "recovered", "ticks", "last_tick_ms",
+    )
+
+    def __init__(self):
+        self.submitted = 0
+        self.offered = 0
+        self.accepted = 0
+        self.declined = 0
+        self.expired = 0
+        self.withdrawn = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.completed = 0
+        self.recovered = 0
+        self.ticks = 0
+        self.last_tick_ms = 0.0
+
+    def as_dict(self) -> Dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class JobScheduler:
+    def __init__(
+            self, store: JobStore, engine: MatchingEngine, config: JobsConfig,
+            on_offered: Callable[[List[DispatchJob]], Awaitable | None] | None = None,
+    ):
+        self._store = store
+        self._engine = engine
+        self._config = config
+        self.on_offered = on_offered
+        # called with each job submitted, for aggregates counting demand
+        self.on_submitted: Callable[[DispatchJob], None] | None = None
+        self._task: asyncio.Task | None = None
+        self._wake = asyncio.Event()
+        self.stats = SchedulerStats()
+
+    def priority(self, tier: int, deadline: float) -> float:
+        return deadline + tier * self._config.tier_spacing_s
+
+    async def submit(
+            self, job_id: int, lat: float, lng: float, tier: int | None = None, deadline: float | None = None,
+            now: float | None = None,
+    ) -> DispatchJob | None:
+        """
+        Queue a job, None when one with the id already exists
+        """
+        now = time.time() if now is None else now
+        tier = self._config.default_tier if tier is None else tier
+        deadline = now + self._config.default_sla_s if deadline is None else deadline
+        job = DispatchJob(job_id, lat, lng, tier, deadline, now)
+
+        [applied] = await self._store.apply([
+            Transition(job_id, None, JobState.PENDING, self.priority(tier, deadline), job, "submitted")
+        ])
+        if not applied:
+            return None
+        self.stats.submitted += 1
+        if self.on_submitted is not None:
+            self.on_submitted(job)
+        return job
+
+    async def get(self, job_id: int) -> DispatchJob | None:
+        return await self._store.get(job_id)
+
+    async def counts(self) -> Dict[str, int]:
+        return await self._store.counts()
+
+    async def cancel(self, job_id: int) -> bool:
+        job = await self._store.get(job_id)
+        if job is None or not await self._finish(job, "cancelled"):
+            return False
+        self.stats.cancelled += 1
+        return True
+
+    async def accept(self, job_id: int, courier_id: int, now: float | None = None) -> bool:
+        """
+        The courier accepts its offer of the job; False when the job is not on offer to it, the offer may
+        have expired
+        """
+        job = await self._store.get(job_id)
+        if not _offered_to(job, courier_id, JobState.OFFERED):
+            return False
+
+        now = time.time() if now is None else now
+        accepted = job._replace(state=JobState.ACCEPTED, offer_expires_at=None)
+        [applied] = await self._store.apply([
+            Transition(job_id, JobState.OFFERED, JobState.ACCEPTED, now, accepted, "accepted", job.attempts)
+        ])
+        if applied:
+            self.stats.accepted += 1
+        return applied
+
+    async def decline(self, job_id: int, courier_id: int) -> bool:
+        job = await self._store.get(job_id)
+        if not _offered_to(job, courier_id, JobState.OFFERED):
+            return False
+
+        [applied] = await self._retry([job], "declined")
+        if applied:
+            self.stats.declined += 1
+        return applied
+
+    async def withdraw(self, jobs: Sequence[DispatchJob]) -> int:
+        """
+        Take back offers that never reached their couriers, the jobs going to other couriers on the next
+        tick; returns how many were still on offer
+        """
+        withdrawn = sum(await self._retry(jobs, "withdrawn"))
+        self.stats.withdrawn += withdrawn
+        return withdrawn
+
+    def wake(self):
+        """
+        Run the next tick now rather than after tick_interval
+        """
+        self._wake.set()
+
+    async def complete(self, job_id: int, courier_id: int) -> bool:
+        """
+        The courier delivered the job
+        """
+        job = await self._store.get(job_id)
+        if not _offered_to(job, courier_id, JobState.ACCEPTED) or not await self._finish(job, "completed"):
+            return False
+        self.stats.completed += 1
+        return True
+
+    async def recover(self) -> int:
+        """
+        Give the matching engine back the loads of the couriers holding jobs, returning how many jobs
+        """
+        recovered = 0
+        for state in (JobState.OFFERED, JobState.ACCEPTED):
+            async for jobs in self._store.scan(state, self._config.recovery_chunk):
+                for job in jobs:
+                    if job.courier_id is not None:
+                        self._engine.acquire(job.courier_id)
+                recovered += len(jobs)
+        self.stats.recovered += recovered
+        return recovered
+
+    async def tick(self, now: float | None = None) -> List[DispatchJob]:
+        """
+        Retry the expired offers and match the most urgent pending jobs, returning the jobs offered
+        """
+        now = time.time() if now is None else now
+        started = time.perf_counter()
+        config = self._config
+
+        expired = await self._store.lowest(JobState.OFFERED, config.batch_size, max_score=now)
+        if expired:
+            self.stats.expired += sum(await self._retry(expired, "expired"))
+
+        offered = []
+        jobs = await self._store.lowest(JobState.PENDING, config.batch_size)
+        if jobs:
+            assignments, _ = await self._engine.match_batch(
+                [PendingOrder(job.job_id, job.lat, job.lng, job.created_at, job.excluded) for job in jobs]
+            )
+            by_id = {job.job_id: job for job in jobs}
+            expires_at = now + config.offer_timeout_s
+            offers = [
+                by_id[assigned.order_id]._replace(
+                    state=JobState.OFFERED, attempts=by_id[assigned.order_id].attempts + 1,
+                    courier_id=assigned.courier_id, offer_expires_at=expires_at,
+                )
+                for assigned in assignments
+            ]
+            applied = await self._store.apply([
+                Transition(job.job_id, JobState.PENDING, JobState.OFFERED, expires_at, job, "offered")
+                for job in offers
+            ])
+            for job, was_applied in zip(offers, applied):
+                if was_applied:
+                    offered.append(job)
+                else:
+                    # cancelled while it was being matched
+                    self._engine.release(job.courier_id)
+            self.stats.offered += len(offered)
+
+        self.stats.ticks += 1
+        self.stats.last_tick_ms = round((time.perf_counter() - started) * 1000, 3)
+        if offered and self.on_offered is not None:
+            result = self.on_offered(offered)
+            if inspect.isawaitable(result):
+                await result
+        return offered
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run(), name="job-scheduler")
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        try:
+            await self.recover()
+        except Exception:
+            _Logger.exception("recovering courier loads failed")
+
+        while True:
+            try:
+                await self.tick()
+            except Exception:
+                _Logger.exception("dispatch tick failed")
+            try:
+                await asyncio.wait_for(self._wake.wait(), self._config.tick_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def _retry(self, jobs: Sequence[DispatchJob], event: str) -> List[bool]:
+        """
+        Take offers back: the jobs are pending again, or failed once out of attempts
+        """
+        transitions = []
+        for job in jobs:
+            if job.attempts >= self._config.max_attempts:
+                transitions.append(Transition(
+                    job.job_id, JobState.OFFERED, None, event=f"{event}:failed", offer=job.attempts,
+                ))
+            else:
+                pending = job._replace(
+                    state=JobState.PENDING, courier_id=None, offer_expires_at=None,
+                    excluded=(*job.excluded, job.courier_id),
+                )
+                transitions.append(Transition(
+                    job.job_id, JobState.OFFERED, JobState.PENDING, self.priority(job.tier, job.deadline), pending,
+                    event, job.attempts,
+                ))
+
+        applied = await self._store.apply(transitions)
+        for job, transition, was_applied in zip(jobs, transitions, applied):
+            if was_applied:
+                self._engine.release(job.courier_id)
+                if transition.destination is None:
+                    _Logger.warning("job %s failed after %s offers", job.job_id, job.attempts)
+                    self.stats.failed += 1
+        return applied
+
+    async def _finish(self, job: DispatchJob, event: str) -> bool:
+        [applied] = await self._store.apply([Transition(job.job_id, job.state, None, event=event)])
+        if applied and job.courier_id is not None:
+            self._engine.release(job.courier_id)
+        return applied
+
+
+def _offered_to(job: DispatchJob | None, courier_id: int, state: str) -> bool:
+    return job is not None and job.state == state and job.courier_id == courier_id
@@ -0,0 +1,114 @@
+"""
+Batched ingestion of courier location pings.
+
+Couriers ping every few seconds over long-lived connections. Writing each ping to the store as it arrives
+would interleave tens of thousands of small writes with socket reads; instead pings are coalesced per
+courier, only the latest one in each window survives, and the window is applied to the store in chunks
+that yield to the event loop in between so reads are never starved by a large flush.
+"""
+import asyncio
+import logging
+import time
+from typing import Callable, Dict, List, Tuple
+
+from src.repositories.location_store import CourierLocationStore
+
+_Logger = logging.getLogger(__name__)
+
+
+class IngestStats:
+    __slots__ = ("received", "coalesced", "stale", "applied", "flushes", "last_flush_ms")
+
+    def __init__(self):
+        self.received = 0
+        self.coalesced = 0
+        self.stale = 0
+        self.applied = 0
+        self.flushes = 0
+        self.last_flush_ms = 0.0
+
+    def as_dict(self) -> Dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class LocationIngestor:
+    def __init__(self, store: CourierLocationStore, flush_interval: float, apply_chunk_size: int):
+        self._store = store
+        self._flush_interval = flush_interval
+        self._apply_chunk_size = apply_chunk_size
+        self._pending: Dict[int, Tuple[int, float, float, float]] = {}
+        self._task: asyncio.Task | None = None
+        # each called with every chunk right after it is applied: a journal recording it, aggregates counting it
+        self.on_applied: List[Callable[[List[Tuple[int, float, float, float]]], None]] = []
+        self.stats = IngestStats()
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def submit(self, courier_id: int, lat: float, lng: float, sent_at: float | None = None):
+        """
+        Queue a ping for the next flush. A later ping from the same courier replaces it, a ping older than
+        the one already queued is ignored.
+        """
+        if not -90 <= lat <= 90 or not -180 <= lng <= 180:
+            raise ValueError(f"invalid coordinates ({lat}, {lng})")
+
+        if sent_at is None:
+            sent_at = time.time()
+
+        self.stats.received += 1
+        queued = self._pending.get(courier_id)
+        if queued is not None:
+            if queued[3] > sent_at:
+                self.stats.stale += 1
+                return
+            self.stats.coalesced += 1
+
+        self._pending[courier_id] = (courier_id, lat, lng, sent_at)
+
+    async def flush(self) -> int:
+        if not self._pending:
+            return 0
+
+        batch, self._pending = list(self._pending.values()), {}
+        started = time.perf_counter()
+        chunk_size = self._apply_chunk_size
+        for start in range(0, len(batch), chunk_size):
+            if start:
+                await asyncio.sleep(0)
+            chunk = batch[start:start + chunk_size]
+            self._store.update_many(chunk)
+            for listener in self.on_applied:
+                listener(chunk)
+
+        self.stats.applied += len(batch)
+        self.stats.flushes += 1
+        self.stats.last_flush_ms = round((time.perf_counter() - started) * 1000, 3)
+        return len(batch)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run(), name="location-ingestor")
+
+    async def stop(self):
+        """
+        Stop the flush loop and apply whatever is still pending
+        """
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self._flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                _Logger.exception("location flush failed")
@@ -0,0 +1,299 @@
+"""
+Batched order to courier matching.
+
+Orders are collected for a short window and matched together instead of each taking the nearest free
+courier as it arrives, which at peak hands the one courier two orders are competing for to whichever came
+first. Every window the engine gathers the nearest couriers of each order, builds the courier x order cost
+matrix in one vectorized pass and solves the assignment for the whole batch.
+"""
+import asyncio
+import inspect
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, MutableMapping, NamedTuple, Sequence, Tuple
+
+import numpy as np
+from src.helpers import assignment
+from src.helpers.geo import haversine_np_m
+from src.models.courier import CourierPosition
+from src.models.order import Assignment, PendingOrder
+from src.repositories.location_store import CourierLocationStore
+from src.settings import MatchingConfig
+
+_Logger = logging.getLogger(__name__)
+
+# orders looked up between yields to the event loop while gathering candidates
+_CANDIDATE_CHUNK = 200
+
+
+def build_cost_matrix(
+        courier_lats: np.ndarray, courier_lngs: np.ndarray, courier_loads: np.ndarray,
+        order_lats: np.ndarray, order_lngs: np.ndarray, config: MatchingConfig
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Cost in seconds of each courier taking each order: the pickup ETA plus a penalty per order the courier
+    is already carrying. Returns (cost, distance_m, eta_s), each couriers x orders.
+    """
+    distance = haversine_np_m(courier_lats[:, None], courier_lngs[:, None], order_lats, order_lngs)
+    eta = distance * (config.detour_factor / config.speed_mps)
+    cost = eta + config.load_penalty_s * courier_loads[:, None]
+    cost[distance > config.max_pickup_m] = infeasible_cost(config)
+    return cost, distance, eta
+
+
+def infeasible_cost(config: MatchingConfig) -> float:
+    """
+    Cost of a pair that must not be matched, finite so the solvers can run over it and well above any
+    feasible cost
+    """
+    worst_eta = config.max_pickup_m * config.detour_factor / config.speed_mps
+    return 10 * (worst_eta + config.load_penalty_s * config.max_active_orders)
+
+
+def solve(cost: np.ndarray, config: MatchingConfig) -> assignment.Pairs:
+    if min(cost.shape) <= config.hungarian_max_size:
+        return assignment.hungarian(cost)
+
+    return assignment.greedy_regret(cost)
+
+
+class _Batch(NamedTuple):
+    orders: Sequence[PendingOrder]
+    courier_ids: List[int]
+    cost: np.ndarray
+    distance: np.ndarray
+    eta: np.ndarray
+
+
+class MatchingStats:
+    __slots__ = ("batches", "orders_matched", "orders_carried", "last_batch_size", "last_batch_ms")
+
+    def __init__(self):
+        self.batches = 0
+        self.orders_matched = 0
+        self.orders_carried = 0
+        self.last_batch_size = 0
+        self.last_batch_ms = 0.0
+
+    def as_dict(self) -> Dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class MatchingEngine:
+    def __init__(
+            self, store: CourierLocationStore, config: MatchingConfig,
+            on_assigned: Callable[[List[Assignment]], Awaitable | None] | None = None,
+            loads: MutableMapping[int, int] | None = None
+    ):
+        self._store = store
+        self._config = config
+        self._on_assigned = on_assigned
+        self._pending: Dict[int, PendingOrder] = {}
+        # orders each courier is carrying, couriers without any are left out
+        self._loads = {} if loads is None else loads
+        self._task: asyncio.Task | None = None
+        self.stats = MatchingStats()
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def submit(self, order: PendingOrder):
+        self._pending[order.order_id] = order
+
+    def cancel(self, order_id: int) -> bool:
+        return self._pending.pop(order_id, None) is not None
+
+    def load_of(self, courier_id: int) -> int:
+        return self._loads.get(courier_id, 0)
+
+    def acquire(self, courier_id: int):
+        """
+        The courier took on an order outside a batch, or one it held before a restart
+        """
+        self._loads[courier_id] = self._loads.get(courier_id, 0) + 1
+
+    def release(self, courier_id: int):
+        """
+        The courier finished or dropped one of its orders
+        """
+        load = self._loads.get(courier_id, 0) - 1
+        if load > 0:
+            self._loads[courier_id] = load
+        else:
+            self._loads.pop(courier_id, None)
+
+    def match(self, orders: Sequence[PendingOrder]) -> Tuple[List[Assignment], List[PendingOrder]]:
+        """
+        Assign a batch of orders, returning the assignments and the orders no courier could take
+        """
+        assignments, unmatched = self.propose(orders)
+        self.commit(assignments)
+        return assignments, unmatched
+
+    def propose(self, orders: Sequence[PendingOrder], candidates: Sequence[CourierPosition] | None = None
+                ) -> Tuple[List[Assignment], List[PendingOrder]]:
+        """
+        Same as match without recording the assignments against the couriers' loads. `candidates` replaces
+        the lookup of nearby couriers in the store.
+        """
+        if candidates is None:
+            courier_ids: Dict[int, None] = {}
+            self._collect_candidates(orders, courier_ids)
+            candidates = self._positions(courier_ids)
+
+        batch = self._build_batch(orders, candidates)
+        if batch is None:
+            return [], list(orders)
+
+        return self._assignments(batch, solve(batch.cost, self._config))
+
+    def commit(self, assignments: Sequence[Assignment]):
+        for assigned in assignments:
+            self.acquire(assigned.courier_id)
+
+    async def run_batch(self) -> List[Assignment]:
+        orders, self._pending = list(self._pending.values()), {}
+        if not orders:
+            return []
+
+        assignments, unmatched = await self.match_batch(orders)
+        for order in unmatched:
+            # a newer submission for the same order wins over the carried one
+            self._pending.setdefault(order.order_id, order)
+        self.stats.orders_carried += len(unmatched)
+
+        if assignments and self._on_assigned is not None:
+            result = self._on_assigned(assignments)
+            if inspect.isawaitable(result):
+                await result
+
+        return assignments
+
+    async def match_batch(self, orders: Sequence[PendingOrder]) -> Tuple[List[Assignment], List[PendingOrder]]:
+        """
+        Match the given orders now, outside the pending window; the orders left unmatched are returned
+        rather than carried
+        """
+        started = time.perf_counter()
+        assignments, unmatched = await self._match_batch(list(orders))
+
+        self.stats.batches += 1
+        self.stats.orders_matched += len(assignments)
+        self.stats.last_batch_size = len(orders)
+        self.stats.last_batch_ms = round((time.perf_counter() - started) * 1000, 3)
+        return assignments, unmatched
+
+    async def _match_batch(self, orders: List[PendingOrder]) -> Tuple[List[Assignment], List[PendingOrder]]:
+        # nearest-courier lookups are the slow part of building a large batch, yield between chunks so
+        # location updates keep flowing
+        courier_ids: Dict[int, None] = {}
+        for start in range(0, len(orders), _CANDIDATE_CHUNK):
+            if start:
+                await asyncio.sleep(0)
+            self._collect_candidates(orders[start:start + _CANDIDATE_CHUNK], courier_ids)
+
+        batch = self._build_batch(orders, self._positions(courier_ids))
+        if batch is None:
+            return [], orders
+
+        # the solver only touches the cost matrix, so it runs off the event loop
+        pairs = await asyncio.to_thread(solve, batch.cost, self._config)
+        assignments, unmatched = self._assignments(batch, pairs)
+        self.commit(assignments)
+        return assignments, unmatched
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run(), name="matching-engine")
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self._config.window)
+            try:
+                await self.run_batch()
+            except Exception:
+                _Logger.exception("matching batch failed")
+
+    def _collect_candidates(self, orders: Sequence[PendingOrder], candidates: Dict[int, None]):
+        """
+        Add the nearest couriers with spare capacity around each order. Every candidate is priced against
+        every order in the batch, so a courier near two orders can go to either.
+        """
+        config = self._config
+        for order in orders:
+            # ask for extra couriers in case some of the nearest are already full
+            neighbours = self._store.nearest(order.lat, order.lng, 2 * config.candidates_per_order,
+                                             config.max_pickup_m)
+            self._add_candidates(neighbours, candidates)
+
+    def _add_candidates(self, neighbours: Sequence[Tuple[CourierPosition, float]], candidates: Dict[int, None]):
+        """
+        Add the first candidates_per_order couriers of a nearest-first list that can take another order
+        """
+        config = self._config
+        found = 0
+        for position, _ in neighbours:
+            if self._loads.get(position.courier_id, 0) >= config.max_active_orders:
+                continue
+            candidates[position.courier_id] = None
+            found += 1
+            if found == config.candidates_per_order:
+                break
+
+    def _positions(self, courier_ids) -> List[CourierPosition]:
+        positions = (self._store.get(courier_id) for courier_id in courier_ids)
+        # couriers can go offline between gathering candidates and building the batch
+        return [position for position in positions if position is not None]
+
+    def _build_batch(self, orders: Sequence[PendingOrder], positions: Sequence[CourierPosition]) -> _Batch | None:
+        if not positions:
+            return None
+
+        courier_ids = [p.courier_id for p in positions]
+        cost, distance, eta = build_cost_matrix(
+            np.fromiter((p.lat for p in positions), dtype=np.float64, count=len(positions)),
+            np.fromiter((p.lng for p in positions), dtype=np.float64, count=len(positions)),
+            np.fromiter((self.load_of(c) for c in courier_ids), dtype=np.float64, count=len(courier_ids)),
+            np.fromiter((o.lat for o in orders), dtype=np.float64, count=len(orders)),
+            np.fromiter((o.lng for o in orders), dtype=np.float64, count=len(orders)),
+            self._config,
+        )
+
+        excluded = [(col, order.excluded) for col, order in enumerate(orders) if order.excluded]
+        if excluded:
+            rows = {courier_id: row for row, courier_id in enumerate(courier_ids)}
+            for col, excluded_ids in excluded:
+                for courier_id in excluded_ids:
+                    row = rows.get(courier_id)
+                    if row is not None:
+                        # an infinite distance also keeps the pair out of the assignments
+                        cost[row, col] = infeasible_cost(self._config)
+                        distance[row, col] = np.inf
+        return _Batch(orders, courier_ids, cost, distance, eta)
+
+    def _assignments(self, batch: _Batch, pairs: assignment.Pairs) -> Tuple[List[Assignment], List[PendingOrder]]:
+        rows, cols = pairs
+        feasible = batch.distance[rows, cols] <= self._config.max_pickup_m
+        rows, cols = rows[feasible], cols[feasible]
+
+        assignments = [
+            Assignment(
+                batch.orders[col].order_id, batch.courier_ids[row], float(batch.distance[row, col]),
+                float(batch.eta[row, col]), float(batch.cost[row, col]),
+            )
+            for row, col in zip(rows.tolist(), cols.tolist())
+        ]
+
+        matched = np.zeros(len(batch.orders), dtype=bool)
+        matched[cols] = True
+        return assignments, [order for order, done in zip(batch.orders, matched.tolist()) if not done]
@@ -0,0 +1,174 @@
+"""
+Offers pushed to couriers, with delivery acknowledgements.
+
+The scheduler hands over every tick's offers as one batch, pushed through the connection registry in one
+pass. The courier app acknowledges an offer as soon as it shows it, before the courier decides. An offer
+that cannot be pushed, its courier not connected or too far behind, or that is not acknowledged within
+ack_timeout_s, is withdrawn, and the scheduler is woken to offer the job to the next best courier right away
+rather than waiting out the offer timeout.
+
+Couriers answer on the same socket:
+    {"type": "ack" | "accept" | "decline", "job_id": 123}
+and are pushed
+    {"type": "offer", "job_id": ..., "lat": ..., "lng": ..., "tier": ..., "deadline": ..., "expires_at": ...}
+    {"type": "accepted" | "declined", "job_id": ..., "ok": true | false}
+"""
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Sequence, Tuple
+
+from src.models.job import DispatchJob
+from src.services.connection_registry import ConnectionRegistry
+from src.services.job_scheduler import JobScheduler
+from src.settings import PushConfig
+
+_Logger = logging.getLogger(__name__)
+
+
+class PushStats:
+    __slots__ = ("offers", "pushed", "unreachable", "acknowledged", "ack_timeouts", "withdrawn", "latencies_ms")
+
+    def __init__(self, latency_samples: int):
+        self.offers = 0
+        self.pushed = 0
+        self.unreachable = 0
+        self.acknowledged = 0
+        self.ack_timeouts = 0
+        self.withdrawn = 0
+        # push to acknowledgement, the most recent latency_samples of them
+        self.latencies_ms: Deque[float] = deque(maxlen=latency_samples)
+
+    @property
+    def ack_rate(self) -> float:
+        return round(self.acknowledged / self.pushed, 4) if self.pushed else 0.0
+
+    def as_dict(self) -> Dict:
+        latencies = sorted(self.latencies_ms)
+        return {
+            **{name: getattr(self, name) for name in self.__slots__ if name != "latencies_ms"},
+            "ack_rate": self.ack_rate,
+            **{f"ack_p{pct}_ms": _percentile(latencies, pct) for pct in (50, 95, 99)},
+        }
+
+
+def _percentile(sorted_samples: List[float], pct: int) -> float:
+    if not sorted_samples:
+        return 0.0
+    return round(sorted_samples[min(len(sorted_samples) - 1, len(sorted_samples) * pct // 100)], 3)
+
+
+def offer_message(job: DispatchJob) -> str:
+    return json.dumps({
+        "type": "offer", "job_id": job.job_id, "lat": job.lat, "lng": job.lng, "tier": job.tier,
+        "deadline": job.deadline, "expires_at": job.offer_expires_at,
+    }, separators=(",", ":"))
+
+
+class OfferDispatcher:
+    def __init__(self, registry: ConnectionRegistry, scheduler: JobScheduler, config: PushConfig):
+        self._registry = registry
+        self._scheduler = scheduler
+        self._config = config
+        # job id -> (offer, monotonic time it was pushed at), oldest push first
+        self._unacked: OrderedDict[int, Tuple[DispatchJob, float]] = OrderedDict()
+        self._task: asyncio.Task | None = None
+        self.stats = PushStats(config.latency_samples)
+
+    @property
+    def unacknowledged(self) -> int:
+        return len(self._unacked)
+
+    async def offer(self, jobs: Sequence[DispatchJob]):
+        """
+        Push a batch of offers, each to the courier it is made to
+        """
+        self.stats.offers += len(jobs)
+        pushed = self._registry.push_many((job.courier_id, offer_message(job)) for job in jobs)
+        pushed_at = time.monotonic()
+
+        lost = []
+        for job, was_pushed in zip(jobs, pushed):
+            if not was_pushed:
+                lost.append(job)
+            else:
+                self._unacked.pop(job.job_id, None)
+                self._unacked[job.job_id] = (job, pushed_at)
+        self.stats.pushed += len(jobs) - len(lost)
+        self.stats.unreachable += len(lost)
+        if lost:
+            await self._withdraw(lost)
+
+    def acknowledge(self, courier_id: int, job_id: int) -> bool:
+        unacked = self._unacked.get(job_id)
+        if unacked is None or unacked[0].courier_id != courier_id:
+            return False
+
+        del self._unacked[job_id]
+        self.stats.acknowledged += 1
+        self.stats.latencies_ms.append((time.monotonic() - unacked[1]) * 1000)
+        return True
+
+    async def handle(self, courier_id: int, kind: str, job_id: int) -> str | None:
+        """
+        A message from the courier's socket, returning the reply to push back if any
+        """
+        if kind == "ack":
+            self.acknowledge(courier_id, job_id)
+            return None
+        if kind not in ("accept", "decline"):
+            raise ValueError(f"unknown message type {kind!r}")
+
+        # answering is acknowledging, should the app have skipped the ack
+        self.acknowledge(courier_id, job_id)
+        if kind == "accept":
+            ok = await self._scheduler.accept(job_id, courier_id)
+        else:
+            ok = await self._scheduler.decline(job_id, courier_id)
+        return json.dumps({"type": f"{kind}ed", "job_id": job_id, "ok": ok}, separators=(",", ":"))
+
+    async def check_acks(self, now: float | None = None) -> int:
+        """
+        Withdraw the offers that are past ack_timeout_s unacknowledged, returning how many
+        """
+        now = time.monotonic() if now is None else now
+        cutoff = now - self._config.ack_timeout_s
+        expired = []
+        while self._unacked:
+            job_id, (job, pushed_at) = next(iter(self._unacked.items()))
+            if pushed_at > cutoff:
+                break
+            del self._unacked[job_id]
+            expired.append(job)
+
+        if expired:
+            self.stats.ack_timeouts += len(expired)
+            await self._withdraw(expired)
+        return len(expired)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run(), name="offer-acks")
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self._config.ack_check_interval)
+            try:
+                await self.check_acks()
+            except Exception:
+                _Logger.exception("withdrawing unacknowledged offers failed")
+
+    async def _withdraw(self, jobs: List[DispatchJob]):
+        self.stats.withdrawn += await self._scheduler.withdraw(jobs)
+        self._scheduler.wake()
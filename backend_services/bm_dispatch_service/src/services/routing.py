@@ -0,0 +1,43 @@
+"""
+Travel time providers for the ETA service. A backend answers many origin/destination pairs per call so a
+remote routing engine can be asked in bulk.
+"""
+from abc import ABC, abstractmethod
+
+import numpy as np
+from src.helpers.geo import haversine_np_m
+
+# how much slower than free flow traffic moves, by local hour of the day
+_CONGESTION = (
+    1.0, 1.0, 1.0, 1.0, 1.0, 1.05, 1.2, 1.6, 1.8, 1.5, 1.25, 1.2,
+    1.3, 1.3, 1.2, 1.25, 1.5, 1.8, 1.9, 1.6, 1.3, 1.15, 1.05, 1.0,
+)
+
+
+class RoutingBackend(ABC):
+    @abstractmethod
+    async def travel_times(self, from_lats: np.ndarray, from_lngs: np.ndarray, to_lats: np.ndarray,
+                           to_lngs: np.ndarray, depart_at: float) -> np.ndarray:
+        """
+        Seconds from each origin to the destination at the same index, leaving at `depart_at`
+        """
+
+
+class StubRoutingBackend(RoutingBackend):
+    """
+    Local stand-in for a routing engine: the straight-line distance stretched by a detour factor, at a
+    speed that drops in the rush hours
+    """
+
+    def __init__(self, speed_mps: float, detour_factor: float, utc_offset_hours: float = 0):
+        self.speed_mps = speed_mps
+        self.detour_factor = detour_factor
+        self.utc_offset_hours = utc_offset_hours
+        self.calls = 0
+
+    async def travel_times(self, from_lats: np.ndarray, from_lngs: np.ndarray, to_lats: np.ndarray,
+                           to_lngs: np.ndarray, depart_at: float) -> np.ndarray:
+        self.calls += 1
+        hour = int((depart_at / 3600 + self.utc_offset_hours) % 24)
+        distance = haversine_np_m(from_lats, from_lngs, to_lats, to_lngs)
+        return distance * (self.detour_factor * _CONGESTION[hour] / self.speed_mps)
@@ -0,0 +1,299 @@
+"""
+Dispatch state sharded by region over worker processes.
+
+Spatial queries and matching are CPU bound and a single uvicorn event loop can only run one at a time.
+The pool keeps courier positions in a shared memory table written by this process only, and hands each
+worker the couriers in the tiles hashed to it: a location update crosses to the owning worker as a row
+number, and queries and matching are forwarded to the shards whose tiles they touch. Queries near a tile
+edge fan out to every shard that owns part of the search circle and the results are merged here. Nearest
+queries issued in the same event loop iteration go to each shard as one batch, so a burst of requests
+costs one round trip per shard instead of one per query.
+"""
+import asyncio
+import functools
+import heapq
+import logging
+import multiprocessing
+import time
+from collections import defaultdict
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Dict, Iterable, List, Sequence, Set, Tuple
+
+import numpy as np
+from src.helpers.regions import RegionPartitioner
+from src.models.courier import CourierPosition
+from src.models.order import Assignment, PendingOrder
+from src.repositories.location_store import POSITION_ROW
+from src.repositories.shared_positions import SharedLoads, SharedPositionTable
+from src.services import shard_worker
+from src.settings import MatchingConfig
+
+_Logger = logging.getLogger(__name__)
+
+Neighbours = List[Tuple[CourierPosition, float]]
+
+
+class ShardStats:
+    __slots__ = ("updates", "moves", "queries", "fanned_out", "failed")
+
+    def __init__(self):
+        self.updates = 0
+        self.moves = 0
+        self.queries = 0
+        self.fanned_out = 0
+        self.failed = 0
+
+    def as_dict(self) -> Dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class ShardPool:
+    """
+    Stands in for CourierLocationStore: updates and lookups by id are synchronous and served from the
+    shared table, spatial queries are coroutines answered by the shards.
+    """
+
+    def __init__(self, shards: int, capacity: int, tile_deg: float, cell_size: float, config: MatchingConfig):
+        self.partitioner = RegionPartitioner(shards, tile_deg)
+        self.table = SharedPositionTable(capacity)
+        self.loads = SharedLoads(self.table, self.table.slot_of)
+        self._cell_size = cell_size
+        self._config = config
+        self._shard_of: Dict[int, int] = {}
+        self._executors: List[ProcessPoolExecutor] = []
+        self._queued: Dict[int, List[Tuple[Tuple, asyncio.Future]]] = {}
+        self.stats = ShardStats()
+
+    @property
+    def shards(self) -> int:
+        return self.partitioner.shards
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    def __contains__(self, courier_id: int) -> bool:
+        return self.table.slot_of(courier_id) is not None
+
+    def start(self):
+        if self._executors:
+            return
+
+        # the block is only mapped here: spawned workers import the app module again and must not create one
+        self.table.open()
+        # spawned rather than forked: the parent runs an event loop and threads that must not be copied
+        context = multiprocessing.get_context("spawn")
+        self._executors = [
+            ProcessPoolExecutor(
+                max_workers=1, mp_context=context, initializer=shard_worker.init,
+                initargs=(shard, self.table.name, self.table.capacity, self._cell_size, self._config),
+            )
+            for shard in range(self.shards)
+        ]
+
+    def close(self):
+        executors, self._executors = self._executors, []
+        for executor in executors:
+            executor.shutdown(wait=True, cancel_futures=True)
+        self.table.close()
+
+    def update(self, courier_id: int, lat: float, lng: float, updated_at: float | None = None):
+        self.update_many([(courier_id, lat, lng, time.time() if updated_at is None else updated_at)])
+
+    def update_many(self, updates: Iterable[Tuple[int, float, float, float]]):
+        """
+        Write the positions to the shared table and send each owning shard the rows that changed. A courier
+        that crossed into another shard's tile is removed from the one it left.
+        """
+        slots = defaultdict(list)
+        moved = defaultdict(list)
+        for courier_id, lat, lng, updated_at in updates:
+            if not -90 <= lat <= 90 or not -180 <= lng <= 180:
+                raise ValueError(f"invalid coordinates ({lat}, {lng})")
+
+            slot = self.table.write(courier_id, lat, lng, updated_at)
+            shard = self.partitioner.shard_of(lat, lng)
+            previous = self._shard_of.get(courier_id)
+            if previous != shard:
+                if previous is not None:
+                    moved[previous].append(courier_id)
+                self._shard_of[courier_id] = shard
+            slots[shard].append((slot, courier_id))
+
+        for shard, courier_ids in moved.items():
+            self.stats.moves += len(courier_ids)
+            self._send(shard, shard_worker.remove, courier_ids)
+        for shard, rows in slots.items():
+            self.stats.updates += len(rows)
+            rows = np.asarray(rows, dtype=np.int64)
+            self._send(shard, shard_worker.apply, rows[:, 0], rows[:, 1])
+
+    def load(self, rows: np.ndarray, chunk: int = 50_000):
+        """
+        Load POSITION_ROW rows; they go to the shards as ordinary updates, a chunk at a time
+        """
+        for start in range(0, len(rows), chunk):
+            self.update_many(rows[start:start + chunk].tolist())
+
+    def export(self) -> np.ndarray:
+        """
+        Every courier's position as POSITION_ROW rows, read from the shared table
+        """
+        table = self.table
+        slots = table.live_slots()
+        rows = np.empty(len(slots), dtype=POSITION_ROW)
+        rows["courier_id"] = table.ids[slots]
+        rows["lat"] = table.lats[slots]
+        rows["lng"] = table.lngs[slots]
+        rows["updated_at"] = table.updated_at[slots]
+        return rows
+
+    def remove(self, courier_id: int) -> bool:
+        shard = self._shard_of.pop(courier_id, None)
+        if self.table.release(courier_id) is None:
+            return False
+
+        self._send(shard, shard_worker.remove, [courier_id])
+        return True
+
+    def get(self, courier_id: int) -> CourierPosition | None:
+        slot = self.table.slot_of(courier_id)
+        if slot is None:
+            return None
+
+        table = self.table
+        return CourierPosition(courier_id, float(table.lats[slot]), float(table.lngs[slot]),
+                               float(table.updated_at[slot]))
+
+    async def within_radius(self, lat: float, lng: float, radius_m: float, limit: int | None = None) -> Neighbours:
+        shards = self.partitioner.shards_for_circle(lat, lng, radius_m)
+        self._count_query(shards)
+        results = await asyncio.gather(*(
+            self._call(shard, shard_worker.within_radius, lat, lng, radius_m, limit) for shard in shards
+        ))
+        return _merge(results, limit)
+
+    async def nearest(self, lat: float, lng: float, k: int, max_radius_m: float | None = None) -> Neighbours:
+        """
+        Asks the shard owning the point first. Shards owning tiles within the k-th distance found there, or
+        within max_radius_m if it found fewer, are asked next, every shard when there is no bound.
+        """
+        owner = self.partitioner.shard_of(lat, lng)
+        found = await self._nearest(owner, lat, lng, k, max_radius_m)
+
+        radius = found[-1][1] if len(found) == k else max_radius_m
+        if radius is None:
+            others = set(range(self.shards))
+        else:
+            others = self.partitioner.shards_for_circle(lat, lng, radius)
+        others.discard(owner)
+        self._count_query(others | {owner})
+        if not others:
+            return found
+
+        results = await asyncio.gather(*(self._nearest(shard, lat, lng, k, radius) for shard in others))
+        return _merge([found, *results], k)
+
+    async def nearest_many(self, points: Sequence[Tuple[float, float]], k: int, max_radius_m: float
+                           ) -> List[Neighbours]:
+        """
+        Nearest couriers of many points within a fixed radius, each asked of every shard its circle touches
+        """
+        async def one(lat: float, lng: float) -> Neighbours:
+            shards = self.partitioner.shards_for_circle(lat, lng, max_radius_m)
+            self._count_query(shards)
+            results = await asyncio.gather(*(self._nearest(shard, lat, lng, k, max_radius_m) for shard in shards))
+            return _merge(results, k)
+
+        return await asyncio.gather(*(one(lat, lng) for lat, lng in points))
+
+    def split(self, orders: Sequence[PendingOrder]) -> Tuple[Dict[int, List[PendingOrder]], List[PendingOrder]]:
+        """
+        Orders whose pickup radius lies in a single shard's tiles, by shard, and the orders on a boundary
+        """
+        interior = defaultdict(list)
+        boundary = []
+        for order in orders:
+            shards = self.partitioner.shards_for_circle(order.lat, order.lng, self._config.max_pickup_m)
+            if len(shards) == 1:
+                interior[shards.pop()].append(order)
+            else:
+                boundary.append(order)
+        return interior, boundary
+
+    async def propose(self, shard: int, orders: Sequence[PendingOrder]
+                      ) -> Tuple[List[Assignment], List[PendingOrder]]:
+        return await self._call(shard, shard_worker.propose, orders)
+
+    async def propose_with(self, shard: int, orders: Sequence[PendingOrder], courier_ids: Sequence[int]
+                           ) -> Tuple[List[Assignment], List[PendingOrder]]:
+        rows = [(self.table.slot_of(courier_id), courier_id) for courier_id in courier_ids]
+        rows = np.asarray([row for row in rows if row[0] is not None], dtype=np.int64).reshape(-1, 2)
+        return await self._call(shard, shard_worker.propose_with, orders, rows[:, 0], rows[:, 1])
+
+    async def shard_stats(self) -> List[Dict]:
+        return await asyncio.gather(*(self._call(shard, shard_worker.stats) for shard in range(self.shards)))
+
+    def _nearest(self, shard: int, lat: float, lng: float, k: int, max_radius_m: float | None) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        queued = self._queued.get(shard)
+        if queued is None:
+            queued = self._queued[shard] = []
+            # runs after every task already scheduled in this iteration had the chance to queue its query
+            loop.call_soon(self._flush_nearest, shard)
+        queued.append(((lat, lng, k, max_radius_m), future))
+        return future
+
+    def _flush_nearest(self, shard: int):
+        queued = self._queued.pop(shard)
+        done = self._call(shard, shard_worker.nearest, [query for query, _ in queued])
+        done.add_done_callback(functools.partial(_resolve, [future for _, future in queued]))
+
+    def _call(self, shard: int, function, *args) -> asyncio.Future:
+        return asyncio.wrap_future(self._executors[shard].submit(function, *args))
+
+    def _send(self, shard: int, function, *args):
+        """
+        Submit without waiting. Each shard runs one worker, so its calls still apply in submission order.
+        """
+        future = self._executors[shard].submit(function, *args)
+        future.add_done_callback(functools.partial(self._sent, shard, function.__name__))
+
+    def _sent(self, shard: int, name: str, future: Future):
+        if not future.cancelled() and future.exception() is not None:
+            self.stats.failed += 1
+            _Logger.error("shard %s failed %s", shard, name, exc_info=future.exception())
+
+    def _count_query(self, shards: Set[int]):
+        self.stats.queries += 1
+        if len(shards) > 1:
+            self.stats.fanned_out += 1
+
+
+def _resolve(futures: List[asyncio.Future], done: asyncio.Future):
+    for index, future in enumerate(futures):
+        if future.done():
+            continue
+        if done.cancelled():
+            future.cancel()
+        elif done.exception() is not None:
+            future.set_exception(done.exception())
+        else:
+            future.set_result(done.result()[index])
+
+
+def _merge(parts: Iterable[Neighbours], limit: int | None) -> Neighbours:
+    """
+    Merge nearest-first results from several shards. A courier that just moved between shards can be in
+    both until the old one processes its removal; the nearer entry is kept.
+    """
+    merged = []
+    seen = set()
+    for position, distance in heapq.merge(*parts, key=lambda found: found[1]):
+        if position.courier_id in seen:
+            continue
+        seen.add(position.courier_id)
+        merged.append((position, distance))
+        if limit is not None and len(merged) == limit:
+            break
+    return merged
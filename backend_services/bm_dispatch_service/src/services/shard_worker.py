@@ -0,0 +1,107 @@
+"""
+Entry points run inside a shard worker process.
+
+Each worker attaches to the shared position table and keeps a spatial index and a matching engine over the
+couriers whose positions fall in its tiles. Functions here are submitted by ShardPool and operate on the
+process-global state set up by `init`.
+"""
+import logging
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+from src.models.courier import CourierPosition
+from src.models.order import Assignment, PendingOrder
+from src.repositories.location_store import CourierLocationStore
+from src.repositories.shared_positions import SharedLoads, SharedPositionTable
+from src.services.matching_engine import MatchingEngine
+from src.settings import MatchingConfig
+
+_Logger = logging.getLogger(__name__)
+
+
+class _Shard:
+    def __init__(self, shard_id: int, table: SharedPositionTable, cell_size: float, config: MatchingConfig):
+        self.shard_id = shard_id
+        self.table = table
+        self.store = CourierLocationStore(cell_size=cell_size)
+        # rows of the couriers this shard has seen, owned or passed in as boundary candidates
+        self.slots: Dict[int, int] = {}
+        self.engine = MatchingEngine(self.store, config, loads=SharedLoads(table, self.slots.get))
+
+
+_shard: _Shard | None = None
+
+
+def init(shard_id: int, table_name: str, capacity: int, cell_size: float, config: MatchingConfig):
+    global _shard
+    _shard = _Shard(shard_id, SharedPositionTable(capacity, name=table_name).open(), cell_size, config)
+    _Logger.info("shard %s attached to %s", shard_id, table_name)
+
+
+def apply(slots: np.ndarray, courier_ids: np.ndarray) -> int:
+    """
+    Index the current positions in the given rows. A row reassigned to another courier since it was sent
+    is skipped, the courier it was sent for has been removed.
+    """
+    table = _shard.table
+    current = table.ids[slots] == courier_ids
+    slots, courier_ids = slots[current], courier_ids[current]
+    updates = zip(courier_ids.tolist(), table.lats[slots].tolist(), table.lngs[slots].tolist(),
+                  table.updated_at[slots].tolist())
+    _shard.store.update_many(updates)
+    _shard.slots.update(zip(courier_ids.tolist(), slots.tolist()))
+    return len(slots)
+
+
+def remove(courier_ids: Sequence[int]) -> int:
+    removed = 0
+    for courier_id in courier_ids:
+        _shard.slots.pop(courier_id, None)
+        removed += _shard.store.remove(courier_id)
+    return removed
+
+
+def nearest(queries: Sequence[Tuple[float, float, int, float | None]]) -> List[List[Tuple[CourierPosition, float]]]:
+    """
+    Answers a batch of (lat, lng, k, max_radius_m) nearest queries
+    """
+    return [_shard.store.nearest(lat, lng, k, max_radius_m) for lat, lng, k, max_radius_m in queries]
+
+
+def within_radius(lat: float, lng: float, radius_m: float, limit: int | None
+                  ) -> List[Tuple[CourierPosition, float]]:
+    return _shard.store.within_radius(lat, lng, radius_m, limit)
+
+
+def propose(orders: Sequence[PendingOrder]) -> Tuple[List[Assignment], List[PendingOrder]]:
+    return _shard.engine.propose(orders)
+
+
+def propose_with(orders: Sequence[PendingOrder], slots: np.ndarray, courier_ids: np.ndarray
+                 ) -> Tuple[List[Assignment], List[PendingOrder]]:
+    """
+    Match orders against candidates gathered from several shards, read from the shared table by row
+    """
+    table = _shard.table
+    current = table.ids[slots] == courier_ids
+    slots, courier_ids = slots[current], courier_ids[current]
+    _shard.slots.update(zip(courier_ids.tolist(), slots.tolist()))
+
+    candidates = [
+        CourierPosition(courier_id, lat, lng, updated_at)
+        for courier_id, lat, lng, updated_at in zip(
+            courier_ids.tolist(), table.lats[slots].tolist(), table.lngs[slots].tolist(),
+            table.updated_at[slots].tolist(),
+        )
+    ]
+    try:
+        return _shard.engine.propose(orders, candidates)
+    finally:
+        # guests are only resolvable while their batch is being priced
+        for courier_id in courier_ids.tolist():
+            if courier_id not in _shard.store:
+                _shard.slots.pop(courier_id, None)
+
+
+def stats() -> Dict:
+    return {"shard": _shard.shard_id, "couriers": len(_shard.store)}
@@ -0,0 +1,55 @@
+import asyncio
+from typing import Dict, List, Sequence, Tuple
+
+from src.models.order import Assignment, PendingOrder
+from src.services.matching_engine import MatchingEngine
+from src.services.shard_pool import ShardPool
+from src.settings import MatchingConfig
+
+
+class ShardedMatchingEngine(MatchingEngine):
+    """
+    Matching over a ShardPool. Orders whose pickup radius lies inside one shard's tiles are matched by
+    their shards in parallel, none of them can compete for a courier of another shard. The remaining
+    boundary orders gather candidates from every shard they touch and are solved together by one shard,
+    after the interior assignments are counted against the couriers' loads.
+    """
+
+    def __init__(self, pool: ShardPool, config: MatchingConfig, on_assigned=None):
+        super().__init__(pool, config, on_assigned, loads=pool.loads)
+        self._pool = pool
+        self._next_shard = 0
+
+    async def _match_batch(self, orders: List[PendingOrder]) -> Tuple[List[Assignment], List[PendingOrder]]:
+        interior, boundary = self._pool.split(orders)
+        results = await asyncio.gather(*(self._pool.propose(shard, part) for shard, part in interior.items()))
+
+        assignments, unmatched = [], []
+        for proposed, left in results:
+            assignments.extend(proposed)
+            unmatched.extend(left)
+        self.commit(assignments)
+
+        if boundary:
+            proposed, left = await self._match_boundary(boundary)
+            assignments.extend(proposed)
+            unmatched.extend(left)
+
+        return assignments, unmatched
+
+    async def _match_boundary(self, orders: Sequence[PendingOrder]) -> Tuple[List[Assignment], List[PendingOrder]]:
+        config = self._config
+        found = await self._pool.nearest_many(
+            [(order.lat, order.lng) for order in orders], 2 * config.candidates_per_order, config.max_pickup_m
+        )
+        courier_ids: Dict[int, None] = {}
+        for neighbours in found:
+            self._add_candidates(neighbours, courier_ids)
+        if not courier_ids:
+            return [], list(orders)
+
+        # spread the boundary batches over the shards rather than always loading the first one
+        shard, self._next_shard = self._next_shard, (self._next_shard + 1) % self._pool.shards
+        assignments, unmatched = await self._pool.propose_with(shard, orders, list(courier_ids))
+        self.commit(assignments)
+        return assignments, unmatched
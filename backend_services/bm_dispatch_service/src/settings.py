@@ -0,0 +1,209 @@
+import os
+from collections import namedtuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LocationStoreConfig = namedtuple("LocationStoreConfig", "cell_size")
+
+LOCATION_STORE = LocationStoreConfig(
+    cell_size=float(os.getenv("LOCATION_CELL_SIZE", 0.01)),
+)
+
+LocationIngestConfig = namedtuple(
+    "LocationIngestConfig", "flush_interval,apply_chunk_size,frames_per_second,burst,max_dropped,max_frame_bytes"
+)
+
+# pings are coalesced per courier and applied to the store every flush_interval seconds,
+# connections sending faster than frames_per_second (after a burst) are throttled, and closed once
+# max_dropped frames in a row are dropped
+LOCATION_INGEST = LocationIngestConfig(
+    flush_interval=float(os.getenv("LOCATION_FLUSH_INTERVAL", 0.25)),
+    apply_chunk_size=int(os.getenv("LOCATION_APPLY_CHUNK_SIZE", 2000)),
+    frames_per_second=float(os.getenv("LOCATION_FRAMES_PER_SECOND", 2)),
+    burst=int(os.getenv("LOCATION_BURST", 10)),
+    max_dropped=int(os.getenv("LOCATION_MAX_DROPPED", 50)),
+    max_frame_bytes=int(os.getenv("LOCATION_MAX_FRAME_BYTES", 256)),
+)
+
+ServerConfig = namedtuple("ServerConfig", "host,port,ws_max_size,ws_max_queue,ws_ping_interval,ws_per_message_deflate")
+
+# small websocket buffers and queues keep the footprint of an idle courier connection low, and location
+# frames are too small to gain from compression that costs a few hundred KB of zlib state per connection
+SERVER = ServerConfig(
+    host=os.getenv("DISPATCH_HOST", "0.0.0.0"),
+    port=int(os.getenv("DISPATCH_PORT", 8001)),
+    ws_max_size=int(os.getenv("DISPATCH_WS_MAX_SIZE", 4096)),
+    ws_max_queue=int(os.getenv("DISPATCH_WS_MAX_QUEUE", 4)),
+    ws_ping_interval=float(os.getenv("DISPATCH_WS_PING_INTERVAL", 30)),
+    ws_per_message_deflate=os.getenv("DISPATCH_WS_PER_MESSAGE_DEFLATE", "false").lower() == "true",
+)
+
+MatchingConfig = namedtuple(
+    "MatchingConfig",
+    "window,candidates_per_order,max_pickup_m,speed_mps,detour_factor,load_penalty_s,max_active_orders,"
+    "hungarian_max_size",
+)
+
+# orders are collected for `window` seconds and matched together; batches where both sides are larger than
+# hungarian_max_size are solved with greedy-with-regret instead of exactly
+MATCHING = MatchingConfig(
+    window=float(os.getenv("MATCHING_WINDOW", 2)),
+    candidates_per_order=int(os.getenv("MATCHING_CANDIDATES_PER_ORDER", 8)),
+    max_pickup_m=float(os.getenv("MATCHING_MAX_PICKUP_M", 5000)),
+    speed_mps=float(os.getenv("MATCHING_SPEED_MPS", 6)),
+    detour_factor=float(os.getenv("MATCHING_DETOUR_FACTOR", 1.3)),
+    load_penalty_s=float(os.getenv("MATCHING_LOAD_PENALTY_S", 300)),
+    max_active_orders=int(os.getenv("MATCHING_MAX_ACTIVE_ORDERS", 2)),
+    hungarian_max_size=int(os.getenv("MATCHING_HUNGARIAN_MAX_SIZE", 500)),
+)
+
+ShardingConfig = namedtuple("ShardingConfig", "workers,capacity,tile_deg")
+
+# with workers > 0 courier positions live in shared memory and spatial queries and matching run in that many
+# worker processes, each owning the tiles of `tile_deg` degrees hashed to it. Orders whose pickup radius
+# stays inside one tile group are matched by its shard alone, so tiles should be wide compared to
+# MATCHING.max_pickup_m
+SHARDING = ShardingConfig(
+    workers=int(os.getenv("DISPATCH_SHARDS", 0)),
+    capacity=int(os.getenv("DISPATCH_SHARD_CAPACITY", 200_000)),
+    tile_deg=float(os.getenv("DISPATCH_SHARD_TILE_DEG", 0.5)),
+)
+
+EtaConfig = namedtuple(
+    "EtaConfig",
+    "min_lat,min_lng,max_lat,max_lng,cell_deg,bucket_hours,utc_offset_hours,near_m,table_refresh_s,cache_size,"
+    "cache_ttl_s,coordinate_decimals,max_batch,speed_mps,detour_factor",
+)
+
+# travel times between the cells of the bounding box are precomputed per time-of-day bucket of bucket_hours
+# and refreshed every table_refresh_s. Trips shorter than near_m, or leaving the box, are routed and cached
+# with coordinates rounded to coordinate_decimals
+ETA = EtaConfig(
+    min_lat=float(os.getenv("ETA_MIN_LAT", 5.45)),
+    min_lng=float(os.getenv("ETA_MIN_LNG", -0.45)),
+    max_lat=float(os.getenv("ETA_MAX_LAT", 5.85)),
+    max_lng=float(os.getenv("ETA_MAX_LNG", 0.05)),
+    cell_deg=float(os.getenv("ETA_CELL_DEG", 0.02)),
+    bucket_hours=int(os.getenv("ETA_BUCKET_HOURS", 3)),
+    utc_offset_hours=float(os.getenv("ETA_UTC_OFFSET_HOURS", 0)),
+    near_m=float(os.getenv("ETA_NEAR_M", 3000)),
+    table_refresh_s=float(os.getenv("ETA_TABLE_REFRESH_S", 900)),
+    cache_size=int(os.getenv("ETA_CACHE_SIZE", 100_000)),
+    cache_ttl_s=float(os.getenv("ETA_CACHE_TTL_S", 300)),
+    coordinate_decimals=int(os.getenv("ETA_COORDINATE_DECIMALS", 4)),
+    max_batch=int(os.getenv("ETA_MAX_BATCH", 10_000)),
+    speed_mps=float(os.getenv("ETA_SPEED_MPS", 6)),
+    detour_factor=float(os.getenv("ETA_DETOUR_FACTOR", 1.3)),
+)
+
+AuthConfig = namedtuple(
+    "AuthConfig", "verifying_key,jwk_url,algorithms,audience,issuer,leeway,user_id_claim,claims_cache_size"
+)
+
+# the verifying side of account_serv's SIMPLE_JWT settings: same key, algorithm and account id claim
+AUTH = AuthConfig(
+    verifying_key=os.getenv("VERIFYING_KEY", ""),
+    jwk_url=os.getenv("JWK_URL", ""),
+    algorithms=("RS256",),
+    audience=os.getenv("JWT_AUDIENCE") or None,
+    issuer=os.getenv("JWT_ISSUER") or None,
+    leeway=float(os.getenv("JWT_LEEWAY", 0)),
+    user_id_claim="account_id",
+    claims_cache_size=int(os.getenv("AUTH_CLAIMS_CACHE_SIZE", 50_000)),
+)
+
+RedisConfig = namedtuple("RedisConfig", "url,host,port,db,password")
+
+# the Redis account_serv caches accounts in, keyed by the bare account id; no host disables it
+REDIS = RedisConfig(
+    url=os.getenv("REDIS_URL", ""),
+    host=os.getenv("REDIS_HOST", ""),
+    port=int(os.getenv("REDIS_PORT", 6379)),
+    db=int(os.getenv("REDIS_DB", 0)),
+    password=os.getenv("REDIS_PASSWORD", ""),
+)
+
+AccountDirectoryConfig = namedtuple(
+    "AccountDirectoryConfig", "base_url,service_token,cache_size,cache_ttl_s,not_found_ttl_s,lookup_delay_s,"
+    "lookup_timeout_s,max_batch"
+)
+
+# profiles missing from Redis are fetched from account_serv in the background, lookup_delay_s worth of
+# misses per request of at most max_batch ids
+ACCOUNTS = AccountDirectoryConfig(
+    base_url=os.getenv("ACCOUNT_SERV_URL", ""),
+    service_token=os.getenv("ACCOUNT_SERV_TOKEN", ""),
+    cache_size=int(os.getenv("ACCOUNT_CACHE_SIZE", 50_000)),
+    cache_ttl_s=float(os.getenv("ACCOUNT_CACHE_TTL_S", 60)),
+    not_found_ttl_s=float(os.getenv("ACCOUNT_NOT_FOUND_TTL_S", 10)),
+    lookup_delay_s=float(os.getenv("ACCOUNT_LOOKUP_DELAY_S", 0.05)),
+    lookup_timeout_s=float(os.getenv("ACCOUNT_LOOKUP_TIMEOUT_S", 2)),
+    max_batch=int(os.getenv("ACCOUNT_LOOKUP_MAX_BATCH", 500)),
+)
+
+JobsConfig = namedtuple(
+    "JobsConfig", "tick_interval,batch_size,offer_timeout_s,max_attempts,tier_spacing_s,default_tier,default_sla_s,"
+    "key_prefix,events_max_length,recovery_chunk"
+)
+
+# every tick_interval offers past offer_timeout_s are retried, up to max_attempts offers a job, and the
+# batch_size most urgent ready jobs are matched. Jobs are ordered by deadline, each tier below 0 counting as
+# tier_spacing_s later. Jobs live in REDIS under key_prefix when it is configured, in memory otherwise
+JOBS = JobsConfig(
+    tick_interval=float(os.getenv("JOBS_TICK_INTERVAL", 2)),
+    batch_size=int(os.getenv("JOBS_BATCH_SIZE", 2000)),
+    offer_timeout_s=float(os.getenv("JOBS_OFFER_TIMEOUT_S", 30)),
+    max_attempts=int(os.getenv("JOBS_MAX_ATTEMPTS", 5)),
+    tier_spacing_s=float(os.getenv("JOBS_TIER_SPACING_S", 300)),
+    default_tier=int(os.getenv("JOBS_DEFAULT_TIER", 1)),
+    default_sla_s=float(os.getenv("JOBS_DEFAULT_SLA_S", 1800)),
+    key_prefix=os.getenv("JOBS_KEY_PREFIX", "dispatch:jobs"),
+    events_max_length=int(os.getenv("JOBS_EVENTS_MAX_LENGTH", 100_000)),
+    recovery_chunk=int(os.getenv("JOBS_RECOVERY_CHUNK", 1000)),
+)
+
+PushConfig = namedtuple("PushConfig", "ack_timeout_s,ack_check_interval,max_outbox,latency_samples")
+
+# an offer pushed to a courier that is not acknowledged within ack_timeout_s goes to the next courier;
+# a connection with max_outbox messages waiting to be written is too slow to be sent more
+PUSH = PushConfig(
+    ack_timeout_s=float(os.getenv("PUSH_ACK_TIMEOUT_S", 1)),
+    ack_check_interval=float(os.getenv("PUSH_ACK_CHECK_INTERVAL", 0.05)),
+    max_outbox=int(os.getenv("PUSH_MAX_OUTBOX", 32)),
+    latency_samples=int(os.getenv("PUSH_LATENCY_SAMPLES", 10_000)),
+)
+
+JournalConfig = namedtuple(
+    "JournalConfig", "directory,segment_bytes,commit_interval,snapshot_interval_s,keep_snapshots,fsync"
+)
+
+# with a directory, courier positions and in-memory job state changes are appended to a log there, fsynced
+# once per commit_interval for everything appended meanwhile, and snapshotted every snapshot_interval_s so a
+# restart loads the newest snapshot and replays only the log after it. No directory disables it
+JOURNAL = JournalConfig(
+    directory=os.getenv("JOURNAL_DIR", ""),
+    segment_bytes=int(os.getenv("JOURNAL_SEGMENT_BYTES", 64 * 1024 * 1024)),
+    commit_interval=float(os.getenv("JOURNAL_COMMIT_INTERVAL", 0.002)),
+    snapshot_interval_s=float(os.getenv("JOURNAL_SNAPSHOT_INTERVAL_S", 300)),
+    keep_snapshots=int(os.getenv("JOURNAL_KEEP_SNAPSHOTS", 2)),
+    fsync=os.getenv("JOURNAL_FSYNC", "true").lower() == "true",
+)
+
+HeatmapConfig = namedtuple(
+    "HeatmapConfig", "min_lat,min_lng,max_lat,max_lng,cell_deg,bucket_s,window_buckets,cache_s"
+)
+
+# orders submitted and couriers seen per cell of cell_deg over the box, counted in buckets of bucket_s and
+# summed over the last window_buckets of them. A rendered heatmap is served for up to cache_s seconds
+HEATMAP = HeatmapConfig(
+    min_lat=float(os.getenv("HEATMAP_MIN_LAT", 5.45)),
+    min_lng=float(os.getenv("HEATMAP_MIN_LNG", -0.45)),
+    max_lat=float(os.getenv("HEATMAP_MAX_LAT", 5.85)),
+    max_lng=float(os.getenv("HEATMAP_MAX_LNG", 0.05)),
+    cell_deg=float(os.getenv("HEATMAP_CELL_DEG", 0.01)),
+    bucket_s=float(os.getenv("HEATMAP_BUCKET_S", 60)),
+    window_buckets=int(os.getenv("HEATMAP_WINDOW_BUCKETS", 15)),
+    cache_s=float(os.getenv("HEATMAP_CACHE_S", 1)),
+)
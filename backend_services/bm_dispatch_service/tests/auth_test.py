@@ -0,0 +1,187 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+from fastapi import Depends
+from src import settings
+from src.factories.app_factory import create_app
+from src.helpers.auth import InvalidToken, get_current_account
+from src.models.account import AccountProfile
+from src.services.account_directory import AccountDirectory
+
+ACCOUNTS = {
+    1: {"id": 1, "displayName": "Ama", "phone": "+233200000001", "timezone": "Africa/Accra", "roles": "courier"},
+    2: {"id": 2, "displayName": "Kofi", "phone": "+233200000002", "timezone": None, "roles": "courier"},
+}
+
+
+@pytest.fixture
+def account_serv():
+    """
+    A local stand-in for account_serv's batch endpoint, recording the ids of every request
+    """
+    requests = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            ids = json.loads(self.rfile.read(int(self.headers["Content-Length"])))["ids"]
+            requests.append((self.path, ids))
+            body = json.dumps({"accounts": [ACCOUNTS.get(account_id) for account_id in ids]}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}", requests
+    server.shutdown()
+    server.server_close()
+
+
+def test_claims_are_memoized_until_the_token_expires(tokens):
+    verifier = tokens.verifier()
+    token = tokens.issue(5, roles="courier")
+
+    async def scenario():
+        return [await verifier.verify(token) for _ in range(3)]
+
+    claims = asyncio.run(scenario())
+
+    assert claims[0]["account_id"] == 5 and claims[0]["roles"] == "courier"
+    assert verifier.stats.as_dict() == {"verified": 1, "memoized": 2, "rejected": 0}
+
+
+@pytest.mark.parametrize("case", ["expired", "other_key", "hs256", "no_account_id"])
+def test_invalid_tokens_are_rejected(tokens, case):
+    verifier = tokens.verifier()
+    token = {
+        "expired": lambda: tokens.issue(5, ttl=-10),
+        "other_key": lambda: tokens.issue(5, key=rsa.generate_private_key(public_exponent=65537, key_size=2048)),
+        "hs256": lambda: tokens.issue(5, key="shared-secret", algorithm="HS256"),
+        "no_account_id": lambda: tokens.issue(None),
+    }[case]()
+
+    with pytest.raises(InvalidToken):
+        asyncio.run(verifier.verify(token))
+    assert verifier.stats.rejected == 1
+
+
+def test_endpoints_require_a_bearer_token(tokens, http_request):
+    app = tokens.authorize(create_app())
+
+    async def scenario():
+        return (
+            await http_request(app, "GET", "/dispatch/stats"),
+            await http_request(app, "GET", "/dispatch/stats", token="garbage"),
+            await http_request(app, "GET", "/dispatch/stats", token=tokens.issue(1)),
+        )
+
+    (missing, _), (garbage, _), (status, body) = asyncio.run(scenario())
+
+    assert (missing, garbage) == (401, 401)
+    assert status == 200 and body["pending"] == 0
+
+
+def test_profiles_missing_from_redis_are_looked_up_in_one_batch(account_serv):
+    base_url, requests = account_serv
+    directory = AccountDirectory(None, settings.ACCOUNTS._replace(base_url=base_url, lookup_delay_s=0.01))
+
+    async def scenario():
+        first = await asyncio.gather(*(directory.get(account_id) for account_id in (1, 2, 3)))
+        while directory._lookup_task is not None:
+            await asyncio.sleep(0.01)
+        second = await asyncio.gather(*(directory.get(account_id) for account_id in (1, 2, 3)))
+        return first, second
+
+    first, second = asyncio.run(scenario())
+
+    assert first == [None, None, None]
+    assert second == [
+        AccountProfile(1, "Ama", "+233200000001", "Africa/Accra"), AccountProfile(2, "Kofi", "+233200000002", None),
+        None,
+    ]
+    assert [(path, sorted(ids)) for path, ids in requests] == [("/account/batch/", [1, 2, 3])]
+    assert directory.stats.lookups == 1
+
+
+class _CachedAccounts:
+    """
+    Redis holding account_serv's cache entries
+    """
+
+    def __init__(self, entries):
+        self.entries = entries
+        self.reads = []
+
+    async def mget(self, keys):
+        self.reads.append(keys)
+        return [self.entries.get(key) for key in keys]
+
+    async def aclose(self):
+        pass
+
+
+def test_profiles_are_read_from_every_cached_account_format(account_serv):
+    base_url, requests = account_serv
+    redis = _CachedAccounts({
+        "1": json.dumps(ACCOUNTS[1]).encode(),
+        # account 2 as account_serv's AccountCodec writes it, schema version 1
+        "2": bytes.fromhex(
+            "0100ce7700000200000000000000000000000000000000000000000000000000000000070000000d00000000000000000000"
+            "000000000000000400000000000000000000000000000000000000000000000000636f75726965722b32333332303030303030"
+            "30324b6f6669"
+        ),
+        # account_serv found nothing for 3
+        "3": b"\x00",
+    })
+    directory = AccountDirectory(redis, settings.ACCOUNTS._replace(base_url=base_url, lookup_delay_s=0.01))
+
+    async def scenario():
+        profiles = await asyncio.gather(*(directory.get(account_id) for account_id in (1, 2, 3, 4)))
+        while directory._lookup_task is not None:
+            await asyncio.sleep(0.01)
+        return profiles, await directory.get(3)
+
+    profiles, again = asyncio.run(scenario())
+
+    assert profiles == [
+        AccountProfile(1, "Ama", "+233200000001", "Africa/Accra"), AccountProfile(2, "Kofi", "+233200000002", None),
+        None, None,
+    ]
+    assert again is None and len(redis.reads) == 1
+    assert directory.stats.redis_hits == 2
+    assert [(path, ids) for path, ids in requests] == [("/account/batch/", [4])]
+
+
+def test_current_account_carries_the_cached_profile(tokens, http_request, account_serv):
+    base_url, _ = account_serv
+    app = tokens.authorize(create_app())
+    config = settings.ACCOUNTS._replace(base_url=base_url, lookup_delay_s=0)
+    app.state.account_directory = AccountDirectory(None, config)
+    captured = []
+
+    @app.get("/me")
+    async def me(account=Depends(get_current_account)):
+        captured.append(account)
+        return {"account_id": account.account_id}
+
+    async def scenario():
+        await http_request(app, "GET", "/me", token=tokens.issue(1))
+        while app.state.account_directory._lookup_task is not None:
+            await asyncio.sleep(0.01)
+        return await http_request(app, "GET", "/me", token=tokens.issue(1))
+
+    status, body = asyncio.run(scenario())
+
+    assert status == 200 and body == {"account_id": 1}
+    assert captured[0].profile is None
+    assert captured[1].profile.display_name == "Ama"
@@ -0,0 +1,65 @@
+import json
+import time
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+from src import settings
+from src.helpers.auth import TokenVerifier
+
+
+class Tokens:
+    """
+    Access tokens shaped like account_serv's, signed with a key generated for the test session
+    """
+
+    def __init__(self, private_key):
+        self.private_key = private_key
+
+    def issue(self, account_id: int, ttl: float = 300, key=None, algorithm: str = "RS256", **claims) -> str:
+        payload = {"token_type": "access", "account_id": account_id, "exp": int(time.time() + ttl), **claims}
+        return jwt.encode(payload, key or self.private_key, algorithm=algorithm)
+
+    def verifier(self) -> TokenVerifier:
+        return TokenVerifier(settings.AUTH, self.private_key.public_key())
+
+    def authorize(self, app):
+        app.state.token_verifier = self.verifier()
+        return app
+
+
+@pytest.fixture(scope="session")
+def tokens():
+    return Tokens(rsa.generate_private_key(public_exponent=65537, key_size=2048))
+
+
+async def _http_request(app, method, path, body=None, token=None):
+    payload = json.dumps(body).encode() if body is not None else b""
+    messages = []
+    path, _, query = path.partition("?")
+
+    async def receive():
+        return {"type": "http.request", "body": payload, "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": method, "scheme": "http",
+        "path": path, "raw_path": path.encode(), "query_string": query.encode(), "root_path": "",
+        "headers": [(b"content-type", b"application/json")] + (
+            [(b"authorization", f"Bearer {token}".encode())] if token else []
+        ), "client": ("test", 1), "server": ("test", 80),
+    }
+    await app(scope, receive, send)
+    status = next(m["status"] for m in messages if m["type"] == "http.response.start")
+    body = b"".join(m.get("body", b"") for m in messages if m["type"] == "http.response.body")
+    return status, json.loads(body) if body else None
+
+
+@pytest.fixture
+def http_request():
+    """
+    Send one HTTP request through an ASGI app, returning the status and the decoded JSON body
+    """
+    return _http_request
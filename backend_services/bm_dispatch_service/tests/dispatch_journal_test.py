@@ -0,0 +1,150 @@
+import asyncio
+import random
+
+import numpy as np
+from src import settings
+from src.models.job import JobState
+from src.repositories.event_log import EventLog
+from src.repositories.job_store import MemoryJobStore
+from src.repositories.location_store import POSITION_ROW, CourierLocationStore
+from src.services.dispatch_journal import DispatchJournal
+from src.services.job_scheduler import JobScheduler
+from src.services.matching_engine import MatchingEngine
+
+ACCRA = (5.6037, -0.1870)
+NOW = 1698825600.0
+
+
+def _journal(directory, **config):
+    couriers = CourierLocationStore()
+    jobs = MemoryJobStore()
+    journal = DispatchJournal(couriers, jobs, settings.JOURNAL._replace(directory=str(directory), fsync=False,
+                                                                        **config))
+    jobs.on_applied = journal.record_transitions
+    scheduler = JobScheduler(jobs, MatchingEngine(couriers, settings.MATCHING), settings.JOBS)
+    return journal, couriers, jobs, scheduler
+
+
+def test_bulk_load_matches_updates():
+    rng = random.Random(3)
+    rows = np.array([
+        (courier_id, rng.uniform(-90, 90), rng.uniform(-180, 180), NOW + courier_id) for courier_id in range(2000)
+    ] + [(5000, 90.0, 180.0, NOW), (5001, -90.0, -180.0, NOW)], dtype=POSITION_ROW)
+    loaded, updated = CourierLocationStore(), CourierLocationStore()
+    loaded.load(rows)
+    updated.update_many(rows.tolist())
+
+    assert len(loaded) == len(updated) == len(rows)
+    assert np.array_equal(np.sort(loaded.export(), order="courier_id"), np.sort(updated.export(), order="courier_id"))
+    for lat, lng in ((5.6, -0.18), (60.0, 179.9), (-89.0, 0.0)):
+        assert loaded.nearest(lat, lng, 5) == updated.nearest(lat, lng, 5)
+        assert loaded.within_radius(lat, lng, 2_000_000) == updated.within_radius(lat, lng, 2_000_000)
+
+    loaded.update(7, *ACCRA, NOW)
+    assert loaded.remove(8) and loaded.get(7).lat == ACCRA[0] and 8 not in loaded
+
+
+def test_torn_tail_is_truncated(tmp_path):
+    log = EventLog(tmp_path, segment_bytes=1 << 20, commit_interval=0, fsync=False)
+    asyncio.run(_append(log, b"first", b"second", b"third"))
+    (_, path), = log.segments()
+    path.write_bytes(path.read_bytes()[:-2])
+
+    reopened = EventLog(tmp_path, segment_bytes=1 << 20, commit_interval=0, fsync=False)
+    asyncio.run(_append(reopened, b"fourth"))
+
+    assert [(seq, bytes(payload)) for seq, _, payload in reopened.records()] == [
+        (1, b"first"), (2, b"second"), (3, b"fourth")
+    ]
+
+
+def test_crash_after_rotation_keeps_numbering(tmp_path):
+    async def crash(log, count):
+        log.open()
+        for index in range(count):
+            log.append(1, b"%08d" % index)
+            await log.commit()
+        # no close: the last commit rotated, leaving an empty segment behind
+        log._file.close()
+
+    log = EventLog(tmp_path, segment_bytes=100, commit_interval=0, fsync=False)
+    asyncio.run(crash(log, 20))
+    assert log.segments()[-1][1].stat().st_size == 0
+
+    reopened = EventLog(tmp_path, segment_bytes=100, commit_interval=0, fsync=False)
+    asyncio.run(_append(reopened, b"after"))
+
+    assert reopened.last_seq == 21
+    assert [seq for seq, _, _ in reopened.records()] == list(range(1, 22))
+
+
+def test_recovery_after_rotation_replays_in_order(tmp_path):
+    journal, couriers, _, _ = _journal(tmp_path, segment_bytes=100)
+
+    async def before_crash():
+        journal.log.open()
+        for step in range(1, 19):
+            journal.record_positions([(1, ACCRA[0] + step * 0.001, ACCRA[1], NOW + step)])
+            await journal.log.commit()
+        journal.log._file.close()
+
+    asyncio.run(before_crash())
+    recovered, recovered_couriers, _, _ = _journal(tmp_path, segment_bytes=100)
+    recovered.recover()
+    assert recovered.log.last_seq == 18
+
+    async def after_restart():
+        recovered.record_positions([(1, *ACCRA, NOW + 100)])
+        await recovered.log.close()
+
+    asyncio.run(after_restart())
+    again, again_couriers, _, _ = _journal(tmp_path)
+    stats = again.recover()
+
+    assert stats["replayed"] == 19 and again.log.last_seq == 19
+    assert again_couriers.get(1).lat == ACCRA[0] and again_couriers.get(1).updated_at == NOW + 100
+
+
+async def _append(log, *payloads):
+    log.open()
+    for payload in payloads:
+        log.append(1, payload)
+    await log.close()
+
+
+def test_snapshot_and_tail_recover_the_state(tmp_path):
+    journal, couriers, jobs, scheduler = _journal(tmp_path, segment_bytes=256)
+
+    async def before_restart():
+        journal.log.open()
+        for courier_id in range(1, 4):
+            couriers.update(courier_id, ACCRA[0] + courier_id * 0.002, ACCRA[1], NOW)
+            journal.record_positions([(courier_id, ACCRA[0] + courier_id * 0.002, ACCRA[1], NOW)])
+        for job_id in (10, 11, 12):
+            await scheduler.submit(job_id, *ACCRA, now=NOW)
+        await scheduler.tick(NOW)
+        snapshot_seq = await journal.snapshot()
+
+        # after the snapshot: only in the log
+        couriers.update(2, *ACCRA, NOW + 5)
+        journal.record_positions([(2, *ACCRA, NOW + 5)])
+        await scheduler.accept(10, (await jobs.get(10)).courier_id, now=NOW + 5)
+        await scheduler.decline(11, (await jobs.get(11)).courier_id)
+        await scheduler.cancel(12)
+        await scheduler.submit(13, *ACCRA, tier=0, now=NOW + 6)
+        await journal.log.close()
+        return snapshot_seq, journal.log.segments()[0][0]
+
+    snapshot_seq, oldest_segment = asyncio.run(before_restart())
+    expected = {job.job_id: job for job in jobs._jobs.values()}
+
+    recovered, recovered_couriers, recovered_jobs, _ = _journal(tmp_path)
+    stats = recovered.recover()
+
+    # the segments the snapshot covers are gone, the tail is all that is replayed
+    assert oldest_segment == snapshot_seq + 1 == stats["recovered_from_seq"] + 1 and stats["replayed"] == 5
+    assert np.array_equal(recovered_couriers.export(), couriers.export())
+    assert {job.job_id: job for job in recovered_jobs._jobs.values()} == expected
+    assert asyncio.run(recovered_jobs.counts()) == asyncio.run(jobs.counts())
+    assert recovered_jobs._queues[JobState.PENDING].scores == jobs._queues[JobState.PENDING].scores
+    assert recovered.log.last_seq == journal.log.last_seq
@@ -0,0 +1,102 @@
+import asyncio
+
+import numpy as np
+import pytest
+from src import settings
+from src.factories.app_factory import create_app
+from src.helpers.ttl_cache import TTLCache
+from src.services.eta_service import EtaService
+from src.services.routing import StubRoutingBackend
+
+ACCRA = (5.6037, -0.1870)
+# 02:00 and 07:30 UTC on 2023-11-01, Accra is on UTC, each in the middle of its 3 hour bucket
+NIGHT = 1698804000.0
+RUSH_HOUR = NIGHT + 5.5 * 3600
+
+
+@pytest.fixture
+def backend():
+    config = settings.ETA
+    return StubRoutingBackend(config.speed_mps, config.detour_factor, config.utc_offset_hours)
+
+
+@pytest.fixture
+def service(backend):
+    return EtaService(backend, settings.ETA)
+
+
+def test_ttl_cache_evicts_least_recently_used_and_expired():
+    now = [0.0]
+    cache = TTLCache(max_size=2, ttl=10, clock=lambda: now[0])
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+
+    now[0] = 10
+    assert cache.get("c") is None
+    assert cache.stats.as_dict() == {"hits": 2, "misses": 2, "expired": 1, "evictions": 1, "hit_rate": 0.5}
+
+
+def test_table_matches_the_backend_for_longer_trips(service, backend):
+    rng = np.random.default_rng(1)
+    from_lats, to_lats = rng.uniform(5.5, 5.8, (2, 500))
+    from_lngs, to_lngs = rng.uniform(-0.4, 0.0, (2, 500))
+
+    async def scenario():
+        await service.refresh_tables()
+        calls = backend.calls
+        etas = await service.eta_many(from_lats, from_lngs, to_lats, to_lngs, RUSH_HOUR)
+        routed = await backend.travel_times(from_lats, from_lngs, to_lats, to_lngs, RUSH_HOUR)
+        return etas, routed, backend.calls - calls
+
+    etas, routed, calls = asyncio.run(scenario())
+
+    assert service.stats.from_table > 400
+    assert calls == 2  # the short trips, routed in one call, and the reference
+    assert np.allclose(etas, routed, rtol=0.01)
+
+
+def test_routed_trips_are_cached_per_time_of_day(service, backend):
+    far = (ACCRA[0] + 0.3, ACCRA[1] + 0.3)
+
+    async def scenario():
+        night = await service.eta(*ACCRA, *far, NIGHT)
+        again = await service.eta(*ACCRA, *far, NIGHT + 60)
+        rush = await service.eta(*ACCRA, *far, RUSH_HOUR)
+        return night, again, rush
+
+    night, again, rush = asyncio.run(scenario())
+
+    assert night == again
+    assert rush > night * 1.5
+    assert backend.calls == 2
+    assert service.cache_stats["hit_rate"] == pytest.approx(1 / 3, abs=1e-3)
+
+
+def test_invalid_coordinates_are_rejected(service):
+    with pytest.raises(ValueError):
+        asyncio.run(service.eta_many([91.0], [0.0], [0.0], [0.0]))
+
+
+def test_batch_endpoint(tokens, http_request):
+    app = tokens.authorize(create_app())
+    token = tokens.issue(1)
+    pairs = [[*ACCRA, ACCRA[0] + i * 0.001, ACCRA[1]] for i in range(2000)]
+
+    async def scenario():
+        batch = await http_request(app, "POST", "/eta/batch", {"pairs": pairs, "depart_at": NIGHT}, token)
+        invalid = await http_request(app, "POST", "/eta/batch", {"pairs": [[95, 0, 0, 0]]}, token)
+        stats = await http_request(app, "GET", "/eta/stats", token=token)
+        return batch, invalid, stats
+
+    (status, body), (invalid_status, _), (_, stats) = asyncio.run(scenario())
+
+    assert status == 200
+    assert len(body["eta_s"]) == 2000
+    assert body["eta_s"][0] == 0 and body["eta_s"] == sorted(body["eta_s"])
+    assert invalid_status == 422
+    assert stats["queries"] == 2000 and stats["backend_calls"] == 1
@@ -0,0 +1,75 @@
+import asyncio
+
+from src import settings
+from src.factories.app_factory import create_app
+from src.models.job import DispatchJob
+from src.services.demand_heatmap import DemandHeatmap, decode_binary
+
+ACCRA = (5.6037, -0.1870)
+NOW = 1698825600.0
+CONFIG = settings.HEATMAP._replace(bucket_s=60, window_buckets=3, cache_s=1)
+
+
+def _order(job_id, lat, lng, at):
+    return DispatchJob(job_id, lat, lng, 1, at + 1800, at)
+
+
+def test_counts_slide_with_the_window():
+    heatmap = DemandHeatmap(CONFIG)
+    cell = heatmap.cell_of(*ACCRA)
+
+    heatmap.record_order(_order(1, *ACCRA, NOW))
+    heatmap.record_order(_order(2, 0.0, 0.0, NOW))
+    # a courier is counted once per cell and bucket however often it pings
+    heatmap.record_positions([(1, *ACCRA, NOW), (1, *ACCRA, NOW), (2, *ACCRA, NOW)], now=NOW)
+    heatmap.record_positions([(1, *ACCRA, NOW + 61)], now=NOW + 61)
+    heatmap.record_order(_order(3, *ACCRA, NOW + 121))
+
+    current = heatmap.snapshot(NOW + 121)
+    assert current.cells.tolist() == [cell]
+    assert current.demand.tolist() == [2]
+    # three courier-buckets over a window of three buckets
+    assert current.supply.tolist() == [1.0]
+    assert heatmap.stats.outside == 1
+
+    # the first bucket leaves the window, then everything does
+    assert heatmap.snapshot(NOW + 180).demand.tolist() == [1]
+    assert heatmap.snapshot(NOW + 180).supply.round(2).tolist() == [0.33]
+    assert len(heatmap.snapshot(NOW + 3600).cells) == 0
+
+
+def test_rendered_heatmap_is_cached_between_updates():
+    heatmap = DemandHeatmap(CONFIG)
+    heatmap.record_order(_order(1, *ACCRA, NOW))
+
+    binary, version = heatmap.render("binary", NOW)
+    assert heatmap.render("binary", NOW + 0.5) == (binary, version)
+    heatmap.record_order(_order(2, *ACCRA, NOW + 0.5))
+    # changed, but still within cache_s of the last render
+    assert heatmap.render("binary", NOW + 0.6) == (binary, version)
+    updated, newer = heatmap.render("binary", NOW + 1.5)
+
+    decoded = decode_binary(updated)
+    assert newer > version and decoded["demand"] == [2] and decoded["cells"] == [heatmap.cell_of(*ACCRA)]
+    assert decoded["cols"] == heatmap.cols and decoded["window_s"] == 180
+    assert heatmap.stats.renders == 2 and heatmap.stats.cache_hits == 2
+
+
+def test_heatmap_endpoint(tokens, http_request):
+    app = tokens.authorize(create_app())
+    token = tokens.issue(1)
+
+    async def scenario():
+        await app.state.job_scheduler.submit(10, *ACCRA)
+        app.state.location_ingestor.submit(3, *ACCRA)
+        await app.state.location_ingestor.flush()
+        return (
+            await http_request(app, "GET", "/heatmap", token=token),
+            await http_request(app, "GET", "/heatmap?format=xml", token=token),
+        )
+
+    (status, body), (bad_status, _) = asyncio.run(scenario())
+
+    assert status == 200 and bad_status == 422
+    assert body["demand"] == [1] and body["cells"] == [app.state.demand_heatmap.cell_of(*ACCRA)]
+    assert body["supply"] == [round(1 / settings.HEATMAP.window_buckets, 2)]
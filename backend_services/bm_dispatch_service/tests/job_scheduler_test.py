@@ -0,0 +1,178 @@
+import asyncio
+
+import pytest
+from src import settings
+from src.factories.app_factory import create_app
+from src.models.job import DispatchJob, JobState
+from src.repositories.job_store import MemoryJobStore, Transition
+from src.repositories.location_store import CourierLocationStore
+from src.services.job_scheduler import JobScheduler
+from src.services.matching_engine import MatchingEngine
+
+ACCRA = (5.6037, -0.1870)
+NOW = 1698825600.0
+
+
+@pytest.fixture
+def couriers():
+    store = CourierLocationStore()
+    store.update(1, ACCRA[0], ACCRA[1], NOW)
+    store.update(2, ACCRA[0] + 0.004, ACCRA[1], NOW)
+    return store
+
+
+def _scheduler(couriers, **config):
+    engine = MatchingEngine(couriers, settings.MATCHING)
+    store = MemoryJobStore()
+    return JobScheduler(store, engine, settings.JOBS._replace(**config)), engine, store
+
+
+def test_most_urgent_jobs_are_matched_first(couriers):
+    scheduler, engine, store = _scheduler(couriers, batch_size=2, tier_spacing_s=600)
+
+    async def scenario():
+        await scheduler.submit(10, *ACCRA, tier=1, deadline=NOW + 300, now=NOW)
+        await scheduler.submit(11, *ACCRA, tier=0, deadline=NOW + 800, now=NOW)
+        await scheduler.submit(12, *ACCRA, tier=1, deadline=NOW + 100, now=NOW)
+        duplicate = await scheduler.submit(12, *ACCRA, now=NOW)
+        offered = await scheduler.tick(NOW)
+        return duplicate, offered, await scheduler.counts()
+
+    duplicate, offered, counts = asyncio.run(scenario())
+
+    # tier 1 counts 600s later: 12 is due at 700, 11 at 800 and 10 at 900
+    assert duplicate is None
+    assert sorted(job.job_id for job in offered) == [11, 12]
+    assert all(job.state == JobState.OFFERED and job.attempts == 1 for job in offered)
+    assert counts == {"pending": 1, "offered": 2, "accepted": 0}
+    assert engine.load_of(1) == engine.load_of(2) == 1
+
+
+def test_expired_offers_are_retried_until_the_job_fails(couriers):
+    scheduler, engine, store = _scheduler(couriers, offer_timeout_s=30, max_attempts=2)
+
+    async def scenario():
+        await scheduler.submit(10, *ACCRA, now=NOW)
+        first = await scheduler.tick(NOW)
+        retried = await scheduler.tick(NOW + 31)
+        await scheduler.tick(NOW + 62)
+        return first, retried, await scheduler.counts()
+
+    first, retried, counts = asyncio.run(scenario())
+
+    assert [job.attempts for job in first + retried] == [1, 2]
+    assert counts == {"pending": 0, "offered": 0, "accepted": 0}
+    assert scheduler.stats.expired == 2 and scheduler.stats.failed == 1
+    assert engine.load_of(1) == engine.load_of(2) == 0
+    assert [event for _, event in store.events] == ["submitted", "offered", "expired", "offered", "expired:failed"]
+
+
+def test_only_the_offered_courier_can_accept_before_the_offer_expires(couriers):
+    scheduler, engine, _ = _scheduler(couriers, offer_timeout_s=30)
+
+    async def scenario():
+        await scheduler.submit(10, *ACCRA, now=NOW)
+        await scheduler.submit(11, *ACCRA, now=NOW)
+        offers = {job.job_id: job.courier_id for job in await scheduler.tick(NOW)}
+        other = {10: offers[11], 11: offers[10]}
+        results = [
+            await scheduler.accept(10, other[10], now=NOW + 1),
+            await scheduler.accept(10, offers[10], now=NOW + 1),
+            await scheduler.complete(10, offers[10]),
+            await scheduler.decline(11, offers[11]),
+            await scheduler.accept(11, offers[11], now=NOW + 2),
+        ]
+        return offers, results, await scheduler.get(11)
+
+    offers, results, declined = asyncio.run(scenario())
+
+    assert results == [False, True, True, True, False]
+    assert declined.state == JobState.PENDING and declined.courier_id is None
+    assert engine.load_of(offers[10]) == engine.load_of(offers[11]) == 0
+    assert scheduler.stats.completed == 1 and scheduler.stats.declined == 1
+
+
+def test_a_job_back_in_its_queue_is_listed_once():
+    store = MemoryJobStore()
+    job = DispatchJob(1, *ACCRA, 0, NOW + 600, NOW)
+
+    async def scenario():
+        await store.apply([Transition(1, None, JobState.PENDING, 5.0, job)])
+        await store.apply([Transition(1, JobState.PENDING, JobState.OFFERED, NOW, job)])
+        await store.apply([Transition(1, JobState.OFFERED, JobState.PENDING, 5.0, job)])
+        await store.apply([Transition(2, None, JobState.PENDING, 6.0, job._replace(job_id=2))])
+        return [job.job_id for job in await store.lowest(JobState.PENDING, 10)]
+
+    assert asyncio.run(scenario()) == [1, 2]
+
+
+def test_a_stale_offer_cannot_be_accepted_or_declined(couriers):
+    scheduler, engine, store = _scheduler(couriers, offer_timeout_s=30)
+
+    async def scenario():
+        await scheduler.submit(10, *ACCRA, now=NOW)
+        [first] = await scheduler.tick(NOW)
+        [second] = await scheduler.tick(NOW + 31)
+
+        # the first courier read its offer just before it expired and went to the other courier
+        async def stale_get(job_id):
+            return first
+
+        store.get = stale_get
+        results = [await scheduler.accept(10, first.courier_id, now=NOW + 32),
+                   await scheduler.decline(10, first.courier_id)]
+        del store.get
+        return first, second, results, await scheduler.get(10)
+
+    first, second, results, job = asyncio.run(scenario())
+
+    assert first.courier_id != second.courier_id
+    assert results == [False, False]
+    assert job == second
+    assert engine.load_of(first.courier_id) == 0 and engine.load_of(second.courier_id) == 1
+
+
+def test_recovery_restores_the_loads_of_couriers_holding_jobs(couriers):
+    scheduler, _, store = _scheduler(couriers)
+
+    async def scenario():
+        await scheduler.submit(10, *ACCRA, now=NOW)
+        await scheduler.submit(11, *ACCRA, now=NOW)
+        offers = await scheduler.tick(NOW)
+        await scheduler.accept(offers[0].job_id, offers[0].courier_id, now=NOW)
+
+        restarted = JobScheduler(store, MatchingEngine(couriers, settings.MATCHING), settings.JOBS)
+        return await restarted.recover(), restarted._engine
+
+    recovered, engine = asyncio.run(scenario())
+
+    assert recovered == 2
+    assert engine.load_of(1) == engine.load_of(2) == 1
+
+
+def test_dispatch_endpoints(tokens, http_request, couriers):
+    app = tokens.authorize(create_app())
+    scheduler, _, _ = _scheduler(couriers)
+    app.state.job_scheduler = scheduler
+    token = tokens.issue(99)
+
+    async def scenario():
+        submitted = await http_request(app, "POST", "/dispatch/orders", {"order_id": 10, "lat": ACCRA[0],
+                                                                         "lng": ACCRA[1], "tier": 0}, token)
+        duplicate = await http_request(app, "POST", "/dispatch/orders", {"order_id": 10, "lat": 0, "lng": 0}, token)
+        [offer] = await scheduler.tick()
+        wrong_courier = await http_request(app, "POST", "/dispatch/orders/10/accept", token=token)
+        accepted = await http_request(app, "POST", "/dispatch/orders/10/accept",
+                                      token=tokens.issue(offer.courier_id))
+        job = await http_request(app, "GET", "/dispatch/orders/10", token=token)
+        stats = await http_request(app, "GET", "/dispatch/stats", token=token)
+        return submitted, duplicate, wrong_courier, accepted, job, stats
+
+    submitted, duplicate, wrong_courier, accepted, job, stats = asyncio.run(scenario())
+
+    assert submitted[0] == 202 and submitted[1]["tier"] == 0
+    assert duplicate[0] == 409
+    assert wrong_courier[0] == 409
+    assert accepted[0] == 204
+    assert job[1]["state"] == JobState.ACCEPTED
+    assert stats[1]["accepted"] == 1 and stats[1]["scheduler"]["offered"] == 1
@@ -0,0 +1,161 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+from src import settings
+from src.factories.app_factory import create_app
+from src.helpers.location_frames import decode_frame, encode_binary
+from src.helpers.rate_limit import TokenBucket
+from src.repositories.location_store import CourierLocationStore
+from src.services.location_ingestor import LocationIngestor
+
+
+@pytest.fixture
+def store():
+    return CourierLocationStore()
+
+
+@pytest.fixture
+def ingestor(store):
+    return LocationIngestor(store, flush_interval=60, apply_chunk_size=3)
+
+
+def test_pings_are_coalesced_per_courier(ingestor, store):
+    ingestor.submit(1, 5.60, -0.18, 10.0)
+    ingestor.submit(1, 5.61, -0.19, 12.0)
+    ingestor.submit(1, 5.62, -0.20, 11.0)  # older than the queued ping
+    ingestor.submit(2, 6.68, -1.62, 10.0)
+
+    assert len(store) == 0
+    assert asyncio.run(ingestor.flush()) == 2
+
+    assert (store.get(1).lat, store.get(1).lng, store.get(1).updated_at) == (5.61, -0.19, 12.0)
+    assert ingestor.stats.as_dict() | {"last_flush_ms": 0} == {
+        "received": 4, "coalesced": 1, "stale": 1, "applied": 2, "flushes": 1, "last_flush_ms": 0,
+    }
+
+
+def test_flush_applies_in_chunks_and_stop_drains(ingestor, store):
+    async def scenario():
+        ingestor.start()
+        for courier_id in range(10):
+            ingestor.submit(courier_id, 5.6, -0.18, 1.0)
+        await ingestor.stop()
+
+    asyncio.run(scenario())
+
+    assert len(store) == 10
+    assert ingestor.pending == 0
+
+
+def test_invalid_coordinates_are_rejected(ingestor):
+    with pytest.raises(ValueError):
+        ingestor.submit(1, 91.0, 0.0)
+    assert ingestor.pending == 0
+
+
+def test_decode_frame():
+    assert decode_frame(encode_binary(5.6, -0.18, 10.0)) == (5.6, -0.18, 10.0)
+    assert decode_frame(encode_binary(5.6, -0.18)) == (5.6, -0.18, None)
+    assert decode_frame(json.dumps({"lat": 5.6, "lng": -0.18})) == (5.6, -0.18, None)
+
+    for frame in (b"\x00" * 8, "not json", "[1, 2]", json.dumps({"lat": "nan", "lng": 0})):
+        with pytest.raises(ValueError):
+            decode_frame(frame)
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=2, burst=3)
+    now = bucket._stamp
+
+    assert [bucket.take(now) for _ in range(4)] == [True, True, True, False]
+    assert bucket.take(now + 0.5)
+    assert not bucket.take(now + 0.5)
+
+
+async def _websocket_session(app, path, frames):
+    """
+    Drive a websocket connection through the ASGI app, returning what the app sent back
+    """
+    incoming = asyncio.Queue()
+    sent = []
+    for message in [{"type": "websocket.connect"}, *frames, {"type": "websocket.disconnect", "code": 1000}]:
+        incoming.put_nowait(message)
+
+    async def send(message):
+        sent.append(message)
+
+    path, _, query = path.partition("?")
+    scope = {
+        "type": "websocket", "path": path, "raw_path": path.encode(), "root_path": "", "scheme": "ws",
+        "query_string": query.encode(), "headers": [], "client": ("127.0.0.1", 1), "server": ("testserver", 80),
+        "subprotocols": [],
+    }
+    await app(scope, incoming.get, send)
+    return sent
+
+
+def _frame(lat, lng, sent_at):
+    return {"type": "websocket.receive", "bytes": encode_binary(lat, lng, sent_at)}
+
+
+def test_websocket_frames_reach_the_store(tokens):
+    app = tokens.authorize(create_app())
+    frames = [_frame(5.6, -0.18, 1.0), {"type": "websocket.receive", "text": '{"lat": 5.7, "lng": -0.2, "ts": 2}'}]
+
+    sent = asyncio.run(_websocket_session(app, f"/ws/locations/42?token={tokens.issue(42)}", frames))
+    asyncio.run(app.state.location_ingestor.flush())
+
+    assert sent == [{"type": "websocket.accept", "subprotocol": None, "headers": []}]
+    assert (app.state.location_store.get(42).lat, app.state.location_store.get(42).updated_at) == (5.7, 2.0)
+
+
+def test_websocket_flooding_client_is_closed(tokens):
+    app = tokens.authorize(create_app())
+    config = settings.LOCATION_INGEST
+    frames = [_frame(5.6, -0.18, i + 1) for i in range(config.burst + config.max_dropped + 5)]
+
+    sent = asyncio.run(_websocket_session(app, f"/ws/locations/42?token={tokens.issue(42)}", frames))
+
+    assert sent[-1]["type"] == "websocket.close"
+    assert sent[-1]["code"] == 1008
+    assert app.state.location_ingestor.stats.received == config.burst
+
+
+def test_websocket_drops_between_accepted_frames_are_forgiven(tokens, monkeypatch):
+    app = tokens.authorize(create_app())
+    config = settings.LOCATION_INGEST._replace(frames_per_second=1, burst=1, max_dropped=3)
+    monkeypatch.setattr(settings, "LOCATION_INGEST", config)
+    # a quarter second between frames: every fourth one is accepted, the three between dropped
+    ticks = iter(range(1000))
+    monkeypatch.setattr("src.helpers.rate_limit.time", SimpleNamespace(monotonic=lambda: next(ticks) * 0.25))
+    frames = [_frame(5.6, -0.18, i + 1) for i in range(40)]
+
+    sent = asyncio.run(_websocket_session(app, f"/ws/locations/42?token={tokens.issue(42)}", frames))
+
+    assert [message["type"] for message in sent] == ["websocket.accept"]
+    assert app.state.location_ingestor.stats.received == 10
+
+
+def test_websocket_malformed_frame_closes_connection(tokens):
+    app = tokens.authorize(create_app())
+    frames = [{"type": "websocket.receive", "text": "{}"}]
+
+    sent = asyncio.run(_websocket_session(app, f"/ws/locations/42?token={tokens.issue(42)}", frames))
+
+    assert sent[-1]["type"] == "websocket.close"
+    assert sent[-1]["code"] == 1007
+
+
+@pytest.mark.parametrize("token", [None, "not-a-token", "other-courier"])
+def test_websocket_requires_the_courier_token(tokens, token):
+    app = tokens.authorize(create_app())
+    if token == "other-courier":
+        token = tokens.issue(7)
+    path = "/ws/locations/42" if token is None else f"/ws/locations/42?token={token}"
+
+    sent = asyncio.run(_websocket_session(app, path, [_frame(5.6, -0.18, 1.0)]))
+
+    assert sent == [{"type": "websocket.close", "code": 1008, "reason": sent[0]["reason"]}]
+    assert app.state.location_ingestor.stats.received == 0
@@ -0,0 +1,90 @@
+import random
+
+import pytest
+from src.helpers.geo import haversine_m
+from src.repositories.location_store import CourierLocationStore
+
+ACCRA = (5.6037, -0.1870)
+
+
+@pytest.fixture
+def store():
+    return CourierLocationStore()
+
+
+@pytest.fixture
+def populated_store(store):
+    rng = random.Random(7)
+    for courier_id in range(2000):
+        store.update(courier_id, ACCRA[0] + rng.uniform(-0.2, 0.2), ACCRA[1] + rng.uniform(-0.2, 0.2), 0.0)
+    return store
+
+
+def _brute_force(store, lat, lng):
+    return sorted((haversine_m(lat, lng, p.lat, p.lng), p.courier_id) for p in store.positions())
+
+
+def test_update_and_get(store):
+    store.update(1, *ACCRA, updated_at=10.0)
+    store.update(1, 5.61, -0.19, updated_at=11.0)
+
+    position = store.get(1)
+    assert (position.lat, position.lng, position.updated_at) == (5.61, -0.19, 11.0)
+    assert len(store) == 1
+
+
+def test_remove_reuses_slots(store):
+    store.update(1, *ACCRA)
+    store.update(2, *ACCRA)
+
+    assert store.remove(1)
+    assert not store.remove(1)
+    store.update(3, 5.7, -0.2)
+
+    assert store.get(1) is None
+    assert {p.courier_id for p in store.positions()} == {2, 3}
+    assert [p.courier_id for p, _ in store.nearest(*ACCRA, k=5)] == [2, 3]
+
+
+def test_invalid_coordinates_are_rejected(store):
+    with pytest.raises(ValueError):
+        store.update(1, 91.0, 0.0)
+
+
+def test_nearest_matches_brute_force(populated_store):
+    expected = [courier_id for _, courier_id in _brute_force(populated_store, *ACCRA)[:10]]
+
+    result = populated_store.nearest(*ACCRA, k=10)
+
+    assert [p.courier_id for p, _ in result] == expected
+    assert [d for _, d in result] == sorted(d for _, d in result)
+
+
+def test_nearest_respects_max_radius(populated_store):
+    result = populated_store.nearest(*ACCRA, k=50, max_radius_m=1000)
+
+    assert all(distance <= 1000 for _, distance in result)
+
+
+def test_within_radius_matches_brute_force(populated_store):
+    expected = [courier_id for distance, courier_id in _brute_force(populated_store, *ACCRA) if distance <= 3000]
+
+    result = populated_store.within_radius(*ACCRA, radius_m=3000)
+
+    assert [p.courier_id for p, _ in result] == expected
+
+
+def test_queries_across_the_antimeridian(store):
+    store.update(1, 0.0, 179.999)
+    store.update(2, 0.0, -179.999)
+    store.update(3, 0.0, 170.0)
+
+    assert {p.courier_id for p, _ in store.within_radius(0.0, 180.0, radius_m=1000)} == {1, 2}
+    assert {p.courier_id for p, _ in store.nearest(0.0, -180.0, k=2)} == {1, 2}
+
+
+def test_nearest_with_sparse_far_away_couriers(store):
+    store.update(1, 50.0, 10.0)
+    store.update(2, -30.0, 100.0)
+
+    assert [p.courier_id for p, _ in store.nearest(*ACCRA, k=1)] == [1]
@@ -0,0 +1,108 @@
+import asyncio
+import itertools
+
+import numpy as np
+import pytest
+from src import settings
+from src.helpers import assignment
+from src.models.order import PendingOrder
+from src.repositories.location_store import CourierLocationStore
+from src.services.matching_engine import MatchingEngine
+
+ACCRA = (5.6037, -0.1870)
+
+
+def _brute_force(cost):
+    n, m = cost.shape
+    if n <= m:
+        return min(sum(cost[i, p[i]] for i in range(n)) for p in itertools.permutations(range(m), n))
+    return min(sum(cost[p[j], j] for j in range(m)) for p in itertools.permutations(range(n), m))
+
+
+@pytest.mark.parametrize("shape", [(1, 1), (3, 3), (4, 6), (6, 4), (5, 5)])
+def test_hungarian_is_optimal(shape):
+    rng = np.random.default_rng(sum(shape))
+    for _ in range(20):
+        cost = rng.random(shape) * 100
+        rows, cols = assignment.hungarian(cost)
+
+        assert len(rows) == min(shape)
+        assert len(set(rows.tolist())) == len(set(cols.tolist())) == min(shape)
+        assert assignment.total_cost(cost, (rows, cols)) == pytest.approx(_brute_force(cost))
+
+
+@pytest.mark.parametrize("solver", [assignment.greedy, assignment.greedy_regret])
+def test_heuristics_return_valid_assignments(solver):
+    rng = np.random.default_rng(3)
+    for shape in [(4, 7), (7, 4), (6, 6)]:
+        rows, cols = solver(rng.random(shape))
+
+        assert len(rows) == min(shape)
+        assert len(set(rows.tolist())) == len(set(cols.tolist())) == min(shape)
+
+
+def test_regret_beats_greedy_when_the_first_order_steals_the_only_option():
+    # the first order is a little closer to courier 0, but the second order has no other courier nearby
+    cost = np.array([[1.0, 2.0], [3.0, 100.0]])
+
+    assert assignment.total_cost(cost, assignment.greedy(cost)) == 101.0
+    assert assignment.total_cost(cost, assignment.greedy_regret(cost)) == 5.0
+
+
+@pytest.fixture
+def store():
+    store = CourierLocationStore()
+    store.update(1, ACCRA[0], ACCRA[1], 0.0)
+    store.update(2, ACCRA[0], ACCRA[1] + 0.003, 0.0)
+    return store
+
+
+@pytest.fixture
+def engine(store):
+    return MatchingEngine(store, settings.MATCHING._replace(max_active_orders=1, max_pickup_m=3000))
+
+
+def test_batch_matching_minimises_total_eta(engine):
+    orders = [
+        PendingOrder(10, ACCRA[0], ACCRA[1] + 0.001, 0.0),
+        PendingOrder(11, ACCRA[0], ACCRA[1] - 0.002, 0.0),
+    ]
+
+    assignments, unmatched = engine.match(orders)
+
+    # nearest-first sends courier 1 to order 10 and courier 2 all the way across to order 11
+    assert {a.order_id: a.courier_id for a in assignments} == {10: 2, 11: 1}
+    assert unmatched == []
+    assert engine.load_of(1) == engine.load_of(2) == 1
+
+
+def test_full_and_distant_couriers_are_not_matched(engine):
+    engine.match([PendingOrder(10, ACCRA[0], ACCRA[1], 0.0)])
+    far_order = PendingOrder(12, ACCRA[0] + 0.5, ACCRA[1], 0.0)
+
+    assignments, unmatched = engine.match([PendingOrder(11, ACCRA[0], ACCRA[1], 0.0), far_order])
+
+    assert [(a.order_id, a.courier_id) for a in assignments] == [(11, 2)]
+    assert unmatched == [far_order]
+
+    engine.release(1)
+    assert engine.load_of(1) == 0
+
+
+def test_run_batch_reports_assignments_and_carries_unmatched_orders(engine):
+    delivered = []
+
+    async def on_assigned(assignments):
+        delivered.extend(assignments)
+
+    engine._on_assigned = on_assigned
+    for order_id in range(3):
+        engine.submit(PendingOrder(order_id, ACCRA[0], ACCRA[1], 0.0))
+
+    asyncio.run(engine.run_batch())
+
+    assert len(delivered) == 2
+    assert engine.pending == 1
+    assert engine.stats.as_dict() | {"last_batch_ms": 0} == {
+        "batches": 1, "orders_matched": 2, "orders_carried": 1, "last_batch_size": 3, "last_batch_ms": 0,
+    }
@@ -0,0 +1,151 @@
+import asyncio
+import json
+import time
+
+import pytest
+from src import settings
+from src.factories.app_factory import create_app
+from src.models.job import JobState
+from src.repositories.job_store import MemoryJobStore
+from src.repositories.location_store import CourierLocationStore
+from src.services.connection_registry import ConnectionRegistry
+from src.services.job_scheduler import JobScheduler
+from src.services.matching_engine import MatchingEngine
+from src.services.offer_dispatcher import OfferDispatcher
+
+ACCRA = (5.6037, -0.1870)
+
+
+class _Socket:
+    def __init__(self):
+        self.sent = []
+        self.closed = None
+
+    async def send_text(self, message):
+        self.sent.append(json.loads(message))
+
+    async def close(self, code, reason=""):
+        self.closed = code
+
+
+@pytest.fixture
+def dispatch():
+    couriers = CourierLocationStore()
+    couriers.update(1, ACCRA[0], ACCRA[1])
+    couriers.update(2, ACCRA[0] + 0.004, ACCRA[1])
+    scheduler = JobScheduler(MemoryJobStore(), MatchingEngine(couriers, settings.MATCHING), settings.JOBS)
+    registry = ConnectionRegistry(settings.PUSH.max_outbox)
+    dispatcher = OfferDispatcher(registry, scheduler, settings.PUSH)
+    scheduler.on_offered = dispatcher.offer
+    return scheduler, registry, dispatcher
+
+
+def test_fan_out_is_queued_in_one_pass_and_written_per_connection():
+    registry = ConnectionRegistry(max_outbox=2)
+
+    async def scenario():
+        sockets = {courier_id: _Socket() for courier_id in range(1000)}
+        for courier_id, socket in sockets.items():
+            registry.connect(courier_id, socket)
+        pushed = registry.push_many([(courier_id, json.dumps({"n": courier_id})) for courier_id in range(1001)])
+        overflow = registry.push_many([(7, "{}")] * 3)
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        await registry.close()
+        return sockets, pushed, overflow
+
+    sockets, pushed, overflow = asyncio.run(scenario())
+
+    assert pushed == [True] * 1000 + [False]
+    assert overflow == [True, False, False]
+    assert all(socket.sent[0] == {"n": courier_id} for courier_id, socket in sockets.items())
+    assert sockets[7].sent[1:] == [{}]
+    assert all(socket.closed == 1001 for socket in sockets.values())
+    assert registry.stats.not_connected == 1 and registry.stats.overflowed == 2
+
+
+def test_unreached_and_unacknowledged_offers_go_to_the_next_courier(dispatch):
+    scheduler, registry, dispatcher = dispatch
+
+    async def scenario():
+        socket = _Socket()
+        registry.connect(2, socket)
+        await scheduler.submit(10, *ACCRA)
+        # courier 1 is nearest but not connected, the offer is withdrawn as soon as it is made
+        first = await scheduler.tick()
+        second = await scheduler.tick()
+        await asyncio.sleep(0)
+        timed_out = await dispatcher.check_acks(time.monotonic() + settings.PUSH.ack_timeout_s)
+        return first, second, socket.sent, timed_out, await scheduler.get(10)
+
+    first, second, sent, timed_out, job = asyncio.run(scenario())
+
+    assert [offer.courier_id for offer in first + second] == [1, 2]
+    assert [(message["type"], message["job_id"]) for message in sent] == [("offer", 10)]
+    assert timed_out == 1
+    assert job.state == JobState.PENDING and job.excluded == (1, 2)
+    assert dispatcher.stats.as_dict()["unreachable"] == 1 and dispatcher.stats.ack_timeouts == 1
+    assert scheduler.stats.withdrawn == 2
+
+
+def test_acknowledged_offer_is_timed_and_accepted(dispatch):
+    scheduler, registry, dispatcher = dispatch
+
+    async def scenario():
+        registry.connect(1, _Socket())
+        await scheduler.submit(10, *ACCRA)
+        await scheduler.tick()
+        acknowledged = dispatcher.acknowledge(1, 10), dispatcher.acknowledge(1, 10)
+        reply = await dispatcher.handle(1, "accept", 10)
+        timed_out = await dispatcher.check_acks(time.monotonic() + 60)
+        return acknowledged, reply, timed_out, await scheduler.get(10)
+
+    acknowledged, reply, timed_out, job = asyncio.run(scenario())
+
+    assert acknowledged == (True, False)
+    assert json.loads(reply) == {"type": "accepted", "job_id": 10, "ok": True}
+    assert timed_out == 0 and job.state == JobState.ACCEPTED
+    stats = dispatcher.stats.as_dict()
+    assert stats["ack_rate"] == 1.0 and stats["ack_p99_ms"] < 1000
+
+
+def test_offer_socket(tokens):
+    app = tokens.authorize(create_app())
+    app.state.location_store.update(3, *ACCRA)
+    outgoing = asyncio.Queue()
+    incoming = asyncio.Queue()
+    scope = {
+        "type": "websocket", "path": "/ws/offers/3", "raw_path": b"/ws/offers/3", "root_path": "", "scheme": "ws",
+        "query_string": f"token={tokens.issue(3)}".encode(), "headers": [], "client": ("127.0.0.1", 1),
+        "server": ("testserver", 80), "subprotocols": [],
+    }
+
+    async def next_sent():
+        return await asyncio.wait_for(outgoing.get(), 1)
+
+    async def scenario():
+        incoming.put_nowait({"type": "websocket.connect"})
+        session = asyncio.get_running_loop().create_task(app(scope, incoming.get, outgoing.put))
+        accepted = await next_sent()
+
+        await app.state.job_scheduler.submit(10, *ACCRA)
+        await app.state.job_scheduler.tick()
+        offer = json.loads((await next_sent())["text"])
+        for kind in ("ack", "accept"):
+            incoming.put_nowait({"type": "websocket.receive", "text": json.dumps({"type": kind, "job_id": 10})})
+        reply = json.loads((await next_sent())["text"])
+
+        incoming.put_nowait({"type": "websocket.receive", "text": "not json"})
+        closed = await next_sent()
+        incoming.put_nowait({"type": "websocket.disconnect", "code": 1000})
+        await session
+        return accepted, offer, reply, closed
+
+    accepted, offer, reply, closed = asyncio.run(scenario())
+
+    assert accepted["type"] == "websocket.accept"
+    assert offer["type"] == "offer" and offer["job_id"] == 10
+    assert reply == {"type": "accepted", "job_id": 10, "ok": True}
+    assert closed["type"] == "websocket.close" and closed["code"] == 1007
+    assert len(app.state.connection_registry) == 0
+    assert app.state.offer_dispatcher.stats.acknowledged == 1
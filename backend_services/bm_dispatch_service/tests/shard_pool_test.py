@@ -0,0 +1,131 @@
+import asyncio
+
+import pytest
+from src import settings
+from src.helpers.regions import RegionPartitioner
+from src.models.order import PendingOrder
+from src.repositories.location_store import CourierLocationStore
+from src.repositories.shared_positions import SharedLoads, SharedPositionTable
+from src.services.shard_pool import ShardPool
+from src.services.sharded_matching_engine import ShardedMatchingEngine
+
+ACCRA = (5.6037, -0.1870)
+TILE_DEG = 0.05
+
+
+@pytest.fixture(scope="module")
+def pool():
+    pool = ShardPool(2, capacity=1000, tile_deg=TILE_DEG, cell_size=0.01, config=settings.MATCHING)
+    pool.start()
+    yield pool
+    pool.close()
+
+
+def _boundary_point(partitioner: RegionPartitioner, lat: float = ACCRA[0]):
+    """
+    A point on a tile edge whose two sides belong to different shards
+    """
+    for step in range(1, 100):
+        lng = -0.2 + step * TILE_DEG
+        if partitioner.shard_of(lat, lng - 0.001) != partitioner.shard_of(lat, lng + 0.001):
+            return lat, lng
+    raise AssertionError("no boundary between shards")
+
+
+def test_partitioner_covers_the_circle():
+    partitioner = RegionPartitioner(4, TILE_DEG)
+    lat, lng = ACCRA
+
+    assert partitioner.shards_for_circle(lat, lng, 1) == {partitioner.shard_of(lat, lng)}
+    nearby = partitioner.shards_for_circle(lat, lng, 8000)
+    for d_lat in (-0.07, 0, 0.07):
+        for d_lng in (-0.07, 0, 0.07):
+            assert partitioner.shard_of(lat + d_lat, lng + d_lng) in nearby
+    assert partitioner.shards_for_circle(lat, lng, 5_000_000) == {0, 1, 2, 3}
+
+
+def test_shared_loads_follow_the_row_owner():
+    table = SharedPositionTable(4).open()
+    try:
+        loads = SharedLoads(table, table.slot_of)
+        table.write(7, *ACCRA, 0.0)
+        loads[7] = 2
+
+        assert loads.get(7) == 2
+        assert list(loads) == [7]
+        assert loads.get(8, 0) == 0
+
+        table.release(7)
+        table.write(8, *ACCRA, 0.0)
+        assert loads.get(8, 0) == 0
+        with pytest.raises(KeyError):
+            loads[7] = 1
+    finally:
+        table.close()
+
+
+def test_table_is_shared_by_name():
+    table = SharedPositionTable(4).open()
+    attached = SharedPositionTable(4, name=table.name).open()
+    try:
+        slot = table.write(3, 1.5, 2.5, 10.0)
+
+        assert attached.ids[slot] == 3
+        assert (attached.lats[slot], attached.lngs[slot]) == (1.5, 2.5)
+    finally:
+        attached.close()
+        table.close()
+
+
+def test_queries_merge_across_shards(pool):
+    lat, lng = _boundary_point(pool.partitioner)
+    reference = CourierLocationStore(cell_size=0.01)
+    for courier_id in range(40):
+        # couriers on both sides of the tile edge
+        position = (lat + (courier_id % 5) * 0.002, lng + (courier_id - 20) * 0.0005 + 0.00013)
+        pool.update(courier_id, *position, 1.0)
+        reference.update(courier_id, *position, 1.0)
+
+    async def scenario():
+        return (
+            await pool.nearest(lat, lng, 10),
+            await pool.within_radius(lat, lng, 800),
+            await pool.shard_stats(),
+        )
+
+    nearest, within, shard_stats = asyncio.run(scenario())
+
+    assert [p.courier_id for p, _ in nearest] == [p.courier_id for p, _ in reference.nearest(lat, lng, 10)]
+    assert [p.courier_id for p, _ in within] == [p.courier_id for p, _ in reference.within_radius(lat, lng, 800)]
+    assert all(stats["couriers"] for stats in shard_stats)
+    assert sum(stats["couriers"] for stats in shard_stats) == 40
+
+
+def test_courier_moving_between_shards(pool):
+    lat, lng = _boundary_point(pool.partitioner)
+    pool.update(500, lat, lng - 0.001, 1.0)
+    pool.update(500, lat, lng + 0.001, 2.0)
+
+    found = asyncio.run(pool.within_radius(lat, lng, 300))
+
+    assert [(p.courier_id, p.updated_at) for p, _ in found if p.courier_id == 500] == [(500, 2.0)]
+    assert pool.remove(500)
+    assert pool.get(500) is None
+
+
+def test_sharded_matching_assigns_each_courier_once(pool):
+    # away from the couriers of the other tests
+    lat, lng = _boundary_point(pool.partitioner, ACCRA[0] + 1)
+    config = settings.MATCHING._replace(max_active_orders=1)
+    engine = ShardedMatchingEngine(pool, config)
+    for courier_id in range(600, 604):
+        pool.update(courier_id, lat, lng + (courier_id - 601.5) * 0.002, 1.0)
+    for order_id in range(6):
+        engine.submit(PendingOrder(order_id, lat + 0.001, lng + (order_id - 2.5) * 0.001, 0.0))
+
+    assignments = asyncio.run(engine.run_batch())
+
+    assert len(assignments) == 4
+    assert len({a.courier_id for a in assignments}) == 4
+    assert all(engine.load_of(courier_id) == 1 for courier_id in range(600, 604))
+    assert engine.pending == 2